@@ -4,7 +4,7 @@ import { apiFetch } from '@/lib/api'
 export interface TrainingJob {
     id: string
     name: string
-    status: 'idle' | 'preparing' | 'training' | 'completed' | 'failed'
+    status: 'idle' | 'preparing' | 'training' | 'completed' | 'failed' | 'cancelled' | 'interrupted'
     progress: number
     currentStep: number
     totalSteps: number
@@ -184,17 +184,20 @@ export const useTrainingStore = create<TrainingState>((set) => ({
                 logs: [`[${new Date().toLocaleTimeString()}] Training started: ${state.config.modelName}`]
             })
 
-            // Start status polling
+            // Start status polling (logs are read incrementally from logOffset)
+            let logOffset = 0
             const pollStatus = async () => {
                 const currentJob = useTrainingStore.getState().activeJob;
-                if (!currentJob || currentJob.status === 'completed' || currentJob.status === 'failed') return;
+                if (!currentJob || currentJob.status !== 'training') return;
 
                 try {
                     const [statusData, gpuData] = await Promise.all([
-                        apiFetch<any>(`/train/status?job_id=${currentJob.id}`),
+                        apiFetch<any>(`/train/status?job_id=${currentJob.id}&offset=${logOffset}`),
                         apiFetch<any>('/gpu/status')
                     ]);
 
+                    logOffset = statusData.log_offset ?? logOffset
+
                     set((state) => ({
                         activeJob: state.activeJob ? {
                             ...state.activeJob,
@@ -212,7 +215,7 @@ export const useTrainingStore = create<TrainingState>((set) => ({
                         logs: statusData.logs ? [...state.logs, ...statusData.logs] : state.logs
                     }));
 
-                    if (statusData.status !== 'completed' && statusData.status !== 'failed') {
+                    if (statusData.status === 'training') {
                         setTimeout(pollStatus, 3000);
                     }
                 } catch (error) {
@@ -242,7 +245,15 @@ export const useTrainingStore = create<TrainingState>((set) => ({
         }
     },
 
-    stopTraining: () => set({ activeJob: null }),
+    stopTraining: () => {
+        const job = useTrainingStore.getState().activeJob
+        if (job && job.status === 'training') {
+            apiFetch(`/train/${job.id}`, { method: 'DELETE' }).catch((error) => {
+                console.error('Cancel training error:', error)
+            })
+        }
+        set({ activeJob: null })
+    },
 
     previewCheckpoint: (_checkpointId: string) => {
         // Logic to load checkpoint preview
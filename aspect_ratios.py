@@ -0,0 +1,42 @@
+"""
+Aspect Ratios
+
+The generation presets offered by the API (`GET /aspect-ratios`), kept
+apart from server.py so training code can use the same table without
+importing the server.
+"""
+
+from dataclasses import dataclass
+
+
+@dataclass
+class AspectRatioConfig:
+    name: str
+    ratio: str
+    width: int
+    height: int
+    category: str
+    recommended_steps: int
+
+ASPECT_RATIOS = {
+    "1:1": AspectRatioConfig("Square", "1:1", 1024, 1024, "square", 30),
+    "16:9": AspectRatioConfig("Widescreen", "16:9", 1344, 768, "horizontal", 32),
+    "3:2": AspectRatioConfig("Photo", "3:2", 1216, 832, "horizontal", 30),
+    "4:3": AspectRatioConfig("Classic", "4:3", 1152, 896, "horizontal", 30),
+    "9:16": AspectRatioConfig("Portrait", "9:16", 768, 1344, "vertical", 32),
+    "2:3": AspectRatioConfig("Photo Portrait", "2:3", 832, 1216, "vertical", 30),
+    "3:4": AspectRatioConfig("Classic Portrait", "3:4", 896, 1152, "vertical", 30),
+    "21:9": AspectRatioConfig("Cinematic", "21:9", 1536, 640, "cinematic", 35),
+    "4:5": AspectRatioConfig("Instagram", "4:5", 896, 1088, "social", 28),
+    "1:2": AspectRatioConfig("Story", "1:2", 640, 1280, "social", 32),
+}
+
+
+def validate_aspect_ratio(width: int, height: int) -> bool:
+    return width % 64 == 0 and height % 64 == 0
+
+
+def get_aspect_ratio_config(ratio: str) -> AspectRatioConfig:
+    if ratio not in ASPECT_RATIOS:
+        return ASPECT_RATIOS["1:1"]
+    return ASPECT_RATIOS[ratio]
@@ -0,0 +1,89 @@
+"""
+Benchmark: aspect-ratio bucketed training loader on CPU.
+
+A directory of JPEGs with a realistic mix of photo shapes (square, 3:2,
+4:3, 16:9, portrait, phone screenshots) is loaded through
+bucket_sampler.bucket_loader, one epoch per configuration:
+
+- workers: 0 decodes and resizes in the training process; N > 0 uses N
+  DataLoader worker processes (overlaps with the step on a real trainer)
+- batch size: batches are same-shape tensors drawn from one bucket
+
+Reported: the dataset_stats() report (bucket occupancy, batches per
+epoch, crop loss vs a fixed square crop), then loader throughput in
+images/s and the time to the first batch (worker start-up).
+
+Usage:
+    python benchmarks/bench_bucket_loader.py [--images 48] [--resolution 1024] [--workers 0,1,2]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bucket_sampler import BucketedImageDataset, bucket_loader, dataset_stats
+
+SIZES = [
+    (1536, 1536), (1800, 1200), (1200, 1800), (1600, 1200), (1200, 1600),
+    (1920, 1080), (1080, 1920), (1170, 2532), (2048, 1536), (1400, 1400)
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=48)
+    parser.add_argument("--resolution", type=int, default=1024)
+    parser.add_argument("--workers", default="0,1,2")
+    parser.add_argument("--batch-sizes", default="1,4")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.images):
+            width, height = SIZES[i % len(SIZES)]
+            small = rng.integers(0, 255, (height // 16, width // 16, 3), dtype=np.uint8)
+            Image.fromarray(small).resize((width, height), Image.BILINEAR).save(
+                os.path.join(tmp, f"{i:04d}.jpg"), quality=90
+            )
+
+        start = time.perf_counter()
+        dataset = BucketedImageDataset.from_directory(tmp, "a photo of sks", args.resolution)
+        scan = time.perf_counter() - start
+        batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+
+        print(f"{args.images} JPEGs (1-5 MP), resolution {args.resolution}, {os.cpu_count()} core(s); "
+              f"header scan {scan * 1000:.0f} ms\n")
+        stats = dataset_stats(dataset, batch_size=max(batch_sizes))
+        print(f"{'ratio':>6}{'bucket':>11}{'images':>8}{'batches':>9}{'crop %':>8}{'upscaled':>10}")
+        for row in stats["buckets"]:
+            print(f"{row['ratio']:>6}{row['bucket']:>11}{row['images']:>8}{row['batches']:>9}"
+                  f"{row['mean_crop_pct']:>8.1f}{row['upscaled']:>10}")
+        print(f"\nbatch {stats['batch_size']}: {stats['batches_per_epoch']} batches/epoch, "
+              f"{stats['full_batches']} full; mean crop {stats['mean_crop_pct']}% bucketed vs "
+              f"{stats['square_crop_pct']}% square {args.resolution}x{args.resolution}\n")
+
+        print(f"{'workers':>8}{'batch':>7}{'images/s':>10}{'first batch':>13}")
+        for workers in (int(w) for w in args.workers.split(",")):
+            for batch_size in batch_sizes:
+                loader = bucket_loader(dataset, batch_size=batch_size, workers=workers, seed=0)
+                start = time.perf_counter()
+                first = None
+                seen = 0
+                for batch in loader:
+                    if first is None:
+                        first = time.perf_counter() - start
+                    seen += len(batch["captions"])
+                elapsed = time.perf_counter() - start
+                print(f"{workers:>8}{batch_size:>7}{seen / elapsed:>10.1f}{first * 1000:>10.0f} ms")
+                del loader
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Benchmark: full-frame copies in the faceswap and canny preprocessing paths.
+
+Compares the previous conversions (np.array + cv2.cvtColor + .copy() +
+np.concatenate + Image.fromarray) with the image_buffer helpers. Model
+calls are replaced by stand-ins that touch the frame the same way
+(detection reads a resized copy; the swap returns a new frame).
+
+Each pipeline is a list of steps. For every step the bytes it allocates
+are measured from tracemalloc (NumPy arrays, bytes) plus PIL's block
+allocator stats, which tracemalloc does not see. The sum is reported in
+frame-sized copies. Peak RSS is measured by running the pipeline in a
+fresh process (VmHWM above the baseline after the inputs are created).
+
+Usage:
+    python benchmarks/bench_buffers.py [--size 3840x2160]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from image_buffer import rgb_array, bgr_array, image_from_bgr, image_from_gray
+
+
+def detect(frame):
+    """Stand-in for face_app.get: reads a downscaled copy"""
+    return cv2.resize(frame, (640, 640 * frame.shape[0] // frame.shape[1]))
+
+
+def swap(frame):
+    """Stand-in for face_swapper.get(paste_back=True): returns a new frame"""
+    out = frame.copy()
+    out[:128, :128] = 255 - out[:128, :128]
+    return out
+
+
+# Each step maps the state dict to a new value stored under its name
+PIPELINES = {
+    "faceswap before": [
+        ("source", lambda s: cv2.cvtColor(np.array(s["source_pil"]), cv2.COLOR_RGB2BGR)),
+        ("target", lambda s: cv2.cvtColor(np.array(s["target_pil"]), cv2.COLOR_RGB2BGR)),
+        ("detect", lambda s: (detect(s["source"]), detect(s["target"]))),
+        ("res", lambda s: s["target"].copy()),
+        ("res", lambda s: swap(s["res"])),
+        ("rgb", lambda s: cv2.cvtColor(s["res"], cv2.COLOR_BGR2RGB)),
+        ("out", lambda s: Image.fromarray(s["rgb"])),
+    ],
+    "faceswap after": [
+        ("source", lambda s: bgr_array(s["source_pil"])),
+        ("target", lambda s: bgr_array(s["target_pil"])),
+        ("detect", lambda s: (detect(s["source"]), detect(s["target"]))),
+        ("res", lambda s: swap(s["target"])),
+        ("out", lambda s: image_from_bgr(s["res"])),
+    ],
+    "canny before": [
+        ("np", lambda s: np.array(s["target_pil"])),
+        ("edges", lambda s: cv2.Canny(s["np"], 100, 200)[:, :, None]),
+        ("rgb", lambda s: np.concatenate([s["edges"]] * 3, axis=2)),
+        ("out", lambda s: Image.fromarray(s["rgb"])),
+    ],
+    "canny after": [
+        ("np", lambda s: rgb_array(s["target_pil"])),
+        ("edges", lambda s: cv2.Canny(s["np"], 100, 200)),
+        ("out", lambda s: image_from_gray(s["edges"])),
+    ],
+}
+
+
+def make_inputs(width: int, height: int) -> dict:
+    rng = np.random.default_rng(0)
+    return {
+        "target_pil": Image.fromarray(rng.integers(0, 255, (height, width, 3), dtype=np.uint8)),
+        "source_pil": Image.fromarray(rng.integers(0, 255, (1024, 1024, 3), dtype=np.uint8)),
+    }
+
+
+def run(steps, inputs: dict) -> dict:
+    state = dict(inputs)
+    for name, step in steps:
+        state[name] = step(state)
+    return state
+
+
+def count_allocations(steps, inputs: dict):
+    """(number of steps allocating >= 1/2 frame, total bytes allocated)"""
+    block_size = Image.core.get_block_size()
+    state = dict(inputs)
+    frame_bytes = inputs["target_pil"].width * inputs["target_pil"].height * 3
+    large, total = 0, 0
+    tracemalloc.start()
+    for name, step in steps:
+        before = tracemalloc.get_traced_memory()[0]
+        blocks_before = Image.core.get_stats()["allocated_blocks"]
+        tracemalloc.reset_peak()
+        state[name] = step(state)
+        traced = tracemalloc.get_traced_memory()[1] - before
+        pil = (Image.core.get_stats()["allocated_blocks"] - blocks_before) * block_size
+        step_bytes = traced + pil
+        total += step_bytes
+        if step_bytes >= frame_bytes // 2:
+            large += 1
+    tracemalloc.stop()
+    return large, total
+
+
+def peak_rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def child(name: str, width: int, height: int):
+    inputs = make_inputs(width, height)
+    baseline = peak_rss_mb()
+    start = time.perf_counter()
+    run(PIPELINES[name], inputs)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"peak_mb": peak_rss_mb() - baseline, "elapsed": elapsed}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", default="3840x2160")
+    parser.add_argument("--child")
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+    if args.child:
+        child(args.child, width, height)
+        return
+
+    frame_bytes = width * height * 3
+    inputs = make_inputs(width, height)
+    print(f"Frame {width}x{height} ({frame_bytes / 1024**2:.1f} MB)")
+    for name, steps in PIPELINES.items():
+        run(steps, inputs)  # warm up
+        large, total = count_allocations(steps, inputs)
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", name, "--size", args.size],
+            capture_output=True, text=True, check=True
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(
+            f"  {name:<16} large allocs {large}   allocated {total / frame_bytes:4.1f} frames   "
+            f"peak RSS +{result['peak_mb']:6.1f} MB   {result['elapsed'] * 1000:7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark: dataset auto-captioning, cold vs cached vs resumed.
+
+A directory of 1024x1024 JPEGs is captioned three times through
+dataset_captioning.caption_directory with the BLIP-shaped stand-in from
+bench_interrogate behind a MicroBatcher:
+
+- cold:     nothing cached, every image goes through the captioner
+- cached:   overwrite=True, captions come from the caption store
+- resumed:  sidecars exist, every image is skipped
+
+Usage:
+    python benchmarks/bench_dataset_caption.py [--images 64]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_interrogate import StandInCaptioner
+from caption_store import CaptionStore
+from dataset_captioning import caption_directory
+from micro_batcher import MicroBatcher
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=64)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    model = StandInCaptioner().eval()
+    rng = np.random.default_rng(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = os.path.join(tmp, "dataset")
+        os.makedirs(dataset)
+        base = rng.integers(0, 255, (1024, 1024, 3), dtype=np.uint8)
+        for i in range(args.images):
+            Image.fromarray(np.roll(base, i * 7, axis=1)).save(os.path.join(dataset, f"{i:04d}.jpg"), quality=90)
+        store = CaptionStore(os.path.join(tmp, "captions.sqlite3"))
+
+        async def run(overwrite):
+            batcher = MicroBatcher(model.caption, max_batch=4, max_wait=0.01, name="bench")
+            stats = await caption_directory(
+                dataset, batcher.submit, store, "stand-in@1", overwrite=overwrite, max_in_flight=8
+            )
+            batcher.close()
+            return stats
+
+        print(f"{args.images} images (1024x1024 JPEG), stand-in captioner, {os.cpu_count()} core(s)")
+        for label, overwrite in (("cold", False), ("cached", True), ("resumed", False)):
+            stats = asyncio.run(run(overwrite))
+            print(
+                f"  {label:<8} {stats.elapsed:7.2f} s  {stats.total / stats.elapsed:8.1f} img/s  "
+                f"(captioned {stats.captioned}, cached {stats.cached}, skipped {stats.skipped})"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark: bulk dataset ingestion vs one-image-at-a-time uploads.
+
+A set of 1600x1200 JPEG photos (10% of them re-compressed near-duplicates)
+is added to an empty dataset three ways:
+
+- per-image:  what /dataset/upload did per request - base64 decode, PIL
+              decode, re-encode as PNG - serially, one image at a time
+              (HTTP round-trips not included)
+- tar stream: dataset_ingest.ingest_archive reading an uncompressed tar
+              through AsyncStreamReader in 256 KB chunks, as the endpoint
+              does with the request body
+- zip:        the same images as a zip (spooled, then read per member)
+
+Reported: images/s, input MB/s, and images written vs dropped.
+
+Usage:
+    python benchmarks/bench_dataset_ingest.py [--images 120] [--workers 1,4]
+"""
+
+import argparse
+import asyncio
+import base64
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import zipfile
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from dataset_ingest import AsyncStreamReader, ingest_archive
+
+
+def make_photos(count):
+    rng = np.random.default_rng(0)
+    photos = []
+    for i in range(count):
+        if i % 10 == 9:
+            # Near-duplicate: an earlier photo saved again at lower quality
+            original = Image.open(io.BytesIO(photos[i - 5][1]))
+            out = io.BytesIO()
+            original.save(out, format="JPEG", quality=70)
+        else:
+            small = rng.integers(0, 255, (75, 100, 3), dtype=np.uint8)
+            out = io.BytesIO()
+            Image.fromarray(small).resize((1600, 1200), Image.BICUBIC).save(out, format="JPEG", quality=90)
+        photos.append((f"photos/{i:04d}.jpg", out.getvalue()))
+    return photos
+
+
+def build_tar(photos):
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w") as archive:
+        for name, data in photos:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return out.getvalue()
+
+
+def build_zip(photos):
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_STORED) as archive:
+        for name, data in photos:
+            archive.writestr(name, data)
+    return out.getvalue()
+
+
+def per_image(photos, directory):
+    os.makedirs(directory)
+    payloads = [base64.b64encode(data).decode() for _, data in photos]
+    start = time.perf_counter()
+    for i, payload in enumerate(payloads):
+        image = Image.open(io.BytesIO(base64.b64decode(payload)))
+        image.save(os.path.join(directory, f"img_{i}.png"), format="PNG")
+    return time.perf_counter() - start, len(payloads), 0
+
+
+def tar_stream(body, directory, workers):
+    async def chunks():
+        for i in range(0, len(body), 256 * 1024):
+            await asyncio.sleep(0)
+            yield body[i:i + 256 * 1024]
+
+    async def run():
+        reader = AsyncStreamReader(chunks(), asyncio.get_running_loop())
+        return await asyncio.to_thread(ingest_archive, reader, directory, workers)
+
+    stats = asyncio.run(run())
+    return stats.elapsed, stats.written, stats.duplicates + stats.invalid
+
+
+def zip_file(body, directory, workers):
+    stats = ingest_archive(io.BytesIO(body), directory, workers)
+    return stats.elapsed, stats.written, stats.duplicates + stats.invalid
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=120)
+    parser.add_argument("--workers", default="1,4")
+    args = parser.parse_args()
+
+    photos = make_photos(args.images)
+    tar_body, zip_body = build_tar(photos), build_zip(photos)
+    megabytes = sum(len(data) for _, data in photos) / 1024**2
+    print(f"{args.images} JPEGs 1600x1200 ({megabytes:.1f} MB, {args.images // 10} near-duplicates), "
+          f"{os.cpu_count()} core(s)\n")
+    print(f"{'path':<22}{'images/s':>10}{'MB/s':>8}{'written':>9}{'dropped':>9}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = [("per-image (PNG)", lambda d: per_image(photos, d))]
+        for workers in (int(w) for w in args.workers.split(",")):
+            runs.append((f"tar stream, {workers} wkr", lambda d, w=workers: tar_stream(tar_body, d, w)))
+            runs.append((f"zip, {workers} wkr", lambda d, w=workers: zip_file(zip_body, d, w)))
+        for i, (name, run) in enumerate(runs):
+            elapsed, written, dropped = run(os.path.join(tmp, str(i)))
+            print(f"{name:<22}{args.images / elapsed:>10.1f}{megabytes / elapsed:>8.1f}{written:>9}{dropped:>9}")
+
+
+if __name__ == "__main__":
+    main()
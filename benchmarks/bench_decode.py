@@ -0,0 +1,98 @@
+"""
+Benchmark: full decode vs resolution-aware decode of 24 MP photos.
+
+Compares ``Image.open(...).convert("RGB")`` (the old decode_image path)
+with ``image_decode.open_rgb`` at the size hints used by the endpoints.
+Each case runs in a fresh subprocess to report its own peak RSS.
+
+Usage:
+    python benchmarks/bench_decode.py
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+CASES = [
+    ("full decode + convert", None),
+    ("hint 1024 (controlnet/face source)", 1024),
+    ("hint 640 (face detection)", 640),
+    ("hint 384 (BLIP)", 384),
+]
+
+
+def make_photo(path: str, fmt: str):
+    """6000x4000 synthetic photo with gradients and noise"""
+    import numpy as np
+    from PIL import Image
+    h, w = 4000, 6000
+    y = np.linspace(0, 255, h, dtype=np.float32)[:, None]
+    x = np.linspace(0, 255, w, dtype=np.float32)[None, :]
+    noise = np.random.default_rng(0).integers(0, 32, (h, w), dtype=np.uint8)
+    rgb = np.stack(np.broadcast_arrays((x + y) / 2, x, y), axis=-1).astype(np.uint8)
+    rgb += noise[..., None]
+    Image.fromarray(rgb).save(path, format=fmt, quality=90)
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process (VmHWM resets on exec, unlike ru_maxrss)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def child(path: str, hint):
+    from PIL import Image
+    from image_decode import open_rgb
+    times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        if hint is None:
+            image = Image.open(path).convert("RGB")
+        else:
+            image = open_rgb(path, target_size=hint)
+        times.append(time.perf_counter() - start)
+    rss = peak_rss_mb()
+    print(json.dumps({"ms": min(times) * 1000, "size": image.size, "rss_mb": rss}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--child")
+    parser.add_argument("--hint", type=int, default=0)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.hint or None)
+        return
+
+    tmp = tempfile.mkdtemp(prefix="bench_decode_")
+    for fmt, ext in (("JPEG", "jpg"), ("PNG", "png")):
+        path = os.path.join(tmp, f"photo24mp.{ext}")
+        make_photo(path, fmt)
+        print(f"\n{fmt} 6000x4000 ({os.path.getsize(path) / 1024**2:.1f} MB)")
+        for label, hint in CASES:
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", path, "--hint", str(hint or 0)],
+                capture_output=True, text=True, check=True
+            )
+            r = json.loads(out.stdout.strip().splitlines()[-1])
+            size = f"{r['size'][0]}x{r['size'][1]}"
+            print(f"  {label:<36} {r['ms']:8.1f} ms  {size:>10}  peak RSS {r['rss_mb']:7.1f} MB")
+        os.remove(path)
+    os.rmdir(tmp)
+
+
+if __name__ == "__main__":
+    main()
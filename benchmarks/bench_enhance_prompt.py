@@ -0,0 +1,83 @@
+"""
+Benchmark: /enhance-prompt traffic with single-flight + result cache.
+
+Simulates UI traffic: prompts drawn from a Zipf-like distribution over a
+small vocabulary of short prompts, sent in bursts of concurrent requests
+(several users, keystroke-pause duplicates). The LLM is simulated as a
+serialised generation taking --llm-ms per call (Phi-3 Mini, 200 tokens,
+is on the order of seconds on a consumer GPU).
+
+Compared: no dedupe (one generation per request), single-flight only
+(random sampling, nothing cached) and single-flight + cache
+(deterministic or seeded requests).
+
+Usage:
+    python benchmarks/bench_enhance_prompt.py [--requests 400] [--llm-ms 50]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from single_flight import Measured, SingleFlightCache
+
+
+def traffic(count: int, vocabulary: int, burst: int, seed: int = 0):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    prompts = [f"prompt {i}" for i in range(vocabulary)]
+    return [rng.choices(prompts, weights, k=burst) for _ in range(count // burst)]
+
+
+async def simulate(bursts, llm_seconds: float, mode: str):
+    cache = SingleFlightCache(max_entries=1024, name="bench")
+    gpu = asyncio.Lock()
+    generations = 0
+    latencies = []
+
+    async def generate():
+        nonlocal generations
+        async with gpu:
+            generations += 1
+            await asyncio.sleep(llm_seconds)
+        return Measured("enhanced", llm_seconds)
+
+    async def request(prompt):
+        start = time.perf_counter()
+        if mode == "none":
+            await generate()
+        else:
+            await cache.run(prompt, generate, cacheable=mode == "cache")
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for burst in bursts:
+        await asyncio.gather(*(request(prompt) for prompt in burst))
+    return generations, time.perf_counter() - start, statistics.mean(latencies), cache.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--vocabulary", type=int, default=100)
+    parser.add_argument("--burst", type=int, default=8)
+    parser.add_argument("--llm-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    bursts = traffic(args.requests, args.vocabulary, args.burst)
+    total = sum(len(b) for b in bursts)
+    print(f"{total} requests in bursts of {args.burst}, {args.vocabulary} distinct prompts (Zipf), LLM {args.llm_ms:.0f} ms/call")
+    print(f"  {'mode':<24} {'generations':>11} {'wall':>8} {'mean latency':>13} {'LLM time saved':>15}")
+    for label, mode in (("no dedupe", "none"), ("single-flight", "flight"), ("single-flight + cache", "cache")):
+        generations, wall, latency, stats = asyncio.run(simulate(bursts, args.llm_ms / 1000, mode))
+        print(f"  {label:<24} {generations:>11} {wall:7.2f}s {latency * 1000:10.0f} ms {stats['saved_seconds']:13.2f} s")
+
+
+if __name__ == "__main__":
+    main()
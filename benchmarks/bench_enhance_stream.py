@@ -0,0 +1,88 @@
+"""
+Benchmark: buffered vs streamed /enhance-prompt.
+
+Phi-3 is simulated by a generate() stand-in that produces one token every
+--token-ms in a worker thread, driven through AsyncTextStreamer exactly as
+the server drives the real model. The enhanced prompt is a paragraph of
+--prompt-tokens tokens followed by an explanation the model would keep
+writing until max_new_tokens.
+
+Reported: time until the client sees anything, and until the answer is
+complete, for the old buffered path (all max_new_tokens generated, then
+returned), the buffered path with the paragraph stop, and the stream.
+
+Usage:
+    python benchmarks/bench_enhance_stream.py [--token-ms 20] [--prompt-tokens 90]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm_stream import AsyncTextStreamer, paragraph_end
+
+
+def stand_in_model(prompt_tokens: int, max_new_tokens: int):
+    words = [f" word{i}" for i in range(prompt_tokens)] + ["\n\n"]
+    words += [f" note{i}" for i in range(max_new_tokens)]
+    decode = lambda ids: "".join(words[i] for i in ids)
+    return words, decode
+
+
+def generate(streamer, max_new_tokens: int, token_seconds: float):
+    streamer.put([[0]])
+    criteria = streamer.stopping_criteria()
+    for token in range(max_new_tokens):
+        time.sleep(token_seconds)
+        streamer.put([token])
+        if criteria(None, None):
+            break
+    streamer.end()
+
+
+async def buffered(decode, args, early_stop: bool):
+    start = time.perf_counter()
+    streamer = AsyncTextStreamer(decode, complete_at=paragraph_end if early_stop else None,
+                                 max_tokens=args.max_new_tokens)
+    await asyncio.to_thread(generate, streamer, args.max_new_tokens, args.token_ms / 1000)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed, streamer.tokens
+
+
+async def streamed(decode, args):
+    start = time.perf_counter()
+    first = None
+    streamer = AsyncTextStreamer(decode, asyncio.get_running_loop(), max_tokens=args.max_new_tokens)
+    task = streamer.run(generate, streamer, args.max_new_tokens, args.token_ms / 1000)
+    async for _ in streamer:
+        if first is None:
+            first = time.perf_counter() - start
+    await task
+    return first, time.perf_counter() - start, streamer.tokens
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--token-ms", type=float, default=20)
+    parser.add_argument("--prompt-tokens", type=int, default=90)
+    parser.add_argument("--max-new-tokens", type=int, default=200)
+    args = parser.parse_args()
+
+    _, decode = stand_in_model(args.prompt_tokens, args.max_new_tokens)
+    print(f"{args.token_ms:.0f} ms/token, answer {args.prompt_tokens} tokens, max_new_tokens {args.max_new_tokens}")
+    print(f"  {'mode':<26}{'first text':>12}{'complete':>12}{'tokens':>8}")
+    rows = [
+        ("buffered (no stop)", asyncio.run(buffered(decode, args, early_stop=False))),
+        ("buffered + paragraph stop", asyncio.run(buffered(decode, args, early_stop=True))),
+        ("streamed (SSE)", asyncio.run(streamed(decode, args))),
+    ]
+    for name, (first, complete, tokens) in rows:
+        print(f"  {name:<26}{first * 1000:>10.0f}ms{complete * 1000:>10.0f}ms{tokens:>8}")
+
+
+if __name__ == "__main__":
+    main()
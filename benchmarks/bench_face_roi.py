@@ -0,0 +1,136 @@
+"""
+Benchmark: full-frame paste-back vs ROI multi-face swap on 4K group photos.
+
+- full frame: INSwapper.get(paste_back=True) once per face (the previous
+  /faceswap loop)
+- ROI:        face_roi.swap_faces (aligned crops, batched model run, blend
+  inside each face's ROI)
+
+The real InsightFace INSwapper class is used with a stand-in ONNX model
+that has inswapper_128's interface (dynamic batch, ~4 GFLOP per crop),
+since the weights are not redistributable. Runs on CPUExecutionProvider.
+
+Usage:
+    python benchmarks/bench_face_roi.py [--faces 1,2,5,10,20]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import onnx
+import onnxruntime as ort
+from onnx import TensorProto, helper, numpy_helper
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from face_roi import swap_faces
+
+# Arcface-style 5-point landmarks around a face centre (unit scale ~ 40 px face)
+LANDMARKS = np.array([[-18, -12], [18, -12], [0, 4], [-14, 20], [14, 20]], dtype=np.float32)
+
+
+def build_swapper(path: str, channels: int = 64, layers: int = 3):
+    from insightface.model_zoo.inswapper import INSwapper
+    rng = np.random.default_rng(0)
+    inits, nodes = [], []
+    prev, prev_c = "target", 3
+    for i in range(layers + 2):
+        out_c = 3 if i == layers + 1 else channels
+        inits.append(numpy_helper.from_array(
+            (rng.standard_normal((out_c, prev_c, 3, 3)) * 0.05).astype(np.float32), f"w{i}"
+        ))
+        nodes.append(helper.make_node("Conv", [prev, f"w{i}"], [f"c{i}"], pads=[1, 1, 1, 1]))
+        if i <= layers:
+            nodes.append(helper.make_node("Relu", [f"c{i}"], [f"r{i}"]))
+            prev, prev_c = f"r{i}", out_c
+        else:
+            prev = f"c{i}"
+    inits += [
+        numpy_helper.from_array((rng.standard_normal((512, 3)) * 0.05).astype(np.float32), "proj"),
+        numpy_helper.from_array(np.array([-1, 3, 1, 1], dtype=np.int64), "shape"),
+        numpy_helper.from_array(np.eye(512, dtype=np.float32), "emap"),  # INSwapper reads the last one
+    ]
+    nodes += [
+        helper.make_node("MatMul", ["source", "proj"], ["p"]),
+        helper.make_node("Reshape", ["p", "shape"], ["p4"]),
+        helper.make_node("Add", [prev, "p4"], ["a"]),
+        helper.make_node("Sigmoid", ["a"], ["output"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "inswapper_stand_in",
+        [helper.make_tensor_value_info("target", TensorProto.FLOAT, ["N", 3, 128, 128]),
+         helper.make_tensor_value_info("source", TensorProto.FLOAT, ["N", 512])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, ["N", 3, 128, 128])],
+        inits
+    )
+    onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=8), path)
+    options = ort.SessionOptions()
+    options.log_severity_level = 3
+    session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+    return INSwapper(model_file=path, session=session)
+
+
+def group_faces(count: int, width: int, height: int, scale: float = 3.0):
+    """`count` faces on a grid, like a group photo"""
+    cols = int(np.ceil(np.sqrt(count * width / height)))
+    rows = int(np.ceil(count / cols))
+    faces = []
+    for i in range(count):
+        cx = (i % cols + 0.5) * width / cols
+        cy = (i // cols + 0.5) * height / rows
+        faces.append(SimpleNamespace(kps=LANDMARKS * scale + (cx, cy)))
+    return faces
+
+
+def timed(fn, repeat: int = 3):
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--faces", default="1,2,5,10,20")
+    parser.add_argument("--size", default="3840x2160")
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        import contextlib
+        import io
+        with contextlib.redirect_stdout(io.StringIO()):
+            swapper = build_swapper(os.path.join(tmp, "swapper.onnx"))
+
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 255, (height, width, 3), dtype=np.uint8)
+    source = SimpleNamespace(normed_embedding=np.full(512, 1 / np.sqrt(512), dtype=np.float32))
+
+    def full_frame(faces):
+        result = frame
+        for face in faces:
+            result = swapper.get(result, face, source, paste_back=True)
+        return result
+
+    print(f"{width}x{height} frame, stand-in inswapper on CPUExecutionProvider, {os.cpu_count()} core(s)")
+    print(f"  {'faces':>5}  {'full frame':>12}  {'ROI':>10}  {'speedup':>8}  {'max diff':>8}")
+    for count in (int(v) for v in args.faces.split(",")):
+        faces = group_faces(count, width, height)
+        full = timed(lambda: full_frame(faces), repeat=1 if count > 5 else 3)
+        roi = timed(lambda: swap_faces(swapper, frame, faces, source))
+        diff = "" if count > 1 else str(int(np.abs(
+            full_frame(faces).astype(np.int16) - swap_faces(swapper, frame, faces, source)
+        ).max()))
+        print(f"  {count:>5}  {full * 1000:9.0f} ms  {roi * 1000:7.0f} ms  {full / roi:7.1f}x  {diff:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Benchmark: frames/sec for face swap over a video clip.
+
+A synthetic 1280x720 clip (panning texture with a bright "face" marker)
+is encoded to MP4, then swapped three ways:
+
+- per-frame:  decode, detect, swap, encode sequentially for every frame
+              (what calling /faceswap per frame amounts to)
+- pipelined:  face_sequence.swap_sequence detecting on every frame
+- tracked:    swap_sequence with keyframe detection every 10 frames and
+              optical-flow landmark tracking in between
+
+Detection is a ~10 GFLOP stand-in net at 640x640 plus a marker locator
+(for ground truth); the swap is face_roi.swap_faces with the stand-in
+inswapper from bench_face_roi. Everything runs on CPUExecutionProvider.
+
+Usage:
+    python benchmarks/bench_face_sequence.py [--frames 120]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_faceswap import conv_stack, to_blob
+from bench_face_roi import LANDMARKS, build_swapper
+from face_roi import swap_faces
+from face_sequence import VideoSink, open_frames, swap_sequence
+
+WIDTH, HEIGHT = 1280, 720
+STEP = 3  # pan speed, px per frame
+SCALE = 2.5
+
+
+def write_clip(path: str, count: int):
+    rng = np.random.default_rng(0)
+    texture = rng.integers(0, 200, (HEIGHT, WIDTH + count * STEP), dtype=np.uint8)
+    texture = cv2.GaussianBlur(cv2.cvtColor(texture, cv2.COLOR_GRAY2BGR), (9, 9), 0)
+    # Small marker at the face centre; the landmarks sit on the texture around it
+    cv2.circle(texture, (WIDTH // 2 + count * STEP, HEIGHT // 2), 8, (255, 255, 255), -1)
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 30, (WIDTH, HEIGHT))
+    for i in range(count):
+        offset = count * STEP - i * STEP
+        writer.write(np.ascontiguousarray(texture[:, offset:offset + WIDTH]))
+    writer.release()
+
+
+def locate(frame):
+    """Ground truth: the marker's centroid"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    m = cv2.moments((gray > 245).astype(np.uint8))
+    if not m["m00"]:
+        return []
+    cx, cy = m["m10"] / m["m00"], m["m01"] / m["m00"]
+    kps = LANDMARKS * SCALE + (cx, cy)
+    return [SimpleNamespace(kps=kps, bbox=np.array([cx - 60, cy - 60, cx + 60, cy + 60], dtype=np.float32))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=120)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="bench_sequence_")
+    clip = os.path.join(tmp, "clip.mp4")
+    write_clip(clip, args.frames)
+
+    detector = conv_stack(640, 32, 5, stride=2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        swapper = build_swapper(os.path.join(tmp, "swapper.onnx"))
+    source = SimpleNamespace(normed_embedding=np.full(512, 1 / np.sqrt(512), dtype=np.float32))
+
+    def detect(frame):
+        detector.run(None, {"input": to_blob(frame, 640)})
+        return locate(frame)
+
+    errors = []
+
+    def swap(frame, faces):
+        truth = locate(frame)
+        if truth:
+            errors.append(float(np.abs(faces[0].kps - truth[0].kps).mean()))
+        return swap_faces(swapper, frame, faces, source)
+
+    def per_frame():
+        frames, fps, _ = open_frames(clip)
+        sink = VideoSink(os.path.join(tmp, "per_frame.mp4"), fps)
+        for frame in frames:
+            faces = detect(frame)
+            sink.write(swap_faces(swapper, frame, faces, source) if faces else frame)
+        sink.close()
+
+    def sequence(interval):
+        frames, fps, _ = open_frames(clip)
+        sink = VideoSink(os.path.join(tmp, f"seq_{interval}.mp4"), fps)
+        return swap_sequence(frames, detect, swap, sink, keyframe_interval=interval)
+
+    print(f"{args.frames} frames {WIDTH}x{HEIGHT}, CPUExecutionProvider, {os.cpu_count()} core(s)")
+    start = time.perf_counter()
+    per_frame()
+    elapsed = time.perf_counter() - start
+    print(f"  per-frame           {args.frames / elapsed:6.2f} fps   {args.frames} detections")
+
+    for label, interval in (("pipelined", 1), ("tracked (every 10)", 10)):
+        errors.clear()
+        stats = sequence(interval)
+        print(
+            f"  {label:<19} {stats.fps:6.2f} fps   {stats.keyframes} detections   "
+            f"landmark error {np.mean(errors):.2f} px (max {np.max(errors):.2f})"
+        )
+
+
+if __name__ == "__main__":
+    main()
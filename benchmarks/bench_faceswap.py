@@ -0,0 +1,225 @@
+"""
+Benchmark: per-swap latency with and without the face detection cache.
+
+One source face is swapped onto a series of distinct targets, comparing:
+
+- uncached:   detect + embed the source and the target on every swap
+- cached:     source detections come from face_cache (frame hash lookup)
+- registered: source passed by face id, no source work at all
+
+All ONNX work runs on onnxruntime's CPUExecutionProvider. With --real
+and --source/--target images, InsightFace buffalo_l (~/.insightface) is
+used for analysis. Otherwise stand-in conv nets of similar cost are used:
+detection ~10 GFLOP at 640x640 (det_10g), recognition ~5 GFLOP per face at
+112x112 (ArcFace R50). The swap is a ~5 GFLOP net at 128x128 in both
+modes, since it is identical across variants.
+
+With --pool-sizes, batch throughput of faceswap_pool is measured instead:
+every pool size processes the same targets with the session thread plan
+from faceswap_pool.plan_threads.
+
+Usage:
+    python benchmarks/bench_faceswap.py [--targets 10]
+    python benchmarks/bench_faceswap.py --real --source a.jpg --target b.jpg
+    python benchmarks/bench_faceswap.py --pool-sizes 1,2,4 --targets 32
+"""
+
+import argparse
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from face_cache import FaceCache
+
+import onnxruntime as ort
+from onnx import TensorProto, helper, numpy_helper
+
+
+def conv_stack(
+    size: int, channels: int, layers: int, stride: int = 1, head: int = 0, options=None
+) -> ort.InferenceSession:
+    """3-channel input -> conv(stride) -> `layers` x conv3x3 [-> pooled linear head]"""
+    rng = np.random.default_rng(0)
+    nodes, inits = [], []
+    prev, prev_c = "input", 3
+    for i in range(layers + 1):
+        w = numpy_helper.from_array(
+            (rng.standard_normal((channels, prev_c, 3, 3)) * 0.05).astype(np.float32), f"w{i}"
+        )
+        inits.append(w)
+        s = stride if i == 0 else 1
+        nodes.append(helper.make_node("Conv", [prev, f"w{i}"], [f"c{i}"], pads=[1, 1, 1, 1], strides=[s, s]))
+        nodes.append(helper.make_node("Relu", [f"c{i}"], [f"r{i}"]))
+        prev, prev_c = f"r{i}", channels
+    output_shape = [1, channels, size // stride, size // stride]
+    if head:
+        inits.append(numpy_helper.from_array(
+            (rng.standard_normal((channels, head)) * 0.05).astype(np.float32), "fc"
+        ))
+        nodes.append(helper.make_node("GlobalAveragePool", [prev], ["gap"]))
+        nodes.append(helper.make_node("Flatten", ["gap"], ["flat"]))
+        nodes.append(helper.make_node("MatMul", ["flat", "fc"], ["emb"]))
+        prev, output_shape = "emb", [1, head]
+    graph = helper.make_graph(
+        nodes, "stand_in",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, [1, 3, size, size])],
+        [helper.make_tensor_value_info(prev, TensorProto.FLOAT, output_shape)],
+        inits
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=8)
+    return ort.InferenceSession(
+        model.SerializeToString(), sess_options=options, providers=["CPUExecutionProvider"]
+    )
+
+
+def to_blob(image: np.ndarray, size: int) -> np.ndarray:
+    blob = cv2.resize(image, (size, size)).astype(np.float32) / 255.0
+    return blob.transpose(2, 0, 1)[None]
+
+
+class StandInAnalyzer:
+    """face_app.get stand-in: one detection pass + one embedding per face"""
+
+    def __init__(self, options=None):
+        self.det = conv_stack(640, 32, 5, stride=2, options=options)
+        self.rec = conv_stack(112, 64, 5, head=512, options=options)
+
+    def get(self, frame):
+        self.det.run(None, {"input": to_blob(frame, 640)})
+        h, w = frame.shape[:2]
+        crop = frame[h // 4: h // 2, w // 4: w // 2]
+        embedding = self.rec.run(None, {"input": to_blob(crop, 112)})[0][0]
+        return [SimpleNamespace(
+            bbox=np.array([w / 4, h / 4, w / 2, h / 2]), det_score=0.9,
+            kps=np.zeros((5, 2)), normed_embedding=embedding / np.linalg.norm(embedding)
+        )]
+
+
+def real_analyzer():
+    from insightface.app import FaceAnalysis
+    app = FaceAnalysis(name="buffalo_l", providers=["CPUExecutionProvider"])
+    app.prepare(ctx_id=-1, det_size=(640, 640))
+    return app
+
+
+def bench_pool(sizes, count: int):
+    """Batch throughput of faceswap_pool with stand-in workers"""
+    import asyncio
+    from faceswap_pool import FaceSwapPool, SwapWorker
+
+    rng = np.random.default_rng(2)
+    targets = [rng.integers(0, 255, (1080, 1920, 3), dtype=np.uint8) for _ in range(4)]
+
+    class StandInSwapper:
+        def __init__(self, options):
+            self.net = conv_stack(128, 64, 4, options=options)
+
+        def get(self, frame, target_face, source_face, paste_back=True):
+            self.net.run(None, {"input": to_blob(frame, 128)})
+            return frame
+
+    def work(worker, index):
+        frame = targets[index % len(targets)]
+        result = frame
+        for face in worker.analyzer.get(frame):
+            result = worker.swapper.get(result, face, None)
+        return index
+
+    print(f"Batch of {count} targets, {os.cpu_count()} cores (stand-in nets, CPUExecutionProvider)")
+    for size in sizes:
+        pool = FaceSwapPool(
+            size=size,
+            worker_factory=lambda options: SwapWorker(StandInAnalyzer(options), StandInSwapper(options))
+        )
+        pool.start()
+
+        async def drain():
+            return [r async for r in pool.imap_unordered(work, range(count))]
+
+        start = time.perf_counter()
+        asyncio.run(drain())
+        elapsed = time.perf_counter() - start
+        print(f"  pool {size} ({pool.intra_op} intra-op threads each)   "
+              f"{count / elapsed:6.2f} targets/s   {elapsed:6.1f} s")
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--targets", type=int, default=10)
+    parser.add_argument("--real", action="store_true")
+    parser.add_argument("--source")
+    parser.add_argument("--target")
+    parser.add_argument("--pool-sizes")
+    args = parser.parse_args()
+
+    if args.pool_sizes:
+        bench_pool([int(v) for v in args.pool_sizes.split(",")], args.targets)
+        return
+
+    rng = np.random.default_rng(1)
+    if args.real:
+        analyzer = real_analyzer()
+        source = cv2.imread(args.source)
+        base_target = cv2.imread(args.target)
+    else:
+        analyzer = StandInAnalyzer()
+        source = rng.integers(0, 255, (1024, 1024, 3), dtype=np.uint8)
+        base_target = rng.integers(0, 255, (1080, 1920, 3), dtype=np.uint8)
+    swapper = conv_stack(128, 64, 4)
+
+    # Distinct targets (one pixel differs), so only the source can hit the cache
+    targets = []
+    for i in range(args.targets):
+        target = base_target.copy()
+        target[0, 0, 0] = i % 256
+        target[0, 1, 0] = i // 256
+        targets.append(target)
+
+    def swap(target, faces, source_face):
+        for _ in faces:
+            swapper.run(None, {"input": to_blob(target, 128)})
+
+    def uncached(target, cache, face_id):
+        source_face = analyzer.get(source)[0]
+        swap(target, analyzer.get(target), source_face)
+
+    def cached(target, cache, face_id):
+        _, source_faces = cache.detect(source, analyzer.get)
+        _, target_faces = cache.detect(target, analyzer.get)
+        swap(target, target_faces, source_faces[0])
+
+    def registered(target, cache, face_id):
+        source_face = cache.get_source(face_id)
+        _, target_faces = cache.detect(target, analyzer.get)
+        swap(target, target_faces, source_face)
+
+    kind = "buffalo_l" if args.real else "stand-in nets"
+    height, width = base_target.shape[:2]
+    print(f"{args.targets} swaps of one source onto distinct {width}x{height} targets "
+          f"({kind}, CPUExecutionProvider, {os.cpu_count()} cores)")
+    baseline = None
+    for label, fn in (("uncached", uncached), ("cached", cached), ("registered", registered)):
+        cache = FaceCache()
+        key, faces = cache.detect(source, analyzer.get)  # registration happens once, up front
+        face_id = cache.register_source(key, faces, 0)
+        cache = cache if label == "registered" else FaceCache()
+        fn(targets[0], cache, face_id)  # warm up
+        times = []
+        for target in targets[1:]:
+            start = time.perf_counter()
+            fn(target, cache, face_id)
+            times.append(time.perf_counter() - start)
+        per_swap = sum(times) / len(times)
+        baseline = baseline or per_swap
+        print(f"  {label:<11} {per_swap * 1000:8.1f} ms/swap   ({(1 - per_swap / baseline) * 100:5.1f}% faster)")
+
+
+if __name__ == "__main__":
+    main()
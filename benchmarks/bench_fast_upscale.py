@@ -0,0 +1,91 @@
+"""
+Benchmark: latency per megapixel of the fast (non-diffusion) upscale modes.
+
+- resample: Lanczos + unsharp mask (fast_upscale.resample)
+- onnx:     a stand-in ESPCN-sized x2 network (conv 5x5 3->64, 3x3
+            64->32, 3x3 32->12, DepthToSpace) on CPUExecutionProvider,
+            tiled, with tiles spread over 1..N threads
+
+Real SR exports (e.g. Real-ESRGAN x2) are far heavier per pixel than
+ESPCN; scale the onnx numbers by the model's FLOPs.
+
+Usage:
+    python benchmarks/bench_fast_upscale.py [--size 1024x1024]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fast_upscale import OnnxSuperResolution, resample
+
+
+def build_espcn(path: str, scale: int = 2):
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+    rng = np.random.default_rng(0)
+    shapes = [(64, 3, 5, 5), (32, 64, 3, 3), (3 * scale * scale, 32, 3, 3)]
+    inits, nodes, prev = [], [], "input"
+    for i, shape in enumerate(shapes):
+        inits.append(numpy_helper.from_array((rng.standard_normal(shape) * 0.05).astype(np.float32), f"w{i}"))
+        pad = shape[-1] // 2
+        nodes.append(helper.make_node("Conv", [prev, f"w{i}"], [f"c{i}"], pads=[pad] * 4))
+        if i < len(shapes) - 1:
+            nodes.append(helper.make_node("Tanh", [f"c{i}"], [f"t{i}"]))
+            prev = f"t{i}"
+    nodes.append(helper.make_node("DepthToSpace", [f"c{len(shapes) - 1}"], ["d"], blocksize=scale))
+    nodes.append(helper.make_node("Sigmoid", ["d"], ["output"]))
+    graph = helper.make_graph(
+        nodes, "espcn_stand_in",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, [1, 3, "H", "W"])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, [1, 3, "H2", "W2"])],
+        inits
+    )
+    onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=8), path)
+
+
+def timed(fn, repeat: int = 3) -> float:
+    fn()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", default="1024x1024")
+    parser.add_argument("--threads", default="1,2,4")
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.split("x"))
+    megapixels = width * height / 1e6
+
+    rng = np.random.default_rng(1)
+    image = Image.fromarray(rng.integers(0, 255, (height, width, 3), dtype=np.uint8))
+
+    print(f"{width}x{height} input ({megapixels:.2f} MP), {os.cpu_count()} core(s); ms per input MP")
+    for scale in (1.5, 2.0):
+        t = timed(lambda: resample(image, scale))
+        print(f"  resample x{scale:<4}          {t * 1000 / megapixels:8.1f} ms/MP")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = os.path.join(tmp, "espcn_x2.onnx")
+        build_espcn(model)
+        for threads in (int(v) for v in args.threads.split(",")):
+            sr = OnnxSuperResolution(model, threads=threads)
+            t = timed(lambda: sr.upscale(image), repeat=2)
+            print(f"  onnx x2, {threads} thread(s)     {t * 1000 / megapixels:8.1f} ms/MP")
+            sr.close()
+
+
+if __name__ == "__main__":
+    main()
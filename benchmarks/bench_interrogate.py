@@ -0,0 +1,112 @@
+"""
+Benchmark: /interrogate throughput with dynamic micro-batching on CPU.
+
+N concurrent caption requests go through micro_batcher.MicroBatcher at
+different max_batch settings. With transformers installed and the BLIP
+weights cached, the real Salesforce/blip-image-captioning-base model is
+used (--model blip); otherwise a scaled-down BLIP-shaped stand-in: ViT
+patch encoder (384px -> 576 tokens) + greedy transformer decoder.
+
+Usage:
+    python benchmarks/bench_interrogate.py [--requests 32] [--model stand-in|blip]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from micro_batcher import MicroBatcher
+
+
+class StandInCaptioner(torch.nn.Module):
+    def __init__(self, dim=256, heads=4, enc_layers=4, dec_layers=2, vocab=4000, steps=20):
+        super().__init__()
+        self.patch = torch.nn.Conv2d(3, dim, 16, stride=16)
+        self.encoder = torch.nn.TransformerEncoder(
+            torch.nn.TransformerEncoderLayer(dim, heads, dim * 4, batch_first=True), enc_layers
+        )
+        self.decoder = torch.nn.TransformerDecoder(
+            torch.nn.TransformerDecoderLayer(dim, heads, dim * 4, batch_first=True), dec_layers
+        )
+        self.embed = torch.nn.Embedding(vocab, dim)
+        self.head = torch.nn.Linear(dim, vocab)
+        self.steps = steps
+
+    @torch.inference_mode()
+    def caption(self, images):
+        x = torch.stack([
+            torch.from_numpy(np.asarray(image.resize((384, 384)), dtype=np.float32) / 255).permute(2, 0, 1)
+            for image in images
+        ])
+        memory = self.encoder(self.patch(x).flatten(2).transpose(1, 2))
+        tokens = torch.zeros(len(images), 1, dtype=torch.long)
+        for _ in range(self.steps):
+            hidden = self.decoder(self.embed(tokens), memory)
+            tokens = torch.cat([tokens, self.head(hidden[:, -1]).argmax(-1, keepdim=True)], dim=1)
+        return [" ".join(map(str, row[1:6].tolist())) for row in tokens]
+
+
+def blip_captioner():
+    from transformers import BlipForConditionalGeneration, BlipProcessor
+    processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
+    model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
+
+    @torch.inference_mode()
+    def caption(images):
+        inputs = processor(images=images, return_tensors="pt")
+        out = model.generate(**inputs, max_length=50)
+        return processor.batch_decode(out, skip_special_tokens=True)
+    return caption
+
+
+async def run(caption, images, max_batch):
+    batcher = MicroBatcher(caption, max_batch=max_batch, max_wait=0.01, name="bench")
+    latencies = []
+
+    async def one(image):
+        start = time.perf_counter()
+        await batcher.submit(image)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(image) for image in images))
+    elapsed = time.perf_counter() - start
+    batcher.close()
+    return len(images) / elapsed, statistics.median(latencies), batcher.stats()["mean_batch"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--batches", default="1,4,8,16")
+    parser.add_argument("--model", default="stand-in", choices=["stand-in", "blip"])
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    if args.model == "blip":
+        caption = blip_captioner()
+    else:
+        caption = StandInCaptioner().eval().caption
+
+    rng = np.random.default_rng(0)
+    images = [Image.fromarray(rng.integers(0, 255, (384, 384, 3), dtype=np.uint8)) for _ in range(args.requests)]
+    caption(images[:1])  # Warm up
+
+    print(f"{args.requests} concurrent requests, {args.model}, torch {torch.get_num_threads()} thread(s)")
+    print(f"  {'max_batch':>9}  {'images/s':>9}  {'p50 latency':>12}  {'mean batch':>10}")
+    for max_batch in (int(v) for v in args.batches.split(",")):
+        throughput, p50, mean_batch = asyncio.run(run(caption, images, max_batch))
+        print(f"  {max_batch:>9}  {throughput:9.2f}  {p50 * 1000:9.0f} ms  {mean_batch:>10}")
+
+
+if __name__ == "__main__":
+    main()
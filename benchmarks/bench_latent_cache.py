@@ -0,0 +1,195 @@
+"""
+Benchmark: latent cache prep throughput and training step cost.
+
+SDXL weights are not available here, so small stand-ins play the models:
+a conv encoder with the SD VAE's 8x downsampling to 4 latent channels,
+a 2-layer transformer text encoder producing [77, 2048] embeddings plus a
+pooled vector, and a conv "UNet" whose forward + backward is the step.
+
+Prep (latent_cache.LatentCache.prepare over a directory of JPEGs of
+mixed aspect ratios):
+
+- cold:     every image decoded, bucketed and encoded
+- rerun:    unchanged dataset, nothing encoded
+- changed:  two images replaced, only those encoded
+
+Training step, batch size 1:
+
+- uncached: decode + resize/crop + VAE encode + text encode + step, what
+            the trainer does per step without a cache
+- cached:   batch read from the memory-mapped cache + step
+
+Usage:
+    python benchmarks/bench_latent_cache.py [--images 24] [--resolution 512] [--steps 12]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+from PIL import Image
+from torch import nn
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from image_decode import open_rgb
+from latent_cache import (
+    Encoders, LatentCache, make_buckets, nearest_bucket, resize_to_bucket, to_pixels
+)
+
+SIZES = [(1200, 1200), (1600, 900), (900, 1350), (1400, 1050), (800, 1600)]
+
+
+class StandInVAEEncoder(nn.Module):
+    def __init__(self):
+        super().__init__()
+        layers, channels = [nn.Conv2d(3, 64, 3, padding=1)], 64
+        for out in (64, 128, 256):
+            layers += [nn.SiLU(), nn.Conv2d(channels, out, 3, stride=2, padding=1), nn.SiLU(),
+                       nn.Conv2d(out, out, 3, padding=1)]
+            channels = out
+        layers += [nn.SiLU(), nn.Conv2d(channels, 4, 3, padding=1)]
+        self.net = nn.Sequential(*layers)
+
+    def forward(self, x):
+        return self.net(x) * 0.13025
+
+
+class StandInTextEncoder(nn.Module):
+    def __init__(self, vocab=49408, dim=512):
+        super().__init__()
+        self.embed = nn.Embedding(vocab, dim)
+        layer = nn.TransformerEncoderLayer(dim, 8, dim * 4, batch_first=True)
+        self.encoder = nn.TransformerEncoder(layer, 2)
+        self.project = nn.Linear(dim, 2048)
+        self.pool = nn.Linear(dim, 1280)
+
+    def forward(self, ids):
+        hidden = self.encoder(self.embed(ids))
+        return self.project(hidden), self.pool(hidden[:, -1])
+
+
+class StandInUNet(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.net = nn.Sequential(
+            nn.Conv2d(4, 128, 3, padding=1), nn.SiLU(), nn.Conv2d(128, 128, 3, padding=1), nn.SiLU(),
+            nn.Conv2d(128, 4, 3, padding=1)
+        )
+        self.text = nn.Linear(2048, 128)
+
+    def forward(self, latents, embeds):
+        return self.net(latents) + self.text(embeds.mean(1)).mean(-1)[:, None, None, None]
+
+
+def tokenize(captions):
+    ids = torch.zeros(len(captions), 77, dtype=torch.long)
+    for i, caption in enumerate(captions):
+        codes = [b % 49408 for b in caption.encode()][:77]
+        ids[i, :len(codes)] = torch.tensor(codes)
+    return ids
+
+
+def stand_in_encoders(vae, text_encoder):
+    @torch.no_grad()
+    def encode_images(pixels):
+        return vae(torch.from_numpy(pixels)).numpy()
+
+    @torch.no_grad()
+    def encode_text(captions):
+        embeds, pooled = text_encoder(tokenize(captions))
+        return embeds.numpy(), pooled.numpy()
+
+    return Encoders(version="stand-in", encode_images=encode_images, encode_text=encode_text)
+
+
+def write_image(path, size, seed):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (size[1] // 16, size[0] // 16, 3), dtype=np.uint8)
+    Image.fromarray(small).resize(size, Image.BILINEAR).save(path, quality=90)
+
+
+def train_step(unet, optimizer, latents, embeds):
+    noise = torch.randn_like(latents)
+    loss = nn.functional.mse_loss(unet(latents + noise, embeds), noise)
+    optimizer.zero_grad()
+    loss.backward()
+    optimizer.step()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", type=int, default=24)
+    parser.add_argument("--resolution", type=int, default=512)
+    parser.add_argument("--steps", type=int, default=12)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    vae, text_encoder, unet = StandInVAEEncoder().eval(), StandInTextEncoder().eval(), StandInUNet()
+    optimizer = torch.optim.AdamW(unet.parameters(), lr=1e-4)
+    encoders = stand_in_encoders(vae, text_encoder)
+    prompt = "a photo of sks person"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        dataset = os.path.join(tmp, "dataset")
+        os.makedirs(dataset)
+        paths = []
+        for i in range(args.images):
+            path = os.path.join(dataset, f"{i:04d}.jpg")
+            write_image(path, SIZES[i % len(SIZES)], i)
+            paths.append(path)
+        cache = LatentCache(os.path.join(tmp, "cache"))
+
+        print(f"{args.images} JPEGs ({len(SIZES)} aspect ratios), resolution {args.resolution}, "
+              f"stand-in encoders, {os.cpu_count()} core(s)\n")
+        print(f"{'prep':<10}{'seconds':>9}{'encoded':>9}{'reused':>8}{'img/s':>8}")
+        runs = [("cold", None), ("rerun", None), ("changed", paths[:2])]
+        for name, replace in runs:
+            for j, path in enumerate(replace or []):
+                write_image(path, SIZES[j], 1000 + j)
+            stats = cache.prepare(dataset, encoders, prompt, resolution=args.resolution).to_dict()
+            print(f"{name:<10}{stats['elapsed']:>9.2f}{stats['encoded']:>9}{stats['reused']:>8}"
+                  f"{stats['images_per_second']:>8.1f}")
+
+        buckets = make_buckets(args.resolution)
+
+        def uncached_batch(path):
+            image = open_rgb(path)
+            bucket = nearest_bucket(image.size, buckets)
+            image, _ = resize_to_bucket(image, bucket)
+            with torch.no_grad():
+                latents = vae(torch.from_numpy(to_pixels(image)[None]))
+                embeds, _ = text_encoder(tokenize([prompt]))
+            return latents, embeds
+
+        data = cache.open("stand-in", args.resolution)
+        batches = data.batches(batch_size=1, seed=0)
+
+        def cached_batch(path):
+            batch = next(batches)
+            return (torch.from_numpy(batch["latents"].astype(np.float32)),
+                    torch.from_numpy(batch["prompt_embeds"].astype(np.float32)))
+
+        print(f"\n{'step':<10}{'ms/step':>9}{'of which data':>15}")
+        results = {}
+        for name, load in (("uncached", uncached_batch), ("cached", cached_batch)):
+            load_seconds = step_seconds = 0.0
+            for i in range(args.steps + 1):
+                start = time.perf_counter()
+                latents, embeds = load(paths[i % len(paths)])
+                loaded = time.perf_counter()
+                train_step(unet, optimizer, latents, embeds)
+                if i:  # First step warms up the allocator
+                    load_seconds += loaded - start
+                    step_seconds += time.perf_counter() - start
+            results[name] = step_seconds / args.steps
+            print(f"{name:<10}{results[name] * 1000:>9.1f}{load_seconds / args.steps * 1000:>13.1f} ms")
+        print(f"\nstep speedup: {results['uncached'] / results['cached']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
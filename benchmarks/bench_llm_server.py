@@ -0,0 +1,139 @@
+"""
+Benchmark: Phi-3 enhancer serving, one-at-a-time vs continuous batching.
+
+Phi-3 Mini (3.8B) is not available here, so a small float32 decoder with the
+same calling convention stands in for it on CPU (the path load_phi3_model
+takes without CUDA). Requests share a --prefix-tokens system prompt
+(PROMPT_ENHANCE_SYSTEM plus chat template is ~110 Phi-3 tokens) followed by
+a short user prompt, and arrive from --clients concurrent clients.
+
+Modes:
+  sequential        one request at a time, full prompt prefill (previous
+                    behaviour: generate() behind a lock)
+  sequential+prefix one at a time, shared prefix KV reused
+  batched N         continuous batching up to N sequences + prefix KV
+
+Usage:
+    python benchmarks/bench_llm_server.py [--requests 24] [--clients 8] [--new-tokens 48]
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+import torch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from llm_server import LLMServer
+
+
+class StandInCausalLM(torch.nn.Module):
+    """Pre-norm decoder blocks; (input_ids, attention_mask, position_ids, past_key_values) -> logits, KV"""
+
+    def __init__(self, vocab=4096, dim=384, heads=6, layers=6, max_positions=1024):
+        super().__init__()
+        torch.manual_seed(0)
+        self.heads, self.head_dim = heads, dim // heads
+        self.embed = torch.nn.Embedding(vocab, dim)
+        self.positions = torch.nn.Embedding(max_positions, dim)
+        self.blocks = torch.nn.ModuleList(
+            torch.nn.ModuleDict({
+                "norm1": torch.nn.LayerNorm(dim), "qkv": torch.nn.Linear(dim, 3 * dim),
+                "out": torch.nn.Linear(dim, dim), "norm2": torch.nn.LayerNorm(dim),
+                "mlp": torch.nn.Sequential(torch.nn.Linear(dim, 4 * dim), torch.nn.GELU(), torch.nn.Linear(4 * dim, dim))
+            }) for _ in range(layers)
+        )
+        self.head = torch.nn.Linear(dim, vocab)
+
+    def forward(self, input_ids, attention_mask, position_ids, past_key_values=None, use_cache=True):
+        b, t = input_ids.shape
+        x = self.embed(input_ids) + self.positions(position_ids)
+        cache = []
+        for i, block in enumerate(self.blocks):
+            q, k, v = (p.view(b, t, self.heads, self.head_dim).transpose(1, 2)
+                       for p in block["qkv"](block["norm1"](x)).chunk(3, dim=-1))
+            if past_key_values:
+                k = torch.cat([past_key_values[i][0], k], dim=2)
+                v = torch.cat([past_key_values[i][1], v], dim=2)
+            cache.append((k, v))
+            total = k.shape[2]
+            causal = torch.arange(total)[None, :] <= torch.arange(total - t, total)[:, None]
+            allowed = causal[None, None] & attention_mask[:, None, None, :].bool()
+            attn = torch.nn.functional.scaled_dot_product_attention(q, k, v, attn_mask=allowed)
+            x = x + block["out"](attn.transpose(1, 2).reshape(b, t, -1))
+            x = x + block["mlp"](block["norm2"](x))
+        return SimpleNamespace(logits=self.head(x), past_key_values=tuple(cache))
+
+
+async def run_mode(model, prefix, prompts, args, max_batch: int, use_prefix: bool):
+    server = LLMServer(model, max_batch=max_batch, name="bench")
+    if use_prefix:
+        server.set_prefix(prefix)
+    # Warm-up (and build the prefix KV) outside the measurement
+    await server.generate(prompts[0], max_new_tokens=2)
+    warm_tokens = server.generated_tokens
+    rng = random.Random(1)
+    queue = list(prompts)
+    latencies = []
+
+    async def client():
+        while queue:
+            ids = queue.pop()
+            start = time.perf_counter()
+            await server.generate(ids, max_new_tokens=args.new_tokens, do_sample=True,
+                                  temperature=0.7, top_p=0.9, seed=rng.randrange(1 << 30))
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.clients)))
+    wall = time.perf_counter() - start
+    stats = server.stats()
+    server.close()
+    latencies.sort()
+    tokens = stats["generated_tokens"] - warm_tokens
+    return {
+        "tokens_per_second": tokens / wall,
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[min(len(latencies) - 1, math.ceil(0.95 * len(latencies)) - 1)],
+        "mean_batch": stats["mean_batch"],
+        "wall": wall
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=24)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--prefix-tokens", type=int, default=110)
+    parser.add_argument("--new-tokens", type=int, default=48)
+    args = parser.parse_args()
+
+    torch.set_grad_enabled(False)
+    model = StandInCausalLM().eval()
+    rng = random.Random(0)
+    prefix = [rng.randrange(4096) for _ in range(args.prefix_tokens)]
+    prompts = [prefix + [rng.randrange(4096) for _ in range(rng.randint(6, 16))] for _ in range(args.requests)]
+
+    params = sum(p.numel() for p in model.parameters()) / 1e6
+    print(f"stand-in decoder {params:.1f}M params fp32 CPU ({torch.get_num_threads()} threads), "
+          f"{args.requests} requests from {args.clients} clients, {args.prefix_tokens}-token shared prefix, "
+          f"{args.new_tokens} new tokens")
+    print(f"  {'mode':<20}{'tokens/s':>10}{'p50':>9}{'p95':>9}{'batch':>7}")
+    for name, max_batch, use_prefix in [
+        ("sequential", 1, False),
+        ("sequential+prefix", 1, True),
+        ("batched 4", 4, True),
+        ("batched 8", 8, True),
+    ]:
+        r = asyncio.run(run_mode(model, prefix, prompts, args, max_batch, use_prefix))
+        print(f"  {name:<20}{r['tokens_per_second']:>10.1f}{r['p50']:>8.2f}s{r['p95']:>8.2f}s{r['mean_batch']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
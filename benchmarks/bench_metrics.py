@@ -0,0 +1,74 @@
+"""
+Micro-benchmark for metrics instrumentation overhead.
+
+Measures the per-call cost of the hot-path primitives and of the ASGI
+middleware wrapped around a no-op app, so we can confirm instrumentation
+is cheap enough to leave on in production.
+
+Usage:
+    python benchmarks/bench_metrics.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from metrics import MetricsRegistry, MetricsMiddleware, stage
+
+N = 200_000
+
+
+def bench(label, fn, n=N):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed / n * 1e9:8.0f} ns/op")
+    return elapsed / n
+
+
+def main():
+    registry = MetricsRegistry()
+    counter = registry.counter("bench_total", "bench", ("method", "endpoint", "status"))
+    hist = registry.histogram("bench_seconds", "bench", ("method", "endpoint"))
+
+    bench("empty loop", lambda: None)
+    bench("Counter.inc (3 labels)", lambda: counter.inc("POST", "/generate", "200"))
+    bench("Histogram.observe (2 labels)", lambda: hist.observe(0.123, "POST", "/generate"))
+
+    def stage_block():
+        with stage("bench", "stage"):
+            pass
+    bench("stage() context manager", stage_block)
+
+    async def noop_app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    async def run(app, n):
+        scope = {"type": "http", "path": "/generate", "method": "POST"}
+        start = time.perf_counter()
+        for _ in range(n):
+            await app(dict(scope), None, send)
+        return (time.perf_counter() - start) / n
+
+    n = N // 4
+    bare = asyncio.run(run(noop_app, n))
+    wrapped = asyncio.run(run(MetricsMiddleware(noop_app), n))
+    print(f"{'ASGI no-op app':<40} {bare * 1e9:8.0f} ns/req")
+    print(f"{'ASGI no-op app + MetricsMiddleware':<40} {wrapped * 1e9:8.0f} ns/req")
+    print(f"{'middleware overhead':<40} {(wrapped - bare) * 1e6:8.2f} us/req")
+
+    start = time.perf_counter()
+    registry.render()
+    print(f"{'render()':<40} {(time.perf_counter() - start) * 1e6:8.0f} us")
+
+
+if __name__ == "__main__":
+    main()
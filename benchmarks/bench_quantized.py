@@ -0,0 +1,125 @@
+"""
+Benchmark: fp32 vs dynamic int8 backend for the auxiliary CPU models.
+
+Phi-3 / BLIP weights are not available here, so the stand-in decoder from
+bench_llm_server.py (scaled up to ~90M parameters) plays the prompt
+enhancer. Each backend runs in a fresh subprocess:
+
+- fp32: weights loaded from a saved state dict (what from_pretrained does)
+- int8: QuantizedModelCache.load with a warm disk cache (meta-device
+  skeleton + int8 weights, no fp32 allocation)
+
+Reported: load time, peak RSS, greedy decode tokens/s through LLMServer,
+and the quality check: teacher-forced next-token agreement and logit
+cosine similarity of int8 against fp32 on the same token sequences.
+
+Usage:
+    python benchmarks/bench_quantized.py [--layers 12] [--dim 768] [--tokens 48]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import torch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from bench_decode import peak_rss_mb
+from bench_llm_server import StandInCausalLM
+from llm_server import LLMServer
+from quantized_models import QuantizedModelCache, model_size_mb
+
+
+def build(args):
+    return StandInCausalLM(vocab=4096, dim=args.dim, heads=args.dim // 64, layers=args.layers).eval()
+
+
+def child(args):
+    torch.set_grad_enabled(False)
+    start = time.perf_counter()
+    if args.child == "fp32":
+        model = build(args)
+        model.load_state_dict(torch.load(os.path.join(args.work, "fp32.pt")))
+    else:
+        model, _ = QuantizedModelCache(args.work).load("stand-in", lambda: None, lambda: build(args))
+    load_seconds = time.perf_counter() - start
+
+    sequences = torch.load(os.path.join(args.work, "sequences.pt"))
+    logits = [model(s[None], torch.ones_like(s)[None], torch.arange(len(s))[None]).logits[0] for s in sequences]
+    torch.save(logits, os.path.join(args.work, f"logits_{args.child}.pt"))
+
+    server = LLMServer(model, max_batch=1, name="bench")
+
+    async def decode():
+        for s in sequences:
+            await server.generate(s[:24].tolist(), max_new_tokens=args.tokens)
+
+    start = time.perf_counter()
+    asyncio.run(decode())
+    decode_seconds = time.perf_counter() - start
+    server.close()
+    print(json.dumps({
+        "load_s": load_seconds,
+        "tokens_per_s": len(sequences) * args.tokens / decode_seconds,
+        "size_mb": model_size_mb(model),
+        "rss_mb": peak_rss_mb()
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--layers", type=int, default=12)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--tokens", type=int, default=48)
+    parser.add_argument("--sequences", type=int, default=4)
+    parser.add_argument("--child")
+    parser.add_argument("--work")
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    with tempfile.TemporaryDirectory() as work:
+        model = build(args)
+        torch.save(model.state_dict(), os.path.join(work, "fp32.pt"))
+        generator = torch.Generator().manual_seed(0)
+        torch.save([torch.randint(0, 4096, (128,), generator=generator) for _ in range(args.sequences)],
+                   os.path.join(work, "sequences.pt"))
+        start = time.perf_counter()
+        _, info = QuantizedModelCache(work).load("stand-in", lambda: model, lambda: build(args))
+        print(f"stand-in decoder {sum(p.numel() for p in build(args).parameters()) / 1e6:.0f}M params, "
+              f"{torch.get_num_threads()} thread(s); first int8 load (quantize + save) {time.perf_counter() - start:.2f} s")
+        del model
+
+        results = {}
+        for backend in ("fp32", "int8"):
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", backend, "--work", work, "--layers", str(args.layers),
+                 "--dim", str(args.dim), "--tokens", str(args.tokens)],
+                capture_output=True, text=True
+            )
+            if out.returncode:
+                print(f"{backend} failed:\n{out.stderr[-2000:]}")
+                return
+            results[backend] = json.loads(out.stdout.strip().splitlines()[-1])
+
+        fp32 = torch.load(os.path.join(work, "logits_fp32.pt"))
+        int8 = torch.load(os.path.join(work, "logits_int8.pt"))
+        agreement = torch.cat([(a.argmax(-1) == b.argmax(-1)).float() for a, b in zip(fp32, int8)]).mean().item()
+        cosine = torch.cat([torch.nn.functional.cosine_similarity(a, b, dim=-1) for a, b in zip(fp32, int8)]).mean().item()
+
+        print(f"  {'backend':<8}{'weights':>10}{'load':>9}{'peak RSS':>11}{'decode':>13}")
+        for backend, r in results.items():
+            print(f"  {backend:<8}{r['size_mb']:>8.0f}MB{r['load_s']:>8.2f}s{r['rss_mb']:>9.0f}MB{r['tokens_per_s']:>9.1f} tok/s")
+        print(f"  quality (int8 vs fp32, teacher-forced): top-1 agreement {agreement:.1%}, logit cosine {cosine:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark: model transfers and wall time for mixed /generate + /upscale
+traffic, old load/offload-per-call policy vs model_residency.
+
+Transfers and inference are simulated with sleeps (scaled from typical
+SDXL / x4 upscaler numbers on a PCIe 4 GPU: main pipelines 2.0 s to
+move, upscaler 0.8 s, generate 3.0 s, upscale 4.0 s), divided by
+--speedup so the run is quick.
+
+Usage:
+    python benchmarks/bench_residency.py [--speedup 20]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from model_residency import ModelResidency
+
+COST = {"move_main": 2.0, "move_upscaler": 0.8, "generate": 3.0, "upscale": 4.0}
+
+TRACES = {
+    "alternating": ["generate", "upscale"] * 6,
+    "bursty": ["generate"] * 3 + ["upscale"] * 5 + ["generate"] * 2 + ["upscale"] * 2,
+    "random": random.Random(0).choices(["generate", "upscale"], k=12),
+}
+
+
+class Sim:
+    def __init__(self, speedup: float):
+        self.speedup = speedup
+        self.transfers = 0
+        self.lock = asyncio.Lock()  # One GPU
+
+    async def cost(self, name: str, transfer: bool = False):
+        self.transfers += transfer
+        await asyncio.sleep(COST[name] / self.speedup)
+
+
+async def old_policy(trace, sim: Sim):
+    main_on_gpu = True
+    for kind in trace:
+        async with sim.lock:
+            if kind == "generate":
+                if not main_on_gpu:
+                    await sim.cost("move_main", True)
+                    main_on_gpu = True
+                await sim.cost("generate")
+            else:
+                # offload_main_models -> upscaler.to(cuda) -> run -> offload_upscaler
+                if main_on_gpu:
+                    await sim.cost("move_main", True)
+                    main_on_gpu = False
+                await sim.cost("move_upscaler", True)
+                await sim.cost("upscale")
+                await sim.cost("move_upscaler", True)
+
+
+async def residency_policy(trace, sim: Sim):
+    residency = ModelResidency()
+    pending = []
+
+    def mover(name):
+        return lambda: time.sleep(COST[name] / sim.speedup)
+
+    def counted(fn):
+        def run():
+            sim.transfers += 1
+            fn()
+        return run
+
+    residency.register("main", counted(mover("move_main")), counted(mover("move_main")), default=True)
+    residency.register("upscaler", counted(mover("move_upscaler")), counted(mover("move_upscaler")))
+
+    async def request(kind):
+        group = "main" if kind == "generate" else "upscaler"
+        async with residency.use(group):
+            async with sim.lock:
+                await sim.cost(kind)
+
+    # Requests arrive slightly staggered, queueing behind the running one
+    for kind in trace:
+        pending.append(asyncio.create_task(request(kind)))
+        await asyncio.sleep(0.1 / sim.speedup)
+    await asyncio.gather(*pending)
+
+
+async def run(policy, trace, speedup):
+    sim = Sim(speedup)
+    start = time.perf_counter()
+    await policy(trace, sim)
+    return sim.transfers, (time.perf_counter() - start) * speedup
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--speedup", type=float, default=20)
+    args = parser.parse_args()
+
+    print(f"{'trace':<12} {'policy':<18} {'transfers':>9} {'wall (s, unscaled)':>20}")
+    for name, trace in TRACES.items():
+        for label, policy in (("offload per call", old_policy), ("residency", residency_policy)):
+            transfers, wall = asyncio.run(run(policy, trace, args.speedup))
+            print(f"{name:<12} {label:<18} {transfers:>9} {wall:>20.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark: whole-image vs tiled x4 upscaling, time and peak memory.
+
+The upscaler is a tiny stand-in ONNX net (conv 3->32 -> conv 32->48 ->
+DepthToSpace x4) on CPUExecutionProvider, so activation memory grows with
+the input area like the diffusion upscaler's does. Each case runs in a
+fresh subprocess and reports its own peak RSS, which includes the input
+and the uint8 result (both unavoidable and proportional to area).
+
+Usage:
+    python benchmarks/bench_tiled_upscale.py [--sizes 256,512,1024,2048]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bench_decode import peak_rss_mb
+
+
+def build_model(path: str):
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+    rng = np.random.default_rng(0)
+    inits = [
+        numpy_helper.from_array((rng.standard_normal((32, 3, 3, 3)) * 0.1).astype(np.float32), "w0"),
+        numpy_helper.from_array((rng.standard_normal((48, 32, 3, 3)) * 0.05).astype(np.float32), "w1"),
+    ]
+    nodes = [
+        helper.make_node("Conv", ["input", "w0"], ["c0"], pads=[1, 1, 1, 1]),
+        helper.make_node("Relu", ["c0"], ["r0"]),
+        helper.make_node("Conv", ["r0", "w1"], ["c1"], pads=[1, 1, 1, 1]),
+        helper.make_node("DepthToSpace", ["c1"], ["d"], blocksize=4),
+        helper.make_node("Sigmoid", ["d"], ["output"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "upscaler_stand_in",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, [1, 3, "H", "W"])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, [1, 3, "H4", "W4"])],
+        inits
+    )
+    onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=8), path)
+
+
+def child(model: str, size: int, tile: int):
+    import onnxruntime as ort
+    from PIL import Image
+    from tiled_upscale import TiledUpscaler
+
+    options = ort.SessionOptions()
+    options.enable_cpu_mem_arena = False
+    session = ort.InferenceSession(model, sess_options=options, providers=["CPUExecutionProvider"])
+
+    def upscale(tiles):
+        out = []
+        for tile_image in tiles:
+            x = np.asarray(tile_image, dtype=np.float32).transpose(2, 0, 1)[None] / 255
+            y = session.run(None, {"input": x})[0][0].transpose(1, 2, 0)
+            out.append(Image.fromarray((y * 255).astype(np.uint8)))
+        return out
+
+    rng = np.random.default_rng(1)
+    image = Image.fromarray(rng.integers(0, 255, (size, size, 3), dtype=np.uint8))
+    start = time.perf_counter()
+    if tile:
+        result = TiledUpscaler(upscale, tile=tile, overlap=tile // 8).run(image)
+    else:
+        result = upscale([image])[0]
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"s": elapsed, "size": result.size, "rss_mb": peak_rss_mb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="256,512,1024,2048")
+    parser.add_argument("--tile", type=int, default=256)
+    parser.add_argument("--child")
+    parser.add_argument("--size", type=int)
+    parser.add_argument("--tile-size", type=int, default=0)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child, args.size, args.tile_size)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = os.path.join(tmp, "upscaler.onnx")
+        build_model(model)
+        print(f"x4 stand-in upscaler, CPUExecutionProvider, {os.cpu_count()} core(s); tile {args.tile}, overlap {args.tile // 8}")
+        print(f"  {'input':>9}  {'whole image':>22}  {'tiled':>22}")
+        for size in (int(v) for v in args.sizes.split(",")):
+            cells = []
+            for tile in (0, args.tile):
+                out = subprocess.run(
+                    [sys.executable, __file__, "--child", model, "--size", str(size), "--tile-size", str(tile)],
+                    capture_output=True, text=True
+                )
+                if out.returncode:
+                    cells.append(f"{'failed':>22}")
+                    continue
+                r = json.loads(out.stdout.strip().splitlines()[-1])
+                cells.append(f"{r['s']:6.2f} s {r['rss_mb']:8.0f} MB")
+            print(f"  {size:>4}x{size:<4}  {cells[0]:>22}  {cells[1]:>22}")
+
+
+if __name__ == "__main__":
+    main()
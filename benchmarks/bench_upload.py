@@ -0,0 +1,120 @@
+"""
+Benchmark: base64 JSON vs streamed binary upload for large images.
+
+Each path runs in a fresh subprocess so peak RSS is measured
+per path without interference:
+
+- json:   json.dumps/loads of a base64 body, b64decode, PIL decode
+- stream: 64 KB chunks spooled into the UploadStore, PIL decode from disk
+
+Usage:
+    python benchmarks/bench_upload.py [--size-mb 10]
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+def make_png(size_mb: float) -> bytes:
+    """Random-noise PNG of roughly `size_mb` (noise barely compresses)"""
+    from PIL import Image
+    side = int((size_mb * 1024**2 / 3) ** 0.5)
+    image = Image.frombytes("RGB", (side, side), os.urandom(side * side * 3))
+    buffer = BytesIO()
+    image.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process (VmHWM resets on exec, unlike ru_maxrss)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_json(path: str) -> float:
+    from PIL import Image
+    with open(path, "rb") as f:
+        raw = f.read()
+    body = json.dumps({"image": "data:image/png;base64," + base64.b64encode(raw).decode()})
+    del raw
+    start = time.perf_counter()
+    payload = json.loads(body)
+    data = base64.b64decode(payload["image"].split(",", 1)[1])
+    Image.open(BytesIO(data)).convert("RGB")
+    return time.perf_counter() - start
+
+
+def run_stream(path: str) -> float:
+    from PIL import Image
+    from upload_store import UploadStore
+
+    store = UploadStore(root=tempfile.mkdtemp(prefix="bench_uploads_"))
+
+    async def chunks():
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(64 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+
+    start = time.perf_counter()
+    stored = asyncio.run(store.save_stream(chunks()))
+    Image.open(stored.path).convert("RGB")
+    return time.perf_counter() - start
+
+
+def child(mode: str, path: str):
+    baseline = peak_rss_mb()
+    elapsed = run_json(path) if mode == "json" else run_stream(path)
+    print(json.dumps({"elapsed": elapsed, "peak_rss_mb": peak_rss_mb(), "baseline_mb": baseline}))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=10)
+    parser.add_argument("--child", choices=["json", "stream"])
+    parser.add_argument("--path")
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args.path)
+        return
+
+    with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as f:
+        f.write(make_png(args.size_mb))
+        path = f.name
+    print(f"Input: {os.path.getsize(path) / 1024**2:.1f} MB PNG")
+
+    for mode in ("json", "stream"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--path", path],
+            capture_output=True, text=True, check=True
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        print(
+            f"{mode:<8} latency {result['elapsed'] * 1000:8.1f} ms   "
+            f"peak RSS {result['peak_rss_mb']:7.1f} MB"
+        )
+    os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
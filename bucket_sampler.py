@@ -0,0 +1,267 @@
+"""
+Aspect-Ratio Bucketing for Training
+
+Training at a single square resolution crops every non-square image and
+makes batches of mixed shapes impossible. Instead, every image is assigned
+to the closest of the generation aspect ratios (aspect_ratios.ASPECT_RATIOS,
+scaled to the training resolution), resized to cover that bucket and
+center-cropped; batches are drawn from one bucket at a time, so they
+stack into a single tensor at any batch size:
+
+- `BucketedImageDataset` reads only image headers up front; decoding and
+  resizing happen in `__getitem__`, i.e. in the DataLoader's worker
+  processes when `bucket_loader(workers > 0)` is used
+- `BucketSampler` shuffles within buckets and then the order of batches,
+  reshuffled per epoch from a seed
+- `dataset_stats()` reports bucket occupancy, batches per epoch and the
+  share of pixels cropped away, against a fixed square crop
+"""
+
+import math
+import os
+from collections import defaultdict
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import logging
+
+import numpy as np
+from PIL import Image
+
+from aspect_ratios import ASPECT_RATIOS
+from dataset_captioning import list_dataset_images, sidecar_path
+from image_decode import open_rgb
+
+logger = logging.getLogger(__name__)
+
+Bucket = Tuple[int, int]  # (width, height)
+
+
+def training_buckets(resolution: int = 1024, step: int = 64) -> Dict[str, Bucket]:
+    """ASPECT_RATIOS (defined at 1024) scaled to `resolution`, sides multiples of `step`"""
+    scale = resolution / 1024
+    buckets: Dict[str, Bucket] = {}
+    for ratio, config in ASPECT_RATIOS.items():
+        bucket = tuple(max(step, int(side * scale / step + 0.5) * step) for side in (config.width, config.height))
+        if bucket not in buckets.values():
+            buckets[ratio] = bucket
+    return buckets
+
+
+def nearest_bucket(size: Tuple[int, int], buckets: Sequence[Bucket]) -> Bucket:
+    """Bucket whose aspect ratio is closest to that of `size` (width, height)"""
+    ratio = math.log(size[0] / size[1])
+    return min(buckets, key=lambda b: abs(math.log(b[0] / b[1]) - ratio))
+
+
+def bucket_key(bucket: Bucket) -> str:
+    return f"{bucket[0]}x{bucket[1]}"
+
+
+def parse_bucket(key: str) -> Bucket:
+    width, height = key.split("x")
+    return int(width), int(height)
+
+
+def resize_to_bucket(image: Image.Image, bucket: Bucket) -> Tuple[Image.Image, Tuple[int, int]]:
+    """Scale `image` to cover `bucket` and center-crop it; returns the crop's (top, left)"""
+    width, height = bucket
+    scale = max(width / image.width, height / image.height)
+    resized = (max(width, round(image.width * scale)), max(height, round(image.height * scale)))
+    if resized != image.size:
+        image = image.resize(resized, Image.BICUBIC)
+    top = (resized[1] - height) // 2
+    left = (resized[0] - width) // 2
+    return image.crop((left, top, left + width, top + height)), (top, left)
+
+
+def cropped_fraction(size: Tuple[int, int], bucket: Bucket) -> float:
+    """Share of the image's pixels that resize_to_bucket crops away"""
+    image_ratio, bucket_ratio = size[0] / size[1], bucket[0] / bucket[1]
+    return 1.0 - min(image_ratio, bucket_ratio) / max(image_ratio, bucket_ratio)
+
+
+def to_pixels(image: Image.Image) -> np.ndarray:
+    """[3, H, W] float32 in [-1, 1], the VAE's input range"""
+    return np.asarray(image, dtype=np.float32).transpose(2, 0, 1) / 127.5 - 1.0
+
+
+def time_ids(size: Tuple[int, int], crop: Tuple[int, int], bucket: Bucket) -> List[int]:
+    """SDXL add_time_ids: original (h, w), crop (top, left), target (h, w)"""
+    return [size[1], size[0], crop[0], crop[1], bucket[1], bucket[0]]
+
+
+def read_caption(image_path: str, default: str) -> str:
+    """The image's sidecar caption, else `default` (e.g. the instance prompt)"""
+    path = sidecar_path(image_path)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            caption = f.read().strip()
+        if caption:
+            return caption
+    return default
+
+
+class BucketSampler:
+    """
+    Batch sampler (usable as a DataLoader `batch_sampler`): lists of item
+    indices that all share one bucket
+    """
+
+    def __init__(
+        self,
+        buckets: Sequence[str],
+        batch_size: int = 1,
+        shuffle: bool = True,
+        drop_last: bool = False,
+        seed: Optional[int] = 0
+    ):
+        self.batch_size = max(1, batch_size)
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+        self.seed = seed
+        self.epoch = 0
+        self.groups: Dict[str, List[int]] = defaultdict(list)
+        for index, key in enumerate(buckets):
+            self.groups[key].append(index)
+
+    def set_epoch(self, epoch: int):
+        self.epoch = epoch
+
+    def __len__(self) -> int:
+        rounding = math.floor if self.drop_last else math.ceil
+        return sum(rounding(len(items) / self.batch_size) for items in self.groups.values())
+
+    def __iter__(self) -> Iterator[List[int]]:
+        rng = np.random.default_rng(None if self.seed is None else (self.seed, self.epoch))
+        batches = []
+        for key in sorted(self.groups):
+            items = self.groups[key]
+            order = rng.permutation(len(items)) if self.shuffle else range(len(items))
+            ordered = [items[i] for i in order]
+            for first in range(0, len(ordered), self.batch_size):
+                batch = ordered[first:first + self.batch_size]
+                if len(batch) == self.batch_size or not self.drop_last:
+                    batches.append(batch)
+        if self.shuffle:
+            batches = [batches[i] for i in rng.permutation(len(batches))]
+        return iter(batches)
+
+
+class BucketedImageDataset:
+    """Map-style dataset of bucketed training images; picklable for DataLoader workers"""
+
+    def __init__(self, paths: Sequence[str], captions: Sequence[str], resolution: int = 1024):
+        self.resolution = resolution
+        self.ratios = training_buckets(resolution)
+        choices = list(self.ratios.values())
+        self.paths: List[str] = []
+        self.captions: List[str] = []
+        self.sizes: List[Tuple[int, int]] = []
+        self.buckets: List[Bucket] = []
+        for path, caption in zip(paths, captions):
+            try:
+                with Image.open(path) as probe:
+                    size = probe.size
+            except Exception as e:
+                logger.warning(f"Skipping {path}: {e}")
+                continue
+            self.paths.append(path)
+            self.captions.append(caption)
+            self.sizes.append(size)
+            self.buckets.append(nearest_bucket(size, choices))
+
+    @classmethod
+    def from_directory(cls, directory: str, instance_prompt: str, resolution: int = 1024) -> "BucketedImageDataset":
+        paths = list_dataset_images(directory)
+        return cls(paths, [read_caption(p, instance_prompt) for p in paths], resolution)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getitem__(self, index: int) -> dict:
+        bucket = self.buckets[index]
+        image, crop = resize_to_bucket(open_rgb(self.paths[index], bucket), bucket)
+        return {
+            "pixels": to_pixels(image),
+            "time_ids": np.array(time_ids(self.sizes[index], crop, bucket), dtype=np.float32),
+            "caption": self.captions[index],
+            "bucket": bucket_key(bucket)
+        }
+
+    def sampler(self, batch_size: int = 1, shuffle: bool = True, drop_last: bool = False,
+                seed: Optional[int] = 0) -> BucketSampler:
+        return BucketSampler([bucket_key(b) for b in self.buckets], batch_size, shuffle, drop_last, seed)
+
+
+def collate(items: List[dict]) -> dict:
+    """Stack one bucket's items into a batch of torch tensors"""
+    import torch
+    return {
+        "pixels": torch.from_numpy(np.stack([item["pixels"] for item in items])),
+        "time_ids": torch.from_numpy(np.stack([item["time_ids"] for item in items])),
+        "captions": [item["caption"] for item in items],
+        "bucket": items[0]["bucket"]
+    }
+
+
+def bucket_loader(
+    dataset: BucketedImageDataset,
+    batch_size: int = 1,
+    workers: int = 2,
+    shuffle: bool = True,
+    drop_last: bool = False,
+    seed: Optional[int] = 0
+):
+    """
+    DataLoader over `dataset` with same-shape batches. `workers` > 0 decodes
+    and resizes in that many processes, overlapping with the training step.
+    """
+    import torch
+    from torch.utils.data import DataLoader
+    return DataLoader(
+        dataset,
+        batch_sampler=dataset.sampler(batch_size, shuffle, drop_last, seed),
+        num_workers=workers,
+        collate_fn=collate,
+        pin_memory=torch.cuda.is_available(),
+        persistent_workers=workers > 0,
+        prefetch_factor=2 if workers > 0 else None
+    )
+
+
+def dataset_stats(dataset: BucketedImageDataset, batch_size: int = 1) -> dict:
+    """Bucket occupancy, batches per epoch and crop loss, bucketed vs a fixed square crop"""
+    names = {bucket: ratio for ratio, bucket in dataset.ratios.items()}
+    per_bucket: Dict[Bucket, List[int]] = defaultdict(list)
+    for index, bucket in enumerate(dataset.buckets):
+        per_bucket[bucket].append(index)
+
+    rows = []
+    for bucket, indices in sorted(per_bucket.items(), key=lambda item: -len(item[1])):
+        sizes = [dataset.sizes[i] for i in indices]
+        rows.append({
+            "ratio": names[bucket],
+            "bucket": bucket_key(bucket),
+            "images": len(indices),
+            "batches": math.ceil(len(indices) / batch_size),
+            "partial_batch": len(indices) % batch_size,
+            "mean_crop_pct": round(100 * float(np.mean([cropped_fraction(s, bucket) for s in sizes])), 2),
+            # Images smaller than the bucket get upscaled
+            "upscaled": sum(s[0] < bucket[0] or s[1] < bucket[1] for s in sizes)
+        })
+
+    square = (dataset.resolution, dataset.resolution)
+    total = len(dataset)
+    bucketed_crop = [cropped_fraction(s, b) for s, b in zip(dataset.sizes, dataset.buckets)]
+    square_crop = [cropped_fraction(s, square) for s in dataset.sizes]
+    batches = sum(row["batches"] for row in rows)
+    return {
+        "images": total,
+        "resolution": dataset.resolution,
+        "batch_size": batch_size,
+        "buckets_used": len(rows),
+        "batches_per_epoch": batches,
+        "full_batches": sum(row["images"] // batch_size for row in rows),
+        "mean_crop_pct": round(100 * float(np.mean(bucketed_crop)), 2) if total else 0.0,
+        "square_crop_pct": round(100 * float(np.mean(square_crop)), 2) if total else 0.0,
+        "buckets": rows
+    }
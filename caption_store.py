@@ -0,0 +1,127 @@
+"""
+Persistent Caption Store
+
+SQLite table of captions keyed by (image hash, captioner). The image hash
+is taken over the decoded pixels (face_cache.frame_key), so the same
+picture sent as base64, upload or URL maps to one entry; the captioner
+string names the model and generation settings, so changing either
+re-captions instead of serving stale results.
+
+Survives restarts; one connection is shared across threads behind a lock
+(lookups are a primary-key read, far below a BLIP forward pass).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+import logging
+
+from metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join("cache", "captions.sqlite3")
+
+
+class CaptionStore:
+    def __init__(self, path: str = DEFAULT_PATH, name: str = "captions"):
+        self.path = path
+        self.name = name
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened lazily so importing the module never touches the disk
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS captions ("
+                " image_hash TEXT NOT NULL,"
+                " captioner TEXT NOT NULL,"
+                " caption TEXT NOT NULL,"
+                " created REAL NOT NULL,"
+                " PRIMARY KEY (image_hash, captioner))"
+            )
+            self._conn = conn
+        return self._conn
+
+    def get(self, image_hash: str, captioner: str) -> Optional[str]:
+        return self.get_many([image_hash], captioner).get(image_hash)
+
+    def get_many(self, image_hashes: Sequence[str], captioner: str) -> Dict[str, str]:
+        """Cached captions for whichever of `image_hashes` are known"""
+        found: Dict[str, str] = {}
+        unique = list(dict.fromkeys(image_hashes))
+        with self._lock:
+            conn = self._connect()
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                chunk = unique[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT image_hash, caption FROM captions WHERE captioner = ? "
+                    f"AND image_hash IN ({','.join('?' * len(chunk))})",
+                    [captioner, *chunk]
+                ).fetchall()
+                found.update(rows)
+            hits = sum(h in found for h in image_hashes)
+            self.hits += hits
+            self.misses += len(image_hashes) - hits
+        for h in image_hashes:
+            record_cache_lookup(self.name, h in found)
+        return found
+
+    def put(self, image_hash: str, captioner: str, caption: str):
+        self.put_many([(image_hash, caption)], captioner)
+
+    def put_many(self, items: Iterable[Tuple[str, str]], captioner: str):
+        now = time.time()
+        rows = [(h, captioner, caption, now) for h, caption in items]
+        if not rows:
+            return
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO captions VALUES (?, ?, ?, ?)", rows)
+
+    def clear(self, captioner: Optional[str] = None) -> int:
+        """Drop all captions (or one captioner's); returns the number removed"""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                if captioner is None:
+                    cursor = conn.execute("DELETE FROM captions")
+                else:
+                    cursor = conn.execute("DELETE FROM captions WHERE captioner = ?", (captioner,))
+            return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM captions").fetchone()[0]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "path": self.path
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Global instance
+caption_store = CaptionStore()
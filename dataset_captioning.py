@@ -0,0 +1,165 @@
+"""
+Dataset Auto-Captioning
+
+Walks a dataset directory and writes a sidecar caption next to every
+image (`photo.png` -> `photo.txt`), the layout train_connector.py's
+trainer reads captions from:
+
+- images that already have a sidecar are skipped, and each sidecar is
+  written atomically as soon as its caption is ready, so an interrupted
+  job resumes where it stopped when started again
+- decoding runs in a thread pool at the captioner's input size
+- captions come from the caption store when the same pixels were
+  captioned before; the rest go through the (micro-batched) captioner
+- a fixed set of `max_in_flight` workers pulls images from the list, so a
+  large dataset never turns into thousands of pending tasks; directory
+  listing and caption store (sqlite) access run off the event loop
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+import logging
+
+from PIL import Image
+
+from face_cache import frame_key
+from image_buffer import rgb_array
+from image_decode import open_rgb
+from upload_store import IMAGE_EXTENSIONS
+
+logger = logging.getLogger(__name__)
+
+
+class CaptionJobCancelled(Exception):
+    """Raised when a dataset captioning job is cancelled"""
+
+
+@dataclass
+class CaptionJobStats:
+    total: int = 0
+    skipped: int = 0  # Sidecar already present
+    cached: int = 0   # Served from the caption store
+    captioned: int = 0
+    failed: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def done(self) -> int:
+        return self.skipped + self.cached + self.captioned + self.failed
+
+    def to_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "done": self.done,
+            "skipped": self.skipped,
+            "cached": self.cached,
+            "captioned": self.captioned,
+            "failed": self.failed,
+            "elapsed": round(self.elapsed, 3),
+            "progress": round(self.done / self.total * 100, 2) if self.total else 100.0
+        }
+
+
+def sidecar_path(image_path: str) -> str:
+    return os.path.splitext(image_path)[0] + ".txt"
+
+
+def list_dataset_images(directory: str) -> List[str]:
+    """Image files directly under `directory`, sorted by name"""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        and os.path.isfile(os.path.join(directory, name))
+    )
+
+
+def write_sidecar(image_path: str, caption: str):
+    path = sidecar_path(image_path)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(caption.strip() + "\n")
+    os.replace(tmp, path)
+
+
+async def caption_directory(
+    directory: str,
+    caption: Callable[[Image.Image], Awaitable[str]],
+    store,
+    captioner: str,
+    decode_size: int = 384,
+    decode_workers: int = 4,
+    max_in_flight: int = 16,
+    overwrite: bool = False,
+    prefix: str = "",
+    progress: Optional[Callable[[CaptionJobStats], None]] = None,
+    cancel: Optional[threading.Event] = None
+) -> CaptionJobStats:
+    """
+    Caption every image in `directory` that has no sidecar yet (or all of
+    them with `overwrite`). `caption(image)` returns one caption;
+    `store` is a CaptionStore. `prefix` (e.g. a trigger word) is prepended
+    to every sidecar.
+    """
+    images = await asyncio.to_thread(list_dataset_images, directory)
+    stats = CaptionJobStats(total=len(images))
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max(1, decode_workers), thread_name_prefix="caption-decode")
+    queue = iter(images)
+
+    def finish(kind: str):
+        setattr(stats, kind, getattr(stats, kind) + 1)
+        stats.elapsed = time.perf_counter() - start
+        if progress is not None:
+            progress(stats)
+
+    def decode(path: str):
+        """(image, hash, stored caption or None); None when the sidecar exists"""
+        if not overwrite and os.path.exists(sidecar_path(path)):
+            return None
+        image = open_rgb(path, decode_size)
+        image_hash = frame_key(rgb_array(image))
+        return image, image_hash, store.get(image_hash, captioner)
+
+    async def process(path: str):
+        try:
+            decoded = await loop.run_in_executor(executor, decode, path)
+            if decoded is None:
+                finish("skipped")
+                return
+            image, image_hash, text = decoded
+            kind = "cached"
+            if text is None:
+                text = await caption(image)
+                await asyncio.to_thread(store.put, image_hash, captioner, text)
+                kind = "captioned"
+            await asyncio.to_thread(write_sidecar, path, f"{prefix}{text}")
+        except Exception as e:
+            logger.warning(f"Captioning {path} failed: {e}")
+            kind = "failed"
+        finish(kind)
+
+    async def worker():
+        # The shared iterator hands each path to exactly one worker
+        for path in queue:
+            if cancel is not None and cancel.is_set():
+                return
+            await process(path)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(max(1, min(max_in_flight, len(images))))]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        executor.shutdown(wait=False)
+        stats.elapsed = time.perf_counter() - start
+
+    if cancel is not None and cancel.is_set():
+        raise CaptionJobCancelled(f"Cancelled after {stats.done}/{stats.total} images")
+    return stats
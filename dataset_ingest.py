@@ -0,0 +1,380 @@
+"""
+Bulk Dataset Ingestion
+
+Turns one zip or tar (optionally gzip / bzip2 / xz) archive into training
+images under datasets/<project>, the directory train_connector.py and the
+/dataset endpoints read:
+
+- tar bodies are extracted while the request is still arriving: the
+  archive is read as a stream and never written to disk; zip keeps its
+  directory at the end, so a zip body is spooled to a temporary file
+  first and then read member by member
+- members are validated and normalized in a thread pool (full decode,
+  EXIF orientation applied, RGB, longest side capped); files that are
+  already clean RGB JPEG/PNG are kept byte for byte, the rest re-encoded
+  as PNG. A bounded number of members is in flight, so memory stays flat
+  however large the archive
+- near-duplicates are dropped by 64-bit difference hash (dHash): an image
+  within `max_distance` bits of one already in the dataset, or earlier in
+  the same archive, is skipped. Hashes of existing images are kept in
+  .hashes.json so later ingests don't decode them again
+- .txt members become the caption sidecar of the image with the same stem
+"""
+
+import asyncio
+import io
+import json
+import os
+import re
+import tarfile
+import tempfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import AsyncIterator, BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from dataset_captioning import list_dataset_images, sidecar_path
+from upload_store import IMAGE_EXTENSIONS, UploadTooLarge, sniff_archive_type
+
+logger = logging.getLogger(__name__)
+
+DATASET_ROOT = "datasets"
+HASH_INDEX = ".hashes.json"
+_SPOOL_BYTES = 64 * 1024**2
+_SNIFF_BYTES = 512
+
+
+def dataset_path(project_name: str) -> str:
+    """datasets/<project_name>; rejects names that would leave the dataset root"""
+    name = os.path.basename(project_name.strip())
+    if name in ("", ".", "..") or name != project_name.strip():
+        raise ValueError(f"Invalid project name: {project_name!r}")
+    return os.path.join(DATASET_ROOT, name)
+
+
+def dhash(image: Image.Image) -> int:
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail"""
+    pixels = np.asarray(image.convert("L").resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+class HashIndex:
+    """dHashes of a dataset's images, searched by Hamming distance"""
+
+    def __init__(self):
+        self.names: List[str] = []
+        self._hashes = np.zeros(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, name: str, value: int):
+        self.names.append(name)
+        self._hashes = np.append(self._hashes, np.uint64(value))
+
+    def nearest(self, value: int) -> Tuple[Optional[str], int]:
+        """(name, distance) of the closest hash, or (None, 64) when empty"""
+        if not self.names:
+            return None, 64
+        # unpackbits rather than np.bitwise_count, which needs NumPy 2
+        diff = self._hashes ^ np.uint64(value)
+        distances = np.unpackbits(diff.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+        best = int(np.argmin(distances))
+        return self.names[best], int(distances[best])
+
+
+def load_hash_index(directory: str) -> Tuple[HashIndex, Dict[str, dict]]:
+    """
+    Hashes of the images in `directory`, decoding only files not seen
+    before; also returns the .hashes.json entries (name -> size, mtime, dhash)
+    """
+    path = os.path.join(directory, HASH_INDEX)
+    known: Dict[str, dict] = {}
+    if os.path.exists(path):
+        try:
+            with open(path, encoding="utf-8") as f:
+                known = json.load(f)
+        except (OSError, ValueError):
+            known = {}
+    index, entries = HashIndex(), {}
+    for image_path in list_dataset_images(directory):
+        name = os.path.basename(image_path)
+        st = os.stat(image_path)
+        entry = known.get(name)
+        if not entry or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+            try:
+                with Image.open(image_path) as image:
+                    image.draft("RGB", (64, 64))
+                    entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "dhash": f"{dhash(image):016x}"}
+            except Exception as e:
+                logger.warning(f"Cannot hash {image_path}: {e}")
+                continue
+        entries[name] = entry
+        index.add(name, int(entry["dhash"], 16))
+    return index, entries
+
+
+def _save_hash_entries(directory: str, entries: Dict[str, dict]):
+    path = os.path.join(directory, HASH_INDEX)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entries, f)
+    os.replace(tmp, path)
+
+
+@dataclass
+class Normalized:
+    data: bytes
+    extension: str
+    size: Tuple[int, int]
+    dhash: int
+
+
+def normalize_image(data: bytes, max_side: int = 2048) -> Normalized:
+    """Validate one image (full decode) and bring it to RGB within `max_side`"""
+    with Image.open(io.BytesIO(data)) as source:
+        source_format = source.format
+        source.load()
+        rotated = source.getexif().get(0x0112, 1) != 1  # EXIF Orientation
+        image = ImageOps.exif_transpose(source) if rotated else source
+        reencode = (
+            rotated
+            or source_format not in ("JPEG", "PNG")
+            or image.mode != "RGB"
+            or max(image.size) > max_side
+            or getattr(source, "is_animated", False)
+        )
+        if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+            # Transparent pixels become white, not black
+            rgba = image.convert("RGBA")
+            image = Image.new("RGB", image.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel("A"))
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+        value = dhash(image)
+        if not reencode:
+            return Normalized(data, ".jpg" if source_format == "JPEG" else ".png", image.size, value)
+        out = io.BytesIO()
+        image.save(out, format="PNG", compress_level=1)
+        return Normalized(out.getvalue(), ".png", image.size, value)
+
+
+@dataclass
+class IngestStats:
+    received: int = 0    # Image members in the archive
+    written: int = 0
+    duplicates: int = 0  # Near-duplicates of dataset or earlier archive images
+    invalid: int = 0     # Failed to decode
+    captions: int = 0    # Sidecars written from .txt members
+    ignored: int = 0     # Other members
+    bytes_read: int = 0
+    elapsed: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "received": self.received,
+            "written": self.written,
+            "duplicates": self.duplicates,
+            "invalid": self.invalid,
+            "captions": self.captions,
+            "ignored": self.ignored,
+            "bytes_read": self.bytes_read,
+            "elapsed": round(self.elapsed, 3),
+            "images_per_second": round(self.received / self.elapsed, 2) if self.elapsed > 0 else 0.0
+        }
+
+
+class AsyncStreamReader(io.RawIOBase):
+    """
+    Blocking file object over an async byte iterator (e.g. a request
+    body), read from a worker thread; chunks are pulled from the event
+    loop only as fast as the reader consumes them
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop, max_bytes: Optional[int] = None):
+        self._chunks = chunks.__aiter__()
+        self._loop = loop
+        self.max_bytes = max_bytes
+        self.total = 0
+        self._buffer = memoryview(b"")
+        self._eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    async def _next(self) -> bytes:
+        return await self._chunks.__anext__()
+
+    def readinto(self, b) -> int:
+        while not self._buffer and not self._eof:
+            try:
+                chunk = asyncio.run_coroutine_threadsafe(self._next(), self._loop).result()
+            except StopAsyncIteration:
+                self._eof = True
+                break
+            self.total += len(chunk)
+            if self.max_bytes is not None and self.total > self.max_bytes:
+                raise UploadTooLarge(f"Archive exceeds {self.max_bytes} bytes")
+            self._buffer = memoryview(chunk)
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+class _Counted(io.RawIOBase):
+    """Pass-through reader that counts bytes and replays an already-read head"""
+
+    def __init__(self, head: bytes, source: BinaryIO):
+        self._head = memoryview(head)
+        self._source = source
+        self.total = len(head)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self._head:
+            n = min(len(b), len(self._head))
+            b[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        data = self._source.read(len(b))
+        b[:len(data)] = data
+        self.total += len(data)
+        return len(data)
+
+
+def _members(source: "_Counted", kind: str, max_member_bytes: int) -> Iterator[Tuple[str, Optional[bytes]]]:
+    """(name, data) per archive file; data is None for members that are skipped"""
+    stream = io.BufferedReader(source, 1024 * 1024)
+
+    def wanted(name: str, size: int) -> bool:
+        base = os.path.basename(name)
+        return (not base.startswith(".") and "__MACOSX" not in name and size <= max_member_bytes
+                and base.lower().endswith(IMAGE_EXTENSIONS + (".txt",)))
+
+    if kind == "application/zip":
+        with tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES) as spool:
+            while True:
+                chunk = stream.read(1024 * 1024)
+                if not chunk:
+                    break
+                spool.write(chunk)
+            with zipfile.ZipFile(spool) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        yield info.filename, archive.read(info) if wanted(info.filename, info.file_size) else None
+        return
+
+    with tarfile.open(fileobj=stream, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile():
+                yield member.name, archive.extractfile(member).read() if wanted(member.name, member.size) else None
+
+
+def _unique_name(directory: str, stem: str, extension: str, taken: set) -> str:
+    stem = re.sub(r"[^A-Za-z0-9._-]+", "_", stem).strip("._") or "image"
+    name, counter = f"{stem}{extension}", 1
+    while name in taken or os.path.exists(os.path.join(directory, name)):
+        name = f"{stem}_{counter}{extension}"
+        counter += 1
+    taken.add(name)
+    return name
+
+
+def ingest_archive(
+    source: BinaryIO,
+    directory: str,
+    workers: int = 4,
+    max_in_flight: int = 16,
+    max_side: int = 2048,
+    max_distance: int = 4,
+    max_member_bytes: int = 64 * 1024**2,
+    progress: Optional[Callable[[IngestStats], None]] = None
+) -> IngestStats:
+    """
+    Extract the archive read from `source` into `directory` (blocking; run
+    it in a thread). `max_distance` is the dHash distance at or below
+    which an image counts as a duplicate (0: only identical thumbnails).
+    """
+    start = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    head = source.read(_SNIFF_BYTES)
+    kind = sniff_archive_type(head)
+    if kind is None:
+        raise ValueError("Body is not a zip or tar archive")
+    counted = _Counted(head, source)
+    index, hash_entries = load_hash_index(directory)
+    stats = IngestStats()
+    captions: Dict[str, str] = {}
+    written: Dict[str, str] = {}  # archive stem -> image path
+    taken: set = set()
+    pending: deque = deque()
+    executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="dataset-ingest")
+
+    def finish_one():
+        name, future = pending.popleft()
+        try:
+            image = future.result()
+        except Exception as e:
+            logger.info(f"Ingest: skipping invalid image {name}: {e}")
+            stats.invalid += 1
+            return
+        match, distance = index.nearest(image.dhash)
+        if match is not None and distance <= max_distance:
+            stats.duplicates += 1
+            return
+        stem = os.path.splitext(os.path.basename(name))[0]
+        filename = _unique_name(directory, stem, image.extension, taken)
+        path = os.path.join(directory, filename)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(image.data)
+        os.replace(tmp, path)
+        st = os.stat(path)
+        hash_entries[filename] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "dhash": f"{image.dhash:016x}"}
+        index.add(filename, image.dhash)
+        written.setdefault(stem, path)
+        stats.written += 1
+        if progress is not None:
+            stats.elapsed = time.perf_counter() - start
+            progress(stats)
+
+    try:
+        for name, data in _members(counted, kind, max_member_bytes):
+            if data is None:
+                stats.ignored += 1
+                continue
+            if name.lower().endswith(".txt"):
+                captions[os.path.splitext(os.path.basename(name))[0]] = data.decode("utf-8", "replace").strip()
+                continue
+            stats.received += 1
+            pending.append((name, executor.submit(normalize_image, data, max_side)))
+            while len(pending) >= max_in_flight:
+                finish_one()
+        while pending:
+            finish_one()
+    finally:
+        for _, future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+        _save_hash_entries(directory, hash_entries)
+
+    for stem, caption in captions.items():
+        if stem in written and caption:
+            with open(sidecar_path(written[stem]), "w", encoding="utf-8") as f:
+                f.write(caption + "\n")
+            stats.captions += 1
+    stats.bytes_read = counted.total
+    stats.elapsed = time.perf_counter() - start
+    return stats
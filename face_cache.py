@@ -0,0 +1,134 @@
+"""
+Face Detection Cache
+
+Caches InsightFace results (bbox, landmarks, normed embedding) keyed by a
+hash of the exact frame the detector saw, so swapping one source face
+onto many targets runs detection and recognition for the source once.
+
+Clients can also register a source face and reference it by id in later
+/faceswap requests without resending the image. Registered faces live in
+memory only; after a restart the id is unknown and the client registers
+again.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+def frame_key(frame: np.ndarray) -> str:
+    """Content hash of a decoded frame (pixels, shape and dtype)"""
+    frame = np.ascontiguousarray(frame)
+    hasher = hashlib.blake2b(digest_size=20)
+    hasher.update(f"{frame.shape}{frame.dtype}".encode())
+    hasher.update(frame.data)
+    return hasher.hexdigest()
+
+
+def face_summary(face) -> dict:
+    """JSON-friendly description of a detected face"""
+    return {
+        "bbox": [round(float(v), 1) for v in face.bbox],
+        "det_score": round(float(face.det_score), 4),
+        "kps": [[round(float(x), 1), round(float(y), 1)] for x, y in face.kps]
+    }
+
+
+class FaceCache:
+    """LRU cache of detected faces per frame, plus registered source faces"""
+
+    def __init__(self, max_entries: int = 512, max_sources: int = 1024, name: str = "faces"):
+        self.max_entries = max_entries
+        self.max_sources = max_sources
+        self.name = name
+        self._frames: "OrderedDict[str, list]" = OrderedDict()
+        self._sources: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._frames)
+
+    def get(self, key: str) -> Optional[list]:
+        with self._lock:
+            faces = self._frames.get(key)
+            if faces is not None:
+                self._frames.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        record_cache_lookup(self.name, faces is not None)
+        return faces
+
+    def put(self, key: str, faces: list) -> None:
+        with self._lock:
+            self._frames[key] = faces
+            self._frames.move_to_end(key)
+            while len(self._frames) > self.max_entries:
+                self._frames.popitem(last=False)
+
+    def detect(self, frame: np.ndarray, analyze: Callable[[np.ndarray], list]) -> Tuple[str, List]:
+        """
+        Faces in `frame`, from cache or by calling `analyze(frame)`.
+
+        Results are shared between requests and must not be modified.
+        Returns (frame key, faces).
+        """
+        key = frame_key(frame)
+        faces = self.get(key)
+        if faces is None:
+            faces = list(analyze(frame))
+            self.put(key, faces)
+        return key, faces
+
+    def register_source(self, key: str, faces: list, index: int = 0) -> str:
+        """Keep face `index` of a detected frame and return its id"""
+        if not 0 <= index < len(faces):
+            raise IndexError(f"Face index {index} out of range ({len(faces)} face(s) detected)")
+        face_id = f"{key}-{index}"
+        with self._lock:
+            self._sources[face_id] = faces[index]
+            self._sources.move_to_end(face_id)
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        return face_id
+
+    def get_source(self, face_id: str):
+        """A registered source face, or None if unknown or evicted"""
+        with self._lock:
+            face = self._sources.get(face_id)
+            if face is not None:
+                self._sources.move_to_end(face_id)
+        return face
+
+    def remove_source(self, face_id: str) -> bool:
+        with self._lock:
+            return self._sources.pop(face_id, None) is not None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._frames.clear()
+            self._sources.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._frames),
+            "sources": len(self._sources),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+# Global face cache instance
+face_cache = FaceCache()
@@ -0,0 +1,197 @@
+"""
+Face Swap Session Pool
+
+A fixed pool of InsightFace analysers + inswapper sessions for batch face
+swapping on CPU-only nodes. Each worker owns its own ONNX Runtime
+sessions and is used by one thread at a time; ONNX Runtime releases the
+GIL while running, so the pool scales across cores.
+
+Thread tuning: with N workers on C cores each session gets C // N
+intra-op threads and a single inter-op thread (the graphs are
+sequential), and intra-op spinning is disabled so idle sessions do not
+busy-wait on cores another worker is using.
+"""
+
+import asyncio
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Iterable, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import onnxruntime as ort
+    ORT_AVAILABLE = True
+except ImportError:
+    ort = None
+    ORT_AVAILABLE = False
+    logger.warning("onnxruntime not installed - face swap pool unavailable")
+
+_END = object()
+
+
+def default_pool_size(cores: Optional[int] = None) -> int:
+    """Half the cores (at least 1, at most 4): each worker holds ~0.5 GB of models"""
+    cores = cores or os.cpu_count() or 1
+    return max(1, min(4, cores // 2))
+
+
+def plan_threads(pool_size: int, cores: Optional[int] = None) -> Tuple[int, int]:
+    """(intra_op, inter_op) thread counts per session for `pool_size` workers"""
+    cores = cores or os.cpu_count() or 1
+    return max(1, cores // pool_size), 1
+
+
+def cpu_session_options(intra_op: int, inter_op: int = 1):
+    """ONNX Runtime session options for one worker of a CPU pool"""
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op
+    options.inter_op_num_threads = inter_op
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.add_session_config_entry("session.intra_op.allow_spinning", "0")
+    return options
+
+
+@dataclass
+class SwapWorker:
+    """One set of sessions, used by a single thread at a time"""
+    analyzer: Any  # insightface FaceAnalysis
+    swapper: Any   # insightface INSwapper
+
+
+class FaceSwapPool:
+    """Pool of face swap workers driven from asyncio"""
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        swap_model_path: str = "models/insightface/inswapper_128.onnx",
+        analysis_name: str = "buffalo_l",
+        det_size: Tuple[int, int] = (640, 640),
+        providers: Sequence[str] = ("CPUExecutionProvider",),
+        worker_factory: Optional[Callable[[Any], SwapWorker]] = None
+    ):
+        self.size = size or default_pool_size()
+        self.swap_model_path = swap_model_path
+        self.analysis_name = analysis_name
+        self.det_size = det_size
+        self.providers = list(providers)
+        self.worker_factory = worker_factory or self._load_worker
+        self.intra_op, self.inter_op = plan_threads(self.size)
+        self._idle: "queue.Queue[SwapWorker]" = queue.Queue()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @property
+    def started(self) -> bool:
+        return self._executor is not None
+
+    def model_available(self) -> bool:
+        return os.path.exists(self.swap_model_path)
+
+    def _load_worker(self, session_options) -> SwapWorker:
+        import insightface
+        from insightface.app import FaceAnalysis
+
+        analyzer = FaceAnalysis(
+            name=self.analysis_name, providers=self.providers, sess_options=session_options
+        )
+        ctx_id = -1 if self.providers == ["CPUExecutionProvider"] else 0
+        analyzer.prepare(ctx_id=ctx_id, det_size=self.det_size)
+        swapper = insightface.model_zoo.get_model(
+            self.swap_model_path, download=False, download_zip=False,
+            providers=self.providers, sess_options=session_options
+        )
+        return SwapWorker(analyzer, swapper)
+
+    def start(self):
+        """Load every worker's sessions (blocking; call from a thread)"""
+        with self._lock:
+            if self._executor is not None:
+                return
+            options = cpu_session_options(self.intra_op, self.inter_op) if ORT_AVAILABLE else None
+            logger.info(
+                f"Starting face swap pool: {self.size} worker(s), "
+                f"{self.intra_op} intra-op / {self.inter_op} inter-op threads each"
+            )
+            for _ in range(self.size):
+                self._idle.put(self.worker_factory(options))
+            self._executor = ThreadPoolExecutor(self.size, thread_name_prefix="faceswap")
+
+    def _call(self, fn: Callable, item):
+        # The executor has exactly one thread per worker, so this never waits
+        worker = self._idle.get()
+        try:
+            return fn(worker, item)
+        finally:
+            self._idle.put(worker)
+
+    async def run(self, fn: Callable[[SwapWorker, Any], Any], item=None):
+        """Run `fn(worker, item)` on a free worker"""
+        if not self.started:
+            await asyncio.to_thread(self.start)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, item)
+
+    async def imap_unordered(
+        self,
+        fn: Callable[[SwapWorker, Any], Any],
+        items: Iterable,
+        max_in_flight: Optional[int] = None
+    ) -> AsyncIterator[Any]:
+        """
+        Apply `fn(worker, item)` to every item, yielding results as they
+        finish. Items are pulled lazily (in a thread, so archive reads do
+        not block the loop) and at most `max_in_flight` are outstanding.
+        """
+        if not self.started:
+            await asyncio.to_thread(self.start)
+        loop = asyncio.get_running_loop()
+        limit = max_in_flight or self.size * 2
+        iterator = iter(items)
+        pending = set()
+        exhausted = False
+        try:
+            while pending or not exhausted:
+                while not exhausted and len(pending) < limit:
+                    item = await asyncio.to_thread(next, iterator, _END)
+                    if item is _END:
+                        exhausted = True
+                        break
+                    pending.add(loop.run_in_executor(self._executor, self._call, fn, item))
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            # Client went away: drop work that has not started yet
+            for future in pending:
+                future.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "started": self.started,
+            "idle": self._idle.qsize(),
+            "intra_op_threads": self.intra_op,
+            "inter_op_threads": self.inter_op,
+            "providers": self.providers
+        }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            while not self._idle.empty():
+                self._idle.get_nowait()
+
+
+# Global pool instance (workers load on first use)
+faceswap_pool = FaceSwapPool()
@@ -0,0 +1,208 @@
+"""
+Fast Upscaling
+
+Non-diffusion upscale modes for previews, thumbnails and bulk jobs (the
+"Upscale" entries of modules.flags.uov_list):
+
+- "resample": Lanczos resampling (OpenCV's multi-threaded resize when
+  available, PIL otherwise) followed by a light unsharp mask
+- "onnx": an ONNX super-resolution model (ESPCN / Real-ESRGAN style
+  export: NCHW RGB in [0, 1] -> same, fixed integer scale) on
+  CPUExecutionProvider, run over overlapping tiles (tiled_upscale) with
+  each batch of tiles spread across threads. When the requested factor
+  differs from the model's native scale the result is resampled.
+
+The ONNX backend loads lazily from models/upscale/ (first *.onnx file);
+without a model, ONNX modes fall back to "resample".
+"""
+
+import glob
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import logging
+
+import numpy as np
+from PIL import Image, ImageFilter
+
+from image_buffer import CV2_AVAILABLE, cv2, rgb_array
+from tiled_upscale import TiledUpscaler
+
+logger = logging.getLogger(__name__)
+
+try:
+    import onnxruntime as ort
+    ORT_AVAILABLE = True
+except ImportError:
+    ort = None
+    ORT_AVAILABLE = False
+
+BACKENDS = ("resample", "onnx")
+
+# modules.flags.uov_list entry -> (scale, backend)
+UOV_UPSCALE_MODES = {
+    'Upscale (1.5x)': (1.5, "onnx"),
+    'Upscale (2x)': (2.0, "onnx"),
+    'Upscale (Fast 2x)': (2.0, "resample"),
+}
+
+DEFAULT_MODEL_DIR = "models/upscale"
+# Output area grows with scale²; 4x of a 4 MP input is already 64 MP
+MAX_SCALE = 4.0
+
+
+def resolve_mode(mode: str, scale: Optional[float] = None) -> Tuple[float, str]:
+    """(scale, backend) for a uov_list entry or a backend name"""
+    if scale is not None and not 0 < scale <= MAX_SCALE:
+        raise ValueError(f"Upscale factor must be in (0, {MAX_SCALE:g}]")
+    if mode in UOV_UPSCALE_MODES:
+        default_scale, backend = UOV_UPSCALE_MODES[mode]
+        return scale or default_scale, backend
+    if mode in BACKENDS:
+        return scale or 2.0, mode
+    raise ValueError(
+        f"Unknown upscale mode: {mode} (expected one of {', '.join([*UOV_UPSCALE_MODES, *BACKENDS])})"
+    )
+
+
+def _target_size(image: Image.Image, scale: float) -> Tuple[int, int]:
+    return max(1, round(image.width * scale)), max(1, round(image.height * scale))
+
+
+def resample(image: Image.Image, scale: float, sharpen: float = 0.4) -> Image.Image:
+    """Lanczos upscale with a light unsharp mask"""
+    size = _target_size(image, scale)
+    if not CV2_AVAILABLE:
+        out = image.convert("RGB").resize(size, Image.Resampling.LANCZOS)
+        if sharpen:
+            out = out.filter(ImageFilter.UnsharpMask(radius=1, percent=int(sharpen * 100), threshold=2))
+        return out
+    out = cv2.resize(rgb_array(image), size, interpolation=cv2.INTER_LANCZOS4)
+    if sharpen:
+        blurred = cv2.GaussianBlur(out, (0, 0), 1.0)
+        out = cv2.addWeighted(out, 1 + sharpen, blurred, -sharpen, 0)
+    return Image.fromarray(out)
+
+
+class OnnxSuperResolution:
+    """A CPU super-resolution session, run over tiles from several threads"""
+
+    def __init__(self, model_path: str, threads: Optional[int] = None, tile: int = 192, overlap: int = 12):
+        from faceswap_pool import cpu_session_options, plan_threads
+
+        cores = os.cpu_count() or 1
+        self.threads = max(1, threads or min(cores, 4))
+        intra_op, inter_op = plan_threads(self.threads, cores)
+        self.model_path = model_path
+        # One session shared by all threads; Run() is thread-safe and releases the GIL
+        self.session = ort.InferenceSession(
+            model_path, sess_options=cpu_session_options(intra_op, inter_op),
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.tile = tile
+        self.overlap = overlap
+        self.scale = self._probe_scale()
+        self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="sr-tile")
+
+    def _probe_scale(self) -> int:
+        probe = np.zeros((1, 3, 16, 16), dtype=np.float32)
+        out = self.session.run(None, {self.input_name: probe})[0]
+        return int(round(out.shape[-1] / 16))
+
+    def _run_tile(self, tile: Image.Image) -> Image.Image:
+        x = rgb_array(tile).transpose(2, 0, 1)[None].astype(np.float32) / 255
+        y = self.session.run(None, {self.input_name: x})[0][0]
+        y = np.clip(y.transpose(1, 2, 0) * 255 + 0.5, 0, 255).astype(np.uint8)
+        return Image.fromarray(y)
+
+    def _run_tiles(self, tiles: List[Image.Image]) -> List[Image.Image]:
+        return list(self._executor.map(self._run_tile, tiles))
+
+    def upscale(self, image: Image.Image, scale: Optional[float] = None) -> Image.Image:
+        tiler = TiledUpscaler(
+            self._run_tiles, scale=self.scale, tile=self.tile, overlap=self.overlap,
+            batch_size=self.threads * 2
+        )
+        out = tiler.run(image)
+        if scale and abs(scale - self.scale) > 1e-6:
+            out = resample(out, scale / self.scale, sharpen=0)
+        return out
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class FastUpscaler:
+    """Mode dispatch with a lazily loaded ONNX backend"""
+
+    def __init__(self, model_dir: str = DEFAULT_MODEL_DIR, model_path: Optional[str] = None):
+        self.model_dir = model_dir
+        self.model_path = model_path
+        self._sr: Optional[OnnxSuperResolution] = None
+        self._load_failed = False
+        self._lock = threading.Lock()
+
+    def _find_model(self) -> Optional[str]:
+        if self.model_path:
+            return self.model_path if os.path.isfile(self.model_path) else None
+        candidates = sorted(glob.glob(os.path.join(self.model_dir, "*.onnx")))
+        return candidates[0] if candidates else None
+
+    def onnx_backend(self) -> Optional[OnnxSuperResolution]:
+        """The ONNX backend, loading it on first use (None when unavailable)"""
+        if self._sr is not None or self._load_failed:
+            return self._sr
+        with self._lock:
+            if self._sr is None and not self._load_failed:
+                path = self._find_model() if ORT_AVAILABLE else None
+                if path is None:
+                    self._load_failed = True
+                    logger.info("No ONNX super-resolution model found - ONNX upscale modes use resampling")
+                else:
+                    try:
+                        self._sr = OnnxSuperResolution(path)
+                        logger.info(f"Loaded x{self._sr.scale} super-resolution model {path}")
+                    except Exception as e:
+                        self._load_failed = True
+                        logger.error(f"Failed to load super-resolution model {path}: {e}")
+        return self._sr
+
+    def upscale(self, image: Image.Image, mode: str, scale: Optional[float] = None) -> Tuple[Image.Image, dict]:
+        """Upscaled image and info (backend used, scale, latency per input megapixel)"""
+        scale, backend = resolve_mode(mode, scale)
+        start = time.perf_counter()
+        sr = self.onnx_backend() if backend == "onnx" else None
+        if sr is not None:
+            out = sr.upscale(image, scale)
+        else:
+            backend = "resample"
+            out = resample(image, scale)
+        elapsed = time.perf_counter() - start
+        megapixels = image.width * image.height / 1e6
+        return out, {
+            "backend": backend,
+            "scale": scale,
+            "elapsed": round(elapsed, 4),
+            "ms_per_input_mp": round(elapsed * 1000 / megapixels, 2) if megapixels else 0.0
+        }
+
+    def stats(self) -> dict:
+        return {
+            "modes": list(UOV_UPSCALE_MODES),
+            "backends": list(BACKENDS),
+            "onnx_model": self._sr.model_path if self._sr else self._find_model(),
+            "onnx_loaded": self._sr is not None,
+            "onnx_scale": self._sr.scale if self._sr else None
+        }
+
+    def close(self):
+        if self._sr is not None:
+            self._sr.close()
+            self._sr = None
+
+
+# Global instance
+fast_upscaler = FastUpscaler()
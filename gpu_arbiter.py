@@ -0,0 +1,289 @@
+"""
+GPU Arbitration between Training and Live Inference
+
+Training subprocesses and the in-process inference pipelines used to land
+on the same device (cuda:0) and fight over VRAM. The arbiter owns that
+decision:
+
+- `reserve_training(job_id)` places a training job, in order of
+  preference, on
+    exclusive: a device that hosts no inference pipeline
+    routed:    an inference device, while other inference devices keep
+               serving; new requests are routed away from it
+    shared:    the last inference device; inference concurrency on it
+               drops to `shared_slots` while the job runs
+    cpu:       no GPUs at all
+  One training job per device; with none left (or sharing disabled)
+  NoDeviceAvailable is raised. The lease's `env()` pins the subprocess
+  to its device via CUDA_VISIBLE_DEVICES.
+- `inference()` admits a request onto the least loaded device that still
+  takes inference, waiting while every slot is busy
+- with `pause_threshold` > 0, a training job sharing a device is paused
+  (via the bound `pause` hook) once that many requests are waiting, and
+  resumed after `resume_delay` seconds without anyone waiting
+
+Devices are plain ids, so the policy runs (and is tested) without torch.
+`on_assign` / `on_release` mirror occupancy into gpu_manager. The
+arbiter's slots are the only limit on concurrent inference.
+"""
+
+import asyncio
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+import logging
+
+from metrics import gpu_arbiter_decisions_total
+
+logger = logging.getLogger(__name__)
+
+EXCLUSIVE = "exclusive"
+ROUTED = "routed"
+SHARED = "shared"
+CPU = "cpu"
+
+
+class NoDeviceAvailable(RuntimeError):
+    pass
+
+
+@dataclass
+class TrainingLease:
+    job_id: str
+    device: Optional[int]
+    mode: str
+    granted: float = field(default_factory=time.time)
+    paused: bool = False
+
+    def env(self) -> Dict[str, str]:
+        """Environment overrides for the training subprocess"""
+        return {"CUDA_VISIBLE_DEVICES": "" if self.device is None else str(self.device)}
+
+    def to_dict(self) -> dict:
+        return {"job_id": self.job_id, "device": self.device, "mode": self.mode, "paused": self.paused}
+
+
+class GPUArbiter:
+    def __init__(
+        self,
+        devices: Sequence[int],
+        inference_devices: Sequence[int] = (0,),
+        inference_slots: int = 2,
+        shared_slots: int = 1,
+        allow_shared: bool = True,
+        min_inference_devices: int = 1,
+        pause_threshold: int = 0,
+        resume_delay: float = 5.0,
+        on_assign: Optional[Callable[[int], None]] = None,
+        on_release: Optional[Callable[[int], None]] = None
+    ):
+        self.devices = list(devices)
+        # Inference can only run where a pipeline lives
+        self.inference_devices = [d for d in inference_devices if d in self.devices]
+        self.inference_slots = max(1, inference_slots)
+        self.shared_slots = max(1, min(shared_slots, self.inference_slots))
+        self.allow_shared = allow_shared
+        self.min_inference_devices = max(1, min_inference_devices)
+        self.pause_threshold = pause_threshold
+        self.resume_delay = resume_delay
+        self.on_assign = on_assign
+        self.on_release = on_release
+        self.pause: Optional[Callable[[str], bool]] = None
+        self.resume: Optional[Callable[[str], bool]] = None
+
+        self.leases: Dict[str, TrainingLease] = {}
+        self._active: Counter = Counter()  # device -> running inference requests
+        self._waiting = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self._resume_task: Optional[asyncio.Task] = None
+        self.decisions: Counter = Counter()
+        self.requests: Counter = Counter()  # device -> inference requests served
+
+    def bind_training(self, pause: Callable[[str], bool], resume: Callable[[str], bool]):
+        """Hooks that stop / continue a training job (e.g. TrainingSupervisor.pause / resume)"""
+        self.pause, self.resume = pause, resume
+
+    @property
+    def _condition(self) -> asyncio.Condition:
+        # Created lazily so the instance can be built outside the event loop
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    # ---- policy ----
+
+    def _training_on(self, device: int) -> Optional[TrainingLease]:
+        for lease in self.leases.values():
+            if lease.device == device:
+                return lease
+        return None
+
+    def _routable(self) -> List[int]:
+        """Inference devices that still take new requests"""
+        return [d for d in self.inference_devices
+                if (lease := self._training_on(d)) is None or lease.mode != ROUTED]
+
+    def _slots(self, device: int) -> int:
+        lease = self._training_on(device)
+        return self.shared_slots if lease is not None and lease.mode == SHARED else self.inference_slots
+
+    def inference_capacity(self) -> int:
+        return sum(self._slots(d) for d in self._routable())
+
+    def _place(self) -> TrainingLease:
+        if not self.devices:
+            return TrainingLease("", None, CPU)
+        free = [d for d in self.devices if self._training_on(d) is None]
+        spare = [d for d in free if d not in self.inference_devices]
+        if spare:
+            return TrainingLease("", min(spare, key=lambda d: self._active[d]), EXCLUSIVE)
+        candidates = [d for d in free if d in self.inference_devices]
+        if not candidates:
+            raise NoDeviceAvailable("Every GPU is already running a training job")
+        routable = self._routable()
+        if len(routable) > self.min_inference_devices:
+            # Drain the least busy inference device
+            return TrainingLease("", min((d for d in candidates if d in routable), key=lambda d: self._active[d]), ROUTED)
+        if not self.allow_shared:
+            raise NoDeviceAvailable("Training would have to share the last inference GPU")
+        return TrainingLease("", min(candidates, key=lambda d: self._active[d]), SHARED)
+
+    def _decide(self, decision: str):
+        self.decisions[decision] += 1
+        gpu_arbiter_decisions_total.inc(decision)
+
+    # ---- training ----
+
+    async def reserve_training(self, job_id: str) -> TrainingLease:
+        """Pick a device for `job_id`; raises NoDeviceAvailable"""
+        async with self._condition:
+            try:
+                lease = self._place()
+            except NoDeviceAvailable:
+                self._decide("rejected")
+                raise
+            lease.job_id = job_id
+            self.leases[job_id] = lease
+            self._decide(lease.mode)
+            if lease.device is not None and self.on_assign is not None:
+                self.on_assign(lease.device)
+        logger.info(f"Training {job_id}: {lease.mode} on {'cpu' if lease.device is None else f'cuda:{lease.device}'}")
+        return lease
+
+    async def release_training(self, job_id: str):
+        """Give the job's device back to inference"""
+        cond = self._condition
+        async with cond:
+            lease = self.leases.pop(job_id, None)
+            if lease is None:
+                return
+            if lease.device is not None and self.on_release is not None:
+                self.on_release(lease.device)
+            cond.notify_all()
+
+    def _pause_shared(self):
+        if self.pause is None or not self.pause_threshold or self._waiting < self.pause_threshold:
+            return
+        for lease in self.leases.values():
+            if lease.mode == SHARED and not lease.paused and self.pause(lease.job_id):
+                lease.paused = True
+                self._decide("pause")
+                logger.info(f"Paused training {lease.job_id}: {self._waiting} inference requests waiting")
+
+    def _schedule_resume(self):
+        if not any(lease.paused for lease in self.leases.values()):
+            return
+        if self._resume_task is not None:
+            self._resume_task.cancel()
+        self._resume_task = asyncio.ensure_future(self._resume_when_quiet())
+
+    async def _resume_when_quiet(self):
+        await asyncio.sleep(self.resume_delay)
+        async with self._condition:
+            if self._waiting:
+                return
+            for lease in self.leases.values():
+                if lease.paused:
+                    lease.paused = False
+                    if self.resume is not None:
+                        self.resume(lease.job_id)
+                    self._decide("resume")
+                    logger.info(f"Resumed training {lease.job_id}")
+
+    # ---- inference ----
+
+    def _pick(self) -> Optional[int]:
+        open_devices = [d for d in self._routable() if self._active[d] < self._slots(d)]
+        if not open_devices:
+            return None
+        return min(open_devices, key=lambda d: (self._active[d] / self._slots(d), d))
+
+    @asynccontextmanager
+    async def inference(self):
+        """Hold an inference slot; yields the device id to run on"""
+        if not self.inference_devices:
+            # CPU-only node: nothing to arbitrate
+            yield None
+            return
+        cond = self._condition
+        async with cond:
+            self._waiting += 1
+            try:
+                if self._pick() is None:
+                    self._pause_shared()
+                    await cond.wait_for(lambda: self._pick() is not None)
+            finally:
+                self._waiting -= 1
+            device = self._pick()
+            self._active[device] += 1
+            self.requests[device] += 1
+            if self.on_assign is not None:
+                self.on_assign(device)
+        try:
+            yield device
+        finally:
+            async with cond:
+                self._active[device] -= 1
+                if self.on_release is not None:
+                    self.on_release(device)
+                if not self._waiting:
+                    self._schedule_resume()
+                cond.notify_all()
+
+    # ---- reporting ----
+
+    def occupancy(self) -> Dict[tuple, int]:
+        """(device, role) -> value, for a metrics gauge"""
+        values = {}
+        for d in self.devices:
+            lease = self._training_on(d)
+            serving = d in self._routable()
+            values[(str(d), "inference_active")] = self._active[d]
+            values[(str(d), "inference_slots")] = self._slots(d) if serving else 0
+            values[(str(d), "training")] = int(lease is not None)
+            values[(str(d), "training_paused")] = int(lease is not None and lease.paused)
+        return values
+
+    def stats(self) -> dict:
+        routable = self._routable()
+        return {
+            "devices": [
+                {
+                    "id": d,
+                    "inference": d in self.inference_devices,
+                    "serving": d in routable,
+                    "inference_active": self._active[d],
+                    "inference_slots": self._slots(d) if d in routable else 0,
+                    "inference_requests": self.requests[d],
+                    "training": lease.to_dict() if (lease := self._training_on(d)) else None
+                }
+                for d in self.devices
+            ],
+            "cpu_training": [lease.job_id for lease in self.leases.values() if lease.device is None],
+            "inference_capacity": self.inference_capacity(),
+            "waiting": self._waiting,
+            "pause_threshold": self.pause_threshold,
+            "decisions": dict(self.decisions)
+        }
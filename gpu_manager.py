@@ -47,6 +47,7 @@ class GPUManager:
         self.num_gpus = 0
         self.gpus: List[GPUInfo] = []
         self.gpu_jobs: Dict[int, int] = {}  # gpu_id -> active job count
+        self.device_props: Dict[int, object] = {}  # gpu_id -> cached device properties
         self.lock = threading.Lock()
         self._detect_gpus()
     
@@ -62,6 +63,7 @@ class GPUManager:
         for i in range(self.num_gpus):
             self.gpu_jobs[i] = 0
             props = torch.cuda.get_device_properties(i)
+            self.device_props[i] = props
             logger.info(f"GPU {i}: {props.name} ({props.total_memory / 1024**3:.2f} GB)")
     
     def get_gpu_info(self, gpu_id: int) -> GPUInfo:
@@ -69,7 +71,7 @@ class GPUManager:
         if gpu_id >= self.num_gpus:
             raise ValueError(f"GPU {gpu_id} not available")
         
-        props = torch.cuda.get_device_properties(gpu_id)
+        props = self.device_props.get(gpu_id) or torch.cuda.get_device_properties(gpu_id)
         total_vram = props.total_memory / 1024**3
         
         # Get memory stats
@@ -132,6 +134,20 @@ class GPUManager:
                 self.gpu_jobs[gpu_id] -= 1
                 logger.debug(f"Job released from GPU {gpu_id} (remaining: {self.gpu_jobs[gpu_id]})")
     
+    def get_memory_stats(self) -> Dict[int, dict]:
+        """
+        Per-device memory in bytes, using cached device properties.
+        Cheap enough to call on every metrics scrape.
+        """
+        stats = {}
+        for i in range(self.num_gpus):
+            stats[i] = {
+                "total": self.device_props[i].total_memory,
+                "allocated": torch.cuda.memory_allocated(i),
+                "reserved": torch.cuda.memory_reserved(i)
+            }
+        return stats
+    
     def get_status(self) -> dict:
         """Get overall GPU status"""
         if self.num_gpus == 0:
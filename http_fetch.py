@@ -0,0 +1,179 @@
+"""
+Async Image Fetcher
+
+Non-blocking fetching of URL image inputs for the async endpoints:
+
+- one shared httpx connection pool for the whole process
+- per-host concurrency limits so one slow host cannot take every connection
+  (a host's semaphore is dropped once no fetch uses it, so arbitrary
+  user-supplied URLs do not grow the table)
+- streaming download with a hard size cap (checked before and while reading)
+- content-type sniffing on the first bytes, so HTML error pages (e.g. ngrok
+  interstitials) are rejected without trying to decode them
+- conditional requests using the ETag / Last-Modified validators remembered
+  in the decoded image cache
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+import logging
+
+from image_cache import DecodedImageCache, URLValidators, content_key, image_cache
+
+logger = logging.getLogger(__name__)
+
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+    logger.warning("httpx not installed - async URL fetching unavailable")
+
+# Magic numbers for image formats PIL can decode
+_IMAGE_SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+)
+
+
+class FetchError(ValueError):
+    """Raised when a URL cannot be fetched as an image"""
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Detect the image MIME type from the first bytes of a body"""
+    if len(head) >= 12 and head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, mime in _IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    return None
+
+
+@dataclass
+class FetchResult:
+    """Outcome of a fetch: either a new body or a still-valid cached one"""
+    content_key: str
+    body: Optional[bytes] = None  # None when the server answered 304
+    content_type: Optional[str] = None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.body is None
+
+
+class AsyncImageFetcher:
+    """Shared async HTTP client for image URLs"""
+
+    def __init__(
+        self,
+        max_bytes: int = 25 * 1024**2,
+        timeout: float = 10.0,
+        max_connections: int = 32,
+        per_host_limit: int = 4,
+        cache: DecodedImageCache = image_cache
+    ):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.cache = cache
+        self._client = None
+        self._host_limits: Dict[str, List] = {}  # host -> [semaphore, fetches using it]
+
+    def _get_client(self):
+        if not HTTPX_AVAILABLE:
+            raise FetchError("httpx is required for URL inputs")
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections
+                ),
+                follow_redirects=True,
+                headers={"Accept": "image/*"}
+            )
+        return self._client
+
+    @asynccontextmanager
+    async def _host_slot(self, url: str):
+        host = urlsplit(url).netloc
+        entry = self._host_limits.get(host)
+        if entry is None:
+            entry = self._host_limits[host] = [asyncio.Semaphore(self.per_host_limit), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._host_limits[host]
+
+    async def fetch(self, url: str) -> FetchResult:
+        """Download `url`, or confirm the cached copy is still valid"""
+        client = self._get_client()
+        validators = self.cache.get_url(url) if self.cache is not None else None
+        headers = validators.request_headers() if validators else {}
+
+        async with self._host_slot(url):
+            try:
+                async with client.stream("GET", url, headers=headers) as response:
+                    if response.status_code == 304 and validators is not None:
+                        return FetchResult(validators.content_key)
+                    if response.status_code >= 400:
+                        raise FetchError(f"HTTP {response.status_code} fetching {url}")
+
+                    declared = response.headers.get("Content-Length")
+                    if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                        raise FetchError(f"Image too large ({declared} bytes > {self.max_bytes})")
+
+                    body = await self._read_capped(response)
+            except httpx.HTTPError as e:
+                raise FetchError(f"Could not fetch {url}: {e}") from e
+
+        sniffed = sniff_image_type(body[:16])
+        if sniffed is None:
+            declared_type = response.headers.get("Content-Type", "unknown")
+            raise FetchError(f"URL did not return an image (Content-Type: {declared_type})")
+
+        key = content_key(body)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if self.cache is not None and (etag or last_modified):
+            self.cache.put_url(url, URLValidators(key, etag, last_modified))
+        return FetchResult(key, body, sniffed)
+
+    async def _read_capped(self, response) -> bytes:
+        chunks = []
+        total = 0
+        async for chunk in response.aiter_bytes():
+            total += len(chunk)
+            if total > self.max_bytes:
+                raise FetchError(f"Image exceeds {self.max_bytes} bytes")
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def forget(self, url: str):
+        """Drop remembered validators, forcing the next fetch to download"""
+        if self.cache is not None:
+            self.cache.forget_url(url)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+# Global fetcher instance
+image_fetcher = AsyncImageFetcher()
@@ -0,0 +1,86 @@
+"""
+Image Buffer Helpers
+
+Moves frames between PIL, NumPy and OpenCV with as few full-frame copies
+as possible:
+
+- PIL -> BGR uses PIL's raw packer to emit BGR bytes directly, so the
+  channel swap happens inside the one unavoidable export copy
+- BGR -> PIL unpacks BGR during the import copy instead of running
+  ``cv2.cvtColor`` first
+- single-channel maps (edges, masks) are wrapped without copying and
+  expanded to RGB in one step
+- in-place channel swaps and channel-order views for arrays that are
+  already writable
+
+Arrays produced from PIL are read-only views over the exported bytes.
+OpenCV and InsightFace only read their inputs, so this is normally fine;
+pass ``writable=True`` when the caller needs to modify the array.
+"""
+
+import numpy as np
+from PIL import Image
+
+try:
+    import cv2
+    CV2_AVAILABLE = True
+except ImportError:
+    cv2 = None
+    CV2_AVAILABLE = False
+
+
+def _ensure_rgb(image: Image.Image) -> Image.Image:
+    return image if image.mode == "RGB" else image.convert("RGB")
+
+
+def rgb_array(image: Image.Image, writable: bool = False) -> np.ndarray:
+    """HxWx3 RGB array of `image` (read-only unless `writable`)"""
+    image = _ensure_rgb(image)
+    array = np.asarray(image)
+    if writable and not array.flags.writeable:
+        array = array.copy()
+    return array
+
+
+def bgr_array(image: Image.Image, writable: bool = False) -> np.ndarray:
+    """HxWx3 BGR array of `image` for OpenCV / InsightFace, in a single copy"""
+    image = _ensure_rgb(image)
+    width, height = image.size
+    if writable:
+        # One writable copy, then swap channels inside it
+        return swap_rb_inplace(np.array(image))
+    data = image.tobytes("raw", "BGR")
+    return np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+
+
+def image_from_bgr(array: np.ndarray) -> Image.Image:
+    """PIL RGB image from a BGR array; the swap happens while PIL copies"""
+    array = np.ascontiguousarray(array, dtype=np.uint8)
+    height, width = array.shape[:2]
+    return Image.frombuffer("RGB", (width, height), array, "raw", "BGR", 0, 1)
+
+
+def image_from_gray(array: np.ndarray, mode: str = "RGB") -> Image.Image:
+    """
+    PIL image from a single-channel uint8 map (e.g. Canny edges).
+
+    The ``L`` image shares memory with `array`; converting to `mode` is the
+    only full-frame allocation.
+    """
+    array = np.ascontiguousarray(array, dtype=np.uint8)
+    height, width = array.shape[:2]
+    gray = Image.frombuffer("L", (width, height), array, "raw", "L", 0, 1)
+    return gray if mode == "L" else gray.convert(mode)
+
+
+def swap_rb_inplace(array: np.ndarray) -> np.ndarray:
+    """Swap the R and B channels of a writable HxWx3 array in place"""
+    if CV2_AVAILABLE and array.flags.c_contiguous:
+        return cv2.cvtColor(array, cv2.COLOR_RGB2BGR, dst=array)
+    array[..., [0, 2]] = array[..., [2, 0]]
+    return array
+
+
+def channel_view(array: np.ndarray) -> np.ndarray:
+    """Reversed channel-order view (RGB <-> BGR) without copying"""
+    return array[..., ::-1]
@@ -0,0 +1,151 @@
+"""
+Decoded Image Cache
+
+Bounded LRU of decoded PIL images keyed by a content hash, so repeated
+edits on the same source image (img2img, controlnet, faceswap, upscale)
+skip base64 and PIL decoding entirely. URL inputs additionally remember
+their HTTP validators (ETag / Last-Modified) for conditional re-fetches.
+
+Cached images are shared between requests and must be treated as
+read-only by callers.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, Optional
+import logging
+
+from metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(data) -> str:
+    """Stable content hash for bytes or str payloads"""
+    if isinstance(data, str):
+        data = data.encode("utf-8", "surrogatepass")
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def image_nbytes(image) -> int:
+    """Approximate in-memory size of a decoded PIL image"""
+    try:
+        return int(image.width) * int(image.height) * len(image.getbands())
+    except Exception:
+        return 0
+
+
+@dataclass
+class URLValidators:
+    """HTTP validators remembered for a fetched URL"""
+    content_key: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def request_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class DecodedImageCache:
+    """LRU cache of decoded images with a memory budget"""
+
+    def __init__(
+        self,
+        max_bytes: int = 512 * 1024**2,
+        max_entries: int = 128,
+        max_urls: int = 1024,
+        name: str = "decoded_images"
+    ):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_urls = max_urls
+        self.name = name
+        self._images: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (image, nbytes)
+        self._urls: "OrderedDict[str, URLValidators]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def get(self, key: Hashable):
+        """Return the cached image for `key` (and mark it recently used), or None"""
+        with self._lock:
+            entry = self._images.get(key)
+            if entry is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        record_cache_lookup(self.name, entry is not None)
+        return entry[0] if entry is not None else None
+
+    def put(self, key: Hashable, image) -> None:
+        """Insert an image, evicting least recently used entries over budget"""
+        nbytes = image_nbytes(image)
+        if nbytes > self.max_bytes:
+            return  # Larger than the whole budget: never cache
+        with self._lock:
+            old = self._images.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._images[key] = (image, nbytes)
+            self.current_bytes += nbytes
+            while self._images and (
+                self.current_bytes > self.max_bytes or len(self._images) > self.max_entries
+            ):
+                _, (_, evicted_bytes) = self._images.popitem(last=False)
+                self.current_bytes -= evicted_bytes
+                self.evictions += 1
+
+    def get_url(self, url: str) -> Optional[URLValidators]:
+        """Validators from the last successful fetch of `url`"""
+        with self._lock:
+            validators = self._urls.get(url)
+            if validators is not None:
+                self._urls.move_to_end(url)
+            return validators
+
+    def put_url(self, url: str, validators: URLValidators) -> None:
+        with self._lock:
+            self._urls[url] = validators
+            self._urls.move_to_end(url)
+            while len(self._urls) > self.max_urls:
+                self._urls.popitem(last=False)
+
+    def forget_url(self, url: str) -> None:
+        with self._lock:
+            self._urls.pop(url, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._images.clear()
+            self._urls.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._images),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "urls": len(self._urls),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0
+        }
+
+
+# Global decoded image cache instance
+image_cache = DecodedImageCache()
@@ -0,0 +1,71 @@
+"""
+Resolution-aware Image Decoding
+
+Decodes images to RGB while honouring a size hint from the consumer, so
+large inputs are never fully materialised when the model only needs a
+fraction of the pixels (BLIP works at ~384px, face detection at 640px):
+
+- JPEG uses libjpeg DCT scaling via ``Image.draft`` (1/2, 1/4, 1/8), which
+  skips most of the decode work instead of downscaling afterwards
+- other formats decode fully, then ``Image.reduce`` does a fast integer
+  box reduction
+- images already in RGB are returned as-is instead of via ``.convert()``,
+  which would copy the whole frame
+
+The result is never smaller than the hint in either dimension, so the
+consumer's own resize still sees at least as many pixels as it needs.
+"""
+
+from typing import Optional, Tuple, Union
+
+from PIL import Image
+
+SizeHint = Optional[Union[int, Tuple[int, int]]]
+
+# Modes Image.reduce handles directly; others are converted to RGB first
+_REDUCIBLE_MODES = ("RGB", "RGBA", "L", "LA")
+
+
+def normalize_size_hint(target_size: SizeHint) -> Optional[Tuple[int, int]]:
+    """Accept a single edge length or a (width, height) pair"""
+    if not target_size:
+        return None
+    if isinstance(target_size, int):
+        return (target_size, target_size)
+    return (int(target_size[0]), int(target_size[1]))
+
+
+def reduction_factor(size: Tuple[int, int], target: Tuple[int, int]) -> int:
+    """Largest integer factor that keeps both dimensions >= target"""
+    return max(1, min(size[0] // target[0], size[1] // target[1]))
+
+
+def open_rgb(source, target_size: SizeHint = None) -> Image.Image:
+    """
+    Open `source` (path or file object) as an RGB image.
+
+    Args:
+        source: Anything accepted by ``Image.open``.
+        target_size: Optional minimum (width, height) or edge length the
+            consumer needs. Decoding may return a smaller image than the
+            original, but never smaller than this.
+    """
+    image = Image.open(source)
+    target = normalize_size_hint(target_size)
+
+    if target is not None and image.format == "JPEG":
+        # Decoder-level downscale: libjpeg only produces the scaled output
+        image.draft("RGB", target)
+
+    image.load()
+
+    if target is not None:
+        factor = reduction_factor(image.size, target)
+        if factor > 1:
+            if image.mode not in _REDUCIBLE_MODES:
+                image = image.convert("RGB")
+            image = image.reduce(factor)
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image
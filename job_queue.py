@@ -13,6 +13,8 @@ from datetime import datetime
 from enum import Enum
 import logging
 
+from metrics import queue_wait_duration
+
 logger = logging.getLogger(__name__)
 
 
@@ -106,6 +108,9 @@ class JobQueue:
                 job.gpu_id = gpu_id
                 job.started_at = datetime.now()
                 self.running_jobs[job_id] = job
+                queue_wait_duration.observe(
+                    (job.started_at - job.created_at).total_seconds(), job.type
+                )
                 logger.info(f"Job {job_id} started on GPU {gpu_id}")
     
     async def complete_job(self, job_id: str, result: Any = None):
@@ -162,6 +167,13 @@ class JobQueue:
                 "max_concurrent": self.max_concurrent_jobs
             }
     
+    def get_depth(self) -> dict:
+        """Lock-free snapshot of queued/running counts for metrics scrapes"""
+        return {
+            "queued": self.queue.qsize(),
+            "running": len(self.running_jobs)
+        }
+    
     def can_accept_job(self) -> bool:
         """Check if queue can accept more running jobs"""
         return len(self.running_jobs) < self.max_concurrent_jobs
@@ -0,0 +1,417 @@
+"""
+Latent Cache for LoRA Training
+
+A LoRA run VAE-encodes every dataset image and text-encodes every caption
+again on each epoch and each run, although neither changes. `prepare()`
+does that work once per dataset and encoder version:
+
+- every image goes to the aspect-ratio bucket closest to its own ratio
+  (bucket_sampler.training_buckets), is resized to cover it and
+  center-cropped
+- latents are stored per bucket as one .npy array ([N, C, h/8, w/8],
+  float16) that training opens with mmap_mode="r": a batch reads only its
+  own rows and repeated runs are served from the page cache
+- text embeddings are stored once per distinct caption (the sidecar .txt
+  written by dataset captioning, else the instance prompt)
+- index.json maps each image's content hash to its bucket row, original
+  size and crop offset (SDXL's size conditioning)
+
+A cache directory belongs to one encoder version and resolution, so
+switching the VAE or the training resolution starts a new one instead of
+mixing latents. Re-runs hash only files whose size or mtime changed and
+encode only images and captions the index doesn't know; buckets without
+changes keep their file. Array files are written under a new generation
+name and the index is replaced last, so an interrupted run leaves the
+previous cache intact.
+"""
+
+import hashlib
+import json
+import os
+import re
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import logging
+
+import numpy as np
+from PIL import Image
+
+from bucket_sampler import (
+    BucketSampler, bucket_key, nearest_bucket, parse_bucket, read_caption, resize_to_bucket,
+    time_ids, to_pixels, training_buckets
+)
+from dataset_captioning import list_dataset_images
+from image_decode import open_rgb
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join("cache", "latents")
+INDEX_FILE = "index.json"
+FORMAT_VERSION = 2
+
+
+def file_hash(path: str) -> str:
+    hasher = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+@dataclass
+class Encoders:
+    """
+    The models the cache stands in for. `version` must change whenever the
+    outputs would (model id, VAE, precision); it names the cache directory.
+    """
+    version: str
+    # [B, 3, H, W] float32 in [-1, 1] -> scaled latents [B, C, H/8, W/8]
+    encode_images: Callable[[np.ndarray], np.ndarray]
+    # captions -> (prompt embeddings [B, T, D], pooled embeddings [B, P] or None)
+    encode_text: Callable[[List[str]], Tuple[np.ndarray, Optional[np.ndarray]]]
+
+
+@dataclass
+class PrepStats:
+    total: int = 0
+    reused: int = 0        # Already in the cache
+    encoded: int = 0       # VAE-encoded in this run
+    failed: int = 0
+    texts_encoded: int = 0
+    buckets_written: int = 0
+    elapsed: float = 0.0
+    encode_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "reused": self.reused,
+            "encoded": self.encoded,
+            "failed": self.failed,
+            "texts_encoded": self.texts_encoded,
+            "buckets_written": self.buckets_written,
+            "elapsed": round(self.elapsed, 3),
+            "images_per_second": round(self.encoded / self.elapsed, 2) if self.elapsed > 0 and self.encoded else 0.0
+        }
+
+
+class LatentCache:
+    def __init__(self, root: str):
+        """`root` holds one dataset's caches, e.g. cache/latents/<project>"""
+        self.root = root
+
+    def directory(self, version: str, resolution: int) -> str:
+        safe = re.sub(r"[^A-Za-z0-9._-]+", "--", version).strip("-")
+        return os.path.join(self.root, f"{safe}-r{resolution}")
+
+    def _load_index(self, directory: str, version: str, resolution: int) -> dict:
+        path = os.path.join(directory, INDEX_FILE)
+        empty = {"format": FORMAT_VERSION, "version": version, "resolution": resolution,
+                 "generation": 0, "files": {}, "images": {}, "buckets": {}, "texts": [], "text_file": None,
+                 "pooled_file": None}
+        if not os.path.exists(path):
+            return empty
+        try:
+            with open(path, encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Latent cache index {path} unreadable ({e}); rebuilding")
+            return empty
+        if index.get("format") != FORMAT_VERSION or index.get("version") != version:
+            return empty
+        return index
+
+    def prepare(
+        self,
+        dataset_dir: str,
+        encoders: Encoders,
+        instance_prompt: str,
+        resolution: int = 1024,
+        batch_size: int = 4,
+        decode_workers: int = 4,
+        progress: Optional[Callable[[PrepStats], None]] = None
+    ) -> PrepStats:
+        """Bring the cache for `dataset_dir` up to date; returns what it did"""
+        start = time.perf_counter()
+        directory = self.directory(encoders.version, resolution)
+        os.makedirs(directory, exist_ok=True)
+        index = self._load_index(directory, encoders.version, resolution)
+        buckets = list(training_buckets(resolution).values())
+        generation = index["generation"] + 1
+
+        images = list_dataset_images(dataset_dir)
+        stats = PrepStats(total=len(images))
+
+        # 1. Identify: content hash, reusing the recorded one while size and mtime match
+        files: Dict[str, dict] = {}
+        entries: Dict[str, Tuple[str, str]] = {}  # hash -> (path, caption); duplicates collapse
+        for path in images:
+            name = os.path.basename(path)
+            st = os.stat(path)
+            known = index["files"].get(name)
+            if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+                digest = known["hash"]
+            else:
+                digest = file_hash(path)
+            files[name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": digest}
+            entries.setdefault(digest, (path, read_caption(path, instance_prompt)))
+
+        # 2. Plan: known hashes keep their row, new ones are assigned a bucket
+        old_images = index["images"]
+        records: Dict[str, dict] = {}
+        todo: Dict[str, List[str]] = defaultdict(list)
+        for digest, (path, caption) in entries.items():
+            if digest in old_images:
+                records[digest] = dict(old_images[digest], caption=caption)
+                stats.reused += 1
+                continue
+            try:
+                with Image.open(path) as probe:
+                    size = probe.size
+            except Exception as e:
+                logger.warning(f"Skipping {path}: {e}")
+                stats.failed += 1
+                continue
+            bucket = nearest_bucket(size, buckets)
+            records[digest] = {"bucket": bucket_key(bucket), "size": list(size), "caption": caption}
+            todo[bucket_key(bucket)].append(digest)
+
+        # 3. Text embeddings, one row per distinct caption
+        text_file, pooled_file, texts = self._update_texts(directory, index, records, encoders, generation, stats)
+        for record in records.values():
+            record["text"] = texts.index(record["caption"])
+
+        # 4. Latents, one array per bucket; untouched buckets keep their file
+        bucket_files = {}
+        executor = ThreadPoolExecutor(max_workers=max(1, decode_workers), thread_name_prefix="latent-decode")
+        try:
+            for key in sorted({r["bucket"] for r in records.values()}):
+                old = index["buckets"].get(key)
+                kept = sorted((d for d, r in records.items() if r["bucket"] == key and d in old_images),
+                              key=lambda d: old_images[d]["row"])
+                removed = old is not None and len(kept) != sum(1 for r in old_images.values() if r["bucket"] == key)
+                if old is not None and not todo.get(key) and not removed:
+                    bucket_files[key] = old
+                    continue
+                bucket_files[key] = self._write_bucket(
+                    directory, key, generation, old, kept, todo.get(key, []), records, entries,
+                    encoders, batch_size, executor, stats, progress, start
+                )
+                stats.buckets_written += 1
+        finally:
+            executor.shutdown(wait=True)
+
+        failed = [d for d, r in records.items() if "row" not in r]
+        for digest in failed:
+            del records[digest]
+
+        # 5. Commit: the new index names the new files; older generations go
+        index.update({
+            "generation": generation, "files": files, "images": records, "buckets": bucket_files,
+            "texts": texts, "text_file": text_file, "pooled_file": pooled_file
+        })
+        tmp = os.path.join(directory, f"{INDEX_FILE}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp, os.path.join(directory, INDEX_FILE))
+        live = {b["file"] for b in bucket_files.values()} | {text_file, pooled_file}
+        for name in os.listdir(directory):
+            if name.endswith(".npy") and name not in live:
+                os.remove(os.path.join(directory, name))
+
+        stats.elapsed = time.perf_counter() - start
+        if progress is not None:
+            progress(stats)
+        return stats
+
+    def _update_texts(self, directory, index, records, encoders, generation, stats):
+        texts = sorted({r["caption"] for r in records.values()})
+        if not texts:
+            return None, None, texts
+        if texts == index["texts"] and index["text_file"]:
+            return index["text_file"], index["pooled_file"], texts
+
+        old_rows = {caption: i for i, caption in enumerate(index["texts"])}
+        missing = [t for t in texts if t not in old_rows]
+        new_embeds, new_pooled = encoders.encode_text(missing) if missing else (None, None)
+        stats.texts_encoded += len(missing)
+        old_embeds = old_pooled = None
+        if index["text_file"]:
+            old_embeds = np.load(os.path.join(directory, index["text_file"]))
+            if index["pooled_file"]:
+                old_pooled = np.load(os.path.join(directory, index["pooled_file"]))
+
+        def row(old, new, caption):
+            if caption in old_rows:
+                return old[old_rows[caption]]
+            return new[missing.index(caption)]
+
+        text_file = f"text.g{generation}.npy"
+        np.save(os.path.join(directory, text_file),
+                np.stack([row(old_embeds, new_embeds, t) for t in texts]).astype(np.float16))
+        pooled_file = None
+        if (new_pooled if missing else old_pooled) is not None:
+            pooled_file = f"pooled.g{generation}.npy"
+            np.save(os.path.join(directory, pooled_file),
+                    np.stack([row(old_pooled, new_pooled, t) for t in texts]).astype(np.float16))
+        return text_file, pooled_file, texts
+
+    def _write_bucket(self, directory, key, generation, old, kept, added, records, entries,
+                      encoders, batch_size, executor, stats, progress, start) -> dict:
+        bucket = parse_bucket(key)
+        name = f"latents_{key}.g{generation}.npy"
+        path = os.path.join(directory, name)
+        source = np.load(os.path.join(directory, old["file"]), mmap_mode="r") if old else None
+        rows = len(kept) + len(added)
+        target = None
+
+        def allocate(shape):
+            # Rows of images that fail to decode stay unused at the end
+            return np.lib.format.open_memmap(path, mode="w+", dtype=np.float16, shape=(rows, *shape))
+
+        if source is not None:
+            target = allocate(source.shape[1:])
+            for row, digest in enumerate(kept):
+                target[row] = source[records[digest]["row"]]
+                records[digest]["row"] = row
+
+        def load(digest):
+            try:
+                image = open_rgb(entries[digest][0], bucket)
+                image, crop = resize_to_bucket(image, bucket)
+                return digest, to_pixels(image), crop
+            except Exception as e:
+                logger.warning(f"Skipping {entries[digest][0]}: {e}")
+                return digest, None, None
+
+        row = len(kept)
+        for first in range(0, len(added), max(1, batch_size)):
+            loaded = list(executor.map(load, added[first:first + batch_size]))
+            ok = [item for item in loaded if item[1] is not None]
+            stats.failed += len(loaded) - len(ok)
+            if not ok:
+                continue
+            encode_start = time.perf_counter()
+            latents = encoders.encode_images(np.stack([item[1] for item in ok]))
+            stats.encode_seconds += time.perf_counter() - encode_start
+            if target is None:
+                target = allocate(latents.shape[1:])
+            target[row:row + len(ok)] = latents
+            for (digest, _, crop), offset in zip(ok, range(len(ok))):
+                records[digest]["row"] = row + offset
+                records[digest]["crop"] = list(crop)
+            row += len(ok)
+            stats.encoded += len(ok)
+            if progress is not None:
+                stats.elapsed = time.perf_counter() - start
+                progress(stats)
+
+        if target is None:
+            # Every new image failed and nothing was kept
+            target = allocate((0,))
+        target.flush()
+        del target, source
+        return {"file": name, "rows": row}
+
+    def open(self, version: str, resolution: int) -> "LatentDataset":
+        return LatentDataset(self.directory(version, resolution))
+
+
+class LatentDataset:
+    """
+    Read side of a prepared cache: bucket-homogeneous training batches
+    straight from the memory-mapped arrays, no image decoding or encoders
+    """
+
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, INDEX_FILE), encoding="utf-8") as f:
+            index = json.load(f)
+        self.directory = directory
+        self.version = index["version"]
+        self.resolution = index["resolution"]
+        self._latents = {
+            key: np.load(os.path.join(directory, info["file"]), mmap_mode="r")
+            for key, info in index["buckets"].items() if info["rows"]
+        }
+        self._text = (np.load(os.path.join(directory, index["text_file"]), mmap_mode="r")
+                      if index["text_file"] else None)
+        self._pooled = (np.load(os.path.join(directory, index["pooled_file"]), mmap_mode="r")
+                        if index["pooled_file"] else None)
+        # (bucket, latent row, text row, time ids) per image
+        self.items: List[Tuple[str, int, int, List[int]]] = [
+            (record["bucket"], record["row"], record["text"],
+             time_ids(record["size"], record["crop"], parse_bucket(record["bucket"])))
+            for record in index["images"].values()
+        ]
+        self.buckets: Dict[str, int] = dict(Counter(item[0] for item in self.items))
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def batches(self, batch_size: int = 1, shuffle: bool = True, seed: Optional[int] = None,
+                drop_last: bool = False) -> Iterator[dict]:
+        """One epoch; every batch comes from a single bucket so latents stack"""
+        sampler = BucketSampler([item[0] for item in self.items], batch_size, shuffle, drop_last, seed)
+        for indices in sampler:
+            items = [self.items[i] for i in indices]
+            key = items[0][0]
+            latent_rows = [item[1] for item in items]
+            text_rows = [item[2] for item in items]
+            batch = {
+                "bucket": key,
+                "latents": self._latents[key][latent_rows],
+                "prompt_embeds": self._text[text_rows],
+                "time_ids": np.array([item[3] for item in items], dtype=np.float32)
+            }
+            if self._pooled is not None:
+                batch["pooled_prompt_embeds"] = self._pooled[text_rows]
+            yield batch
+
+
+def sdxl_encoders(model_id: str, device: Optional[str] = None, vae_id: Optional[str] = None) -> Encoders:
+    """
+    Encoders for an SDXL checkpoint (diffusers layout). Latents are the
+    posterior mean times the VAE scaling factor; prompt embeddings are
+    the penultimate hidden states of both text encoders, concatenated,
+    plus the second encoder's pooled projection.
+    """
+    import torch
+    from diffusers import AutoencoderKL
+    from transformers import CLIPTextModel, CLIPTextModelWithProjection, CLIPTokenizer
+
+    device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+    dtype = torch.float16 if device == "cuda" else torch.float32
+    if vae_id:
+        vae = AutoencoderKL.from_pretrained(vae_id, torch_dtype=dtype)
+    else:
+        # The stock SDXL VAE overflows in fp16
+        vae = AutoencoderKL.from_pretrained(model_id, subfolder="vae", torch_dtype=torch.float32)
+    vae.to(device).eval()
+    tokenizers = [CLIPTokenizer.from_pretrained(model_id, subfolder=f) for f in ("tokenizer", "tokenizer_2")]
+    text_encoders = [
+        CLIPTextModel.from_pretrained(model_id, subfolder="text_encoder", torch_dtype=dtype).to(device).eval(),
+        CLIPTextModelWithProjection.from_pretrained(model_id, subfolder="text_encoder_2", torch_dtype=dtype).to(device).eval()
+    ]
+
+    @torch.no_grad()
+    def encode_images(pixels: np.ndarray) -> np.ndarray:
+        x = torch.from_numpy(pixels).to(device, vae.dtype)
+        latents = vae.encode(x).latent_dist.mean * vae.config.scaling_factor
+        return latents.float().cpu().numpy()
+
+    @torch.no_grad()
+    def encode_text(captions: List[str]) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        hidden, pooled = [], None
+        for tokenizer, encoder in zip(tokenizers, text_encoders):
+            ids = tokenizer(captions, padding="max_length", max_length=tokenizer.model_max_length,
+                            truncation=True, return_tensors="pt").input_ids.to(device)
+            output = encoder(ids, output_hidden_states=True)
+            hidden.append(output.hidden_states[-2])
+            pooled = output[0]
+        return torch.cat(hidden, dim=-1).float().cpu().numpy(), pooled.float().cpu().numpy()
+
+    version = f"{model_id}+{vae_id}" if vae_id else model_id
+    return Encoders(version=version, encode_images=encode_images, encode_text=encode_text)
@@ -0,0 +1,411 @@
+"""
+Continuous-Batching LLM Server
+
+Serves concurrent generation requests for one causal LM (Phi-3 Mini for
+/enhance-prompt) from a single decode loop in a worker thread:
+
+- the KV cache of a shared prompt prefix (the enhancer's system prompt and
+  chat template) is computed once; each request only prefills the tokens
+  after its longest common prefix with it
+- new requests join the running decode batch at token boundaries, and
+  finished ones leave it, so a long generation never holds up short ones
+- sequences of different lengths share the batch through left padding of
+  the KV cache plus an attention mask; each request samples with its own
+  generator, so a seed reproduces its output whatever else is batched
+
+Tokens go to an AsyncTextStreamer per request, which also decides early
+stops (end of the enhanced prompt, client cancel). Works with the float32
+CPU model as well as fp16 on CUDA; it only needs `model(input_ids,
+attention_mask, position_ids, past_key_values, use_cache=True)`.
+"""
+
+import asyncio
+import collections
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional, Sequence, Tuple
+import logging
+
+import torch
+
+from llm_stream import AsyncTextStreamer
+from metrics import batch_size_histogram, queue_wait_duration
+
+try:
+    from transformers import DynamicCache, PreTrainedModel
+except ImportError:
+    DynamicCache = None
+    PreTrainedModel = None
+
+logger = logging.getLogger(__name__)
+
+# Per layer (key, value), each [batch, heads, tokens, head_dim]
+KVCache = Tuple[Tuple[torch.Tensor, torch.Tensor], ...]
+
+
+@dataclass
+class Generation:
+    token_ids: List[int]
+    prompt_tokens: int
+    prefix_tokens: int     # Prompt tokens served from the shared prefix cache
+    queue_seconds: float
+    seconds: float         # Admission to last token
+
+
+@dataclass
+class _Sequence:
+    prompt_ids: List[int]
+    max_new_tokens: int
+    do_sample: bool
+    temperature: float
+    top_p: float
+    generator: Optional[torch.Generator]
+    streamer: Optional[AsyncTextStreamer]
+    future: Future
+    submitted: float = field(default_factory=time.perf_counter)
+    started: float = 0.0
+    prefix_tokens: int = 0
+    generated: List[int] = field(default_factory=list)
+
+
+def common_prefix_length(a: Sequence[int], b: Sequence[int]) -> int:
+    n = min(len(a), len(b))
+    for i in range(n):
+        if a[i] != b[i]:
+            return i
+    return n
+
+
+def _slice_kv(kv: KVCache, rows=None, start: int = 0, end: Optional[int] = None) -> KVCache:
+    out = []
+    for k, v in kv:
+        if rows is not None:
+            k, v = k[rows], v[rows]
+        out.append((k[:, :, start:end], v[:, :, start:end]))
+    return tuple(out)
+
+
+def _pad_kv(kv: KVCache, pad: int) -> KVCache:
+    if pad <= 0:
+        return kv
+    return tuple(
+        (torch.cat([k.new_zeros(*k.shape[:2], pad, k.shape[3]), k], dim=2),
+         torch.cat([v.new_zeros(*v.shape[:2], pad, v.shape[3]), v], dim=2))
+        for k, v in kv
+    )
+
+
+class LLMServer:
+    def __init__(
+        self,
+        model,
+        eos_token_ids: Iterable[int] = (),
+        max_batch: int = 8,
+        name: str = "llm"
+    ):
+        self.model = model
+        self.eos_token_ids = set(eos_token_ids)
+        self.max_batch = max_batch
+        self.name = name
+        self._device = getattr(model, "device", torch.device("cpu"))
+        self._wrap_cache = (
+            DynamicCache is not None and hasattr(DynamicCache, "from_legacy_cache")
+            and isinstance(model, PreTrainedModel)
+        )
+        self._prefix_ids: List[int] = []
+        self._prefix_kv: Optional[KVCache] = None
+        self._waiting: "collections.deque[_Sequence]" = collections.deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        # Decode batch: one row per active sequence, left padded
+        self._active: List[_Sequence] = []
+        self._kv: Optional[KVCache] = None
+        self._mask: Optional[torch.Tensor] = None
+        self._next: List[int] = []
+        # Stats
+        self.requests = 0
+        self.completed = 0
+        self.generated_tokens = 0
+        self.decode_steps = 0
+        self.batched_rows = 0
+        self.prefill_tokens = 0
+        self.prefix_tokens_reused = 0
+        self.busy_seconds = 0.0
+        self._latencies: "collections.deque[float]" = collections.deque(maxlen=1000)
+
+    # ---- public API ----
+
+    def set_prefix(self, prefix_ids: Sequence[int]):
+        """Token ids most prompts start with; their KV cache is built on first use"""
+        with self._cond:
+            self._prefix_ids = list(prefix_ids)
+            self._prefix_kv = None
+
+    async def generate(
+        self,
+        prompt_ids: Sequence[int],
+        max_new_tokens: int = 200,
+        do_sample: bool = False,
+        temperature: float = 1.0,
+        top_p: float = 1.0,
+        seed: Optional[int] = None,
+        streamer: Optional[AsyncTextStreamer] = None
+    ) -> Generation:
+        """
+        Queue a request and wait for it to finish. Tokens are also passed
+        to `streamer` (created with skip_prompt=False) as they are sampled.
+        """
+        if not prompt_ids:
+            raise ValueError("Empty prompt")
+        generator = None
+        if do_sample:
+            generator = torch.Generator()
+            if seed is not None:
+                generator.manual_seed(seed)
+            else:
+                generator.seed()
+        seq = _Sequence(
+            prompt_ids=list(prompt_ids),
+            max_new_tokens=max(1, max_new_tokens),
+            do_sample=do_sample,
+            temperature=temperature,
+            top_p=top_p,
+            generator=generator,
+            streamer=streamer,
+            future=Future()
+        )
+        with self._cond:
+            if self._closed:
+                raise RuntimeError(f"{self.name} server is closed")
+            self._waiting.append(seq)
+            self.requests += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"{self.name}-decode", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return await asyncio.wrap_future(seq.future)
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 3)
+
+        return {
+            "active": len(self._active),
+            "waiting": len(self._waiting),
+            "max_batch": self.max_batch,
+            "requests": self.requests,
+            "completed": self.completed,
+            "generated_tokens": self.generated_tokens,
+            "tokens_per_second": round(self.generated_tokens / self.busy_seconds, 2) if self.busy_seconds else 0.0,
+            "mean_batch": round(self.batched_rows / self.decode_steps, 2) if self.decode_steps else 0.0,
+            "prefix_tokens": len(self._prefix_ids),
+            "prefill_tokens": self.prefill_tokens,
+            "prefix_tokens_reused": self.prefix_tokens_reused,
+            "latency_p50": percentile(0.5),
+            "latency_p95": percentile(0.95)
+        }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    # ---- decode loop (worker thread) ----
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._waiting and not self._active and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    pending = list(self._waiting) + self._active
+                    self._waiting.clear()
+                    break
+                admit = []
+                while self._waiting and len(self._active) + len(admit) < self.max_batch:
+                    admit.append(self._waiting.popleft())
+            start = time.perf_counter()
+            for seq in admit:
+                self._admit(seq)
+            if self._active:
+                self._step()
+            self.busy_seconds += time.perf_counter() - start
+        for seq in pending:
+            self._finish(seq, RuntimeError(f"{self.name} server closed"))
+
+    def _forward(self, input_ids, attention_mask, position_ids, past: Optional[KVCache]):
+        if past is not None and self._wrap_cache:
+            past = DynamicCache.from_legacy_cache(past)
+        with torch.inference_mode():
+            out = self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                position_ids=position_ids,
+                past_key_values=past,
+                use_cache=True
+            )
+        kv = out.past_key_values
+        if hasattr(kv, "to_legacy_cache"):
+            kv = kv.to_legacy_cache()
+        return out.logits[:, -1, :], tuple(kv)
+
+    def _ensure_prefix(self):
+        if self._prefix_kv is None and len(self._prefix_ids) > 1:
+            ids = torch.tensor([self._prefix_ids], device=self._device)
+            _, self._prefix_kv = self._forward(
+                ids,
+                torch.ones_like(ids),
+                torch.arange(len(self._prefix_ids), device=self._device)[None],
+                None
+            )
+
+    def _admit(self, seq: _Sequence):
+        """Prefill one sequence and add it to the decode batch"""
+        now = time.perf_counter()
+        queue_wait_duration.observe(now - seq.submitted, self.name)
+        seq.started = now
+        if seq.streamer is not None and seq.streamer.cancelled:
+            self._finish(seq)
+            return
+        try:
+            self._ensure_prefix()
+            # Keep at least one prompt token to prefill: its logits pick the first new token
+            reuse = min(common_prefix_length(seq.prompt_ids, self._prefix_ids), len(seq.prompt_ids) - 1)
+            past = _slice_kv(self._prefix_kv, end=reuse) if reuse > 0 and self._prefix_kv is not None else None
+            if past is None:
+                reuse = 0
+            total = len(seq.prompt_ids)
+            logits, kv = self._forward(
+                torch.tensor([seq.prompt_ids[reuse:]], device=self._device),
+                torch.ones(1, total, dtype=torch.long, device=self._device),
+                torch.arange(reuse, total, device=self._device)[None],
+                past
+            )
+            seq.prefix_tokens = reuse
+            self.prefix_tokens_reused += reuse
+            self.prefill_tokens += total - reuse
+            token = self._sample(logits[0], seq)
+        except Exception as e:
+            logger.warning(f"{self.name} prefill failed: {e}")
+            self._finish(seq, e)
+            return
+
+        mask = torch.ones(1, total, dtype=torch.long, device=self._device)
+        if not self._active:
+            self._kv, self._mask = kv, mask
+        else:
+            width = max(self._mask.shape[1], total)
+            self._kv = tuple(
+                (torch.cat([bk, nk], dim=0), torch.cat([bv, nv], dim=0))
+                for (bk, bv), (nk, nv) in zip(_pad_kv(self._kv, width - self._mask.shape[1]), _pad_kv(kv, width - total))
+            )
+            self._mask = torch.cat([
+                torch.nn.functional.pad(self._mask, (width - self._mask.shape[1], 0)),
+                torch.nn.functional.pad(mask, (width - total, 0))
+            ])
+        self._active.append(seq)
+        self._next.append(token)
+        self._accept([len(self._active) - 1])
+
+    def _step(self):
+        """One decode step for every active sequence"""
+        rows = len(self._active)
+        self.decode_steps += 1
+        self.batched_rows += rows
+        batch_size_histogram.observe(rows, self.name)
+        positions = self._mask.sum(dim=1, keepdim=True) # Real tokens so far = next position
+        mask = torch.cat([self._mask, self._mask.new_ones(rows, 1)], dim=1)
+        try:
+            logits, kv = self._forward(
+                torch.tensor(self._next, device=self._device)[:, None],
+                mask,
+                positions,
+                self._kv
+            )
+            self._kv, self._mask = kv, mask
+            self._next = [self._sample(logits[i], seq) for i, seq in enumerate(self._active)]
+        except Exception as e:
+            logger.warning(f"{self.name} decode step failed: {e}")
+            for seq in self._active:
+                self._finish(seq, e)
+            self._active, self._next = [], []
+            self._kv = self._mask = None
+            return
+        self._accept(range(rows))
+
+    def _accept(self, rows: Iterable[int]):
+        """Hand the newly sampled tokens of `rows` out; drop finished sequences"""
+        done = []
+        for i in rows:
+            seq, token = self._active[i], self._next[i]
+            finished = token in self.eos_token_ids
+            if not finished:
+                seq.generated.append(token)
+                self.generated_tokens += 1
+                if seq.streamer is not None:
+                    seq.streamer.put([token])
+                    finished = seq.streamer.stop_reason is not None
+                finished = finished or len(seq.generated) >= seq.max_new_tokens
+            if finished:
+                done.append(i)
+        if not done:
+            return
+        for i in done:
+            self._finish(self._active[i])
+        keep = [i for i in range(len(self._active)) if i not in done]
+        self._active = [self._active[i] for i in keep]
+        self._next = [self._next[i] for i in keep]
+        if not keep:
+            self._kv = self._mask = None
+            return
+        rows_kept = torch.tensor(keep, device=self._device)
+        self._mask = self._mask[rows_kept]
+        # Columns that are padding for every remaining row go too
+        first = int((self._mask.sum(dim=0) > 0).nonzero()[0])
+        self._mask = self._mask[:, first:]
+        self._kv = _slice_kv(self._kv, rows=rows_kept, start=first)
+
+    def _sample(self, logits: torch.Tensor, seq: _Sequence) -> int:
+        logits = logits.float().cpu()
+        if not seq.do_sample:
+            return int(torch.argmax(logits))
+        probs = torch.softmax(logits / max(seq.temperature, 1e-5), dim=-1)
+        if seq.top_p < 1.0:
+            sorted_probs, order = torch.sort(probs, descending=True)
+            # Smallest set of tokens whose probability reaches top_p
+            sorted_probs[(torch.cumsum(sorted_probs, dim=-1) - sorted_probs) >= seq.top_p] = 0.0
+            probs = torch.zeros_like(probs).scatter(0, order, sorted_probs)
+        return int(torch.multinomial(probs, 1, generator=seq.generator))
+
+    def _finish(self, seq: _Sequence, error: Optional[BaseException] = None):
+        if seq.streamer is not None:
+            if error is not None:
+                seq.streamer.fail(error)
+            else:
+                seq.streamer.end()
+        if seq.future.done():
+            return
+        if error is not None:
+            seq.future.set_exception(error)
+            return
+        end = time.perf_counter()
+        started = seq.started or end
+        self.completed += 1
+        self._latencies.append(end - seq.submitted)
+        seq.future.set_result(Generation(
+            token_ids=seq.generated,
+            prompt_tokens=len(seq.prompt_ids),
+            prefix_tokens=seq.prefix_tokens,
+            queue_seconds=started - seq.submitted,
+            seconds=end - started
+        ))
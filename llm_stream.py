@@ -0,0 +1,184 @@
+"""
+LLM Token Streaming
+
+Bridges a blocking Hugging Face `generate()` running in a worker thread
+to an async iterator of text chunks:
+
+- `AsyncTextStreamer` implements the streamer interface generate() calls
+  (`put(token_ids)` / `end()`), decodes incrementally and hands every new
+  piece of text to the event loop as soon as its token is produced
+- `stopping_criteria()` ends generation early once the text is complete
+  (by default: the first paragraph ended) or the client called `stop()`
+
+Without a loop the streamer only collects text, so non-streaming callers
+get the same early stop and the same final text.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Why generation ended
+STOP_COMPLETE = "complete"    # Text complete (or end-of-sequence token)
+STOP_LENGTH = "length"        # max_new_tokens reached
+STOP_CANCELLED = "cancelled"  # stop() called
+
+_END = object()
+
+
+def paragraph_end(text: str) -> Optional[int]:
+    """Index where the first paragraph of `text` ends, or None while it is still open"""
+    end = text.find("\n\n")
+    return end if end >= 0 else None
+
+
+class _StopWhenDone:
+    """Stopping criterion (transformers calls it after every step)"""
+
+    def __init__(self, streamer: "AsyncTextStreamer"):
+        self.streamer = streamer
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.streamer.stop_reason is not None
+
+
+class AsyncTextStreamer:
+    def __init__(
+        self,
+        decode: Callable[[List[int]], str],
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+        max_tokens: Optional[int] = None,
+        complete_at: Optional[Callable[[str], Optional[int]]] = paragraph_end,
+        skip_prompt: bool = True
+    ):
+        """
+        `decode(token_ids)` turns generated ids into text (e.g. the tokenizer's
+        decode with skip_special_tokens). `complete_at(text)` returns where
+        the answer ends, or None to keep generating. `max_tokens` tells a
+        length stop from an end-of-sequence stop.
+        """
+        self.decode = decode
+        self.loop = loop
+        self.max_tokens = max_tokens
+        self.complete_at = complete_at
+        self._skip_prompt = skip_prompt
+        self._queue: Optional[asyncio.Queue] = asyncio.Queue() if loop is not None else None
+        self._ids: List[int] = []
+        self._ended = False
+        self.text = ""
+        self.tokens = 0
+        self.stop_reason: Optional[str] = None
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    # ---- generate() side (worker thread) ----
+
+    def put(self, value: Any):
+        ids = value.tolist() if hasattr(value, "tolist") else list(value)
+        if ids and isinstance(ids[0], list):
+            if len(ids) > 1:
+                raise ValueError("AsyncTextStreamer only supports batch size 1")
+            ids = ids[0]
+        if self._skip_prompt:
+            # The first put() is the prompt itself
+            self._skip_prompt = False
+            return
+        if self.stop_reason is not None:
+            return
+        self._ids.extend(ids)
+        self.tokens += len(ids)
+        text = self.decode(self._ids).lstrip()
+        if text.endswith("\ufffd"):
+            # Half of a multi-byte character; wait for the next token
+            return
+        cut = self.complete_at(text) if self.complete_at is not None else None
+        if cut is not None:
+            text = text[:cut].rstrip()
+            self.stop_reason = STOP_COMPLETE
+        if text.startswith(self.text) and len(text) > len(self.text):
+            if self.first_token_at is None:
+                self.first_token_at = time.perf_counter()
+            self._push(text[len(self.text):])
+        self.text = text
+
+    def end(self):
+        if self._ended:
+            return
+        self._ended = True
+        if self.stop_reason is None:
+            length = self.max_tokens is not None and self.tokens >= self.max_tokens
+            self.stop_reason = STOP_LENGTH if length else STOP_COMPLETE
+        self.finished_at = time.perf_counter()
+        self._push(_END)
+
+    def fail(self, error: BaseException):
+        self._push(error)
+        self.end()
+
+    def _push(self, item):
+        if self._queue is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except RuntimeError:
+            # Loop already closed: nobody is listening any more
+            pass
+
+    # ---- event loop side ----
+
+    def stop(self):
+        """Cancel: generation ends after the token currently being produced"""
+        if self.stop_reason is None:
+            self.stop_reason = STOP_CANCELLED
+
+    @property
+    def cancelled(self) -> bool:
+        return self.stop_reason == STOP_CANCELLED
+
+    def stopping_criteria(self) -> _StopWhenDone:
+        return _StopWhenDone(self)
+
+    def run(self, fn: Callable, *args) -> "asyncio.Future":
+        """Run the blocking `fn(*args)` (which calls generate) in a thread"""
+        def target():
+            try:
+                return fn(*args)
+            except BaseException as e:
+                self.fail(e)
+                raise
+            finally:
+                self.end()
+        task = asyncio.ensure_future(asyncio.to_thread(target))
+        # The error also reaches the iterator; don't warn if nobody awaits the task
+        task.add_done_callback(lambda f: f.cancelled() or f.exception())
+        return task
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        if self._queue is None:
+            raise StopAsyncIteration
+        item = await self._queue.get()
+        if item is _END:
+            self._queue.put_nowait(_END)
+            raise StopAsyncIteration
+        if isinstance(item, BaseException):
+            raise item
+        return item
+
+    def stats(self) -> dict:
+        end = self.finished_at or time.perf_counter()
+        elapsed = end - self.started
+        return {
+            "tokens": self.tokens,
+            "stop_reason": self.stop_reason,
+            "time_to_first_token": round(self.first_token_at - self.started, 3) if self.first_token_at else None,
+            "elapsed": round(elapsed, 3),
+            "tokens_per_second": round(self.tokens / elapsed, 2) if elapsed > 0 else 0.0
+        }
+
@@ -0,0 +1,408 @@
+"""
+Prometheus Metrics
+
+Lightweight, dependency-free metrics registry that renders counters,
+gauges and histograms in the Prometheus text exposition format.
+
+The hot path (``Counter.inc``, ``Histogram.observe``, ``stage`` timers and
+the ASGI middleware) only touches a dict and a lock, so instrumentation can
+stay enabled in production. See ``benchmarks/bench_metrics.py``.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base class for a metric family with optional labels"""
+
+    type_name = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: tuple) -> tuple:
+        if len(labels) != len(self.label_names):
+            raise ValueError(
+                f"{self.name} expects labels {self.label_names}, got {labels}"
+            )
+        return tuple(labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter"""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, *labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be computed at scrape time"""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Iterable[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[tuple, float] = {}
+        self._function: Optional[Callable] = None
+
+    def set(self, value: float, *labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, *labels, amount: float = 1.0):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+    def get(self, *labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def set_function(self, fn: Callable):
+        """
+        Compute the gauge lazily on every scrape.
+
+        ``fn`` returns a number for unlabelled gauges, or a dict mapping
+        label tuples to numbers for labelled ones.
+        """
+        self._function = fn
+
+    def _samples(self) -> List[str]:
+        if self._function is not None:
+            try:
+                result = self._function()
+            except Exception as e:
+                logger.warning(f"Gauge {self.name} collector failed: {e}")
+                return []
+            if isinstance(result, dict):
+                items = [(self._key(k if isinstance(k, tuple) else (k,)), v) for k, v in result.items()]
+            else:
+                items = [((), result)]
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class _Timer:
+    """Context manager observing elapsed wall time into a histogram"""
+
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram: "Histogram", labels: tuple):
+        self._histogram = histogram
+        self._labels = labels
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._start, *self._labels)
+        return False
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds"""
+
+    type_name = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts (+Inf last), sum, count]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, *labels) -> _Timer:
+        """Time a block: ``with histogram.time("label"): ...``"""
+        return _Timer(self, labels)
+
+    def get_count(self, *labels) -> int:
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def get_sum(self, *labels) -> float:
+        state = self._values.get(self._key(labels))
+        return state[1] if state else 0.0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = []
+        bounds = self.buckets + (float("inf"),)
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}"
+                )
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metric families and renders the exposition text"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {metric.name} already registered as {existing.type_name}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labels))
+
+    def histogram(
+        self,
+        name: str,
+        help_text: str,
+        labels: Iterable[str] = (),
+        buckets: Iterable[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global registry instance
+registry = MetricsRegistry()
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ==================== Standard Metrics ====================
+
+http_requests_total = registry.counter(
+    "novagen_http_requests_total",
+    "HTTP requests handled, by route template and status code",
+    ("method", "endpoint", "status")
+)
+http_request_duration = registry.histogram(
+    "novagen_http_request_duration_seconds",
+    "HTTP request latency, by route template",
+    ("method", "endpoint")
+)
+stage_duration = registry.histogram(
+    "novagen_stage_duration_seconds",
+    "Time spent in each stage of an endpoint",
+    ("endpoint", "stage")
+)
+queue_wait_duration = registry.histogram(
+    "novagen_queue_wait_seconds",
+    "Time jobs spend queued before they start running",
+    ("job_type",)
+)
+model_transfer_duration = registry.histogram(
+    "novagen_model_transfer_seconds",
+    "Model load, device move and offload timings",
+    ("model", "action")
+)
+cache_requests_total = registry.counter(
+    "novagen_cache_requests_total",
+    "Cache lookups, by cache name and result (hit/miss)",
+    ("cache", "result")
+)
+llm_first_token_duration = registry.histogram(
+    "novagen_llm_first_token_seconds",
+    "Time from request to the first streamed token, by model",
+    ("model",)
+)
+batch_size_histogram = registry.histogram(
+    "novagen_batch_size",
+    "Items per micro-batch, by batcher",
+    ("batcher",),
+    buckets=(1, 2, 4, 8, 16, 32, 64)
+)
+gpu_arbiter_decisions_total = registry.counter(
+    "novagen_gpu_arbiter_decisions_total",
+    "GPU arbiter decisions: training placement (exclusive/routed/shared/cpu/rejected), pause and resume",
+    ("decision",)
+)
+
+
+# ==================== Stage Timing ====================
+
+# Optional listener called as (endpoint, stage, start, end) when a stage
+# finishes. Left as None unless something (e.g. the profiler) needs spans.
+_stage_listener: Optional[Callable[[str, str, float, float], None]] = None
+
+
+def set_stage_listener(listener: Optional[Callable[[str, str, float, float], None]]):
+    """Install (or clear with None) the stage completion listener"""
+    global _stage_listener
+    _stage_listener = listener
+
+
+class _StageTimer:
+    __slots__ = ("endpoint", "stage", "start")
+
+    def __init__(self, endpoint: str, stage: str):
+        self.endpoint = endpoint
+        self.stage = stage
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        stage_duration.observe(end - self.start, self.endpoint, self.stage)
+        if _stage_listener is not None:
+            _stage_listener(self.endpoint, self.stage, self.start, end)
+        return False
+
+
+def stage(endpoint: str, name: str) -> _StageTimer:
+    """Time one stage of an endpoint: ``with stage("generate", "pipeline"): ...``"""
+    return _StageTimer(endpoint, name)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Count a cache hit or miss"""
+    cache_requests_total.inc(cache, "hit" if hit else "miss")
+
+
+# ==================== ASGI Middleware ====================
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request counts and latency.
+
+    The endpoint label uses the matched route template (``/loras/{lora_id}``)
+    rather than the raw path, so cardinality stays bounded.
+    """
+
+    def __init__(self, app, exclude_paths: Iterable[str] = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "GET")
+            http_requests_total.inc(method, endpoint, str(status_holder[0]))
+            http_request_duration.observe(elapsed, method, endpoint)
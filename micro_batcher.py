@@ -0,0 +1,132 @@
+"""
+Dynamic Micro-Batching
+
+Collects concurrent single-item requests into batches for models that
+are much cheaper per item at batch size > 1 (BLIP captioning, ...):
+
+- the first queued item opens a batch; the batcher then waits up to
+  `max_wait` seconds for more, or until `max_batch` items are queued
+- while a batch is running, new requests keep queueing, so under load
+  batches fill up without waiting at all
+- batches run one at a time in a worker thread (the model is shared);
+  each caller gets its own result, or the batch's exception
+
+Batch sizes and queue waits are recorded in metrics.
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Generic, List, Optional, Sequence, TypeVar
+import logging
+
+from metrics import batch_size_histogram, queue_wait_duration
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataclass
+class _Pending:
+    item: Any
+    future: asyncio.Future
+    queued: float = field(default_factory=time.perf_counter)
+
+
+class MicroBatcher(Generic[T, R]):
+    def __init__(
+        self,
+        process: Callable[[List[T]], Sequence[R]],
+        max_batch: int = 8,
+        max_wait: float = 0.01,
+        name: str = "batch"
+    ):
+        self.process = process
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self.name = name
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        if self._worker is None or self._worker.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, item: T) -> R:
+        """Result for one item, processed in whichever batch it lands in"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Pending(item, future))
+        return await future
+
+    async def submit_many(self, items: Sequence[T]) -> List[R]:
+        """Results for many items (queued together, so they batch with each other)"""
+        return list(await asyncio.gather(*(self.submit(item) for item in items)))
+
+    async def _collect(self) -> List[_Pending]:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Callers that gave up (cancelled) don't need a result
+            batch = [p for p in batch if not p.future.done()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            for p in batch:
+                queue_wait_duration.observe(started - p.queued, self.name)
+            batch_size_histogram.observe(len(batch), self.name)
+            try:
+                results = await asyncio.to_thread(self.process, [p.item for p in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f"{self.name}: {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                logger.error(f"{self.name} batch of {len(batch)} failed: {e}")
+                for p in batch:
+                    if not p.future.done():
+                        p.future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for p, result in zip(batch, results):
+                if not p.future.done():
+                    p.future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "max_batch": self.max_batch,
+            "max_wait_ms": round(self.max_wait * 1000, 2),
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch": round(self.items / self.batches, 2) if self.batches else 0.0
+        }
+
+    def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
@@ -0,0 +1,193 @@
+"""
+GPU Model Residency
+
+Decides which heavy model group (main SDXL pipelines, x4 upscaler, ...)
+owns the GPU, instead of offloading and reloading around every request:
+
+- a group stays resident after its request finishes; the next request
+  for the same group runs without any transfer
+- requests for another group wait until the resident group is idle,
+  then the switch (deactivate old, activate new) happens once; requests
+  queued for the resident group go first, so a burst of upscales is
+  served as one group, but only `max_group_run` in a row while another
+  group is waiting, so neither side starves
+- a non-default group is evicted after `idle_timeout` seconds without
+  use, or early when free device memory drops below `min_free_bytes`
+
+The default group (the main pipelines) is assumed resident at startup
+and is never evicted by the idle watcher.
+"""
+
+import asyncio
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ModelGroup:
+    name: str
+    activate: Callable[[], None]    # Blocking: load / move to device
+    deactivate: Callable[[], None]  # Blocking: move off device, free memory
+    default: bool = False
+
+
+class ModelResidency:
+    def __init__(
+        self,
+        idle_timeout: float = 300.0,
+        max_group_run: int = 8,
+        min_free_bytes: int = 0,
+        free_memory: Optional[Callable[[], Optional[int]]] = None,
+        check_interval: float = 5.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.idle_timeout = idle_timeout
+        self.max_group_run = max(1, max_group_run)
+        self.min_free_bytes = min_free_bytes
+        self.free_memory = free_memory
+        self.check_interval = check_interval
+        self.clock = clock
+
+        self.groups: Dict[str, ModelGroup] = {}
+        self.resident: Optional[str] = None
+        self._active = 0
+        self._run = 0  # Consecutive grants to the resident group
+        self._waiting: Counter = Counter()
+        self._last_used = clock()
+        self._cond: Optional[asyncio.Condition] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self.switches = 0
+        self.evictions: Counter = Counter()
+
+    def register(self, name: str, activate: Callable[[], None], deactivate: Callable[[], None], default: bool = False):
+        self.groups[name] = ModelGroup(name, activate, deactivate, default)
+        if default and self.resident is None:
+            self.resident = name
+
+    @property
+    def _condition(self) -> asyncio.Condition:
+        # Created lazily so the instance can be built outside the event loop
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def _can_enter(self, name: str) -> bool:
+        others_waiting = any(n != name and count for n, count in self._waiting.items())
+        if self.resident == name:
+            return not (others_waiting and self._run >= self.max_group_run)
+        if self._active:
+            return False
+        if self.resident is None:
+            return True
+        # Let queued requests for the resident group finish their run first
+        return not self._waiting[self.resident] or self._run >= self.max_group_run
+
+    async def _switch(self, name: str):
+        old = self.groups.get(self.resident) if self.resident else None
+        start = time.perf_counter()
+        if old is not None:
+            await asyncio.to_thread(old.deactivate)
+        self.resident = None
+        await asyncio.to_thread(self.groups[name].activate)
+        self.resident = name
+        self._run = 0
+        self.switches += 1
+        logger.info(
+            f"GPU residency: {old.name if old else 'none'} -> {name} "
+            f"({time.perf_counter() - start:.2f}s)"
+        )
+
+    @asynccontextmanager
+    async def use(self, name: str):
+        """Hold `name` resident on the device for the duration of the block"""
+        if name not in self.groups:
+            raise KeyError(f"Unknown model group: {name}")
+        cond = self._condition
+        async with cond:
+            self._waiting[name] += 1
+            try:
+                await cond.wait_for(lambda: self._can_enter(name))
+            finally:
+                self._waiting[name] -= 1
+            if self.resident != name:
+                try:
+                    await self._switch(name)
+                except Exception:
+                    cond.notify_all()
+                    raise
+            self._active += 1
+            self._run += 1
+        try:
+            yield self.groups[name]
+        finally:
+            async with cond:
+                self._active -= 1
+                self._last_used = self.clock()
+                cond.notify_all()
+
+    async def evict(self, reason: str = "manual") -> Optional[str]:
+        """Deactivate the resident group if it is idle; returns its name"""
+        cond = self._condition
+        async with cond:
+            if self.resident is None or self._active:
+                return None
+            name = self.resident
+            await asyncio.to_thread(self.groups[name].deactivate)
+            self.resident = None
+            self._run = 0
+            self.evictions[reason] += 1
+            logger.info(f"GPU residency: evicted {name} ({reason})")
+            cond.notify_all()
+            return name
+
+    def _eviction_reason(self) -> Optional[str]:
+        group = self.groups.get(self.resident) if self.resident else None
+        if group is None or group.default or self._active:
+            return None
+        if self.clock() - self._last_used >= self.idle_timeout:
+            return "idle"
+        if self.min_free_bytes and self.free_memory is not None:
+            free = self.free_memory()
+            if free is not None and free < self.min_free_bytes:
+                return "memory_pressure"
+        return None
+
+    async def check(self) -> Optional[str]:
+        """One idle / memory-pressure check; returns the evicted group"""
+        reason = self._eviction_reason()
+        return await self.evict(reason) if reason else None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"GPU residency check failed: {e}")
+
+    def start(self):
+        if self._watcher is None:
+            self._watcher = asyncio.get_running_loop().create_task(self._watch())
+
+    def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
+            self._watcher = None
+
+    def stats(self) -> dict:
+        return {
+            "resident": self.resident,
+            "active": self._active,
+            "waiting": {name: count for name, count in self._waiting.items() if count},
+            "idle_seconds": round(self.clock() - self._last_used, 1),
+            "idle_timeout": self.idle_timeout,
+            "max_group_run": self.max_group_run,
+            "switches": self.switches,
+            "evictions": dict(self.evictions)
+        }
@@ -1,7 +1,9 @@
 import torch
 import os
+import time
 from diffusers import StableDiffusionUpscalePipeline
 from .core import vram_optimizer
+from metrics import model_transfer_duration
 
 upscale_pipe = None
 
@@ -9,12 +11,14 @@ def load_upscaler_model():
     global upscale_pipe
     if upscale_pipe is None:
         print("⏳ Loading x4 Upscaler...")
+        load_start = time.perf_counter()
         try:
             upscale_pipe = StableDiffusionUpscalePipeline.from_pretrained(
                 "stabilityai/stable-diffusion-x4-upscaler",
                 torch_dtype=torch.float16
             ).to("cuda")
             upscale_pipe.enable_xformers_memory_efficient_attention()
+            model_transfer_duration.observe(time.perf_counter() - load_start, "upscaler", "load")
             print("✅ x4 Upscaler loaded")
             return True
         except Exception as e:
@@ -29,5 +33,6 @@ def get_upscaler_pipe():
 def offload_upscaler():
     global upscale_pipe
     if upscale_pipe is not None:
-        upscale_pipe.to("cpu")
-        vram_optimizer.clear_cache()
+        with model_transfer_duration.time("upscaler", "offload"):
+            upscale_pipe.to("cpu")
+            vram_optimizer.clear_cache()
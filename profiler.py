@@ -0,0 +1,258 @@
+"""
+On-demand Request Profiler
+
+Arms a profiler for the next N requests of a given endpoint and writes the
+captured traces to a traces directory:
+
+- ``<id>.trace.json``: Chrome trace of the endpoint stages recorded through
+  ``metrics.stage`` (open in chrome://tracing, Perfetto or speedscope)
+- ``<id>.prof``: cProfile stats (CPU mode, load with pstats/snakeviz)
+- ``<id>.torch.json``: torch.profiler Chrome trace (CUDA mode)
+
+When nothing is armed the middleware is a single dict truthiness check and
+no stage listener is installed, so profiling adds no overhead when off.
+"""
+
+import contextvars
+import cProfile
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+import logging
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ("auto", "cprofile", "torch")
+
+_current_session: contextvars.ContextVar = contextvars.ContextVar("profile_session", default=None)
+
+
+@dataclass
+class ProfileSession:
+    """One profiled request"""
+    id: str
+    endpoint: str
+    mode: str
+    started_at: datetime = field(default_factory=datetime.now)
+    start: float = field(default_factory=time.perf_counter)
+    spans: List[tuple] = field(default_factory=list)
+    profiler: Optional[object] = None
+
+
+class RequestProfiler:
+    """Arms profiling for the next N requests of an endpoint"""
+
+    def __init__(self, traces_dir: str = "traces"):
+        self.traces_dir = traces_dir
+        # endpoint path -> [remaining requests, mode]
+        self.armed: Dict[str, list] = {}
+        self.active: Optional[ProfileSession] = None
+        self.lock = threading.Lock()
+
+    def arm(self, endpoint: str, count: int = 1, mode: str = "auto") -> dict:
+        """Profile the next `count` requests hitting `endpoint`"""
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        if count < 1:
+            raise ValueError("count must be at least 1")
+        with self.lock:
+            self.armed[endpoint] = [count, mode]
+        logger.info(f"Profiler armed for {count} request(s) of {endpoint} ({mode})")
+        return self.status()
+
+    def disarm(self, endpoint: Optional[str] = None) -> dict:
+        """Disarm one endpoint, or all of them"""
+        with self.lock:
+            if endpoint is None:
+                self.armed.clear()
+            else:
+                self.armed.pop(endpoint, None)
+        return self.status()
+
+    def status(self) -> dict:
+        return {
+            "armed": {ep: {"remaining": r, "mode": m} for ep, (r, m) in self.armed.items()},
+            "active": self.active.endpoint if self.active else None,
+            "traces": self.list_traces()
+        }
+
+    def list_traces(self) -> List[dict]:
+        if not os.path.isdir(self.traces_dir):
+            return []
+        traces = []
+        for name in sorted(os.listdir(self.traces_dir), reverse=True):
+            path = os.path.join(self.traces_dir, name)
+            traces.append({
+                "name": name,
+                "size": os.path.getsize(path),
+                "url": f"/admin/profile/traces/{name}"
+            })
+        return traces
+
+    def trace_path(self, name: str) -> Optional[str]:
+        """Resolve a trace file name inside the traces dir, or None"""
+        path = os.path.join(self.traces_dir, os.path.basename(name))
+        return path if os.path.isfile(path) else None
+
+    # ---------- Session lifecycle ----------
+
+    def begin(self, endpoint: str) -> Optional[ProfileSession]:
+        """
+        Claim one armed slot for this request and start profiling.
+        Returns None if the endpoint is not armed or another request is
+        already being profiled (profilers cannot be nested).
+        """
+        with self.lock:
+            entry = self.armed.get(endpoint)
+            if entry is None or self.active is not None:
+                return None
+            entry[0] -= 1
+            if entry[0] <= 0:
+                del self.armed[endpoint]
+            mode = entry[1]
+            if mode == "auto":
+                mode = "torch" if _cuda_available() else "cprofile"
+            session = ProfileSession(id=uuid.uuid4().hex[:12], endpoint=endpoint, mode=mode)
+            self.active = session
+
+        try:
+            session.profiler = _start_profiler(mode)
+        except Exception as e:
+            logger.error(f"Could not start {mode} profiler: {e}")
+            session.profiler = None
+        metrics.set_stage_listener(self._on_stage)
+        return session
+
+    def end(self, session: ProfileSession):
+        """Stop profiling and write the trace files"""
+        metrics.set_stage_listener(None)
+        end = time.perf_counter()
+        try:
+            _stop_profiler(session, self.traces_dir)
+            self._write_chrome_trace(session, end)
+        except Exception as e:
+            logger.error(f"Failed to write profile {session.id}: {e}")
+        finally:
+            with self.lock:
+                self.active = None
+        logger.info(f"Profile {session.id} for {session.endpoint} written to {self.traces_dir}")
+
+    def _on_stage(self, endpoint: str, stage: str, start: float, end: float):
+        session = _current_session.get()
+        if session is not None:
+            session.spans.append((endpoint, stage, start, end, threading.get_ident()))
+
+    def _write_chrome_trace(self, session: ProfileSession, end: float):
+        os.makedirs(self.traces_dir, exist_ok=True)
+        pid = os.getpid()
+        events = [{
+            "name": f"request {session.endpoint}",
+            "cat": "request",
+            "ph": "X",
+            "ts": 0,
+            "dur": (end - session.start) * 1e6,
+            "pid": pid,
+            "tid": 0
+        }]
+        for endpoint, stage, start, stop, tid in session.spans:
+            events.append({
+                "name": stage,
+                "cat": endpoint,
+                "ph": "X",
+                "ts": (start - session.start) * 1e6,
+                "dur": (stop - start) * 1e6,
+                "pid": pid,
+                "tid": tid
+            })
+        trace = {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "endpoint": session.endpoint,
+                "mode": session.mode,
+                "started_at": session.started_at.isoformat()
+            }
+        }
+        path = os.path.join(self.traces_dir, f"{_trace_prefix(session)}.trace.json")
+        with open(path, "w") as f:
+            json.dump(trace, f)
+
+
+def _trace_prefix(session: ProfileSession) -> str:
+    stamp = session.started_at.strftime("%Y%m%d-%H%M%S")
+    name = session.endpoint.strip("/").replace("/", "_") or "root"
+    return f"{stamp}_{name}_{session.id}"
+
+
+def _cuda_available() -> bool:
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+
+def _start_profiler(mode: str):
+    if mode == "torch":
+        import torch
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        prof = torch.profiler.profile(activities=activities, record_shapes=False, with_stack=False)
+        prof.start()
+        return prof
+
+    prof = cProfile.Profile()
+    prof.enable()
+    return prof
+
+
+def _stop_profiler(session: ProfileSession, traces_dir: str):
+    prof = session.profiler
+    if prof is None:
+        return
+    os.makedirs(traces_dir, exist_ok=True)
+    prefix = os.path.join(traces_dir, _trace_prefix(session))
+    if session.mode == "torch":
+        prof.stop()
+        prof.export_chrome_trace(f"{prefix}.torch.json")
+    else:
+        prof.disable()
+        prof.dump_stats(f"{prefix}.prof")
+
+
+class ProfilerMiddleware:
+    """ASGI middleware that profiles armed endpoints"""
+
+    def __init__(self, app, profiler: "RequestProfiler" = None):
+        self.app = app
+        self.profiler = profiler or request_profiler
+
+    async def __call__(self, scope, receive, send):
+        # Fast path: nothing armed
+        if not self.profiler.armed or scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        session = self.profiler.begin(scope["path"])
+        if session is None:
+            await self.app(scope, receive, send)
+            return
+
+        token = _current_session.set(session)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_session.reset(token)
+            self.profiler.end(session)
+
+
+# Global profiler instance
+request_profiler = RequestProfiler()
@@ -0,0 +1,160 @@
+"""
+Quantized CPU Backends for Auxiliary Models
+
+The prompt enhancer (Phi-3 Mini) and captioner (BLIP) fall back to float32
+weights without CUDA. The "int8" backend applies dynamic int8 quantization
+to every nn.Linear (int8 weights, activations quantized per call), which
+keeps generate() and the rest of the transformers API unchanged.
+
+Quantizing needs the float32 model once; the result is cached on disk:
+
+- first load: fp32 model -> quantize_dynamic -> save the state dict and
+  every buffer under models/quantized/
+- later loads: the model is built on the meta device (no fp32 weights
+  are ever allocated), its Linear layers are swapped for dynamic
+  quantized ones and the saved weights are assigned in place
+
+Cache files are keyed by model id and torch version, because packed int8
+weights are not portable across torch releases.
+"""
+
+import os
+import re
+import time
+import warnings
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+import logging
+
+import torch
+from torch import nn
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("fp32", "int8")
+QUANTIZED_DIR = os.path.join("models", "quantized")
+
+_QUANTIZED_LINEAR = torch.ao.nn.quantized.dynamic.Linear
+
+
+@contextmanager
+def _quiet_quantization():
+    # torch.ao.quantization warns that it is moving to torchao on every call
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        warnings.filterwarnings("ignore", message=".*quantiz", category=UserWarning)
+        yield
+
+
+def quantize_int8(model: nn.Module) -> nn.Module:
+    """Dynamic int8 quantization of all Linear layers (CPU inference only)"""
+    with _quiet_quantization():
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def _swap_linears(module: nn.Module):
+    """Replace every nn.Linear under `module` with an empty dynamic int8 Linear"""
+    for name, child in module.named_children():
+        if type(child) is nn.Linear:
+            setattr(module, name, _QUANTIZED_LINEAR(
+                child.in_features, child.out_features, bias_=child.bias is not None, dtype=torch.qint8
+            ))
+        else:
+            _swap_linears(child)
+
+
+def _set_buffer(model: nn.Module, name: str, value: torch.Tensor):
+    owner_name, _, buffer_name = name.rpartition(".")
+    owner = model.get_submodule(owner_name) if owner_name else model
+    owner._buffers[buffer_name] = value
+
+
+def model_size_mb(model: nn.Module) -> float:
+    """Size of the model's weights as stored (packed int8 Linear weights included)"""
+    total = sum(t.numel() * t.element_size() for t in model.state_dict().values() if isinstance(t, torch.Tensor))
+    for module in model.modules():
+        if isinstance(module, _QUANTIZED_LINEAR):
+            weight, bias = module._weight_bias()
+            total += weight.numel() + (bias.numel() * bias.element_size() if bias is not None else 0)
+    return total / 1024 ** 2
+
+
+class QuantizedModelCache:
+    def __init__(self, directory: str = QUANTIZED_DIR):
+        self.directory = directory
+
+    def path(self, model_id: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9._-]+", "--", model_id)
+        return os.path.join(self.directory, f"{safe}.int8.torch{torch.__version__.split('+')[0]}.pt")
+
+    def load(
+        self,
+        model_id: str,
+        load_fp32: Callable[[], nn.Module],
+        build_empty: Callable[[], nn.Module]
+    ) -> Tuple[nn.Module, dict]:
+        """
+        The int8 model for `model_id`: from the disk cache when present,
+        otherwise quantized from `load_fp32()` and saved. `build_empty()`
+        constructs the architecture only; it runs on the meta device.
+        """
+        path = self.path(model_id)
+        start = time.perf_counter()
+        if os.path.exists(path):
+            try:
+                model = self._restore(path, build_empty)
+                info = {"source": "cache", "path": path}
+            except Exception as e:
+                # Stale or truncated file: rebuild it from the fp32 weights
+                logger.warning(f"Quantized cache {path} unusable ({e}); re-quantizing")
+                model = None
+        else:
+            model = None
+        if model is None:
+            model = quantize_int8(load_fp32().eval())
+            self._save(model, path)
+            info = {"source": "quantized", "path": path}
+        info["seconds"] = round(time.perf_counter() - start, 3)
+        info["size_mb"] = round(model_size_mb(model), 1)
+        return model.eval(), info
+
+    def _save(self, model: nn.Module, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        payload = {
+            "state_dict": model.state_dict(),
+            # Non-persistent buffers (rotary tables, position ids) are not in
+            # the state dict but would stay on the meta device otherwise
+            "buffers": {name: buf for name, buf in model.named_buffers()}
+        }
+        tmp = f"{path}.tmp"
+        torch.save(payload, tmp)
+        os.replace(tmp, path)
+
+    def _restore(self, path: str, build_empty: Callable[[], nn.Module]) -> nn.Module:
+        with torch.device("meta"):
+            model = build_empty()
+        with _quiet_quantization():
+            _swap_linears(model)
+        payload = torch.load(path, map_location="cpu", weights_only=False)
+        model.load_state_dict(payload["state_dict"], strict=True, assign=True)
+        buffers: Dict[str, torch.Tensor] = payload.get("buffers", {})
+        for name, buf in buffers.items():
+            _set_buffer(model, name, buf)
+        leftover = [name for name, t in list(model.named_parameters()) + list(model.named_buffers()) if t.is_meta]
+        if leftover:
+            raise RuntimeError(f"Weights missing from cache: {', '.join(leftover[:5])}")
+        return model
+
+
+def resolve_backend(requested: Optional[str]) -> str:
+    """Effective backend: int8 only applies without CUDA (dynamic quantization is CPU-only)"""
+    backend = requested or "fp32"
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend '{backend}'. Available: {', '.join(BACKENDS)}")
+    if backend == "int8" and torch.cuda.is_available():
+        return "fp32"
+    return backend
+
+
+# Global instance
+quantized_cache = QuantizedModelCache()
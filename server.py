@@ -4,15 +4,20 @@ import uvicorn
 import base64
 import time
 import asyncio
+import json
+import threading
+import functools
+import tarfile
+import zipfile
 from io import BytesIO
 from glob import glob
 from enum import Enum
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 from dataclasses import dataclass
 
-from fastapi import FastAPI, BackgroundTasks, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, BackgroundTasks, HTTPException, WebSocket, WebSocketDisconnect, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uuid
@@ -34,11 +39,13 @@ from diffusers import (
 from transformers import (
     BlipProcessor,
     BlipForConditionalGeneration,
+    BlipConfig,
+    AutoConfig,
     AutoTokenizer, 
-    AutoModelForCausalLM
+    AutoModelForCausalLM,
+    GenerationConfig
 )
 import cv2
-import numpy as np
 from PIL import Image
 try:
     import insightface
@@ -58,6 +65,37 @@ except ImportError:
 # Import WebSocket manager
 from websocket_manager import manager as ws_manager, get_progress_callback
 
+# Import metrics and job queue
+import metrics
+from metrics import MetricsMiddleware, stage, model_transfer_duration
+from job_queue import job_queue
+from profiler import request_profiler, ProfilerMiddleware
+from image_cache import image_cache, content_key, URLValidators
+from http_fetch import image_fetcher
+from upload_store import upload_store, UploadTooLarge, UPLOAD_REF_PREFIX, IMAGE_EXTENSIONS, iter_archive_images
+from image_decode import open_rgb, normalize_size_hint, SizeHint
+from image_buffer import rgb_array, bgr_array, image_from_bgr, image_from_gray
+from face_cache import face_cache, face_summary, frame_key
+from faceswap_pool import faceswap_pool
+from face_roi import swap_faces
+from face_sequence import open_frames, make_sink, swap_sequence, SequenceCancelled, OUTPUT_KINDS
+from tiled_upscale import TiledUpscaler
+from fast_upscale import fast_upscaler
+from model_residency import ModelResidency
+from micro_batcher import MicroBatcher
+from caption_store import caption_store
+from single_flight import SingleFlightCache, Measured, CACHED, COMPUTED
+from llm_stream import AsyncTextStreamer
+from llm_server import LLMServer
+from quantized_models import quantized_cache, resolve_backend, BACKENDS as AUX_BACKENDS
+from dataset_captioning import caption_directory, CaptionJobCancelled
+from training_supervisor import TrainingSupervisor
+from gpu_manager import gpu_manager
+from gpu_arbiter import GPUArbiter, NoDeviceAvailable
+from aspect_ratios import AspectRatioConfig, ASPECT_RATIOS, validate_aspect_ratio, get_aspect_ratio_config
+from bucket_sampler import BucketedImageDataset, dataset_stats
+from dataset_ingest import AsyncStreamReader, dataset_path, ingest_archive
+
 # Import Modules (Refactored)
 from modules.flags import GenerationMode, Performance, OutputFormat 
 from modules.samplers import get_all_samplers, get_sampler_config, SAMPLER_MAPPING
@@ -69,7 +107,14 @@ import file_manager
 
 # ==================== System Config ====================
 SYSTEM_CONFIG = {
-    "auto_save_drive": False
+    "auto_save_drive": False,
+    # Phi-3 / BLIP weights on CPU-only nodes: "fp32" or "int8" (opt-in
+    # dynamic quantization, cached under models/quantized/; outputs can
+    # differ slightly from fp32); ignored with CUDA
+    "aux_model_backend": "fp32",
+    # Pause a training job sharing the inference GPU once this many
+    # requests are waiting for it (0 = never pause)
+    "training_pause_threshold": 0
 }
 
 # Real-time metrics tracking
@@ -108,6 +153,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(ProfilerMiddleware, profiler=request_profiler)
+
 app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
 
 # ==================== Global Pipelines ====================
@@ -120,6 +168,7 @@ phi3_pipe = None
 phi3_tokenizer = None
 blip_processor = None
 blip_model = None
+aux_model_info: Dict[str, dict] = {} # Backend, load source and size per auxiliary model
 face_app = None
 face_swapper = None
 preprocessors = {}
@@ -150,34 +199,11 @@ MODE_CONFIGS: Dict[GenerationMode, dict] = {
     }
 }
 
-# ==================== Aspect Ratios ====================
-
-@dataclass
-class AspectRatioConfig:
-    name: str
-    ratio: str
-    width: int
-    height: int
-    category: str
-    recommended_steps: int
-
-ASPECT_RATIOS = {
-    "1:1": AspectRatioConfig("Square", "1:1", 1024, 1024, "square", 30),
-    "16:9": AspectRatioConfig("Widescreen", "16:9", 1344, 768, "horizontal", 32),
-    "3:2": AspectRatioConfig("Photo", "3:2", 1216, 832, "horizontal", 30),
-    "4:3": AspectRatioConfig("Classic", "4:3", 1152, 896, "horizontal", 30),
-    "9:16": AspectRatioConfig("Portrait", "9:16", 768, 1344, "vertical", 32),
-    "2:3": AspectRatioConfig("Photo Portrait", "2:3", 832, 1216, "vertical", 30),
-    "3:4": AspectRatioConfig("Classic Portrait", "3:4", 896, 1152, "vertical", 30),
-    "21:9": AspectRatioConfig("Cinematic", "21:9", 1536, 640, "cinematic", 35),
-    "4:5": AspectRatioConfig("Instagram", "4:5", 896, 1088, "social", 28),
-    "1:2": AspectRatioConfig("Story", "1:2", 640, 1280, "social", 32),
-}
-
 # Training Models
 class TrainingRequest(BaseModel):
     project_name: str
     steps: int = 1000
+    batch_size: int = 1  # Same-shape batches from aspect-ratio buckets
 
 class TrainingImageRequest(BaseModel):
     image: str # Base64
@@ -188,43 +214,37 @@ class TrainingImageRequest(BaseModel):
 async def upload_training_image(req: TrainingImageRequest):
     """Save an image for the training dataset"""
     try:
-        # Create project directory
-        project_dir = os.path.join("train_datasets", req.project_name)
+        # Same root the trainer reads (this used to write to train_datasets/)
+        project_dir = dataset_path(req.project_name)
         os.makedirs(project_dir, exist_ok=True)
+        save_path = os.path.join(project_dir, os.path.basename(req.filename))
         
-        # Decode and save image
-        header, encoded = req.image.split(",", 1) if "," in req.image else (None, req.image)
-        image_data = base64.b64decode(encoded)
-        image = Image.open(BytesIO(image_data))
-        
-        save_path = os.path.join(project_dir, req.filename)
-        # Ensure it's RGB for JPG if needed, but here we save as provided or PNG
-        if image.mode in ("RGBA", "P"):
-            image = image.convert("RGB")
-        image.save(save_path)
+        def save():
+            # Decode and save image (base64 or upload:<id> reference)
+            image = decode_image(req.image, use_cache=False)
+            # Ensure it's RGB for JPG if needed, but here we save as provided or PNG
+            if image.mode in ("RGBA", "P"):
+                image = image.convert("RGB")
+            image.save(save_path)
         
+        await asyncio.to_thread(save)
         return {"status": "success", "path": save_path}
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     except Exception as e:
         raise HTTPException(500, f"Error saving training image: {str(e)}")
 
-def validate_aspect_ratio(width: int, height: int) -> bool:
-    return width % 64 == 0 and height % 64 == 0
-
-def get_aspect_ratio_config(ratio: str) -> AspectRatioConfig:
-    if ratio not in ASPECT_RATIOS:
-        return ASPECT_RATIOS["1:1"]
-    return ASPECT_RATIOS[ratio]
-
 # ==================== Model Loading & VRAM Management ====================
 
 def offload_main_models():
     """Offload main models to CPU to free VRAM"""
     global pipe, img2img_pipe, controlnet_pipe
     print("⏳ Offloading Main Models to CPU...")
-    if pipe is not None: pipe.to("cpu")
-    if img2img_pipe is not None: img2img_pipe.to("cpu")
-    if controlnet_pipe is not None: controlnet_pipe.to("cpu")
-    torch.cuda.empty_cache()
+    with model_transfer_duration.time("main", "offload"):
+        if pipe is not None: pipe.to("cpu")
+        if img2img_pipe is not None: img2img_pipe.to("cpu")
+        if controlnet_pipe is not None: controlnet_pipe.to("cpu")
+        torch.cuda.empty_cache()
     print("✅ Main Models Offloaded")
 
 def ensure_main_model_cuda():
@@ -234,14 +254,65 @@ def ensure_main_model_cuda():
         load_model()
     elif pipe.device.type != "cuda":
         print("⏳ Moving Main Model back to CUDA...")
-        pipe.to("cuda")
+        with model_transfer_duration.time("main", "to_device"):
+            pipe.to("cuda")
         print("✅ Main Model on CUDA")
 
 
+def _activate_upscaler():
+    if get_upscaler_pipe() is None:
+        load_upscaler_model()
+    upscale_pipe = get_upscaler_pipe()
+    if upscale_pipe is None:
+        raise RuntimeError("Upscaler model not available")
+    if upscale_pipe.device.type != "cuda":
+        with model_transfer_duration.time("upscaler", "to_device"):
+            upscale_pipe.to("cuda")
+
+def _free_device_memory() -> Optional[int]:
+    return torch.cuda.mem_get_info()[0] if torch.cuda.is_available() else None
+
+# Which model group owns the GPU; switching happens only when another group is needed
+model_residency = ModelResidency(
+    idle_timeout=300,
+    max_group_run=8,
+    min_free_bytes=1024**3,
+    free_memory=_free_device_memory
+)
+model_residency.register("main", ensure_main_model_cuda, offload_main_models, default=True)
+model_residency.register("upscaler", _activate_upscaler, offload_upscaler)
+
+# Keeps /train subprocesses off the device the pipelines serve from, or
+# throttles inference there while they share it. Pipelines live on cuda:0
+# only, so that is the one inference device.
+gpu_arbiter = GPUArbiter(
+    devices=range(gpu_manager.num_gpus),
+    inference_devices=(0,),
+    inference_slots=2,
+    shared_slots=1,
+    pause_threshold=SYSTEM_CONFIG["training_pause_threshold"],
+    on_assign=gpu_manager.assign_job,
+    on_release=gpu_manager.release_job
+)
+
+def gpu_group(name: str):
+    """Run an endpoint with model group `name` resident, on an arbitrated inference slot"""
+    # Residency first: requests queue per group there (so bursts are served
+    # as one group); the arbiter only limits how many of them run at once
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            async with model_residency.use(name), gpu_arbiter.inference():
+                return await handler(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
 def load_model():
     global pipe
     if pipe is None:
         print("⏳ Cargando Juggernaut-XL v9 RunDiffusion Photo v2 (FP16)...")
+        load_start = time.perf_counter()
         try:
             model_path = "models/checkpoints/Juggernaut-XL_v9_RunDiffusionPhoto_v2.safetensors"
             if not os.path.exists(model_path):
@@ -262,6 +333,7 @@ def load_model():
             pipe.enable_xformers_memory_efficient_attention()
             pipe.enable_vae_slicing()
             pipe.enable_vae_tiling()
+            model_transfer_duration.observe(time.perf_counter() - load_start, "base_model", "load")
             print("✅ Modelo Base Cargado")
         except Exception as e:
             print(f"⚠️ Error cargando modelo base: {e}")
@@ -270,6 +342,7 @@ def load_img2img_model():
     global img2img_pipe
     if img2img_pipe is None and pipe is not None:
         print("⏳ Configurando Img2Img pipeline...")
+        load_start = time.perf_counter()
         img2img_pipe = StableDiffusionXLImg2ImgPipeline(
             vae=pipe.vae,
             text_encoder=pipe.text_encoder,
@@ -280,6 +353,7 @@ def load_img2img_model():
             scheduler=pipe.scheduler,
         )
         img2img_pipe.to("cuda")
+        model_transfer_duration.observe(time.perf_counter() - load_start, "img2img", "load")
         print("✅ Img2Img pipeline listo")
 
 def load_controlnet_model(control_type: str):
@@ -302,12 +376,14 @@ def load_controlnet_model(control_type: str):
         
     if model_key not in controlnet_models:
         print(f"⏳ Loading ControlNet {model_key}...")
+        load_start = time.perf_counter()
         try:
             controlnet = ControlNetModel.from_pretrained(
                 models[model_key],
                 torch_dtype=torch.float16
             ).to("cuda")
             controlnet_models[model_key] = controlnet
+            model_transfer_duration.observe(time.perf_counter() - load_start, f"controlnet_{model_key}", "load")
             print(f"✅ ControlNet {model_key} loaded")
         except Exception as e:
             print(f"❌ Error loading ControlNet {model_key}: {e}")
@@ -343,6 +419,7 @@ def load_faceswap_models():
     global face_app, face_swapper
     if face_app is None:
         print("⏳ Loading Face Analysis (InsightFace)...")
+        load_start = time.perf_counter()
         # Ensure models are downloaded. InsightFace auto-downloads to ~/.insightface/
         face_app = FaceAnalysis(name='buffalo_l')
         face_app.prepare(ctx_id=0, det_size=(640, 640))
@@ -355,23 +432,54 @@ def load_faceswap_models():
              face_swapper = insightface.model_zoo.get_model(swap_model_path, download=False, download_zip=False)
         else:
              print(f"⚠️ FaceSwap model not found at {swap_model_path}. Please download inswapper_128.onnx.")
+        model_transfer_duration.observe(time.perf_counter() - load_start, "face_swap", "load")
 
 
 # Upscaler load moved to modules.upscaler
 
+PHI3_MODEL_ID = "microsoft/Phi-3-mini-4k-instruct"
+BLIP_MODEL_ID = "Salesforce/blip-image-captioning-base"
+
+def _aux_backend() -> str:
+    return resolve_backend(SYSTEM_CONFIG.get("aux_model_backend"))
+
+def _load_phi3_int8():
+    def build_empty():
+        config = AutoConfig.from_pretrained(PHI3_MODEL_ID, trust_remote_code=True)
+        return AutoModelForCausalLM.from_config(config, torch_dtype=torch.float32, trust_remote_code=True)
+    
+    model, info = quantized_cache.load(
+        PHI3_MODEL_ID,
+        lambda: AutoModelForCausalLM.from_pretrained(PHI3_MODEL_ID, torch_dtype=torch.float32, trust_remote_code=True),
+        build_empty
+    )
+    try:
+        # from_config leaves the default generation config (single EOS id)
+        model.generation_config = GenerationConfig.from_pretrained(PHI3_MODEL_ID)
+    except Exception as e:
+        print(f"⚠️ Phi-3 generation config not loaded: {e}")
+    return model, info
+
 def load_phi3_model():
     global phi3_pipe, phi3_tokenizer
     if phi3_pipe is None:
-        print("⏳ Cargando Phi-3 Mini...")
+        backend = _aux_backend()
+        print(f"⏳ Cargando Phi-3 Mini ({backend})...")
+        load_start = time.perf_counter()
         try:
-            model_name = "microsoft/Phi-3-mini-4k-instruct"
-            phi3_tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-            phi3_pipe = AutoModelForCausalLM.from_pretrained(
-                model_name,
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
-                device_map="auto",
-                trust_remote_code=True
-            )
+            phi3_tokenizer = AutoTokenizer.from_pretrained(PHI3_MODEL_ID, trust_remote_code=True)
+            info = {}
+            if backend == "int8":
+                phi3_pipe, info = _load_phi3_int8()
+            else:
+                phi3_pipe = AutoModelForCausalLM.from_pretrained(
+                    PHI3_MODEL_ID,
+                    torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32,
+                    device_map="auto",
+                    trust_remote_code=True
+                )
+            aux_model_info["phi3"] = {"backend": backend, **info}
+            model_transfer_duration.observe(time.perf_counter() - load_start, "phi3", "load")
             print("✅ Phi-3 Mini Cargado")
         except Exception as e:
             print(f"⚠️ Error cargando Phi-3 Mini: {e}")
@@ -379,17 +487,40 @@ def load_phi3_model():
 def load_blip_model():
     global blip_processor, blip_model
     if blip_model is None:
-        print("⏳ Cargando BLIP...")
+        backend = _aux_backend()
+        print(f"⏳ Cargando BLIP ({backend})...")
+        load_start = time.perf_counter()
         try:
-            blip_processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-            blip_model = BlipForConditionalGeneration.from_pretrained(
-                "Salesforce/blip-image-captioning-base",
-                torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
-            ).to("cuda" if torch.cuda.is_available() else "cpu")
+            blip_processor = BlipProcessor.from_pretrained(BLIP_MODEL_ID)
+            info = {}
+            if backend == "int8":
+                blip_model, info = quantized_cache.load(
+                    BLIP_MODEL_ID,
+                    lambda: BlipForConditionalGeneration.from_pretrained(BLIP_MODEL_ID, torch_dtype=torch.float32),
+                    lambda: BlipForConditionalGeneration(BlipConfig.from_pretrained(BLIP_MODEL_ID))
+                )
+            else:
+                blip_model = BlipForConditionalGeneration.from_pretrained(
+                    BLIP_MODEL_ID,
+                    torch_dtype=torch.float16 if torch.cuda.is_available() else torch.float32
+                ).to("cuda" if torch.cuda.is_available() else "cpu")
+            aux_model_info["blip"] = {"backend": backend, **info}
+            model_transfer_duration.observe(time.perf_counter() - load_start, "blip", "load")
             print("✅ BLIP Cargado")
         except Exception as e:
             print(f"⚠️ Error cargando BLIP: {e}")
 
+def unload_aux_models():
+    """Drop Phi-3 and BLIP so the next request loads them with the current backend"""
+    global phi3_pipe, phi3_tokenizer, phi3_server, blip_processor, blip_model
+    if phi3_server is not None:
+        phi3_server.close()
+        phi3_server = None
+    phi3_pipe = phi3_tokenizer = None
+    blip_processor = blip_model = None
+    aux_model_info.clear()
+    clear_vram()
+
 def set_scheduler(sampler: str):
     if not pipe: return
     config = pipe.scheduler.config
@@ -412,28 +543,17 @@ def set_scheduler(sampler: str):
         pipe.scheduler = LCMScheduler.from_config(config)
 
 def preprocess_control_image(image: Image.Image, type: str):
-    image_np = np.array(image)
-    
-    if type == "pyracanny":
+    if type == "pyracanny" and "pyracanny" in preprocessors:
         # PyraCanny simulation or using controlnet_aux
-        if "pyracanny" in preprocessors:
-            processed = preprocessors["pyracanny"](image)
-            return processed
-        else:
-            # Fallback simple Canny
-            image_np = cv2.Canny(image_np, 100, 200)
-            image_np = image_np[:, :, None]
-            image_np = np.concatenate([image_np, image_np, image_np], axis=2)
-            return Image.fromarray(image_np)
-            
-    if type == "canny":
-        image_np = cv2.Canny(image_np, 100, 200)
-        image_np = image_np[:, :, None]
-        image_np = np.concatenate([image_np, image_np, image_np], axis=2)
-        return Image.fromarray(image_np)
+        return preprocessors["pyracanny"](image)
+
+    if type in ("pyracanny", "canny"):
+        # Fallback simple Canny; the edge map is expanded to RGB in one step
+        edges = cv2.Canny(rgb_array(image), 100, 200)
+        return image_from_gray(edges)
     
     # CPDS / Depth
-    return Image.fromarray(image_np)
+    return image
 
 # ==================== Request Models ====================
 
@@ -475,15 +595,52 @@ class ControlNetRequest(BaseModel):
     output_format: str = "png"
 
 class FaceSwapRequest(BaseModel):
-    source_image: str # The face to copy
+    source_image: Optional[str] = None # The face to copy
+    source_face_id: Optional[str] = None # Or a face registered via /faceswap/sources
+    source_face_index: int = 0 # Which detected source face to use
     target_image: str # The destination body/scene
     output_format: str = "png"
 
+class FaceSwapBatchRequest(BaseModel):
+    source_image: Optional[str] = None
+    source_face_id: Optional[str] = None
+    source_face_index: int = 0
+    target_images: List[str] = [] # Base64 / URL / upload refs
+    target_dir: Optional[str] = None # Directory of images inside the project
+    target_archive: Optional[str] = None # upload:<id> of a zip/tar, or a local path
+    output_format: str = "png"
+
+class FaceSwapSequenceRequest(BaseModel):
+    source_image: Optional[str] = None
+    source_face_id: Optional[str] = None
+    source_face_index: int = 0
+    input: str # upload:<id> (or project path) of a video, GIF or zip/tar of frames
+    output: Optional[str] = None # video / gif / frames (default: same kind as the input)
+    keyframe_interval: int = 10 # Full detection every N frames, tracking in between
+    max_frames: Optional[int] = None
+
+class FaceSourceRequest(BaseModel):
+    image: str
+    face_index: int = 0
+
 class UpscaleRequest(BaseModel):
     image: Optional[str] = None # Base64 or URL
     filename: Optional[str] = None # Local filename in outputs/
     prompt: str = "high quality"
     output_format: str = "png"
+    mode: Optional[str] = None # Fast non-diffusion mode: a flags.uov_list "Upscale" entry, "resample" or "onnx"
+    scale: Optional[float] = None # Factor for fast modes (default from the mode, at most 4)
+    num_inference_steps: int = 25
+    tile_size: int = 256 # Input px per tile; bounds upscaler memory
+    tile_overlap: int = 32
+    tile_blend: str = "feather" # feather / gaussian
+    tile_batch: int = 1 # Tiles per pipeline call
+    job_id: Optional[str] = None # Subscribe to /ws/progress/{job_id} for per-tile progress
+
+class DatasetCaptionRequest(BaseModel):
+    project_name: str
+    overwrite: bool = False # Re-caption images that already have a .txt sidecar
+    prefix: str = "" # Prepended to every caption (e.g. a trigger word)
 
 class DatasetUploadRequest(BaseModel):
     image: str
@@ -493,39 +650,129 @@ class DatasetUploadRequest(BaseModel):
 class TrainingRequest(BaseModel):
     project_name: str
     steps: int = 1000
+    batch_size: int = 1  # Same-shape batches from aspect-ratio buckets
 
 class PromptEnhanceRequest(BaseModel):
     prompt: str
+    temperature: float = 0.7
+    top_p: float = 0.9
+    max_new_tokens: int = 200
+    seed: Optional[int] = None # Fixed seed: sampled results become reproducible and cacheable
+    deterministic: bool = False # Greedy decoding (ignores temperature/top_p); always cacheable
 
 class InterrogateRequest(BaseModel):
     image: str
 
+class InterrogateBatchRequest(BaseModel):
+    images: List[str]
+
 # ==================== Startup ====================
 
 @app.on_event("startup")
 async def startup_event():
     load_model()
+    model_residency.start()
+    training_supervisor.recover()
     # load_faceswap_models() # Auto-load on startup or lazy load to save VRAM
+    upload_store.cleanup()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await image_fetcher.close()
+    faceswap_pool.shutdown()
+    fast_upscaler.close()
+    model_residency.stop()
+    blip_batcher.close()
+    caption_store.close()
+    if phi3_server is not None:
+        phi3_server.close()
+    await training_supervisor.shutdown()
 
 # ==================== Helpers ====================
 
-def decode_image(image_input: str) -> Image.Image:
-    """Robust image decoding from base64, URL or local path"""
+# Minimum decode sizes for consumers that work below native resolution
+BLIP_DECODE_SIZE = 384
+FACE_SOURCE_DECODE_SIZE = 1024  # Detection runs at det_size=(640, 640)
+CONTROLNET_DECODE_SIZE = 1024
+
+def _cache_key(key: tuple, target_size: SizeHint = None) -> tuple:
+    """Decodes at different size hints are cached separately"""
+    hint = normalize_size_hint(target_size)
+    return key + (hint,) if hint else key
+
+def _decode_cached(key, load, use_cache: bool = True, target_size: SizeHint = None):
+    """Return the cached decode for `key`, or decode `load()` and cache it"""
+    if not use_cache:
+        return open_rgb(load(), target_size)
+    key = _cache_key(key, target_size)
+    image = image_cache.get(key)
+    if image is None:
+        image = open_rgb(load(), target_size)
+        image_cache.put(key, image)
+    return image
+
+def _fetch_url_image(url: str, target_size: SizeHint = None) -> Image.Image:
+    """Fetch an image URL, revalidating with cached ETag/Last-Modified"""
+    import requests
+    validators = image_cache.get_url(url)
+    headers = validators.request_headers() if validators else {}
+    response = requests.get(url, timeout=10, headers=headers)
+    
+    if response.status_code == 304 and validators is not None:
+        image = image_cache.get(_cache_key(("content", validators.content_key), target_size))
+        if image is not None:
+            return image
+        # Decoded image was evicted: fetch the body unconditionally
+        response = requests.get(url, timeout=10)
+    response.raise_for_status()
+    
+    key = content_key(response.content)
+    image = _decode_cached(("content", key), lambda: BytesIO(response.content), target_size=target_size)
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if etag or last_modified:
+        image_cache.put_url(url, URLValidators(key, etag, last_modified))
+    return image
+
+def decode_image(
+    image_input: str,
+    use_cache: bool = True,
+    target_size: SizeHint = None
+) -> Image.Image:
+    """
+    Robust image decoding from base64, upload reference, URL or local path.
+    
+    Decodes are cached by content hash (see image_cache), so the returned
+    image may be shared between requests and must not be modified in place.
+    Pass use_cache=False for one-off images (e.g. dataset uploads).
+    target_size is the minimum size the consumer needs; larger inputs are
+    reduced while decoding (see image_decode.open_rgb).
+    """
     print(f"[DEBUG] Decoding image input (len={len(image_input)}): {image_input[:50]}...")
     
     try:
         # 1. Handle Base64
         if image_input.startswith("data:image") or "," in image_input[:50]:
-            base64_data = image_input.split(",")[1] if "," in image_input else image_input
-            return Image.open(BytesIO(base64.b64decode(base64_data))).convert("RGB")
+            base64_data = image_input.split(",", 1)[1] if "," in image_input else image_input
+            return _decode_cached(
+                ("b64", content_key(base64_data)),
+                lambda: BytesIO(base64.b64decode(base64_data)),
+                use_cache, target_size
+            )
+        
+        # 2. Handle uploaded file reference (decoded straight from disk)
+        if image_input.startswith(UPLOAD_REF_PREFIX):
+            upload_path = upload_store.resolve(image_input)
+            if upload_path is None:
+                raise ValueError(f"Unknown upload reference: {image_input}")
+            upload_id = image_input[len(UPLOAD_REF_PREFIX):]
+            return _decode_cached(("content", upload_id), lambda: upload_path, use_cache, target_size)
         
-        # 2. Handle URL
+        # 3. Handle URL
         if image_input.startswith("http"):
-             import requests
-             response = requests.get(image_input, timeout=10)
-             return Image.open(BytesIO(response.content)).convert("RGB")
+             return _fetch_url_image(image_input, target_size)
         
-        # 3. Handle Local Path (relative to outputs)
+        # 4. Handle Local Path (relative to outputs)
         if "outputs" in image_input or image_input.startswith("/"):
             # Clean path
             clean_path = image_input.lstrip("/")
@@ -534,10 +781,16 @@ def decode_image(image_input: str) -> Image.Image:
                  clean_path = os.path.join(os.path.dirname(__file__), clean_path)
             
             if os.path.exists(clean_path):
-                 return Image.open(clean_path).convert("RGB")
+                 stats = os.stat(clean_path)
+                 key = ("file", os.path.abspath(clean_path), stats.st_mtime_ns, stats.st_size)
+                 return _decode_cached(key, lambda: clean_path, use_cache, target_size)
                  
-        # 4. Fallback: Try raw base64 decode if it looks like it
-        return Image.open(BytesIO(base64.b64decode(image_input))).convert("RGB")
+        # 5. Fallback: Try raw base64 decode if it looks like it
+        return _decode_cached(
+            ("b64", content_key(image_input)),
+            lambda: BytesIO(base64.b64decode(image_input)),
+            use_cache, target_size
+        )
     except Exception as e:
         print(f"[ERROR] Failed to decode image: {e}")
         # If it's a small input, it might be ngrok error page HTML
@@ -545,7 +798,35 @@ def decode_image(image_input: str) -> Image.Image:
              print(f"[DEBUG] Small input suspect (HTML?): {image_input}")
         raise ValueError(f"Could not identify or decode image: {str(e)}")
 
-def save_image(image, output_format="png"):
+async def decode_image_async(image_input: str, target_size: SizeHint = None) -> Image.Image:
+    """
+    decode_image for async endpoints. URL inputs are fetched through the
+    pooled async fetcher and decoded in a worker thread, so a slow remote
+    host never blocks the event loop.
+    """
+    if not image_input.startswith("http"):
+        return decode_image(image_input, target_size=target_size)
+    
+    result = await image_fetcher.fetch(image_input)
+    if result.not_modified:
+        image = image_cache.get(_cache_key(("content", result.content_key), target_size))
+        if image is not None:
+            return image
+        # Decoded image was evicted: download the body again
+        image_fetcher.forget(image_input)
+        result = await image_fetcher.fetch(image_input)
+    
+    return await asyncio.to_thread(
+        _decode_cached, ("content", result.content_key), lambda: BytesIO(result.body),
+        True, target_size
+    )
+
+def save_to_drive_timed(filename: str):
+    """Background Drive copy, timed as the 'drive' stage of /generate"""
+    with stage("generate", "drive"):
+        return file_manager.save_to_drive(filename)
+
+def save_image(image, output_format="png", suffix=""):
     timestamp = int(time.time() * 1000)
     fmt = output_format.lower()
     
@@ -559,7 +840,7 @@ def save_image(image, output_format="png"):
         pil_format = "PNG"
         save_params = {"optimize": True}
         
-    filename = f"gen_{timestamp}.{ext}"
+    filename = f"gen_{timestamp}{suffix}.{ext}"
     out_dir = os.path.abspath("outputs")
     os.makedirs(out_dir, exist_ok=True)
     filepath = os.path.join(out_dir, filename)
@@ -597,10 +878,17 @@ def health_check():
     
     cuda_available = torch.cuda.is_available()
     vram_info = {}
+    gpu_name = "CPU Mode"
+    total_bytes = allocated_bytes = 0
     if cuda_available:
+        # Query the device once; properties are cached by gpu_manager
+        props = gpu_manager.device_props.get(0) or torch.cuda.get_device_properties(0)
+        gpu_name = props.name
+        total_bytes = props.total_memory
+        allocated_bytes = torch.cuda.memory_allocated(0)
         vram_info = {
-            "total_vram_gb": round(torch.cuda.get_device_properties(0).total_memory / 1024**3, 2),
-            "allocated_vram_gb": round(torch.cuda.memory_allocated(0) / 1024**3, 2),
+            "total_vram_gb": round(total_bytes / 1024**3, 2),
+            "allocated_vram_gb": round(allocated_bytes / 1024**3, 2),
             "cached_vram_gb": round(torch.cuda.memory_reserved(0) / 1024**3, 2)
         }
     
@@ -609,19 +897,57 @@ def health_check():
         "version": "NovaGen Backend v2.1",
         "gpu": {
             "available": cuda_available,
-            "name": torch.cuda.get_device_name(0) if cuda_available else "CPU Mode",
-            "vram_total": round(torch.cuda.get_device_properties(0).total_memory / 1024**2, 2) if cuda_available else 0, # In MB
-            "vram_used": round(torch.cuda.memory_allocated(0) / 1024**2, 2) if cuda_available else 0  # In MB
+            "name": gpu_name,
+            "vram_total": round(total_bytes / 1024**2, 2), # In MB
+            "vram_used": round(allocated_bytes / 1024**2, 2)  # In MB
         },
         "models": models_status,
         "cuda_available": cuda_available,
         "vram": vram_info
     }
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+# ==================== Profiling (Admin) ====================
+
+class ProfileArmRequest(BaseModel):
+    endpoint: str  # Request path, e.g. "/generate"
+    count: int = 1
+    mode: str = "auto"  # auto, cprofile, torch
+
+@app.post("/admin/profile")
+def arm_profiler(req: ProfileArmRequest):
+    """Profile the next N requests of an endpoint"""
+    try:
+        return request_profiler.arm(req.endpoint, req.count, req.mode)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@app.delete("/admin/profile")
+def disarm_profiler(endpoint: Optional[str] = None):
+    """Disarm profiling for one endpoint (or all if omitted)"""
+    return request_profiler.disarm(endpoint)
+
+@app.get("/admin/profile")
+def get_profiler_status():
+    """Armed endpoints and captured traces"""
+    return request_profiler.status()
+
+@app.get("/admin/profile/traces/{name}")
+def download_trace(name: str):
+    """Download a captured trace file"""
+    path = request_profiler.trace_path(name)
+    if path is None:
+        raise HTTPException(404, "Trace not found")
+    return FileResponse(path, filename=os.path.basename(path))
+
 @app.get("/gpu/status")
 def get_gpu_status():
-    """Detailed GPU statistics for the GPU Monitor component"""
-    return gpu_manager.get_status()
+    """Detailed GPU statistics for the GPU Monitor component, plus training / inference arbitration"""
+    return {**gpu_manager.get_status(), "arbiter": gpu_arbiter.stats()}
 
 @app.get("/modes")
 def get_modes():
@@ -681,6 +1007,7 @@ async def websocket_progress(websocket: WebSocket, job_id: str):
 
 
 @app.post("/generate")
+@gpu_group("main")
 async def generate_image(req: GenerationRequest, background_tasks: BackgroundTasks):
     ensure_main_model_cuda()
     
@@ -706,19 +1033,23 @@ async def generate_image(req: GenerationRequest, background_tasks: BackgroundTas
     # 2. Process Wildcards
     final_prompt = req.prompt
     if req.use_wildcards:
-        final_prompt = process_wildcards(final_prompt)
+        with stage("generate", "wildcards"):
+            final_prompt = process_wildcards(final_prompt)
 
     # 3. Apply Style
     final_negative = req.negative_prompt
     if req.style_id:
-        final_prompt, final_negative = apply_style(final_prompt, final_negative, req.style_id)
+        with stage("generate", "style"):
+            final_prompt, final_negative = apply_style(final_prompt, final_negative, req.style_id)
 
     # 4. Configure Scheduler/Sampler
     if current_sampler:
-        set_scheduler(current_sampler)
+        with stage("generate", "scheduler"):
+            set_scheduler(current_sampler)
 
     # 5. VRAM Optimization
-    optimize_for_generation(pipe)
+    with stage("generate", "optimize"):
+        optimize_for_generation(pipe)
 
     ar_config = get_aspect_ratio_config(req.aspect_ratio)
     
@@ -738,25 +1069,27 @@ async def generate_image(req: GenerationRequest, background_tasks: BackgroundTas
         await progress_cb.set_stage("generating", f"Generating image {i+1}/{req.num_images}")
         
         gen_start = time.time()
-        image = pipe(
-            prompt=final_prompt,
-            negative_prompt=final_negative,
-            num_inference_steps=current_steps,
-            guidance_scale=current_cfg,
-            width=ar_config.width,
-            height=ar_config.height,
-            generator=generator,
-            callback=lambda step, ts, latents: asyncio.create_task(progress_cb(step, ts, latents)),
-            callback_steps=1
-        ).images[0]
+        with stage("generate", "pipeline"):
+            image = pipe(
+                prompt=final_prompt,
+                negative_prompt=final_negative,
+                num_inference_steps=current_steps,
+                guidance_scale=current_cfg,
+                width=ar_config.width,
+                height=ar_config.height,
+                generator=generator,
+                callback=lambda step, ts, latents: asyncio.create_task(progress_cb(step, ts, latents)),
+                callback_steps=1
+            ).images[0]
         track_gen_time(gen_start)
         
         await progress_cb.set_stage("saving", f"Saving image {i+1}/{req.num_images}")
-        filename, filepath = save_image(image, req.output_format)
+        with stage("generate", "save_image"):
+            filename, filepath = save_image(image, req.output_format)
         
         # Auto-save to Drive if enabled
         if SYSTEM_CONFIG["auto_save_drive"]:
-            background_tasks.add_task(file_manager.save_to_drive, filename)
+            background_tasks.add_task(save_to_drive_timed, filename)
 
         result_images.append({
             "url": f"/outputs/{filename}",
@@ -776,6 +1109,7 @@ async def generate_image(req: GenerationRequest, background_tasks: BackgroundTas
     }
 
 @app.post("/img2img")
+@gpu_group("main")
 async def image_to_image(req: Img2ImgRequest):
     """Image-to-Image with Batch Support"""
     ensure_main_model_cuda()
@@ -783,7 +1117,7 @@ async def image_to_image(req: Img2ImgRequest):
     if img2img_pipe.device.type != "cuda": img2img_pipe.to("cuda")
     
     try:
-        init_image = decode_image(req.image)
+        init_image = await decode_image_async(req.image)
     except Exception as e:
         raise HTTPException(400, f"Invalid Image: {str(e)}")
     
@@ -830,12 +1164,14 @@ async def image_to_image(req: Img2ImgRequest):
     }
 
 @app.post("/controlnet")
+@gpu_group("main")
 async def controlnet_generate(req: ControlNetRequest):
     ensure_main_model_cuda()
     load_controlnet_model(req.control_type)
     
     try:
-        init_image = decode_image(req.image)
+        # Conditioning is resized to the generation size downstream
+        init_image = await decode_image_async(req.image, target_size=CONTROLNET_DECODE_SIZE)
         processed_image = preprocess_control_image(init_image, req.control_type)
     except Exception as e:
          raise HTTPException(400, f"Invalid Image: {str(e)}")
@@ -879,31 +1215,23 @@ async def face_swap(req: FaceSwapRequest):
         raise HTTPException(500, "FaceSwap model not available (inswapper_128.onnx missing?)")
         
     try:
-        # Decode images
-        source_pil = decode_image(req.source_image)
-        target_pil = decode_image(req.target_image)
-        
-        source_img = cv2.cvtColor(np.array(source_pil), cv2.COLOR_RGB2BGR)
-        target_img = cv2.cvtColor(np.array(target_pil), cv2.COLOR_RGB2BGR)
+        # Detections are cached per frame, so a source reused across many
+        # targets is detected and embedded once
+        source_face = await _resolve_source_face(req)
         
-        # Detect faces
-        source_faces = face_app.get(source_img)
-        target_faces = face_app.get(target_img)
+        # The target keeps full resolution because the swap is pasted into it
+        target_pil = await decode_image_async(req.target_image)
+        target_img = bgr_array(target_pil)
+        _, target_faces = face_cache.detect(target_img, face_app.get)
         
-        if not source_faces:
-             raise HTTPException(400, "No face detected in source image")
         if not target_faces:
              raise HTTPException(400, "No face detected in target image")
              
-        # Swap (using first detected face for now)
-        source_face = source_faces[0]
-        res_img = target_img.copy()
-        
-        for target_face in target_faces:
-            res_img = face_swapper.get(res_img, target_face, source_face, paste_back=True)
+        # Only the aligned face crops are swapped (batched) and blended back
+        res_img = swap_faces(face_swapper, target_img, target_faces, source_face)
             
         # Save output
-        final_image = Image.fromarray(cv2.cvtColor(res_img, cv2.COLOR_BGR2RGB))
+        final_image = image_from_bgr(res_img)
         filename, filepath = save_image(final_image, req.output_format)
         
         return {
@@ -914,65 +1242,411 @@ async def face_swap(req: FaceSwapRequest):
             "status": "success"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"FaceSwap error: {e}")
         raise HTTPException(500, f"FaceSwap failed: {str(e)}")
 
+async def _detect_source_faces(image_input: str, detect=None):
+    """
+    Decode a source image and detect its faces (cached by frame hash).
+    `detect(frame)` is an async override, e.g. to run on the session pool.
+    """
+    # Only the source face embedding is used, so it can be decoded smaller
+    source_pil = await decode_image_async(image_input, target_size=FACE_SOURCE_DECODE_SIZE)
+    frame = bgr_array(source_pil)
+    if detect is not None:
+        return await detect(frame)
+    return face_cache.detect(frame, face_app.get)
+
+async def _resolve_source_face(req, detect=None):
+    """Source face from a registered id or from the source image"""
+    if req.source_face_id:
+        face = face_cache.get_source(req.source_face_id)
+        if face is None:
+            raise HTTPException(404, f"Unknown source face id: {req.source_face_id}")
+        return face
+    if not req.source_image:
+        raise HTTPException(422, "Either source_image or source_face_id is required")
+    
+    _, source_faces = await _detect_source_faces(req.source_image, detect)
+    if not source_faces:
+         raise HTTPException(400, "No face detected in source image")
+    if not 0 <= req.source_face_index < len(source_faces):
+         raise HTTPException(400, f"Source face index out of range ({len(source_faces)} face(s) detected)")
+    return source_faces[req.source_face_index]
+
+# Upper bound on targets per batch request
+FACESWAP_BATCH_MAX = 1000
+
+def _batch_local_path(path: str) -> str:
+    """Resolve a local batch input, refusing paths outside the project"""
+    root = os.path.realpath(os.getcwd())
+    resolved = os.path.realpath(os.path.join(root, path.lstrip("/")))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HTTPException(400, f"Path outside the project: {path}")
+    return resolved
+
+def _batch_targets(req: FaceSwapBatchRequest, directory: Optional[str], archive_path: Optional[str]):
+    """Lazily yield (index, name, load) for every target of a batch"""
+    index = 0
+    for i, image_input in enumerate(req.target_images):
+        yield index, f"target_images[{i}]", lambda image_input=image_input: decode_image(image_input, use_cache=False)
+        index += 1
+    
+    if directory:
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                path = os.path.join(directory, name)
+                yield index, name, lambda path=path: open_rgb(path)
+                index += 1
+    
+    if archive_path:
+        for name, data in iter_archive_images(archive_path, upload_store.max_bytes):
+            yield index, name, lambda data=data: open_rgb(BytesIO(data))
+            index += 1
+
+def _swap_batch_item(source_face, output_format: str, batch_id: str, worker, item) -> dict:
+    """Swap one batch target on a pool worker (runs in a pool thread)"""
+    index, name, load = item
+    result = {"index": index, "name": name}
+    try:
+        target_img = bgr_array(load())
+        # Batch targets are one-off, so they bypass the face cache
+        target_faces = worker.analyzer.get(target_img)
+        if not target_faces:
+            return {**result, "error": "No face detected in target image"}
+        res_img = swap_faces(worker.swapper, target_img, target_faces, source_face)
+        filename, _ = save_image(image_from_bgr(res_img), output_format, suffix=f"_{batch_id}_{index}")
+        return {**result, "url": f"/outputs/{filename}", "faces": len(target_faces)}
+    except Exception as e:
+        return {**result, "error": str(e)}
+
+async def _pool_detect(frame):
+    return await faceswap_pool.run(lambda worker, _: face_cache.detect(frame, worker.analyzer.get))
+
+@app.post("/faceswap/batch")
+async def face_swap_batch(req: FaceSwapBatchRequest):
+    """
+    Swap one source face onto many targets (list, directory and/or archive)
+    using the CPU session pool. Streams NDJSON: one line per target as it
+    finishes (in completion order, with its index), then a summary line.
+    """
+    if not faceswap_pool.model_available():
+        raise HTTPException(500, "FaceSwap model not available (inswapper_128.onnx missing?)")
+    
+    directory = archive_path = None
+    if req.target_dir:
+        directory = _batch_local_path(req.target_dir)
+        if not os.path.isdir(directory):
+            raise HTTPException(400, f"Not a directory: {req.target_dir}")
+    if req.target_archive:
+        archive_path = (
+            upload_store.resolve(req.target_archive)
+            if req.target_archive.startswith(UPLOAD_REF_PREFIX)
+            else _batch_local_path(req.target_archive)
+        )
+        if archive_path is None or not os.path.isfile(archive_path):
+            raise HTTPException(400, f"Unknown archive: {req.target_archive}")
+    
+    source_face = await _resolve_source_face(req, detect=_pool_detect)
+    batch_id = uuid.uuid4().hex[:8]
+    
+    def limited_targets():
+        for item in _batch_targets(req, directory, archive_path):
+            if item[0] >= FACESWAP_BATCH_MAX:
+                raise ValueError(f"Batch exceeds {FACESWAP_BATCH_MAX} targets")
+            yield item
+    
+    async def stream():
+        start = time.perf_counter()
+        total = succeeded = 0
+        try:
+            async for result in faceswap_pool.imap_unordered(
+                lambda worker, item: _swap_batch_item(source_face, req.output_format, batch_id, worker, item),
+                limited_targets()
+            ):
+                total += 1
+                succeeded += "error" not in result
+                yield json.dumps(result) + "\n"
+        except ValueError as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+        yield json.dumps({
+            "done": True,
+            "total": total,
+            "succeeded": succeeded,
+            "elapsed": round(time.perf_counter() - start, 3)
+        }) + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+# Finished background jobs kept for polling, per job table
+MAX_FINISHED_JOBS = 50
+
+def _prune_jobs(jobs: Dict[str, dict]):
+    """Forget the oldest finished jobs beyond MAX_FINISHED_JOBS"""
+    finished = [job_id for job_id, job in jobs.items() if job["status"] != "running"]
+    for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+        jobs.pop(job_id, None)
+
+# Sequence (video / GIF) face swap jobs
+sequence_jobs: Dict[str, dict] = {}
+sequence_cancel: Dict[str, threading.Event] = {}
+
+@app.post("/faceswap/sequence")
+async def face_swap_sequence(req: FaceSwapSequenceRequest, background_tasks: BackgroundTasks):
+    """
+    Swap a face across a video, GIF or archive of frames. Runs as a
+    background job: poll GET /faceswap/sequence/{job_id} or subscribe to
+    /ws/progress/{job_id}.
+    """
+    load_faceswap_models()
+    if face_swapper is None:
+        raise HTTPException(500, "FaceSwap model not available (inswapper_128.onnx missing?)")
+    if req.output and req.output not in OUTPUT_KINDS:
+        raise HTTPException(400, f"output must be one of {', '.join(OUTPUT_KINDS)}")
+    
+    input_path = (
+        upload_store.resolve(req.input)
+        if req.input.startswith(UPLOAD_REF_PREFIX)
+        else _batch_local_path(req.input)
+    )
+    if input_path is None or not os.path.isfile(input_path):
+        raise HTTPException(400, f"Unknown sequence input: {req.input}")
+    
+    # The source embedding is resolved once and reused for every frame.
+    # Resolved before opening the input: an unstarted frame generator never
+    # releases its video capture if the request fails here
+    source_face = await _resolve_source_face(req)
+    try:
+        frames, fps, input_kind = open_frames(input_path)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    
+    job_id = f"seq_{uuid.uuid4().hex[:12]}"
+    output_kind = req.output or input_kind
+    sink, output_path = make_sink(output_kind, os.path.abspath("outputs"), job_id, fps)
+    cancel = sequence_cancel[job_id] = threading.Event()
+    job = sequence_jobs[job_id] = {
+        "status": "running",
+        "output": output_kind,
+        "url": f"/outputs/{os.path.basename(output_path)}",
+        "frames": 0,
+        "fps": 0.0
+    }
+    
+    async def run_sequence():
+        loop = asyncio.get_running_loop()
+        
+        def progress(stats):
+            job.update(stats.to_dict())
+            if stats.frames % 10 == 0:
+                asyncio.run_coroutine_threadsafe(
+                    ws_manager.broadcast_event(job_id, "sequence_progress", **stats.to_dict()), loop
+                )
+        
+        try:
+            stats = await asyncio.to_thread(
+                swap_sequence, frames, face_app.get,
+                lambda frame, faces: swap_faces(face_swapper, frame, faces, source_face),
+                sink, req.keyframe_interval,
+                max_frames=req.max_frames, progress=progress, cancel=cancel
+            )
+            job.update(stats.to_dict(), status="completed")
+            await ws_manager.broadcast_event(job_id, "sequence_complete", url=job["url"], **stats.to_dict())
+        except SequenceCancelled:
+            job["status"] = "cancelled"
+        except Exception as e:
+            job.update(status="failed", error=str(e))
+            await ws_manager.broadcast_event(job_id, "error", message=str(e))
+        finally:
+            sequence_cancel.pop(job_id, None)
+            _prune_jobs(sequence_jobs)
+    
+    background_tasks.add_task(run_sequence)
+    return {"status": "started", "job_id": job_id, **job}
+
+@app.get("/faceswap/sequence/{job_id}")
+def get_face_swap_sequence(job_id: str):
+    if job_id not in sequence_jobs:
+        raise HTTPException(404, "Sequence job not found")
+    return sequence_jobs[job_id]
+
+@app.delete("/faceswap/sequence/{job_id}")
+def cancel_face_swap_sequence(job_id: str):
+    cancel = sequence_cancel.get(job_id)
+    if cancel is None:
+        raise HTTPException(404, "No running sequence job with this id")
+    cancel.set()
+    return {"status": "cancelling"}
+
+@app.get("/faceswap/pool")
+def face_swap_pool_status():
+    return faceswap_pool.stats()
+
+@app.post("/faceswap/sources")
+async def register_face_source(req: FaceSourceRequest):
+    """Detect a source face once; later /faceswap calls pass source_face_id"""
+    load_faceswap_models()
+    if face_app is None:
+        raise HTTPException(500, "Face analysis model not available")
+    
+    key, faces = await _detect_source_faces(req.image)
+    if not faces:
+        raise HTTPException(400, "No face detected in source image")
+    try:
+        face_id = face_cache.register_source(key, faces, req.face_index)
+    except IndexError as e:
+        raise HTTPException(400, str(e))
+    
+    return {
+        "face_id": face_id,
+        "face": face_summary(faces[req.face_index]),
+        "faces_detected": len(faces),
+        "status": "success"
+    }
+
+@app.delete("/faceswap/sources/{face_id}")
+async def delete_face_source(face_id: str):
+    if not face_cache.remove_source(face_id):
+        raise HTTPException(404, f"Unknown source face id: {face_id}")
+    return {"status": "success"}
+
+
+async def _upscale_input(req: UpscaleRequest) -> Image.Image:
+    """Decode the /upscale input - try the local file first if a filename is given"""
+    if req.filename:
+        target_path = os.path.join("outputs", os.path.basename(req.filename))
+        if os.path.exists(target_path):
+            print(f"[DEBUG] Using local file for upscale: {target_path}")
+            return decode_image(os.path.abspath(target_path))
+        raise ValueError(f"Local file not found: {target_path}")
+    if req.image:
+        return await decode_image_async(req.image)
+    raise HTTPException(400, "Must provide either image data or filename")
 
 @app.post("/upscale")
 async def upscale_image(req: UpscaleRequest):
-    """Upscale image using Stable Diffusion x4 Upscaler"""
-    # 1. Offload heavy models using local server helper
-    offload_main_models()
-
-    if get_upscaler_pipe() is None:
-        load_upscaler_model()
+    """Upscale image using Stable Diffusion x4 Upscaler, or a fast mode"""
+    if req.mode:
+        return await fast_upscale_image(req)
     
-    upscale_pipe = get_upscaler_pipe()
-    if upscale_pipe is None:
-        raise HTTPException(500, "Upscaler model not available")
+    try:
+        init_image = await _upscale_input(req)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    
+    # Upscale tile by tile so memory depends on the tile size, not the image
+    def upscale_tiles(tiles):
+        return get_upscaler_pipe()(
+            prompt=[req.prompt] * len(tiles),
+            image=tiles,
+            num_inference_steps=req.num_inference_steps
+        ).images
     
-    # Ensure upscaler is on CUDA
-    if upscale_pipe.device.type != "cuda":
-        upscale_pipe.to("cuda")
-
     try:
-        # Decode image - Try Local First if filename provided
-        if req.filename:
-            target_path = os.path.join("outputs", os.path.basename(req.filename))
-            if os.path.exists(target_path):
-                print(f"[DEBUG] Using local file for upscale: {target_path}")
-                init_image = Image.open(target_path).convert("RGB")
-            else:
-                raise ValueError(f"Local file not found: {target_path}")
-        elif req.image:
-            init_image = decode_image(req.image)
-        else:
-            raise HTTPException(400, "Must provide either image data or filename")
-        
-        # Upscale
-        upscaled = upscale_pipe(
-            prompt=req.prompt,
-            image=init_image,
-            num_inference_steps=25
-        ).images[0]
-        
-        # Save
+        upscaler = TiledUpscaler(
+            upscale_tiles, scale=4, tile=req.tile_size, overlap=req.tile_overlap,
+            blend=req.tile_blend, batch_size=req.tile_batch
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    job_id = req.job_id or f"upscale_{uuid.uuid4().hex[:12]}"
+    loop = asyncio.get_running_loop()
+    
+    def progress(done, total):
+        asyncio.run_coroutine_threadsafe(
+            ws_manager.broadcast_event(
+                job_id, "tile_complete", tile=done, total_tiles=total,
+                progress=round(done / total * 100, 2)
+            ),
+            loop
+        )
+    
+    try:
+        # The upscaler stays resident between calls; model_residency swaps
+        # the main pipelines back once, when they are next needed
+        async with model_residency.use("upscaler"), gpu_arbiter.inference():
+            upscaled = await asyncio.to_thread(upscaler.run, init_image, progress)
         filename, filepath = save_image(upscaled, req.output_format)
-        
-        # Offload
-        offload_upscaler()
-
-        return {
-            "image": {
-                "url": f"/outputs/{filename}",
-                "seed": 0
-            },
-            "status": "success"
-        }
     except Exception as e:
         print(f"Upscale error: {e}")
         raise HTTPException(500, f"Upscale failed: {str(e)}")
+    
+    await ws_manager.broadcast_event(job_id, "complete", success=True, url=f"/outputs/{filename}")
+    return {
+        "image": {
+            "url": f"/outputs/{filename}",
+            "seed": 0
+        },
+        "job_id": job_id,
+        "status": "success"
+    }
+
+async def fast_upscale_image(req: UpscaleRequest):
+    """Resampler / ONNX super-resolution upscale; never touches the diffusion pipeline"""
+    try:
+        image = await _upscale_input(req)
+        upscaled, info = await asyncio.to_thread(fast_upscaler.upscale, image, req.mode, req.scale)
+        filename, filepath = save_image(upscaled, req.output_format)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    
+    return {
+        "image": {
+            "url": f"/outputs/{filename}",
+            "seed": 0
+        },
+        "width": upscaled.width,
+        "height": upscaled.height,
+        **info,
+        "status": "success"
+    }
+
+@app.get("/upscale/modes")
+def upscale_modes():
+    return fast_upscaler.stats()
+
+def _caption_batch(images: List[Image.Image]) -> List[str]:
+    """One BLIP forward pass for a batch of images (the processor resizes all to 384px)"""
+    inputs = blip_processor(images=images, return_tensors="pt").to(blip_model.device)
+    inputs["pixel_values"] = inputs["pixel_values"].to(blip_model.dtype)
+    with torch.inference_mode():
+        out = blip_model.generate(**inputs, max_length=50)
+    return blip_processor.batch_decode(out, skip_special_tokens=True)
+
+# Concurrent /interrogate requests are captioned together. On CPU, batches
+# past 4 stop paying off (benchmarks/bench_interrogate.py)
+BLIP_MAX_BATCH = 8 if torch.cuda.is_available() else 4
+BLIP_MAX_WAIT = 0.01  # Seconds the first request waits for company
+INTERROGATE_BATCH_MAX = 256
+blip_batcher = MicroBatcher(_caption_batch, max_batch=BLIP_MAX_BATCH, max_wait=BLIP_MAX_WAIT, name="blip")
+
+# Cached captions are keyed by pixels + this string; change it when the
+# model or generation settings change
+BLIP_CAPTIONER = f"{BLIP_MODEL_ID}|max_length=50"
+
+def _blip_captioner() -> str:
+    # int8 captions can differ slightly from fp32 ones; cache them separately
+    backend = _aux_backend()
+    return BLIP_CAPTIONER if backend == "fp32" else f"{BLIP_CAPTIONER}|{backend}"
+
+async def _caption_image(image: Image.Image) -> Tuple[str, bool]:
+    """(caption, served from the caption store)"""
+    captioner = _blip_captioner()
+
+    def lookup():
+        # Hashing and the sqlite read stay off the event loop
+        image_hash = frame_key(rgb_array(image))
+        return image_hash, caption_store.get(image_hash, captioner)
+
+    image_hash, caption = await asyncio.to_thread(lookup)
+    if caption is not None:
+        return caption, True
+    caption = await blip_batcher.submit(image)
+    await asyncio.to_thread(caption_store.put, image_hash, captioner, caption)
+    return caption, False
 
 @app.post("/interrogate")
 async def interrogate_image(req: InterrogateRequest):
@@ -984,17 +1658,15 @@ async def interrogate_image(req: InterrogateRequest):
         return {"caption": "", "error": "BLIP model not available"}
     
     try:
-        # Decode image
-        image_data = base64.b64decode(req.image.split(',')[1] if ',' in req.image else req.image)
-        image = Image.open(BytesIO(image_data)).convert("RGB")
+        # Decode image (BLIP only needs ~384px)
+        image = await decode_image_async(req.image, target_size=BLIP_DECODE_SIZE)
         
-        # Generate caption
-        inputs = blip_processor(image, return_tensors="pt").to(blip_model.device)
-        out = blip_model.generate(**inputs, max_length=50)
-        caption = blip_processor.decode(out[0], skip_special_tokens=True)
+        # Generate caption (cached by content, batched with concurrent requests)
+        caption, cached = await _caption_image(image)
         
         return {
             "caption": caption,
+            "cached": cached,
             "status": "success"
         }
     except Exception as e:
@@ -1005,66 +1677,291 @@ async def interrogate_image(req: InterrogateRequest):
             "status": "error"
         }
 
+@app.post("/interrogate/batch")
+async def interrogate_batch(req: InterrogateBatchRequest):
+    """Caption many images; results come back in request order"""
+    if len(req.images) > INTERROGATE_BATCH_MAX:
+        raise HTTPException(400, f"At most {INTERROGATE_BATCH_MAX} images per batch")
+    if blip_model is None:
+        load_blip_model()
+    if blip_model is None:
+        raise HTTPException(500, "BLIP model not available")
+    
+    async def caption_one(image_input: str) -> dict:
+        try:
+            image = await decode_image_async(image_input, target_size=BLIP_DECODE_SIZE)
+            caption, cached = await _caption_image(image)
+            return {"caption": caption, "cached": cached, "status": "success"}
+        except Exception as e:
+            return {"caption": "", "error": str(e), "status": "error"}
+    
+    start = time.perf_counter()
+    results = await asyncio.gather(*(caption_one(image) for image in req.images))
+    return {
+        "results": results,
+        "total": len(results),
+        "succeeded": sum(r["status"] == "success" for r in results),
+        "elapsed": round(time.perf_counter() - start, 3),
+        "status": "success"
+    }
+
+@app.get("/interrogate/batching")
+def interrogate_batching():
+    return blip_batcher.stats()
+
+# Dataset auto-captioning jobs
+caption_jobs: Dict[str, dict] = {}
+caption_cancel: Dict[str, threading.Event] = {}
+
+@app.post("/dataset/caption")
+async def caption_dataset(req: DatasetCaptionRequest, background_tasks: BackgroundTasks):
+    """
+    Write BLIP captions as .txt sidecars for every image in
+    datasets/<project_name>. Resumable: images that already have a
+    sidecar are skipped unless overwrite is set. Progress on
+    /ws/progress/{job_id}.
+    """
+    try:
+        dataset_dir = dataset_path(req.project_name)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if not os.path.isdir(dataset_dir):
+        raise HTTPException(404, f"Dataset not found: {req.project_name}")
+    if any(job["status"] == "running" and job["project_name"] == req.project_name for job in caption_jobs.values()):
+        raise HTTPException(409, f"A captioning job is already running for {req.project_name}")
+    if blip_model is None:
+        load_blip_model()
+    if blip_model is None:
+        raise HTTPException(500, "BLIP model not available")
+    
+    job_id = f"caption_{uuid.uuid4().hex[:12]}"
+    cancel = caption_cancel[job_id] = threading.Event()
+    job = caption_jobs[job_id] = {"status": "running", "project_name": req.project_name}
+    
+    async def run_caption_job():
+        last_sent = 0.0
+        
+        def progress(stats):
+            nonlocal last_sent
+            job.update(stats.to_dict())
+            now = time.perf_counter()
+            if now - last_sent >= 0.5 or stats.done == stats.total:
+                last_sent = now
+                asyncio.ensure_future(ws_manager.broadcast_event(job_id, "caption_progress", **stats.to_dict()))
+        
+        try:
+            stats = await caption_directory(
+                dataset_dir, lambda image: blip_batcher.submit(image), caption_store, _blip_captioner(),
+                decode_size=BLIP_DECODE_SIZE, max_in_flight=BLIP_MAX_BATCH * 2,
+                overwrite=req.overwrite, prefix=req.prefix, progress=progress, cancel=cancel
+            )
+            job.update(stats.to_dict(), status="completed")
+            await ws_manager.broadcast_event(job_id, "caption_complete", **stats.to_dict())
+        except CaptionJobCancelled:
+            job["status"] = "cancelled"
+        except Exception as e:
+            job.update(status="failed", error=str(e))
+            await ws_manager.broadcast_event(job_id, "error", message=str(e))
+        finally:
+            caption_cancel.pop(job_id, None)
+            _prune_jobs(caption_jobs)
+    
+    background_tasks.add_task(run_caption_job)
+    return {"status": "started", "job_id": job_id}
+
+@app.get("/dataset/caption/{job_id}")
+def get_caption_job(job_id: str):
+    if job_id not in caption_jobs:
+        raise HTTPException(404, "Caption job not found")
+    return caption_jobs[job_id]
+
+@app.delete("/dataset/caption/{job_id}")
+def cancel_caption_job(job_id: str):
+    cancel = caption_cancel.get(job_id)
+    if cancel is None:
+        raise HTTPException(404, "No running caption job with this id")
+    cancel.set()
+    return {"status": "cancelling"}
+
+@app.get("/dataset/stats/{project_name}")
+async def get_dataset_stats(project_name: str, batch_size: int = 4, resolution: int = 1024):
+    """
+    Aspect-ratio bucket report for datasets/<project_name>: images per
+    bucket, batches per epoch at `batch_size` and pixels lost to cropping,
+    bucketed vs a fixed square crop. Reads image headers only.
+    """
+    try:
+        dataset_dir = dataset_path(project_name)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if not os.path.isdir(dataset_dir):
+        raise HTTPException(404, f"Dataset not found: {project_name}")
+    if batch_size < 1 or resolution < 256 or resolution % 64:
+        raise HTTPException(400, "batch_size must be >= 1 and resolution a multiple of 64 (>= 256)")
+    dataset = await asyncio.to_thread(BucketedImageDataset.from_directory, dataset_dir, "", resolution)
+    return dataset_stats(dataset, batch_size)
+
+# One bulk ingest per dataset at a time
+ingest_locks: Dict[str, asyncio.Lock] = {}
+INGEST_WORKERS = min(8, os.cpu_count() or 1)
+
+@app.post("/dataset/ingest/{project_name}")
+async def ingest_dataset(
+    project_name: str,
+    request: Request,
+    upload: Optional[str] = None,
+    max_distance: int = 4,
+    max_side: int = 2048
+):
+    """
+    Bulk-add images to datasets/<project_name> from a zip / tar(.gz|.bz2|.xz)
+    request body, or from an archive already uploaded via /uploads
+    (?upload=upload:<id>). Tar bodies are extracted while they arrive.
+    Images are validated and normalized in a worker pool, near-duplicates
+    (dHash distance <= max_distance) are dropped and .txt members become
+    caption sidecars.
+    """
+    try:
+        dataset_dir = dataset_path(project_name)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if not 0 <= max_distance <= 64 or max_side < 256:
+        raise HTTPException(400, "max_distance must be 0-64 and max_side >= 256")
+    lock = ingest_locks.setdefault(dataset_dir, asyncio.Lock())
+    if lock.locked():
+        raise HTTPException(409, f"An ingest is already running for {project_name}")
+    
+    async with lock:
+        options = dict(workers=INGEST_WORKERS, max_side=max_side, max_distance=max_distance,
+                       max_member_bytes=upload_store.max_bytes)
+        try:
+            if upload:
+                archive_path = upload_store.resolve(upload)
+                if archive_path is None:
+                    raise HTTPException(404, f"Upload not found: {upload}")
+                
+                def ingest_file():
+                    with open(archive_path, "rb") as f:
+                        return ingest_archive(f, dataset_dir, **options)
+                stats = await asyncio.to_thread(ingest_file)
+            else:
+                reader = AsyncStreamReader(request.stream(), asyncio.get_running_loop(), upload_store.max_archive_bytes)
+                stats = await asyncio.to_thread(ingest_archive, reader, dataset_dir, **options)
+        except UploadTooLarge as e:
+            raise HTTPException(413, str(e))
+        except (ValueError, tarfile.TarError, zipfile.BadZipFile) as e:
+            raise HTTPException(400, f"Invalid archive: {e}")
+    
+    result = stats.to_dict()
+    print(f"📦 Ingested {result['written']}/{result['received']} images into {dataset_dir} "
+          f"({result['images_per_second']} img/s, {result['duplicates']} duplicates, {result['invalid']} invalid)")
+    return {"status": "success", "project_name": project_name, **result}
+
+
 @app.post("/dataset/upload")
 async def upload_dataset(req: DatasetUploadRequest):
     """Save training image to project folder"""
     try:
         # Create dataset dir
-        dataset_dir = os.path.join("datasets", req.project_name)
+        dataset_dir = dataset_path(req.project_name)
         os.makedirs(dataset_dir, exist_ok=True)
+        filepath = os.path.join(dataset_dir, os.path.basename(req.filename))
         
-        # Decode and save
-        image_data = base64.b64decode(req.image.split(',')[1] if ',' in req.image else req.image)
-        image = Image.open(BytesIO(image_data)).convert("RGB")
-        
-        filepath = os.path.join(dataset_dir, req.filename)
-        image.save(filepath, format="PNG")
+        def save():
+            # Decode and save (base64 or upload:<id> reference)
+            image = decode_image(req.image, use_cache=False)
+            image.save(filepath, format="PNG")
         
+        await asyncio.to_thread(save)
         return {"status": "success", "path": filepath}
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     except Exception as e:
         print(f"Dataset upload error: {e}")
         raise HTTPException(500, f"Upload failed: {str(e)}")
 
 
 
+PROMPT_ENHANCE_SYSTEM = """You are an expert AI image generation prompt engineer. Enhance the user's simple prompt into a detailed, vivid description optimized for Stable Diffusion XL. Add artistic details, lighting, composition, and style elements while preserving the core intent. Keep it under 150 words. Return ONLY the enhanced prompt, no explanations."""
+
+# Identical concurrent prompts share one generation; reproducible results are cached
+enhance_cache: SingleFlightCache[str] = SingleFlightCache(max_entries=2048, name="enhance_prompt")
+# Phi-3 decode loop: shared system-prompt KV prefix, continuous batching
+PHI3_MAX_BATCH = 8 if torch.cuda.is_available() else 4
+phi3_server: Optional[LLMServer] = None
+
+def _enhance_key(req: PromptEnhanceRequest) -> tuple:
+    prompt = " ".join(req.prompt.split())
+    if req.deterministic:
+        return (prompt, "greedy", req.max_new_tokens)
+    return (prompt, req.temperature, req.top_p, req.max_new_tokens, req.seed)
+
+def _enhance_prompt_ids(prompt: str) -> List[int]:
+    messages = [
+        {"role": "system", "content": PROMPT_ENHANCE_SYSTEM},
+        {"role": "user", "content": f"Enhance this prompt: {prompt}"}
+    ]
+    return list(phi3_tokenizer.apply_chat_template(messages, add_generation_prompt=True))
+
+def _phi3_eos_ids() -> List[int]:
+    eos = getattr(phi3_pipe.generation_config, "eos_token_id", None)
+    ids = list(eos) if isinstance(eos, (list, tuple)) else [eos]
+    ids.append(phi3_tokenizer.eos_token_id)
+    return [i for i in ids if i is not None]
+
+async def _generate_enhanced_prompt(req: PromptEnhanceRequest, streamer: Optional[AsyncTextStreamer] = None) -> Measured:
+    # The streamer also decides when to stop: the enhanced prompt is one
+    # paragraph, anything after it (notes, explanations) is not generated
+    if streamer is None:
+        streamer = _enhance_streamer(req)
+    generation = await phi3_server.generate(
+        _enhance_prompt_ids(req.prompt),
+        max_new_tokens=req.max_new_tokens,
+        do_sample=not req.deterministic,
+        temperature=req.temperature,
+        top_p=req.top_p,
+        seed=req.seed,
+        streamer=streamer
+    )
+    # Report generation time only (not queueing) as the cost cache hits save
+    return Measured(streamer.text.strip(), generation.seconds)
+
+def _enhance_streamer(req: PromptEnhanceRequest, loop: Optional[asyncio.AbstractEventLoop] = None) -> AsyncTextStreamer:
+    return AsyncTextStreamer(
+        lambda ids: phi3_tokenizer.decode(ids, skip_special_tokens=True),
+        loop=loop,
+        max_tokens=req.max_new_tokens,
+        skip_prompt=False
+    )
+
+async def _ensure_phi3():
+    global phi3_server
+    # Loaded lazily so cache hits never wait for the model
+    if phi3_pipe is None:
+        await asyncio.to_thread(load_phi3_model)
+    if phi3_pipe is None:
+        raise RuntimeError("Phi-3 model not available")
+    if phi3_server is None:
+        phi3_server = LLMServer(phi3_pipe, eos_token_ids=_phi3_eos_ids(), max_batch=PHI3_MAX_BATCH, name="phi3")
+        # Every enhance prompt starts with the system prompt and chat template
+        phi3_server.set_prefix(_enhance_prompt_ids(""))
+
 @app.post("/enhance-prompt")
 async def enhance_prompt(req: PromptEnhanceRequest):
     """Enhance user prompt using Phi-3 Mini LLM"""
-    if phi3_pipe is None:
-        load_phi3_model()
+    cacheable = req.deterministic or req.seed is not None
     
-    if phi3_pipe is None:
-        return {"enhanced_prompt": req.prompt, "error": "Phi-3 model not available"}
+    async def generate() -> Measured:
+        await _ensure_phi3()
+        return await _generate_enhanced_prompt(req)
     
     try:
-        system_prompt = """You are an expert AI image generation prompt engineer. Enhance the user's simple prompt into a detailed, vivid description optimized for Stable Diffusion XL. Add artistic details, lighting, composition, and style elements while preserving the core intent. Keep it under 150 words. Return ONLY the enhanced prompt, no explanations."""
-        
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Enhance this prompt: {req.prompt}"}
-        ]
-        
-        inputs = phi3_tokenizer.apply_chat_template(
-            messages,
-            add_generation_prompt=True,
-            return_tensors="pt"
-        ).to(phi3_pipe.device)
-        
-        outputs = phi3_pipe.generate(
-            inputs,
-            max_new_tokens=200,
-            temperature=0.7,
-            top_p=0.9,
-            do_sample=True,
-            pad_token_id=phi3_tokenizer.eos_token_id
-        )
-        
-        response = phi3_tokenizer.decode(outputs[0][inputs.shape[1]:], skip_special_tokens=True)
-        enhanced = response.strip()
+        enhanced, source = await enhance_cache.run(_enhance_key(req), generate, cacheable)
         
         return {
             "enhanced_prompt": enhanced,
             "original_prompt": req.prompt,
+            "source": source, # cache / shared / computed
             "status": "success"
         }
     except Exception as e:
@@ -1075,95 +1972,198 @@ async def enhance_prompt(req: PromptEnhanceRequest):
             "status": "error"
         }
 
-# Simple training job store
-training_jobs = {}
-
-@app.post("/train")
-async def start_training_endpoint(req: TrainingRequest, background_tasks: BackgroundTasks):
-    """Start training job"""
-    job_id = f"train_{int(datetime.now().timestamp())}"
-    training_jobs[job_id] = {
-        "status": "training",
-        "progress": 0,
-        "current_step": 0,
-        "total_steps": req.steps,
-        "loss": 0.0,
-        "elapsed_time": "00:00",
-        "logs": ["Job initialized.", "Starting training process..."]
-    }
+# Running /enhance-prompt/stream generations, by stream id (for cancellation)
+enhance_streams: Dict[str, AsyncTextStreamer] = {}
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/enhance-prompt/stream")
+async def enhance_prompt_stream(req: PromptEnhanceRequest):
+    """
+    Server-sent events: `start` (stream id), a `token` event per decoded
+    piece of text as Phi-3 produces it, then `done` with the full prompt
+    and stop reason (or `error`). Disconnecting or
+    DELETE /enhance-prompt/stream/{stream_id} stops generation.
+    """
+    cacheable = req.deterministic or req.seed is not None
+    key = _enhance_key(req)
+    stream_id = uuid.uuid4().hex[:8]
     
-    def run_train(jid):
-        import subprocess
+    async def events():
+        start = time.perf_counter()
+        yield _sse("start", {"stream_id": stream_id})
+        
+        cached = enhance_cache.lookup(key) if cacheable else None
+        if cached is not None:
+            yield _sse("token", {"text": cached})
+            yield _sse("done", {
+                "enhanced_prompt": cached,
+                "original_prompt": req.prompt,
+                "source": CACHED,
+                "elapsed": round(time.perf_counter() - start, 3)
+            })
+            return
+        
+        streamer = None
         try:
-            training_jobs[jid]["logs"].append("Training process spawned.")
-            process = subprocess.Popen([
-                "python", "train_connector.py",
-                "--project_name", req.project_name,
-                "--max_train_steps", str(req.steps)
-            ], stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-            
-            while True:
-                line = process.stdout.readline()
-                if line == '' and process.poll() is not None:
-                    break
-                if line:
-                    line = line.strip()
-                    if line.startswith("PROGRESS:"):
-                        try:
-                            training_jobs[jid]["progress"] = int(line.split(":")[1].strip())
-                        except: pass
-                    elif line.startswith("METRICS:"):
-                        try:
-                            # METRICS: loss=0.1500 steps=1/100
-                            parts = line.split(":")[1].strip().split()
-                            for part in parts:
-                                if part.startswith("loss="):
-                                    training_jobs[jid]["loss"] = float(part.split("=")[1])
-                                elif part.startswith("steps="):
-                                    training_jobs[jid]["current_step"] = int(part.split("=")[1].split("/")[0])
-                        except: pass
-                    elif line.startswith("LOG:"):
-                         training_jobs[jid]["logs"].append(line.split(":", 1)[1].strip())
-                    elif line:
-                         training_jobs[jid]["logs"].append(line)
-            
-            if process.returncode == 0:
-                training_jobs[jid]["status"] = "completed"
-                training_jobs[jid]["progress"] = 100
-                training_jobs[jid]["logs"].append("Training completed successfully.")
-            else:
-                training_jobs[jid]["status"] = "failed"
-                training_jobs[jid]["logs"].append("Training process exited with error.")
+            await _ensure_phi3()
+            streamer = _enhance_streamer(req, asyncio.get_running_loop())
+            enhance_streams[stream_id] = streamer
+            task = asyncio.ensure_future(_generate_enhanced_prompt(req, streamer))
+            # Errors also reach the streamer; don't warn when a disconnect leaves it unawaited
+            task.add_done_callback(lambda f: f.cancelled() or f.exception())
+            first = True
+            async for text in streamer:
+                if first:
+                    metrics.llm_first_token_duration.observe(time.perf_counter() - start, "phi3")
+                    first = False
+                yield _sse("token", {"text": text})
+            result = await task
+            if cacheable and not streamer.cancelled:
+                enhance_cache.put(key, result.value, result.seconds)
+            yield _sse("done", {
+                "enhanced_prompt": result.value,
+                "original_prompt": req.prompt,
+                "source": COMPUTED,
+                **streamer.stats()
+            })
         except Exception as e:
-            training_jobs[jid]["status"] = "failed"
-            training_jobs[jid]["logs"].append(f"Internal Error: {str(e)}")
+            print(f"⚠️ Error streaming enhanced prompt: {e}")
+            yield _sse("error", {"error": str(e), "enhanced_prompt": req.prompt})
+        finally:
+            # Client gone (or done): generation stops at the next token
+            if streamer is not None:
+                streamer.stop()
+            enhance_streams.pop(stream_id, None)
     
-    background_tasks.add_task(run_train, job_id)
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/enhance-prompt/stream/{stream_id}")
+async def cancel_enhance_stream(stream_id: str):
+    """Stop a streaming generation; the stream ends with what was produced so far"""
+    streamer = enhance_streams.get(stream_id)
+    if streamer is None:
+        raise HTTPException(404, "No running stream with this id")
+    streamer.stop()
+    return {"status": "cancelling"}
+
+@app.get("/enhance-prompt/stats")
+def enhance_prompt_stats():
+    """Cache / coalescing hit rates, LLM time saved and decode loop throughput"""
+    return {
+        **enhance_cache.stats(),
+        "llm": phi3_server.stats() if phi3_server is not None else None
+    }
+
+# Training jobs: train_connector.py subprocesses with JSON-lines progress
+training_supervisor = TrainingSupervisor(
+    notify=lambda job_id, event, data: ws_manager.broadcast_event(job_id, event, **data),
+    arbiter=gpu_arbiter
+)
+
+@app.post("/train")
+async def start_training_endpoint(req: TrainingRequest):
+    """Start training job (progress on the job's WebSocket and GET /train/status)"""
+    if not 1 <= req.batch_size <= 16:
+        raise HTTPException(400, "batch_size must be between 1 and 16")
+    try:
+        job = await training_supervisor.start(req.project_name, req.steps, req.batch_size)
+    except NoDeviceAvailable as e:
+        raise HTTPException(409, str(e))
+    if job.status == "failed":
+        raise HTTPException(500, job.error)
     return {
         "status": "started",
-        "job_id": job_id,
+        "job_id": job.job_id,
         "message": f"Training {req.project_name} started"
     }
 
 @app.get("/train/status")
-def get_training_status(job_id: str):
-    """Get status of a specific training job"""
-    if job_id not in training_jobs:
+def get_training_status(job_id: str, offset: int = 0, limit: int = 500):
+    """
+    Status of a training job plus its log lines from `offset` on. Pass the
+    returned `log_offset` back as `offset` to get only new lines.
+    """
+    job = training_supervisor.get(job_id)
+    if job is None:
         raise HTTPException(404, "Training job not found")
-    
-    job = training_jobs[job_id]
-    # Return and clear logs to avoid duplicate logs in frontend
-    response_logs = job["logs"]
-    job["logs"] = [] 
-    
+    logs = training_supervisor.read_logs(job_id, offset, min(limit, 2000)) or {"lines": [], "next_offset": offset, "dropped": 0}
     return {
-        **job,
-        "logs": response_logs
+        **job.to_dict(),
+        "logs": logs["lines"],
+        "log_offset": logs["next_offset"],
+        "logs_dropped": logs["dropped"]
     }
 
-# ==================== GPU Management ====================
-
-from gpu_manager import gpu_manager
+@app.get("/train/jobs")
+def list_training_jobs():
+    """Training jobs of this server process, newest first"""
+    return {"jobs": training_supervisor.list(), **training_supervisor.stats()}
+
+@app.delete("/train/{job_id}")
+async def cancel_training(job_id: str):
+    """Stop a running training job"""
+    if not await training_supervisor.cancel(job_id):
+        raise HTTPException(404, "No running training job with this id")
+    return {"status": "cancelled"}
+
+# ==================== Metrics Collectors ====================
+
+metrics.registry.gauge(
+    "novagen_queue_jobs", "Jobs in the job queue, by state", ("state",)
+).set_function(lambda: {(k,): v for k, v in job_queue.get_depth().items()})
+
+metrics.registry.gauge(
+    "novagen_websocket_connections", "Open progress WebSocket connections"
+).set_function(ws_manager.connection_count)
+
+metrics.registry.gauge(
+    "novagen_models_loaded", "Whether each model is resident (1) or not (0)", ("model",)
+).set_function(lambda: {
+    ("base_model",): int(pipe is not None),
+    ("img2img",): int(img2img_pipe is not None),
+    ("controlnet",): int(controlnet_pipe is not None),
+    ("upscaler",): int(get_upscaler_pipe() is not None),
+    ("phi3",): int(phi3_pipe is not None),
+    ("blip",): int(blip_model is not None),
+    ("face_swap",): int(face_swapper is not None),
+})
+
+metrics.registry.gauge(
+    "novagen_gpu_occupancy", "Inference slots, running requests and training per device", ("gpu", "role")
+).set_function(gpu_arbiter.occupancy)
+
+def _device_memory() -> dict:
+    values = {}
+    for gpu_id, stats in gpu_manager.get_memory_stats().items():
+        for kind, value in stats.items():
+            values[(str(gpu_id), kind)] = value
+    return values
+
+metrics.registry.gauge(
+    "novagen_cache_bytes", "Memory held by each cache", ("cache",)
+).set_function(lambda: {(image_cache.name,): image_cache.current_bytes})
+
+metrics.registry.gauge(
+    "novagen_cache_entries", "Entries held by each cache", ("cache",)
+).set_function(lambda: {
+    (image_cache.name,): len(image_cache),
+    (face_cache.name,): len(face_cache),
+    (enhance_cache.name,): len(enhance_cache)
+})
+
+metrics.registry.gauge(
+    "novagen_llm_seconds_saved", "LLM generation time avoided by cache hits and shared in-flight results", ("cache",)
+).set_function(lambda: {(enhance_cache.name,): enhance_cache.saved_seconds})
+
+metrics.registry.gauge(
+    "novagen_device_memory_bytes", "Per-device memory (total/allocated/reserved)", ("device", "kind")
+).set_function(_device_memory)
 
 
 # ==================== LoRA Management ====================
@@ -1266,7 +2266,18 @@ def trigger_vram_optimize():
 def update_system_config(config: dict):
     """Update system configuration"""
     global SYSTEM_CONFIG
+    backend = config.get("aux_model_backend", SYSTEM_CONFIG["aux_model_backend"])
+    if backend not in AUX_BACKENDS:
+        raise HTTPException(400, f"aux_model_backend must be one of: {', '.join(AUX_BACKENDS)}")
+    threshold = config.get("training_pause_threshold", SYSTEM_CONFIG["training_pause_threshold"])
+    if not isinstance(threshold, int) or threshold < 0:
+        raise HTTPException(400, "training_pause_threshold must be a non-negative integer")
+    switched = resolve_backend(backend) != _aux_backend()
     SYSTEM_CONFIG.update(config)
+    gpu_arbiter.pause_threshold = threshold
+    if switched:
+        # Reloaded lazily with the new backend on next use
+        unload_aux_models()
     return {"status": "success", "config": SYSTEM_CONFIG}
 
 @app.get("/system/config")
@@ -1274,6 +2285,30 @@ def get_system_config():
     """Get current system configuration"""
     return SYSTEM_CONFIG
 
+@app.get("/system/aux-models")
+def get_aux_models():
+    """Backend (fp32 / int8), load source and weight size of Phi-3 and BLIP"""
+    return {
+        "backend": _aux_backend(),
+        "loaded": aux_model_info,
+        "quantized_dir": quantized_cache.directory
+    }
+
+@app.get("/system/residency")
+def get_residency_stats():
+    """Which model group is on the GPU, queued requests and evictions"""
+    return model_residency.stats()
+
+@app.get("/system/cache")
+def get_cache_stats():
+    """Hit rates and memory usage of the input caches"""
+    return {
+        image_cache.name: image_cache.stats(),
+        face_cache.name: face_cache.stats(),
+        caption_store.name: caption_store.stats(),
+        enhance_cache.name: enhance_cache.stats()
+    }
+
 @app.get("/gallery")
 def get_gallery():
     """List all generated images in the outputs folder"""
@@ -1323,6 +2358,93 @@ def create_batch_zip_endpoint(req: BatchZipRequest):
         
     return {"status": "success", "message": "Files queued for Drive save"}
 
+# ==================== Binary Uploads ====================
+
+@app.post("/uploads")
+async def upload_image_binary(request: Request):
+    """
+    Upload an image as multipart/form-data (field "file") or as a raw
+    application/octet-stream body. The body is streamed to a spooled temp
+    file, never held as base64. Returns an "upload:<id>" reference usable
+    in any image field of the JSON endpoints.
+    """
+    content_type = request.headers.get("content-type", "")
+    try:
+        if content_type.startswith("multipart/form-data"):
+            form = await request.form()
+            upload = form.get("file")
+            if upload is None or isinstance(upload, str):
+                raise HTTPException(400, "Multipart upload needs a 'file' field")
+            stored = await asyncio.to_thread(upload_store.save_file, upload.file)
+        else:
+            stored = await upload_store.save_stream(request.stream())
+    except UploadTooLarge as e:
+        raise HTTPException(413, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"status": "success", **stored.to_dict()}
+
+def _add_multipart_variant(path: str, request_model, handler):
+    """
+    Register POST {path}/multipart: file fields are stored in the upload
+    store and passed to the JSON handler as upload references, other form
+    fields (or a JSON "params" field) fill in the remaining parameters.
+    """
+    # Repeated form fields fill List[...] parameters (e.g. target_images)
+    list_fields = {
+        name for name, field in request_model.model_fields.items()
+        if getattr(field.annotation, "__origin__", None) is list
+    }
+    
+    async def multipart_endpoint(request: Request):
+        form = await request.form()
+        fields = {}
+        if "params" in form:
+            try:
+                params = json.loads(form["params"])
+            except (ValueError, TypeError) as e:
+                raise HTTPException(400, f"params must be a JSON object: {e}")
+            if not isinstance(params, dict):
+                raise HTTPException(400, "params must be a JSON object")
+            fields.update(params)
+        for key, value in form.multi_items():
+            if key == "params":
+                continue
+            if not isinstance(value, str):
+                try:
+                    stored = await asyncio.to_thread(upload_store.save_file, value.file)
+                except UploadTooLarge as e:
+                    raise HTTPException(413, str(e))
+                except ValueError as e:
+                    raise HTTPException(400, f"{key}: {e}")
+                value = stored.ref
+            if key in list_fields:
+                fields.setdefault(key, []).append(value)
+            else:
+                fields[key] = value
+        try:
+            req = request_model(**fields)
+        except Exception as e:
+            raise HTTPException(422, str(e))
+        return await handler(req)
+    
+    multipart_endpoint.__name__ = f"{handler.__name__}_multipart"
+    app.add_api_route(f"{path}/multipart", multipart_endpoint, methods=["POST"])
+
+for _path, _model, _handler in [
+    ("/img2img", Img2ImgRequest, image_to_image),
+    ("/controlnet", ControlNetRequest, controlnet_generate),
+    ("/faceswap", FaceSwapRequest, face_swap),
+    ("/faceswap/sources", FaceSourceRequest, register_face_source),
+    ("/faceswap/batch", FaceSwapBatchRequest, face_swap_batch),
+    ("/upscale", UpscaleRequest, upscale_image),
+    ("/interrogate", InterrogateRequest, interrogate_image),
+    ("/interrogate/batch", InterrogateBatchRequest, interrogate_batch),
+    ("/dataset/upload", DatasetUploadRequest, upload_dataset),
+    ("/upload-training-image", TrainingImageRequest, upload_training_image),
+]:
+    _add_multipart_variant(_path, _model, _handler)
+
 # ==================== Frontend Serving (SPA) ====================
 
 # Mount the 'outputs' directory to be accessible
@@ -0,0 +1,160 @@
+"""
+Single-Flight Result Cache
+
+For expensive async computations that are often requested with the
+same key (e.g. /enhance-prompt on the same short prompt):
+
+- identical concurrent requests share one computation: the first caller
+  starts it as a task, later ones await the same task ("shared")
+- finished results go into an LRU cache when the caller says they are
+  reproducible (greedy decoding, or sampling with a fixed seed); random
+  samples are only shared between concurrent requests, never cached
+- every hit or shared result credits the time its computation took to
+  `saved_seconds`; a computation can return `Measured(value, seconds)`
+  to report its own cost (e.g. model time without queueing)
+
+Errors are never cached; callers waiting on a failed computation all get
+its exception.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+import logging
+
+from metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar("R")
+
+# Where a result came from
+CACHED = "cache"
+SHARED = "shared"
+COMPUTED = "computed"
+
+
+@dataclass
+class Measured(Generic[R]):
+    """A computed value together with the seconds it cost"""
+    value: R
+    seconds: float
+
+
+class SingleFlightCache(Generic[R]):
+    def __init__(self, max_entries: int = 1024, name: str = "single_flight"):
+        self.max_entries = max_entries
+        self.name = name
+        self._results: "OrderedDict[Hashable, Tuple[R, float]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared = 0
+        self.misses = 0
+        self.compute_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def get(self, key: Hashable) -> Optional[R]:
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is None:
+                return None
+            self._results.move_to_end(key)
+            return entry[0]
+
+    def lookup(self, key: Hashable) -> Optional[R]:
+        """Cached result for `key`, counted as a hit or miss"""
+        with self._lock:
+            entry = self._results.get(key)
+            if entry is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry[1]
+        record_cache_lookup(self.name, entry is not None)
+        return entry[0] if entry is not None else None
+
+    def put(self, key: Hashable, result: R, seconds: float = 0.0):
+        """Store a result computed outside run() (e.g. a streamed generation)"""
+        self.misses += 1
+        self.compute_seconds += seconds
+        self._store(key, result, seconds)
+
+    def _store(self, key: Hashable, result: R, duration: float):
+        with self._lock:
+            self._results[key] = (result, duration)
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    async def run(
+        self,
+        key: Hashable,
+        compute: Callable[[], Awaitable[R]],
+        cacheable: bool = True
+    ) -> Tuple[R, str]:
+        """
+        Result for `key` and its source: CACHED, SHARED or COMPUTED.
+        `cacheable=False` skips the LRU (lookup and store) but still
+        coalesces concurrent identical requests.
+        """
+        if cacheable:
+            cached = self.lookup(key)
+            if cached is not None:
+                return cached, CACHED
+
+        # Random samples and reproducible results never share a flight
+        flight_key = (key, cacheable)
+        flight = self._inflight.get(flight_key)
+        if flight is None:
+            # Its own task, so a leader that disconnects does not cancel
+            # the computation its followers are waiting for
+            flight = asyncio.ensure_future(self._compute(key, flight_key, compute, cacheable))
+            flight.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._inflight[flight_key] = flight
+            self.misses += 1
+            source = COMPUTED
+        else:
+            self.shared += 1
+            source = SHARED
+        result, duration = await asyncio.shield(flight)
+        if source == SHARED:
+            self.saved_seconds += duration
+        return result, source
+
+    async def _compute(self, key, flight_key, compute, cacheable: bool):
+        start = time.perf_counter()
+        try:
+            result = await compute()
+        finally:
+            self._inflight.pop(flight_key, None)
+        duration = time.perf_counter() - start
+        if isinstance(result, Measured):
+            result, duration = result.value, result.seconds
+        self.compute_seconds += duration
+        if cacheable:
+            self._store(key, result, duration)
+        return result, duration
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def stats(self) -> dict:
+        requests = self.hits + self.shared + self.misses
+        return {
+            "entries": len(self._results),
+            "in_flight": len(self._inflight),
+            "hits": self.hits,
+            "shared": self.shared,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+            "shared_rate": round(self.shared / requests, 4) if requests else 0.0,
+            "compute_seconds": round(self.compute_seconds, 3),
+            "saved_seconds": round(self.saved_seconds, 3)
+        }
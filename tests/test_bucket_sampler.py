@@ -0,0 +1,70 @@
+import numpy as np
+from PIL import Image
+
+from aspect_ratios import ASPECT_RATIOS
+from bucket_sampler import (
+    BucketSampler, BucketedImageDataset, bucket_loader, dataset_stats, nearest_bucket,
+    resize_to_bucket, training_buckets
+)
+
+
+def _dataset(directory, sizes):
+    paths = []
+    for i, size in enumerate(sizes):
+        path = str(directory / f"img_{i}.png")
+        Image.fromarray(np.full((size[1], size[0], 3), i * 10, dtype=np.uint8)).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_buckets_follow_aspect_ratio_table():
+    buckets = training_buckets(1024)
+    assert buckets == {ratio: (c.width, c.height) for ratio, c in ASPECT_RATIOS.items()}
+    assert nearest_bucket((1920, 1080), list(buckets.values())) == (1344, 768)
+    assert nearest_bucket((600, 900), list(buckets.values())) == (832, 1216)
+    assert all(w % 64 == 0 and h % 64 == 0 for w, h in training_buckets(512).values())
+
+    image, crop = resize_to_bucket(Image.new("RGB", (300, 100)), (128, 64))
+    assert image.size == (128, 64)
+    assert crop == (0, 32)
+
+
+def test_sampler_batches_share_a_bucket():
+    keys = ["a"] * 5 + ["b"] * 3 + ["c"]
+    sampler = BucketSampler(keys, batch_size=2, seed=1)
+    batches = list(sampler)
+    assert len(batches) == len(sampler) == 6
+    assert sorted(i for batch in batches for i in batch) == list(range(9))
+    assert all(len({keys[i] for i in batch}) == 1 for batch in batches)
+    # Same seed and epoch: same order; next epoch reshuffles
+    assert list(sampler) == batches
+    sampler.set_epoch(1)
+    assert list(sampler) != batches
+
+    dropped = BucketSampler(keys, batch_size=2, drop_last=True)
+    assert len(dropped) == 3 and all(len(batch) == 2 for batch in dropped)
+
+
+def test_loader_yields_same_shape_batches(tmp_path):
+    sizes = [(400, 400), (420, 400), (640, 360), (600, 340), (300, 450), (320, 480), (310, 470)]
+    paths = _dataset(tmp_path, sizes)
+    (tmp_path / "img_0.txt").write_text("a red square")
+    dataset = BucketedImageDataset.from_directory(str(tmp_path), "sks", resolution=512)
+    assert len(dataset) == len(paths)
+
+    for workers in (0, 1):
+        seen = 0
+        for batch in bucket_loader(dataset, batch_size=2, workers=workers, seed=0):
+            width, height = (int(v) for v in batch["bucket"].split("x"))
+            assert batch["pixels"].shape[1:] == (3, height, width)
+            assert batch["time_ids"].shape == (len(batch["captions"]), 6)
+            seen += len(batch["captions"])
+        assert seen == len(paths)
+    assert dataset[0]["caption"] == "a red square"
+
+    stats = dataset_stats(dataset, batch_size=2)
+    assert stats["images"] == 7 and stats["buckets_used"] == 3
+    assert stats["batches_per_epoch"] == 4 and stats["full_batches"] == 3
+    assert {row["ratio"] for row in stats["buckets"]} == {"1:1", "16:9", "2:3"}
+    # Bucketing crops far less than a square crop of the same images
+    assert stats["mean_crop_pct"] < stats["square_crop_pct"]
@@ -0,0 +1,19 @@
+from caption_store import CaptionStore
+
+
+def test_captions_persist_per_captioner(tmp_path):
+    path = str(tmp_path / "captions.sqlite3")
+    store = CaptionStore(path)
+    assert store.get("abc", "blip@1") is None
+    store.put("abc", "blip@1", "a cat on a sofa")
+    store.put_many([("def", "a dog"), ("ghi", "a bird")], "blip@1")
+    store.close()
+
+    reopened = CaptionStore(path)
+    assert reopened.get("abc", "blip@1") == "a cat on a sofa"
+    assert reopened.get("abc", "blip@2") is None  # another captioner version
+    assert reopened.get_many(["def", "zzz", "ghi"], "blip@1") == {"def": "a dog", "ghi": "a bird"}
+
+    stats = reopened.stats()
+    assert stats["entries"] == 3 and stats["hits"] == 3 and stats["misses"] == 2
+    assert reopened.clear("blip@1") == 3 and len(reopened) == 0
@@ -0,0 +1,67 @@
+import asyncio
+import os
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from caption_store import CaptionStore
+from dataset_captioning import CaptionJobCancelled, caption_directory, sidecar_path
+
+
+def _dataset(directory, count=6):
+    rng = np.random.default_rng(0)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"img_{i}.png")
+        Image.fromarray(rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)).save(path)
+        paths.append(path)
+    with open(os.path.join(directory, "notes.md"), "w") as f:
+        f.write("not an image")
+    return paths
+
+
+def _captioner(calls):
+    async def caption(image):
+        calls.append(image.size)
+        await asyncio.sleep(0)
+        return f"an image {len(calls)}"
+    return caption
+
+
+def test_writes_sidecars_and_resumes(tmp_path):
+    paths = _dataset(str(tmp_path))
+    store = CaptionStore(str(tmp_path / "captions.sqlite3"))
+    calls = []
+    # Pretend a previous run got through the first two images
+    for path in paths[:2]:
+        with open(sidecar_path(path), "w") as f:
+            f.write("done before\n")
+
+    stats = asyncio.run(caption_directory(str(tmp_path), _captioner(calls), store, "test@1", prefix="ohwx, "))
+    assert stats.to_dict()["done"] == 6 and stats.skipped == 2 and stats.captioned == 4
+    assert len(calls) == 4
+    with open(sidecar_path(paths[3])) as f:
+        assert f.read().startswith("ohwx, an image")
+
+    # Re-captioning everything is served from the store, except the
+    # two images that were never captioned
+    stats = asyncio.run(caption_directory(str(tmp_path), _captioner(calls), store, "test@1", overwrite=True))
+    assert stats.cached == 4 and stats.captioned == 2 and len(calls) == 6
+
+
+def test_failures_and_cancel(tmp_path):
+    paths = _dataset(str(tmp_path), count=3)
+    with open(paths[0], "wb") as f:
+        f.write(b"broken")
+    store = CaptionStore(str(tmp_path / "captions.sqlite3"))
+
+    stats = asyncio.run(caption_directory(str(tmp_path), _captioner([]), store, "test@1"))
+    assert stats.failed == 1 and stats.captioned == 2
+    assert not os.path.exists(sidecar_path(paths[0]))
+
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(CaptionJobCancelled):
+        asyncio.run(caption_directory(str(tmp_path), _captioner([]), store, "test@1", cancel=cancel))
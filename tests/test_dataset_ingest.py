@@ -0,0 +1,114 @@
+import asyncio
+import io
+import os
+import tarfile
+import zipfile
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from dataset_ingest import AsyncStreamReader, dataset_path, dhash, ingest_archive, normalize_image
+from upload_store import UploadTooLarge
+
+
+def _photo(seed, size=(320, 240)):
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 255, (size[1] // 16, size[0] // 16, 3), dtype=np.uint8)
+    return Image.fromarray(small).resize(size, Image.BILINEAR)
+
+
+def _encode(image, fmt="JPEG", **kwargs):
+    out = io.BytesIO()
+    image.save(out, format=fmt, **kwargs)
+    return out.getvalue()
+
+
+def _tar(members, mode="w:gz"):
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode=mode) as archive:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return out.getvalue()
+
+
+def test_normalize_and_dhash():
+    photo = _photo(0)
+    jpeg = _encode(photo, quality=95)
+    kept = normalize_image(jpeg)
+    assert kept.data is jpeg and kept.extension == ".jpg"
+
+    rgba = photo.convert("RGBA")
+    converted = normalize_image(_encode(rgba, "PNG"), max_side=160)
+    assert converted.extension == ".png" and converted.size == (160, 120)
+    assert Image.open(io.BytesIO(converted.data)).mode == "RGB"
+
+    # Re-compressed copy is near, a different photo is far
+    assert bin(dhash(photo) ^ dhash(Image.open(io.BytesIO(_encode(photo, quality=40))))).count("1") <= 4
+    assert bin(dhash(photo) ^ dhash(_photo(1))).count("1") > 10
+
+    with pytest.raises(Exception):
+        normalize_image(jpeg[:200])
+
+
+def test_streams_tar_from_async_body(tmp_path):
+    members = [
+        ("set/a.jpg", _encode(_photo(0), quality=95)),
+        ("set/a.txt", b"a red thing\n"),
+        ("set/a_copy.jpg", _encode(_photo(0), quality=60)),   # near-duplicate
+        ("set/b.png", _encode(_photo(2).convert("RGBA"), "PNG")),
+        ("set/broken.jpg", b"\xff\xd8\xff not really"),
+        ("set/readme.md", b"notes"),
+        ("set/.hidden.jpg", _encode(_photo(3))),
+    ]
+    body = _tar(members)
+    directory = str(tmp_path / "datasets" / "proj")
+
+    async def chunks():
+        for i in range(0, len(body), 1000):
+            await asyncio.sleep(0)
+            yield body[i:i + 1000]
+
+    async def run():
+        reader = AsyncStreamReader(chunks(), asyncio.get_running_loop())
+        return await asyncio.to_thread(ingest_archive, reader, directory, 2, 2)
+
+    stats = asyncio.run(run())
+    assert (stats.received, stats.written, stats.duplicates, stats.invalid) == (4, 2, 1, 1)
+    assert stats.captions == 1 and stats.ignored == 2 and stats.bytes_read == len(body)
+    assert sorted(f for f in os.listdir(directory) if not f.startswith(".")) == ["a.jpg", "a.txt", "b.png"]
+    with open(os.path.join(directory, "a.txt")) as f:
+        assert f.read() == "a red thing\n"
+
+    async def too_large():
+        reader = AsyncStreamReader(chunks(), asyncio.get_running_loop(), max_bytes=2000)
+        return await asyncio.to_thread(ingest_archive, reader, directory)
+
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(too_large())
+
+
+def test_zip_dedupes_against_existing_dataset(tmp_path):
+    directory = tmp_path / "proj"
+    directory.mkdir()
+    _photo(5).save(directory / "a.jpg", quality=95)
+
+    out = io.BytesIO()
+    with zipfile.ZipFile(out, "w") as archive:
+        archive.writestr("a.jpg", _encode(_photo(6)))         # new content, taken name
+        archive.writestr("again.jpg", _encode(_photo(5), quality=70))
+    stats = ingest_archive(io.BytesIO(out.getvalue()), str(directory))
+    assert (stats.written, stats.duplicates) == (1, 1)
+    assert sorted(f for f in os.listdir(directory) if not f.startswith(".")) == ["a.jpg", "a_1.jpg"]
+
+    # Second run: hashes come from .hashes.json, everything is a duplicate
+    stats = ingest_archive(io.BytesIO(out.getvalue()), str(directory))
+    assert (stats.written, stats.duplicates) == (0, 2)
+
+    with pytest.raises(ValueError):
+        ingest_archive(io.BytesIO(b"plain text, no archive" * 40), str(directory))
+    with pytest.raises(ValueError):
+        dataset_path("../etc")
+    assert dataset_path("my lora") == os.path.join("datasets", "my lora")
@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from face_cache import FaceCache, frame_key, face_summary
+
+
+def _face(x=10.0):
+    return SimpleNamespace(
+        bbox=np.array([x, 20.0, x + 50, 80.0]),
+        det_score=0.99,
+        kps=np.array([[x + 10, 40.0]] * 5),
+        normed_embedding=np.ones(512, dtype=np.float32)
+    )
+
+
+def test_frame_key_depends_on_pixels_and_shape():
+    frame = np.zeros((4, 6, 3), dtype=np.uint8)
+    assert frame_key(frame) == frame_key(frame.copy())
+    assert frame_key(frame) != frame_key(np.zeros((6, 4, 3), dtype=np.uint8))
+    changed = frame.copy()
+    changed[0, 0, 0] = 1
+    assert frame_key(frame) != frame_key(changed)
+
+
+def test_detect_runs_analyzer_once_per_frame():
+    cache = FaceCache()
+    calls = []
+    frame = np.zeros((4, 6, 3), dtype=np.uint8)
+
+    def analyze(f):
+        calls.append(f)
+        return [_face()]
+
+    key1, faces1 = cache.detect(frame, analyze)
+    key2, faces2 = cache.detect(frame.copy(), analyze)
+    assert key1 == key2
+    assert faces1 is faces2
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_lru_eviction():
+    cache = FaceCache(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, [])
+    assert cache.get("a") is None
+    assert cache.get("c") == []
+
+
+def test_register_and_resolve_source():
+    cache = FaceCache(max_sources=1)
+    faces = [_face(), _face(100.0)]
+    face_id = cache.register_source("abc", faces, 1)
+    assert face_id == "abc-1"
+    assert cache.get_source(face_id) is faces[1]
+
+    with pytest.raises(IndexError):
+        cache.register_source("abc", faces, 2)
+
+    cache.register_source("def", faces, 0)
+    assert cache.get_source(face_id) is None  # evicted by max_sources
+    assert cache.remove_source("def-0")
+    assert not cache.remove_source("def-0")
+
+
+def test_face_summary_is_json_friendly():
+    summary = face_summary(_face())
+    assert summary["bbox"] == [10.0, 20.0, 60.0, 80.0]
+    assert len(summary["kps"]) == 5
+    assert isinstance(summary["det_score"], float)
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+pytest.importorskip("insightface")
+pytest.importorskip("onnxruntime")
+onnx = pytest.importorskip("onnx")
+
+from onnx import TensorProto, helper, numpy_helper  # noqa: E402
+
+from face_roi import swap_faces, supports_batch  # noqa: E402
+
+
+def _stand_in_swapper(tmp_path, batch="N"):
+    """Tiny model with inswapper's interface; emap is the last initializer"""
+    from insightface.model_zoo.inswapper import INSwapper
+    rng = np.random.default_rng(0)
+    inits = [
+        numpy_helper.from_array((rng.standard_normal((3, 3, 3, 3)) * 0.1).astype(np.float32), "w"),
+        numpy_helper.from_array((rng.standard_normal((512, 3)) * 0.1).astype(np.float32), "proj"),
+        numpy_helper.from_array(np.array([-1, 3, 1, 1], dtype=np.int64), "shape"),
+        numpy_helper.from_array(np.eye(512, dtype=np.float32), "emap"),
+    ]
+    nodes = [
+        helper.make_node("Conv", ["target", "w"], ["c"], pads=[1, 1, 1, 1]),
+        helper.make_node("MatMul", ["source", "proj"], ["p"]),
+        helper.make_node("Reshape", ["p", "shape"], ["p4"]),
+        helper.make_node("Add", ["c", "p4"], ["a"]),
+        helper.make_node("Sigmoid", ["a"], ["output"]),
+    ]
+    graph = helper.make_graph(
+        nodes, "stand_in",
+        [helper.make_tensor_value_info("target", TensorProto.FLOAT, [batch, 3, 128, 128]),
+         helper.make_tensor_value_info("source", TensorProto.FLOAT, [batch, 512])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, [batch, 3, 128, 128])],
+        inits
+    )
+    path = str(tmp_path / f"swapper_{batch}.onnx")
+    onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=8), path)
+    import onnxruntime as ort
+    session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+    return INSwapper(model_file=path, session=session)
+
+
+def _face(cx, cy, scale=1.0):
+    # Roughly arcface-shaped landmarks around (cx, cy)
+    offsets = np.array([[-18, -12], [18, -12], [0, 4], [-14, 20], [14, 20]], dtype=np.float32)
+    return SimpleNamespace(kps=offsets * scale + (cx, cy))
+
+
+def _frame():
+    rng = np.random.default_rng(1)
+    return rng.integers(0, 255, (360, 480, 3), dtype=np.uint8)
+
+
+def test_single_face_matches_full_frame_paste(tmp_path):
+    swapper = _stand_in_swapper(tmp_path)
+    source = SimpleNamespace(normed_embedding=np.full(512, 1 / np.sqrt(512), dtype=np.float32))
+    frame = _frame()
+    face = _face(200, 150, 1.5)
+
+    expected = swapper.get(frame, face, source, paste_back=True)
+    result = swap_faces(swapper, frame, [face], source)
+
+    diff = np.abs(result.astype(np.int16) - expected.astype(np.int16))
+    assert diff.max() <= 1
+    assert not np.array_equal(result, frame)
+
+
+def test_multi_face_batched_and_unbatched_agree(tmp_path):
+    batched = _stand_in_swapper(tmp_path, "N")
+    single = _stand_in_swapper(tmp_path, 1)
+    assert supports_batch(batched) and not supports_batch(single)
+
+    source = SimpleNamespace(normed_embedding=np.full(512, 1 / np.sqrt(512), dtype=np.float32))
+    frame = _frame()
+    faces = [_face(80, 80), _face(240, 200), _face(400, 100), _face(470, 350)]  # last one clipped
+
+    a = swap_faces(batched, frame, faces, source, max_batch=3)
+    b = swap_faces(single, frame, faces, source)
+    assert np.array_equal(a, b)
+    # Pixels far from every face are untouched
+    assert np.array_equal(a[300:, :100], frame[300:, :100])
+
+
+def test_no_faces_returns_copy(tmp_path):
+    swapper = _stand_in_swapper(tmp_path)
+    frame = _frame()
+    out = swap_faces(swapper, frame, [], None)
+    assert np.array_equal(out, frame) and out is not frame
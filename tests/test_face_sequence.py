@@ -0,0 +1,114 @@
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from face_sequence import (
+    FaceTracker, GifSink, SequenceCancelled, open_frames, swap_sequence
+)
+
+LANDMARKS = np.array([[-18, -12], [18, -12], [0, 4], [-14, 20], [14, 20]], dtype=np.float32)
+
+
+def _moving_frames(count, step=2, size=(240, 320)):
+    """Textured frames shifting right by `step` px per frame"""
+    rng = np.random.default_rng(0)
+    texture = rng.integers(0, 255, (size[0], size[1] + count * step), dtype=np.uint8)
+    texture = np.repeat(texture[..., None], 3, axis=2)
+    # Smooth the noise so optical flow has gradients to work with
+    import cv2
+    texture = cv2.GaussianBlur(texture, (7, 7), 0)
+    for i in range(count):
+        offset = count * step - i * step
+        yield np.ascontiguousarray(texture[:, offset:offset + size[1]])
+
+
+def _face(x, y):
+    kps = LANDMARKS + (x, y)
+    return SimpleNamespace(kps=kps, bbox=np.array([x - 20, y - 20, x + 20, y + 30], dtype=np.float32))
+
+
+class ListSink:
+    def __init__(self):
+        self.frames = []
+        self.closed = False
+
+    def write(self, frame):
+        self.frames.append(frame)
+
+    def close(self):
+        self.closed = True
+
+
+def test_tracker_follows_motion_between_keyframes():
+    calls = []
+
+    def detect(frame):
+        calls.append(1)
+        return [_face(160, 120)] if len(calls) == 1 else [_face(160 + 2 * 5, 120)]
+
+    tracker = FaceTracker(detect, keyframe_interval=5)
+    results = [tracker.update(frame) for frame in _moving_frames(6)]
+
+    assert [keyframe for _, keyframe in results] == [True, False, False, False, False, True]
+    faces, _ = results[4]
+    # Four frames of 2 px motion to the right
+    np.testing.assert_allclose(faces[0].kps, LANDMARKS + (168, 120), atol=0.5)
+    np.testing.assert_allclose(faces[0].bbox[:2], [148, 100], atol=0.5)
+
+
+def test_pipeline_swaps_every_frame_in_order():
+    sink = ListSink()
+    frames = list(_moving_frames(12))
+    swapped = []
+
+    def swap(frame, faces):
+        swapped.append(len(faces))
+        return 255 - frame
+
+    stats = swap_sequence(iter(frames), lambda f: [_face(160, 120)], swap, sink, keyframe_interval=4)
+
+    assert stats.frames == 12 and stats.keyframes == 3 and stats.tracked == 9
+    assert sink.closed
+    assert all(np.array_equal(out, 255 - src) for out, src in zip(sink.frames, frames))
+    assert stats.to_dict()["fps"] > 0
+
+
+def test_frames_without_faces_pass_through_and_max_frames():
+    sink = ListSink()
+    stats = swap_sequence(
+        _moving_frames(20), lambda f: [], lambda f, faces: pytest.fail("no faces"), sink,
+        max_frames=7
+    )
+    assert stats.frames == 7 and len(sink.frames) == 7
+
+
+def test_cancel_and_sink_errors():
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(SequenceCancelled):
+        swap_sequence(_moving_frames(5), lambda f: [], None, ListSink(), cancel=cancel)
+
+    class BrokenSink(ListSink):
+        def write(self, frame):
+            raise IOError("disk full")
+
+    with pytest.raises(IOError):
+        swap_sequence(_moving_frames(30), lambda f: [], None, BrokenSink(), queue_size=2)
+
+
+def test_gif_round_trip(tmp_path):
+    path = str(tmp_path / "clip.gif")
+    sink = GifSink(path, fps=10)
+    for frame in _moving_frames(3):
+        sink.write(frame)
+    sink.close()
+
+    frames, fps, kind = open_frames(path)
+    assert kind == "gif" and fps == pytest.approx(10)
+    decoded = list(frames)
+    assert len(decoded) == 3 and decoded[0].shape == (240, 320, 3)
+    with Image.open(path) as gif:
+        assert gif.n_frames == 3
@@ -0,0 +1,66 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from faceswap_pool import FaceSwapPool, SwapWorker, plan_threads, default_pool_size, ORT_AVAILABLE
+
+
+def _fake_pool(size, created=None):
+    def factory(options):
+        worker = SwapWorker(analyzer=object(), swapper=object())
+        if created is not None:
+            created.append(options)
+        return worker
+    return FaceSwapPool(size=size, worker_factory=factory)
+
+
+def test_thread_plan_splits_cores():
+    assert plan_threads(4, cores=16) == (4, 1)
+    assert plan_threads(3, cores=2) == (1, 1)
+    assert default_pool_size(1) == 1
+    assert default_pool_size(64) == 4
+
+
+@pytest.mark.skipif(not ORT_AVAILABLE, reason="onnxruntime not installed")
+def test_workers_get_tuned_cpu_session_options():
+    created = []
+    pool = _fake_pool(2, created)
+    pool.start()
+    assert len(created) == 2
+    assert created[0].intra_op_num_threads == pool.intra_op
+    assert created[0].inter_op_num_threads == 1
+    pool.shutdown()
+
+
+def test_imap_unordered_streams_all_results_with_exclusive_workers():
+    pool = _fake_pool(3)
+    in_use = set()
+    lock = threading.Lock()
+    peak = []
+
+    def work(worker, item):
+        with lock:
+            assert id(worker) not in in_use
+            in_use.add(id(worker))
+            peak.append(len(in_use))
+        time.sleep(0.02 if item % 2 else 0.005)
+        with lock:
+            in_use.discard(id(worker))
+        return item
+
+    async def collect():
+        return [result async for result in pool.imap_unordered(work, range(12))]
+
+    results = asyncio.run(collect())
+    assert sorted(results) == list(range(12))
+    assert max(peak) <= 3
+    assert pool.stats()["idle"] == 3
+    pool.shutdown()
+
+
+def test_run_single_item():
+    pool = _fake_pool(1)
+    assert asyncio.run(pool.run(lambda worker, item: item * 2, 21)) == 42
+    pool.shutdown()
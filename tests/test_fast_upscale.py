@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from fast_upscale import FastUpscaler, resample, resolve_mode
+
+
+def _image(width=100, height=70):
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 255, (height, width, 3), dtype=np.uint8))
+
+
+def _nearest_x2_model(path):
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper
+    scales = numpy_helper.from_array(np.array([1, 1, 2, 2], dtype=np.float32), "scales")
+    graph = helper.make_graph(
+        [helper.make_node("Resize", ["input", "", "scales"], ["output"], mode="nearest")],
+        "nearest_x2",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, [1, 3, "H", "W"])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, [1, 3, "H2", "W2"])],
+        [scales]
+    )
+    onnx.save(helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=8), path)
+
+
+def test_resolve_mode():
+    assert resolve_mode("Upscale (Fast 2x)") == (2.0, "resample")
+    assert resolve_mode("Upscale (1.5x)") == (1.5, "onnx")
+    with pytest.raises(ValueError):
+        resolve_mode("resample", 100)
+    assert resolve_mode("resample", 3) == (3, "resample")
+    with pytest.raises(ValueError):
+        resolve_mode("Vary (Subtle)")
+
+
+def test_resample_size():
+    assert resample(_image(), 1.5).size == (150, 105)
+
+
+def test_onnx_modes_fall_back_without_model(tmp_path):
+    upscaler = FastUpscaler(model_dir=str(tmp_path))
+    out, info = upscaler.upscale(_image(), "Upscale (2x)")
+    assert out.size == (200, 140) and info["backend"] == "resample"
+
+
+def test_onnx_backend_tiles_match_whole_image(tmp_path):
+    pytest.importorskip("onnxruntime")
+    _nearest_x2_model(str(tmp_path / "x2.onnx"))
+    upscaler = FastUpscaler(model_dir=str(tmp_path))
+    image = _image(300, 250)  # several tiles at the default tile size
+
+    out, info = upscaler.upscale(image, "Upscale (2x)")
+    assert info["backend"] == "onnx" and upscaler.stats()["onnx_scale"] == 2
+    expected = image.resize((600, 500), Image.Resampling.NEAREST)
+    assert np.abs(np.asarray(out, dtype=np.int16) - np.asarray(expected)).max() <= 1
+
+    out, _ = upscaler.upscale(image, "Upscale (1.5x)")
+    assert out.size == (450, 375)
+    upscaler.close()
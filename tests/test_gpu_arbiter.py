@@ -0,0 +1,152 @@
+import asyncio
+import sys
+
+import pytest
+
+from gpu_arbiter import CPU, EXCLUSIVE, ROUTED, SHARED, GPUArbiter, NoDeviceAvailable
+from training_supervisor import CANCELLED, PAUSED, RUNNING, TrainingSupervisor
+
+
+async def _request(arbiter, log, hold=0.02):
+    async with arbiter.inference() as device:
+        log.append(("start", device))
+        await asyncio.sleep(hold)
+        log.append(("end", device))
+
+
+def _max_concurrency(log, device=None):
+    running = peak = 0
+    for event, d in log:
+        if device is None or d == device:
+            running += 1 if event == "start" else -1
+            peak = max(peak, running)
+    return peak
+
+
+def test_training_placement_prefers_spare_devices():
+    capacity, assigned = [], []
+    arbiter = GPUArbiter(devices=[0, 1, 2], inference_devices=[0, 1], inference_slots=2, on_assign=assigned.append)
+
+    async def scenario():
+        leases = []
+        for i in range(3):
+            leases.append(await arbiter.reserve_training(f"job{i}"))
+            capacity.append(arbiter.inference_capacity())
+        with pytest.raises(NoDeviceAvailable):
+            await arbiter.reserve_training("job3")
+        return leases
+
+    exclusive, routed, shared = asyncio.run(scenario())
+    assert (exclusive.mode, exclusive.device) == (EXCLUSIVE, 2)
+    assert routed.mode == ROUTED and shared.mode == SHARED and {routed.device, shared.device} == {0, 1}
+    assert shared.env() == {"CUDA_VISIBLE_DEVICES": str(shared.device)}
+    # Routed device stops taking inference, shared one drops to one slot
+    assert capacity == [4, 2, 1] and assigned == [2, routed.device, shared.device]
+    stats = arbiter.stats()
+    assert stats["decisions"] == {EXCLUSIVE: 1, ROUTED: 1, SHARED: 1, "rejected": 1}
+    assert arbiter.occupancy()[(str(routed.device), "inference_slots")] == 0
+
+    asyncio.run(arbiter.release_training("job1"))
+    assert arbiter.inference_capacity() == 3
+
+    cpu = asyncio.run(GPUArbiter(devices=[]).reserve_training("cpu"))
+    assert cpu.mode == CPU and cpu.env() == {"CUDA_VISIBLE_DEVICES": ""}
+    with pytest.raises(NoDeviceAvailable):
+        asyncio.run(GPUArbiter(devices=[0], allow_shared=False).reserve_training("x"))
+
+
+def test_inference_is_routed_and_throttled_while_training():
+    async def scenario():
+        arbiter = GPUArbiter(devices=[0, 1], inference_devices=[0, 1], inference_slots=2)
+        log = []
+        await asyncio.gather(*(_request(arbiter, log) for _ in range(8)))
+        assert {d for _, d in log} == {0, 1} and _max_concurrency(log) == 4
+
+        lease = await arbiter.reserve_training("train")
+        log = []
+        await asyncio.gather(*(_request(arbiter, log) for _ in range(6)))
+        assert {d for _, d in log} == {1 - lease.device} and _max_concurrency(log) == 2
+
+        shared = GPUArbiter(devices=[0], inference_slots=3, shared_slots=1)
+        log = []
+        await asyncio.gather(*(_request(shared, log) for _ in range(3)))
+        assert _max_concurrency(log) == 3
+        await shared.reserve_training("train")
+        log = []
+        await asyncio.gather(*(_request(shared, log) for _ in range(3)))
+        assert _max_concurrency(log) == 1
+        return shared
+
+    shared = asyncio.run(scenario())
+    assert shared.stats()["devices"][0]["inference_requests"] == 6
+
+
+def test_pauses_shared_training_during_spikes(tmp_path):
+    script = (
+        "import os, time\n"
+        "print('device', repr(os.environ['CUDA_VISIBLE_DEVICES']), flush=True)\n"
+        "time.sleep(60)"
+    )
+    arbiter = GPUArbiter(devices=[0], inference_slots=1, pause_threshold=2, resume_delay=0.05)
+    supervisor = TrainingSupervisor(
+        state_dir=str(tmp_path), arbiter=arbiter, kill_timeout=2,
+        command=lambda job: [sys.executable, "-c", script]
+    )
+    seen = []
+
+    async def scenario():
+        job = await supervisor.start("proj", 10)
+        await asyncio.sleep(0.3)
+        # One request running, two waiting: the spike pauses training
+        spike = asyncio.gather(*(_request(arbiter, [], hold=0.05) for _ in range(3)))
+        await asyncio.sleep(0.02)
+        seen.append(job.status)
+        await spike
+        seen.append(job.status)
+        await asyncio.sleep(0.1)
+        seen.append(job.status)
+        # Below the threshold: no pause
+        await asyncio.gather(*(_request(arbiter, [], hold=0.01) for _ in range(2)))
+        seen.append(job.status)
+        supervisor.pause(job.job_id)
+        assert await supervisor.cancel(job.job_id)
+        return job
+
+    job = asyncio.run(scenario())
+    assert seen == [PAUSED, PAUSED, RUNNING, RUNNING]
+    assert (job.device, job.gpu_mode, job.status) == (0, SHARED, CANCELLED)
+    assert "device '0'" in supervisor.read_logs(job.job_id)["lines"]
+    assert arbiter.decisions["pause"] == 1 and arbiter.decisions["resume"] == 1
+    # Lease released with the process
+    assert arbiter.leases == {} and arbiter.inference_capacity() == 1
+
+
+def test_residency_batches_groups_behind_arbiter_slots():
+    from model_residency import ModelResidency
+
+    switches = []
+    residency = ModelResidency()
+    for name in ("main", "upscaler"):
+        residency.register(name, activate=lambda name=name: switches.append(name),
+                           deactivate=lambda: None, default=name == "main")
+    # Training shares the only device: one inference slot
+    arbiter = GPUArbiter(devices=[0], inference_slots=2, shared_slots=1)
+    order = []
+
+    async def request(name):
+        # Same nesting as server.gpu_group
+        async with residency.use(name), arbiter.inference():
+            order.append(name)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        await arbiter.reserve_training("train")
+        async with residency.use("main"):
+            # Upscales and main-model requests arrive interleaved
+            tasks = [asyncio.create_task(request(name)) for name in ["upscaler", "main"] * 4]
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order == ["main"] * 4 + ["upscaler"] * 4
+    assert switches == ["upscaler"] and residency.stats()["switches"] == 1
@@ -0,0 +1,127 @@
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from http_fetch import AsyncImageFetcher, FetchError, HTTPX_AVAILABLE, sniff_image_type
+from image_cache import DecodedImageCache
+
+PNG_BODY = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+requires_httpx = pytest.mark.skipif(not HTTPX_AVAILABLE, reason="httpx not installed")
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Local stand-in for remote image hosts"""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/image.png":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self._send(200, PNG_BODY, "image/png", {"ETag": '"v1"'})
+        elif self.path == "/slow.png":
+            time.sleep(1.0)
+            self._send(200, PNG_BODY, "image/png")
+        elif self.path == "/big.png":
+            self._send(200, PNG_BODY + b"\x00" * 4096, "image/png")
+        elif self.path == "/page.html":
+            self._send(200, b"<html>ngrok warning</html>", "text/html")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    def _send(self, status, body, content_type, extra=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (extra or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def stand_in_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+def test_sniff_image_type():
+    assert sniff_image_type(PNG_BODY) == "image/png"
+    assert sniff_image_type(b"\xff\xd8\xff\xe0rest") == "image/jpeg"
+    assert sniff_image_type(b"RIFF\x00\x00\x00\x00WEBPVP8 ") == "image/webp"
+    assert sniff_image_type(b"<html>") is None
+
+
+@requires_httpx
+def test_fetch_and_conditional_revalidation(stand_in_server):
+    async def run():
+        fetcher = AsyncImageFetcher(cache=DecodedImageCache())
+        first = await fetcher.fetch(f"{stand_in_server}/image.png")
+        second = await fetcher.fetch(f"{stand_in_server}/image.png")
+        # Idle hosts hold no semaphore
+        assert fetcher._host_limits == {}
+        await fetcher.close()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first.body == PNG_BODY
+    assert first.content_type == "image/png"
+    assert second.not_modified
+    assert second.content_key == first.content_key
+
+
+@requires_httpx
+def test_size_cap_and_non_image_rejected(stand_in_server):
+    async def run(path):
+        fetcher = AsyncImageFetcher(max_bytes=1024, cache=DecodedImageCache())
+        try:
+            return await fetcher.fetch(f"{stand_in_server}{path}")
+        finally:
+            await fetcher.close()
+
+    with pytest.raises(FetchError):
+        asyncio.run(run("/big.png"))
+    with pytest.raises(FetchError):
+        asyncio.run(run("/page.html"))
+    with pytest.raises(FetchError):
+        asyncio.run(run("/missing.png"))
+
+
+@requires_httpx
+def test_event_loop_stays_responsive_during_slow_fetch(stand_in_server):
+    async def run():
+        fetcher = AsyncImageFetcher(cache=DecodedImageCache())
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        results = await asyncio.gather(*[
+            fetcher.fetch(f"{stand_in_server}/slow.png") for _ in range(3)
+        ])
+        task.cancel()
+        await fetcher.close()
+        return ticks, results
+
+    start = time.perf_counter()
+    ticks, results = asyncio.run(run())
+    elapsed = time.perf_counter() - start
+
+    assert all(r.body == PNG_BODY for r in results)
+    # Three 1s fetches run concurrently and the loop keeps ticking meanwhile
+    assert elapsed < 2.5
+    assert ticks >= 50
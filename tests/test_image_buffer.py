@@ -0,0 +1,53 @@
+import numpy as np
+from PIL import Image
+
+from image_buffer import (
+    rgb_array, bgr_array, image_from_bgr, image_from_gray,
+    swap_rb_inplace, channel_view
+)
+
+
+def _sample():
+    return Image.new("RGB", (6, 4), (10, 20, 30))
+
+
+def test_bgr_array_swaps_channels():
+    array = bgr_array(_sample())
+    assert array.shape == (4, 6, 3)
+    assert tuple(array[0, 0]) == (30, 20, 10)
+    assert not array.flags.writeable
+
+
+def test_bgr_array_writable():
+    array = bgr_array(_sample(), writable=True)
+    assert array.flags.writeable
+    assert tuple(array[0, 0]) == (30, 20, 10)
+
+
+def test_bgr_round_trip():
+    source = Image.fromarray(np.random.default_rng(0).integers(0, 255, (5, 7, 3), dtype=np.uint8))
+    assert image_from_bgr(bgr_array(source)).tobytes() == source.tobytes()
+
+
+def test_rgb_array_converts_mode():
+    array = rgb_array(Image.new("RGBA", (3, 2), (1, 2, 3, 4)))
+    assert array.shape == (2, 3, 3)
+
+
+def test_image_from_gray_expands_to_rgb():
+    edges = np.zeros((4, 6), dtype=np.uint8)
+    edges[1, 2] = 255
+    image = image_from_gray(edges)
+    assert image.mode == "RGB"
+    assert image.getpixel((2, 1)) == (255, 255, 255)
+
+
+def test_swap_inplace_and_view():
+    array = np.array(_sample())
+    pointer = array.ctypes.data
+    swapped = swap_rb_inplace(array)
+    assert swapped.ctypes.data == pointer
+    assert tuple(swapped[0, 0]) == (30, 20, 10)
+    view = channel_view(swapped)
+    assert np.shares_memory(view, swapped)
+    assert tuple(view[0, 0]) == (10, 20, 30)
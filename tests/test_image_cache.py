@@ -0,0 +1,67 @@
+from image_cache import DecodedImageCache, URLValidators, content_key
+
+
+class FakeImage:
+    def __init__(self, width, height, bands=("R", "G", "B")):
+        self.width = width
+        self.height = height
+        self._bands = bands
+
+    def getbands(self):
+        return self._bands
+
+
+def test_content_key_is_stable():
+    assert content_key("abc") == content_key(b"abc")
+    assert content_key("abc") != content_key("abd")
+
+
+def test_hit_and_miss_counters():
+    cache = DecodedImageCache(max_bytes=10_000)
+    image = FakeImage(10, 10)
+    assert cache.get("k") is None
+    cache.put("k", image)
+    assert cache.get("k") is image
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+    assert stats["bytes"] == 300
+
+
+def test_memory_budget_evicts_least_recently_used():
+    cache = DecodedImageCache(max_bytes=1000)
+    cache.put("a", FakeImage(10, 10))  # 300 bytes
+    cache.put("b", FakeImage(10, 10))
+    cache.put("c", FakeImage(10, 10))
+    cache.get("a")  # refresh a, b becomes LRU
+    cache.put("d", FakeImage(10, 10))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.current_bytes <= 1000
+    assert cache.evictions == 1
+
+
+def test_oversized_image_not_cached():
+    cache = DecodedImageCache(max_bytes=100)
+    cache.put("big", FakeImage(100, 100))
+    assert len(cache) == 0
+    assert cache.current_bytes == 0
+
+
+def test_entry_limit():
+    cache = DecodedImageCache(max_bytes=10**9, max_entries=2)
+    for key in "abc":
+        cache.put(key, FakeImage(1, 1))
+    assert len(cache) == 2
+    assert cache.get("a") is None
+
+
+def test_url_validators():
+    cache = DecodedImageCache()
+    cache.put_url("http://x/img.png", URLValidators("key", etag='"v1"', last_modified="Mon"))
+    headers = cache.get_url("http://x/img.png").request_headers()
+    assert headers == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon"}
+    assert cache.get_url("http://x/other.png") is None
@@ -0,0 +1,52 @@
+from io import BytesIO
+
+from PIL import Image
+
+from image_decode import open_rgb, normalize_size_hint, reduction_factor
+
+
+def _encode(image, fmt):
+    buffer = BytesIO()
+    image.save(buffer, format=fmt)
+    buffer.seek(0)
+    return buffer
+
+
+def test_normalize_size_hint():
+    assert normalize_size_hint(None) is None
+    assert normalize_size_hint(384) == (384, 384)
+    assert normalize_size_hint((640, 480)) == (640, 480)
+
+
+def test_reduction_factor_keeps_both_sides_above_target():
+    assert reduction_factor((4000, 3000), (640, 640)) == 4
+    assert reduction_factor((600, 3000), (640, 640)) == 1
+
+
+def test_jpeg_draft_decodes_smaller_but_not_below_hint():
+    source = _encode(Image.new("RGB", (2400, 1600), "red"), "JPEG")
+    image = open_rgb(source, target_size=384)
+    assert image.mode == "RGB"
+    assert image.width >= 384 and image.height >= 384
+    assert image.width <= 2400 // 2
+
+
+def test_png_reduced_after_decode():
+    source = _encode(Image.new("RGBA", (2000, 1000), (0, 0, 255, 255)), "PNG")
+    image = open_rgb(source, target_size=(400, 400))
+    assert image.mode == "RGB"
+    assert image.size == (1000, 500)
+
+
+def test_no_hint_keeps_full_resolution():
+    source = _encode(Image.new("L", (300, 200)), "PNG")
+    image = open_rgb(source)
+    assert image.size == (300, 200)
+    assert image.mode == "RGB"
+
+
+def test_palette_image_reduced():
+    source = _encode(Image.new("P", (1000, 1000)), "PNG")
+    image = open_rgb(source, target_size=200)
+    assert image.size == (200, 200)
+    assert image.mode == "RGB"
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+from latent_cache import Encoders, LatentCache, LatentDataset
+
+
+def _encoders(calls, version="stand-in"):
+    def encode_images(pixels):
+        calls["images"] += len(pixels)
+        b, c, h, w = pixels.shape
+        # 8x average pool to 4 channels, the shape an SD VAE produces
+        pooled = pixels.reshape(b, c, h // 8, 8, w // 8, 8).mean(axis=(3, 5))
+        return np.concatenate([pooled, pooled[:, :1]], axis=1)
+
+    def encode_text(captions):
+        calls["texts"] += len(captions)
+        embeds = np.stack([np.full((4, 8), len(c), dtype=np.float32) for c in captions])
+        return embeds, embeds[:, 0]
+
+    return Encoders(version=version, encode_images=encode_images, encode_text=encode_text)
+
+
+def _image(path, size, seed):
+    rng = np.random.default_rng(seed)
+    Image.fromarray(rng.integers(0, 255, (size[1], size[0], 3), dtype=np.uint8)).save(path)
+
+
+def test_prepare_skips_unchanged_and_encodes_only_new(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    _image(str(data / "a.png"), (256, 256), 0)
+    _image(str(data / "b.png"), (384, 192), 1)
+    _image(str(data / "c.png"), (200, 300), 2)
+    (data / "c.txt").write_text("a custom caption\n")
+    cache = LatentCache(str(tmp_path / "cache"))
+    calls = {"images": 0, "texts": 0}
+
+    stats = cache.prepare(str(data), _encoders(calls), "a photo of sks", resolution=256, batch_size=2)
+    assert (stats.encoded, stats.reused, stats.texts_encoded) == (3, 0, 2)
+    assert calls == {"images": 3, "texts": 2}
+
+    # Unchanged dataset: nothing encoded, no bucket rewritten
+    stats = cache.prepare(str(data), _encoders(calls), "a photo of sks", resolution=256)
+    assert (stats.encoded, stats.reused, stats.buckets_written) == (0, 3, 0)
+    assert calls == {"images": 3, "texts": 2}
+
+    # One image replaced, one added, one removed
+    _image(str(data / "a.png"), (256, 256), 5)
+    _image(str(data / "d.png"), (256, 256), 6)
+    os.remove(data / "b.png")
+    stats = cache.prepare(str(data), _encoders(calls), "a photo of sks", resolution=256)
+    assert (stats.encoded, stats.reused) == (2, 1)
+    assert calls["images"] == 5 and calls["texts"] == 2
+
+    dataset = cache.open("stand-in", 256)
+    assert len(dataset) == 3
+    assert sorted(dataset.buckets) == ["192x320", "256x256"]
+    # Stale generations are removed
+    files = os.listdir(dataset.directory)
+    assert len([f for f in files if f.startswith("latents_")]) == 2
+
+    # A different encoder version gets its own cache
+    stats = cache.prepare(str(data), _encoders(calls, version="other-vae"), "a photo of sks", resolution=256)
+    assert stats.encoded == 3
+
+
+def test_dataset_batches_from_memory_mapped_arrays(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    for i in range(5):
+        _image(str(data / f"img_{i}.png"), (256, 256) if i % 2 else (400, 200), i)
+    (data / "img_0.txt").write_text("caption zero")
+    cache = LatentCache(str(tmp_path / "cache"))
+    cache.prepare(str(data), _encoders({"images": 0, "texts": 0}), "sks", resolution=256)
+
+    dataset = LatentDataset(cache.directory("stand-in", 256))
+    batches = list(dataset.batches(batch_size=2, seed=0))
+    assert sum(len(b["latents"]) for b in batches) == 5
+    for batch in batches:
+        width, height = (int(v) for v in batch["bucket"].split("x"))
+        assert batch["latents"].shape[1:] == (4, height // 8, width // 8)
+        assert batch["latents"].dtype == np.float16
+        assert batch["prompt_embeds"].shape[1:] == (4, 8)
+        assert batch["pooled_prompt_embeds"].shape[1:] == (8,)
+        assert (batch["time_ids"][:, 4:] == [height, width]).all()
+    assert all(isinstance(a, np.memmap) for a in dataset._latents.values())
+    # The sidecar caption has its own embedding row
+    assert set(np.unique(dataset._text[:, 0, 0])) == {len("sks"), len("caption zero")}
@@ -0,0 +1,114 @@
+import asyncio
+import math
+from types import SimpleNamespace
+
+import torch
+
+from llm_server import LLMServer
+from llm_stream import AsyncTextStreamer, STOP_COMPLETE
+
+
+class TinyCausalLM(torch.nn.Module):
+    """One attention layer with the calling convention of a transformers causal LM"""
+
+    def __init__(self, vocab=40, dim=16, heads=2):
+        super().__init__()
+        torch.manual_seed(0)
+        self.heads, self.head_dim = heads, dim // heads
+        self.embed = torch.nn.Embedding(vocab, dim)
+        self.positions = torch.nn.Embedding(256, dim)
+        self.qkv = torch.nn.Linear(dim, 3 * dim)
+        self.head = torch.nn.Linear(dim, vocab)
+
+    def forward(self, input_ids, attention_mask, position_ids, past_key_values=None, use_cache=True):
+        b, t = input_ids.shape
+        x = self.embed(input_ids) + self.positions(position_ids)
+        q, k, v = (p.view(b, t, self.heads, self.head_dim).transpose(1, 2) for p in self.qkv(x).chunk(3, dim=-1))
+        if past_key_values:
+            k = torch.cat([past_key_values[0][0], k], dim=2)
+            v = torch.cat([past_key_values[0][1], v], dim=2)
+        total = k.shape[2]
+        scores = q @ k.transpose(-1, -2) / math.sqrt(self.head_dim)
+        causal = torch.arange(total)[None, :] <= torch.arange(total - t, total)[:, None]
+        allowed = causal[None, None] & attention_mask[:, None, None, :].bool()
+        attn = torch.softmax(scores.masked_fill(~allowed, float("-inf")), dim=-1) @ v
+        x = x + attn.transpose(1, 2).reshape(b, t, -1)
+        return SimpleNamespace(logits=self.head(x), past_key_values=((k, v),))
+
+
+def reference_greedy(model, ids, new_tokens):
+    ids = list(ids)
+    out = []
+    with torch.no_grad():
+        for _ in range(new_tokens):
+            t = torch.tensor([ids])
+            logits = model(t, torch.ones_like(t), torch.arange(len(ids))[None]).logits
+            ids.append(int(logits[0, -1].argmax()))
+            out.append(ids[-1])
+    return out
+
+
+PREFIX = [1, 2, 3, 4, 5, 6, 7, 8]
+PROMPTS = [PREFIX + [9, 10], PREFIX + [11], PREFIX[:5] + [12, 13, 14, 15], [20, 21]]
+
+
+def test_continuous_batching_matches_unbatched_greedy():
+    model = TinyCausalLM().eval()
+    server = LLMServer(model, max_batch=2, name="test_llm")
+    server.set_prefix(PREFIX)
+    lengths = [12, 3, 7, 5]
+
+    async def scenario():
+        return await asyncio.gather(*(
+            server.generate(ids, max_new_tokens=n) for ids, n in zip(PROMPTS, lengths)
+        ))
+
+    results = asyncio.run(scenario())
+    server.close()
+    for ids, n, result in zip(PROMPTS, lengths, results):
+        assert result.token_ids == reference_greedy(model, ids, n)
+    assert [r.prefix_tokens for r in results] == [8, 8, 5, 0]
+    stats = server.stats()
+    assert stats["completed"] == 4 and stats["mean_batch"] > 1
+    assert stats["generated_tokens"] == sum(lengths)
+
+
+def test_seeded_sampling_does_not_depend_on_batch():
+    model = TinyCausalLM().eval()
+    server = LLMServer(model, max_batch=4)
+
+    async def alone():
+        return await server.generate(PROMPTS[0], 10, do_sample=True, temperature=0.8, top_p=0.9, seed=7)
+
+    async def crowded():
+        results = await asyncio.gather(
+            server.generate(PROMPTS[1], 15, do_sample=True),
+            server.generate(PROMPTS[0], 10, do_sample=True, temperature=0.8, top_p=0.9, seed=7),
+            server.generate(PROMPTS[3], 4)
+        )
+        return results[1]
+
+    assert asyncio.run(alone()).token_ids == asyncio.run(crowded()).token_ids
+    server.close()
+
+
+def test_eos_and_streamer_stops_leave_the_batch():
+    model = TinyCausalLM().eval()
+    expected = reference_greedy(model, PROMPTS[0], 6)
+    server = LLMServer(model, eos_token_ids=[expected[3]])
+
+    async def scenario():
+        # Completion after the second token, as the enhancer's paragraph stop would
+        streamer = AsyncTextStreamer(lambda ids: "".join(f"t{i} " for i in ids), asyncio.get_running_loop(),
+                                     complete_at=lambda text: len(text) if text.count("t") >= 2 else None,
+                                     skip_prompt=False)
+        stopped, eos = await asyncio.gather(
+            server.generate(PROMPTS[0], 6, streamer=streamer),
+            server.generate(PROMPTS[0], 6)
+        )
+        return streamer, stopped, eos
+
+    streamer, stopped, eos = asyncio.run(scenario())
+    server.close()
+    assert stopped.token_ids == expected[:2] and streamer.stop_reason == STOP_COMPLETE
+    assert eos.token_ids == expected[:3]
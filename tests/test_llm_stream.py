@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from llm_stream import AsyncTextStreamer, STOP_CANCELLED, STOP_COMPLETE, STOP_LENGTH
+
+VOCAB = ["A", " misty", " forest", " at", " dawn", ".", "\n\n", "Note:", " this", " adds"]
+
+
+def decode(ids):
+    return "".join(VOCAB[i] for i in ids)
+
+
+def fake_generate(streamer, ids, max_new_tokens=None, on_token=None):
+    """Mimics transformers: prompt first, one put() per step, criteria after each put"""
+    streamer.put([[99, 98]])
+    criteria = streamer.stopping_criteria()
+    produced = 0
+    for token in ids[:max_new_tokens]:
+        streamer.put([token])
+        produced += 1
+        if on_token is not None:
+            on_token(produced)
+        if criteria(None, None):
+            break
+    streamer.end()
+    return produced
+
+
+def test_streams_pieces_and_stops_at_paragraph_end():
+    async def scenario():
+        streamer = AsyncTextStreamer(decode, asyncio.get_running_loop())
+        task = streamer.run(fake_generate, streamer, list(range(10)))
+        pieces = [piece async for piece in streamer]
+        return streamer, pieces, await task
+
+    streamer, pieces, produced = asyncio.run(scenario())
+    assert pieces == ["A", " misty", " forest", " at", " dawn", "."]
+    assert streamer.text == "A misty forest at dawn."
+    # Generation ended on the paragraph break, not after the trailing note
+    assert produced == 7 and streamer.stop_reason == STOP_COMPLETE
+
+
+def test_length_stop_and_collect_only_mode():
+    streamer = AsyncTextStreamer(decode, max_tokens=3)
+    fake_generate(streamer, list(range(10)), max_new_tokens=3)
+    assert streamer.text == "A misty forest" and streamer.stop_reason == STOP_LENGTH
+    assert streamer.stats()["tokens"] == 3
+
+
+def test_stop_cancels_mid_stream():
+    async def scenario():
+        streamer = AsyncTextStreamer(decode, asyncio.get_running_loop())
+        task = streamer.run(fake_generate, streamer, list(range(6)),
+                            None, lambda n: n == 2 and streamer.stop())
+        pieces = [piece async for piece in streamer]
+        return streamer, pieces, await task
+
+    streamer, pieces, produced = asyncio.run(scenario())
+    assert produced == 2 and pieces == ["A", " misty"]
+    assert streamer.stop_reason == STOP_CANCELLED
+
+
+def test_generation_errors_reach_the_iterator():
+    def broken(streamer):
+        streamer.put([[1]])
+        streamer.put([0])
+        raise RuntimeError("CUDA out of memory")
+
+    async def scenario():
+        streamer = AsyncTextStreamer(decode, asyncio.get_running_loop())
+        streamer.run(broken, streamer)
+        return [piece async for piece in streamer]
+
+    with pytest.raises(RuntimeError, match="out of memory"):
+        asyncio.run(scenario())
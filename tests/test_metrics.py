@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+
+from metrics import MetricsRegistry, MetricsMiddleware, http_requests_total, http_request_duration
+
+
+def test_counter_render():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "A test counter", ("kind",))
+    counter.inc("a")
+    counter.inc("a", amount=2)
+    counter.inc("b")
+
+    text = registry.render()
+    assert "# TYPE test_total counter" in text
+    assert 'test_total{kind="a"} 3' in text
+    assert 'test_total{kind="b"} 1' in text
+
+
+def test_counter_rejects_wrong_label_count():
+    registry = MetricsRegistry()
+    counter = registry.counter("test_total", "A test counter", ("kind",))
+    with pytest.raises(ValueError):
+        counter.inc("a", "b")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    hist = registry.histogram("test_seconds", "A test histogram", buckets=(0.1, 1.0))
+    hist.observe(0.05)
+    hist.observe(0.5)
+    hist.observe(5.0)
+
+    text = registry.render()
+    assert 'test_seconds_bucket{le="0.1"} 1' in text
+    assert 'test_seconds_bucket{le="1"} 2' in text
+    assert 'test_seconds_bucket{le="+Inf"} 3' in text
+    assert "test_seconds_count 3" in text
+    assert hist.get_count() == 3
+
+
+def test_gauge_function_evaluated_on_scrape():
+    registry = MetricsRegistry()
+    depth = {"queued": 2}
+    registry.gauge("test_jobs", "Jobs", ("state",)).set_function(
+        lambda: {(k,): v for k, v in depth.items()}
+    )
+    assert 'test_jobs{state="queued"} 2' in registry.render()
+    depth["queued"] = 7
+    assert 'test_jobs{state="queued"} 7' in registry.render()
+
+
+def test_register_returns_existing_metric():
+    registry = MetricsRegistry()
+    first = registry.counter("test_total", "A test counter")
+    assert registry.counter("test_total", "A test counter") is first
+    with pytest.raises(ValueError):
+        registry.gauge("test_total", "Same name, different type")
+
+
+def test_middleware_records_route_template_and_status():
+    class FakeRoute:
+        path = "/loras/{lora_id}"
+
+    async def app(scope, receive, send):
+        scope["route"] = FakeRoute()
+        await send({"type": "http.response.start", "status": 404, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    middleware = MetricsMiddleware(app)
+    scope = {"type": "http", "path": "/loras/abc", "method": "GET"}
+    before = http_requests_total.get("GET", "/loras/{lora_id}", "404")
+    asyncio.run(middleware(scope, None, send))
+
+    assert http_requests_total.get("GET", "/loras/{lora_id}", "404") == before + 1
+    assert http_request_duration.get_count("GET", "/loras/{lora_id}") >= 1
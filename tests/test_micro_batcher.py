@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from micro_batcher import MicroBatcher
+
+
+def test_concurrent_requests_share_batches():
+    sizes = []
+
+    def process(items):
+        sizes.append(len(items))
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher(process, max_batch=4, max_wait=0.05, name="test")
+
+    async def scenario():
+        return await asyncio.gather(*(batcher.submit(i) for i in range(10)))
+
+    assert asyncio.run(scenario()) == [i * 10 for i in range(10)]
+    assert sizes == [4, 4, 2]
+    assert batcher.stats()["items"] == 10 and batcher.stats()["batches"] == 3
+
+
+def test_lone_request_waits_at_most_max_wait():
+    batcher = MicroBatcher(lambda items: items, max_batch=8, max_wait=0.0)
+
+    async def scenario():
+        first = await batcher.submit("a")
+        return first, await batcher.submit_many(["b", "c"])
+
+    assert asyncio.run(scenario()) == ("a", ["b", "c"])
+    assert batcher.batches == 2
+
+
+def test_batch_errors_reach_every_caller():
+    def process(items):
+        raise RuntimeError("model failed")
+
+    batcher = MicroBatcher(process, max_wait=0.01)
+
+    async def scenario():
+        return await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+    short = MicroBatcher(lambda items: items[:1], max_wait=0.01)
+    with pytest.raises(RuntimeError):
+        asyncio.run(short.submit_many([1, 2]))
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from model_residency import ModelResidency
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _residency(log, **kwargs):
+    residency = ModelResidency(**kwargs)
+    for name in ("main", "upscaler"):
+        residency.register(
+            name,
+            activate=lambda name=name: log.append(f"+{name}"),
+            deactivate=lambda name=name: log.append(f"-{name}"),
+            default=name == "main"
+        )
+    return residency
+
+
+async def _job(residency, name, order, hold=0.01):
+    async with residency.use(name):
+        order.append(name)
+        await asyncio.sleep(hold)
+
+
+def test_consecutive_requests_share_one_switch():
+    log, order = [], []
+    residency = _residency(log)
+
+    async def scenario():
+        # Queue one main job behind a burst of upscales
+        await asyncio.gather(
+            *[_job(residency, "upscaler", order) for _ in range(4)],
+            _job(residency, "main", order)
+        )
+        await _job(residency, "upscaler", order)
+
+    asyncio.run(scenario())
+    assert log == ["-main", "+upscaler", "-upscaler", "+main", "-main", "+upscaler"]
+    assert order == ["upscaler"] * 4 + ["main", "upscaler"]
+    assert residency.stats()["switches"] == 3
+
+
+def test_group_run_is_bounded_while_others_wait():
+    log, order = [], []
+    residency = _residency(log, max_group_run=2)
+
+    async def scenario():
+        async with residency.use("upscaler"):
+            order.append("upscaler")
+            # main queues first, then a burst of upscales arrives
+            main = asyncio.create_task(_job(residency, "main", order))
+            await asyncio.sleep(0)
+            burst = [asyncio.create_task(_job(residency, "upscaler", order)) for _ in range(4)]
+            await asyncio.sleep(0)
+        await asyncio.gather(main, *burst)
+
+    asyncio.run(scenario())
+    assert order == ["upscaler", "upscaler", "main", "upscaler", "upscaler", "upscaler"]
+
+
+def test_idle_and_memory_pressure_eviction():
+    log = []
+    clock = FakeClock()
+    free = {"bytes": 8 << 30}
+    residency = _residency(
+        log, idle_timeout=60, clock=clock, min_free_bytes=1 << 30, free_memory=lambda: free["bytes"]
+    )
+
+    async def scenario():
+        assert await residency.check() is None  # default group is never evicted
+        async with residency.use("upscaler"):
+            clock.now += 120
+            assert await residency.check() is None  # busy
+        clock.now += 30
+        assert await residency.check() is None
+        clock.now += 31
+        assert await residency.check() == "upscaler"
+
+        async with residency.use("upscaler"):
+            pass
+        free["bytes"] = 512 << 20
+        assert await residency.check() == "upscaler"
+
+    asyncio.run(scenario())
+    assert residency.resident is None
+    assert residency.stats()["evictions"] == {"idle": 1, "memory_pressure": 1}
+    assert log == ["-main", "+upscaler", "-upscaler", "+upscaler", "-upscaler"]
+
+
+def test_failed_activation_releases_waiters():
+    residency = ModelResidency()
+    residency.register("main", lambda: None, lambda: None, default=True)
+
+    def boom():
+        raise RuntimeError("out of memory")
+
+    residency.register("upscaler", boom, lambda: None)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            async with residency.use("upscaler"):
+                pass
+        async with residency.use("main"):
+            pass
+        with pytest.raises(KeyError):
+            async with residency.use("nope"):
+                pass
+
+    asyncio.run(scenario())
+    assert residency.resident == "main"
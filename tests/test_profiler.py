@@ -0,0 +1,67 @@
+import asyncio
+import json
+import os
+import pytest
+
+from metrics import stage
+from profiler import RequestProfiler, ProfilerMiddleware
+
+
+async def _send(message):
+    pass
+
+
+def _make_app():
+    async def app(scope, receive, send):
+        with stage("generate", "pipeline"):
+            sum(range(1000))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+    return app
+
+
+def _request(middleware, path="/generate"):
+    asyncio.run(middleware({"type": "http", "path": path, "method": "POST"}, None, _send))
+
+
+def test_arm_profiles_next_n_requests(tmp_path):
+    profiler = RequestProfiler(traces_dir=str(tmp_path))
+    middleware = ProfilerMiddleware(_make_app(), profiler=profiler)
+
+    profiler.arm("/generate", count=2, mode="cprofile")
+    _request(middleware, "/other")
+    _request(middleware)
+    assert profiler.armed["/generate"][0] == 1
+    _request(middleware)
+    _request(middleware)
+    assert "/generate" not in profiler.armed
+
+    names = os.listdir(tmp_path)
+    assert len([n for n in names if n.endswith(".trace.json")]) == 2
+    assert len([n for n in names if n.endswith(".prof")]) == 2
+
+    trace_name = next(n for n in names if n.endswith(".trace.json"))
+    with open(tmp_path / trace_name) as f:
+        trace = json.load(f)
+    stages = [e["name"] for e in trace["traceEvents"] if e["cat"] == "generate"]
+    assert stages == ["pipeline"]
+
+
+def test_disarm_and_validation(tmp_path):
+    profiler = RequestProfiler(traces_dir=str(tmp_path))
+    profiler.arm("/generate", count=3)
+    profiler.disarm("/generate")
+    assert profiler.armed == {}
+
+    with pytest.raises(ValueError):
+        profiler.arm("/generate", count=1, mode="perf")
+    with pytest.raises(ValueError):
+        profiler.arm("/generate", count=0)
+
+
+def test_trace_path_rejects_traversal(tmp_path):
+    profiler = RequestProfiler(traces_dir=str(tmp_path))
+    (tmp_path / "a.trace.json").write_text("{}")
+    assert profiler.trace_path("a.trace.json") is not None
+    assert profiler.trace_path("../a.trace.json") == str(tmp_path / "a.trace.json")
+    assert profiler.trace_path("missing.json") is None
@@ -0,0 +1,60 @@
+import pytest
+import torch
+from torch import nn
+
+from quantized_models import QuantizedModelCache, model_size_mb, resolve_backend
+
+
+class Tiny(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.embed = nn.Embedding(50, 64)
+        self.blocks = nn.Sequential(nn.Linear(64, 256), nn.GELU(), nn.Linear(256, 64))
+        self.head = nn.Linear(64, 50)
+        self.register_buffer("scale", torch.full((64,), 0.5), persistent=False)
+
+    def forward(self, ids):
+        x = self.embed(ids) * self.scale
+        return self.head(x + self.blocks(x))
+
+
+def fp32_model():
+    torch.manual_seed(0)
+    return Tiny().eval()
+
+
+def test_int8_is_cached_and_restored_without_fp32(tmp_path):
+    cache = QuantizedModelCache(str(tmp_path))
+    ids = torch.arange(20)[None]
+    built = []
+
+    quantized, info = cache.load("org/tiny-model", fp32_model, Tiny)
+    assert info["source"] == "quantized" and (tmp_path / info["path"].split("/")[-1]).exists()
+
+    def no_fp32():
+        raise AssertionError("fp32 weights must not be loaded from a warm cache")
+
+    restored, info = cache.load("org/tiny-model", no_fp32, lambda: built.append(1) or Tiny())
+    assert info["source"] == "cache" and built == [1]
+    with torch.no_grad():
+        assert torch.equal(quantized(ids), restored(ids))
+        reference = fp32_model()(ids)
+        # Close to fp32, and the argmax (greedy token) mostly unchanged
+        assert torch.allclose(restored(ids), reference, atol=0.1)
+        assert (restored(ids).argmax(-1) == reference.argmax(-1)).float().mean() >= 0.9
+    assert model_size_mb(restored) < model_size_mb(fp32_model()) / 2
+
+
+def test_corrupt_cache_is_rebuilt(tmp_path):
+    cache = QuantizedModelCache(str(tmp_path))
+    with open(cache.path("m"), "wb") as f:
+        f.write(b"truncated")
+    _, info = cache.load("m", fp32_model, Tiny)
+    assert info["source"] == "quantized"
+    assert cache.load("m", fp32_model, Tiny)[1]["source"] == "cache"
+
+
+def test_backend_names_are_validated():
+    assert resolve_backend(None) == "fp32"
+    with pytest.raises(ValueError):
+        resolve_backend("int4")
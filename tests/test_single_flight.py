@@ -0,0 +1,93 @@
+import asyncio
+
+import pytest
+
+from single_flight import CACHED, COMPUTED, SHARED, Measured, SingleFlightCache
+
+
+def _counter():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return f"result {len(calls)}"
+    return calls, compute
+
+
+def test_concurrent_identical_requests_share_one_computation():
+    cache = SingleFlightCache(name="test")
+    calls, compute = _counter()
+
+    async def scenario():
+        first = await asyncio.gather(*(cache.run("k", compute) for _ in range(5)))
+        again = await cache.run("k", compute)
+        return first, again
+
+    first, again = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [source for _, source in first] == [COMPUTED] + [SHARED] * 4
+    assert again == ("result 1", CACHED)
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["shared"] == 4 and stats["misses"] == 1
+    assert stats["saved_seconds"] >= 5 * 0.01 * 0.9
+
+
+def test_uncacheable_results_are_shared_but_not_stored():
+    cache = SingleFlightCache()
+    calls, compute = _counter()
+
+    async def scenario():
+        await asyncio.gather(*(cache.run("k", compute, cacheable=False) for _ in range(3)))
+        return await cache.run("k", compute, cacheable=False)
+
+    assert asyncio.run(scenario()) == ("result 2", COMPUTED)
+    assert len(calls) == 2 and len(cache) == 0
+
+
+def test_errors_reach_followers_and_are_not_cached():
+    cache = SingleFlightCache(max_entries=1)
+    attempts = []
+
+    async def failing():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("generation failed")
+
+    async def scenario():
+        results = await asyncio.gather(cache.run("k", failing), cache.run("k", failing), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        with pytest.raises(RuntimeError):
+            await cache.run("k", failing)
+
+    asyncio.run(scenario())
+    assert len(attempts) == 2
+
+
+def test_leader_cancellation_does_not_cancel_followers():
+    cache = SingleFlightCache()
+    calls, compute = _counter()
+
+    async def scenario():
+        leader = asyncio.ensure_future(cache.run("k", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.run("k", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(scenario()) == ("result 1", SHARED)
+
+
+def test_measured_cost_is_credited():
+    cache = SingleFlightCache()
+
+    async def compute():
+        return Measured("value", 2.5)
+
+    async def scenario():
+        await cache.run("k", compute)
+        return await cache.run("k", compute)
+
+    assert asyncio.run(scenario()) == ("value", CACHED)
+    assert cache.stats()["compute_seconds"] == 2.5 and cache.stats()["saved_seconds"] == 2.5
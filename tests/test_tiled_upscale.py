@@ -0,0 +1,59 @@
+import threading
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from tiled_upscale import TileCancelled, TiledUpscaler, plan_tiles, tile_weights
+
+
+def _nearest_x4(tiles):
+    return [tile.resize((tile.width * 4, tile.height * 4), Image.Resampling.NEAREST) for tile in tiles]
+
+
+def _image(width, height):
+    rng = np.random.default_rng(0)
+    return Image.fromarray(rng.integers(0, 255, (height, width, 3), dtype=np.uint8))
+
+
+def test_plan_tiles_covers_image_with_equal_tiles():
+    rows = plan_tiles(300, 130, tile=128, overlap=32)
+    boxes = [box for row in rows for box in row]
+    assert {(x1 - x0, y1 - y0) for x0, y0, x1, y1 in boxes} == {(128, 128)}
+    assert rows[0][-1][2] == 300 and rows[-1][0][3] == 130
+    assert [row[0][1] for row in rows] == [0, 2]
+
+    assert plan_tiles(50, 40, tile=128) == [[(0, 0, 50, 40)]]
+    with pytest.raises(ValueError):
+        plan_tiles(100, 100, tile=64, overlap=64)
+
+
+def test_weights_ramp_only_on_inner_edges():
+    w = tile_weights((0, 0, 64, 64), 200, 64, overlap=16, scale=1)
+    assert w[:, 0].min() == 1.0 and w[0, :32].min() == 1.0  # image border
+    assert w[32, -1] < 0.1 and w[32, 32] == 1.0  # inner edge ramps down
+
+
+@pytest.mark.parametrize("blend", ["feather", "gaussian"])
+@pytest.mark.parametrize("batch_size", [1, 3])
+def test_tiled_matches_whole_image(blend, batch_size):
+    image = _image(150, 110)
+    upscaler = TiledUpscaler(_nearest_x4, scale=4, tile=64, overlap=16, blend=blend, batch_size=batch_size)
+    out = upscaler.run(image)
+    expected = _nearest_x4([image])[0]
+    assert out.size == (600, 440)
+    assert np.abs(np.asarray(out, dtype=np.int16) - np.asarray(expected)).max() <= 1
+
+
+def test_progress_and_cancel():
+    image = _image(150, 110)
+    upscaler = TiledUpscaler(_nearest_x4, tile=64, overlap=16, batch_size=2)
+    seen = []
+    upscaler.run(image, progress=lambda done, total: seen.append((done, total)))
+    total = upscaler.tile_count(150, 110)
+    assert seen[-1] == (total, total) and len(seen) < total
+
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(TileCancelled):
+        upscaler.run(image, cancel=cancel)
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import os
+import sys
+import time
+
+from PIL import Image
+
+from training_supervisor import (
+    CANCELLED, COMPLETED, FAILED, INTERRUPTED, LogRing, TrainingSupervisor, TRAIN_SCRIPT
+)
+
+
+def script_command(source):
+    return lambda job: [sys.executable, "-c", source]
+
+
+def test_log_ring_offsets():
+    ring = LogRing(capacity=3)
+    for i in range(5):
+        ring.append(f"line {i}")
+    page = ring.read(0)
+    assert page["lines"] == ["line 2", "line 3", "line 4"] and page["dropped"] == 2
+    assert ring.read(page["next_offset"])["lines"] == []
+    assert ring.read(3, limit=1) == {"lines": ["line 3"], "offset": 3, "next_offset": 4, "dropped": 0, "total": 5}
+
+
+def test_runs_train_connector_with_json_progress(tmp_path):
+    os.makedirs(tmp_path / "datasets" / "proj")
+    Image.new("RGB", (8, 8)).save(tmp_path / "datasets" / "proj" / "a.png")
+    events = []
+
+    async def notify(job_id, event, data):
+        events.append((event, data))
+
+    supervisor = TrainingSupervisor(
+        state_dir=str(tmp_path / "state"), notify=notify, cwd=str(tmp_path),
+        command=lambda job: [sys.executable, TRAIN_SCRIPT, "--project_name", job.project_name,
+                             "--max_train_steps", str(job.total_steps), "--progress-format", "json",
+                             "--step-seconds", "0"]
+    )
+
+    async def scenario():
+        job = await supervisor.start("proj", 3)
+        await supervisor._tasks[job.job_id]
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == COMPLETED and job.current_step == 3 and job.progress == 100
+    assert job.checkpoints == ["models/loras/proj/proj.safetensors"]
+    assert [e for e, _ in events].count("training_progress") == 3 and events[-1][0] == "training_complete"
+    logs = supervisor.read_logs(job.job_id)["lines"]
+    assert logs[0] == "Job initialized." and logs[-1] == "Training completed successfully."
+    # State and full log are on disk
+    with open(tmp_path / "state" / f"{job.job_id}.json") as f:
+        assert json.load(f)["status"] == COMPLETED
+    assert supervisor._read_log_file(job.job_id, 0, 1000)["lines"] == logs
+
+
+def test_failure_cancel_and_bounded_memory(tmp_path):
+    supervisor = TrainingSupervisor(state_dir=str(tmp_path), log_lines=5, max_jobs=1, kill_timeout=2)
+    failing = script_command(
+        "import json\n"
+        "for i in range(20): print('noise', i)\n"
+        "print(json.dumps({'event': 'done', 'status': 'failed', 'error': 'CUDA OOM'}))"
+    )
+    sleeping = script_command("import time\nprint('started', flush=True)\ntime.sleep(60)")
+
+    async def scenario():
+        supervisor.command = failing
+        failed = await supervisor.start("a", 10)
+        await supervisor._tasks[failed.job_id]
+        supervisor.command = sleeping
+        running = await supervisor.start("b", 10)
+        await asyncio.sleep(0.5)
+        start = time.monotonic()
+        assert await supervisor.cancel(running.job_id)
+        return failed, running, time.monotonic() - start
+
+    failed, running, took = asyncio.run(scenario())
+    assert failed.status == FAILED and failed.error == "CUDA OOM"
+    assert running.status == CANCELLED and took < 2
+    # Ring buffers are bounded; finished jobs beyond max_jobs leave memory but stay readable
+    assert supervisor.stats()["in_memory"] == 1 and failed.job_id not in supervisor.jobs
+    assert supervisor.get(failed.job_id).status == FAILED
+    assert len(supervisor.read_logs(running.job_id)["lines"]) <= 5
+    assert supervisor.read_logs(failed.job_id, offset=2, limit=2)["lines"] == ["noise 0", "noise 1"]
+
+
+def test_jobs_running_at_restart_become_interrupted(tmp_path):
+    with open(tmp_path / "train_old.json", "w") as f:
+        json.dump({"job_id": "train_old", "project_name": "x", "total_steps": 5, "status": "training"}, f)
+    supervisor = TrainingSupervisor(state_dir=str(tmp_path))
+    supervisor.recover()
+    assert supervisor.get("train_old").status == INTERRUPTED
+    assert supervisor.get("../train_old") is None
@@ -0,0 +1,96 @@
+import asyncio
+import io
+import os
+
+import pytest
+
+from image_cache import content_key
+from upload_store import UploadStore, UploadTooLarge
+
+PNG_BODY = b"\x89PNG\r\n\x1a\n" + os.urandom(256)
+
+
+async def _chunks(data, size=64):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def test_save_stream_persists_by_content_hash(tmp_path):
+    store = UploadStore(root=str(tmp_path), spool_bytes=128)
+    stored = asyncio.run(store.save_stream(_chunks(PNG_BODY)))
+
+    assert stored.id == content_key(PNG_BODY)
+    assert stored.ref == f"upload:{stored.id}"
+    assert stored.size == len(PNG_BODY)
+    assert stored.content_type == "image/png"
+    with open(store.resolve(stored.ref), "rb") as f:
+        assert f.read() == PNG_BODY
+
+
+def test_save_file_dedupes_identical_content(tmp_path):
+    store = UploadStore(root=str(tmp_path))
+    first = store.save_file(io.BytesIO(PNG_BODY))
+    second = asyncio.run(store.save_stream(_chunks(PNG_BODY)))
+    assert first.id == second.id
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_rejects_oversized_and_non_image(tmp_path):
+    store = UploadStore(root=str(tmp_path), max_bytes=100)
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(store.save_stream(_chunks(PNG_BODY)))
+    with pytest.raises(ValueError):
+        UploadStore(root=str(tmp_path)).save_file(io.BytesIO(b"<html>nope</html>"))
+    assert os.listdir(tmp_path) == []
+
+
+def test_resolve_rejects_unknown_and_malformed_ids(tmp_path):
+    store = UploadStore(root=str(tmp_path))
+    assert store.resolve("upload:" + "0" * 40) is None
+    assert store.resolve("upload:../../etc/passwd") is None
+
+
+def test_cleanup_removes_expired(tmp_path):
+    store = UploadStore(root=str(tmp_path), ttl_seconds=60)
+    stored = store.save_file(io.BytesIO(PNG_BODY))
+    os.utime(stored.path, (0, 0))
+    assert store.cleanup() == 1
+    assert store.resolve(stored.ref) is None
+
+
+def _zip_bytes(members):
+    import zipfile
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def _tar_gz_bytes(members):
+    import tarfile
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("build", [_zip_bytes, _tar_gz_bytes])
+def test_archives_stored_and_iterated(tmp_path, build):
+    from upload_store import iter_archive_images
+    members = {
+        "a.png": PNG_BODY,
+        "dir/b.JPG": b"\xff\xd8\xff" + b"0" * 10,
+        "notes.txt": b"skip me",
+        "dir/.hidden.png": PNG_BODY,
+        "big.png": PNG_BODY * 10,
+    }
+    store = UploadStore(root=str(tmp_path / "store"), max_bytes=100)
+    stored = store.save_file(io.BytesIO(build(members)))
+    assert stored.content_type in ("application/zip", "application/gzip")
+
+    names = [name for name, _ in iter_archive_images(stored.path, max_member_bytes=1000)]
+    assert names == ["a.png", "dir/b.JPG"]
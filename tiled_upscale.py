@@ -0,0 +1,180 @@
+"""
+Tiled Upscaling
+
+Runs a fixed-factor upscaler (e.g. StableDiffusionUpscalePipeline, x4)
+over overlapping tiles instead of the whole image, so model memory
+depends on the tile size rather than the input size:
+
+- tiles are laid out row by row with a configurable overlap; the last
+  tile in each row/column is shifted back to end on the border so all
+  tiles share one size (lets them go through the model as a batch)
+- overlapping regions are blended with a per-tile weight ramp (linear
+  "feather" or "gaussian") that stays at 1 on the image border
+- blending uses a float accumulator one tile row high; rows are
+  normalised into the result image as soon as no later tile touches
+  them, so working memory stays constant as the image grows taller
+  (the only full-size allocation is the output image itself)
+"""
+
+import threading
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image
+
+BLEND_MODES = ("feather", "gaussian")
+
+Tile = Tuple[int, int, int, int]  # x0, y0, x1, y1 in input pixels
+
+
+def _positions(length: int, tile: int, stride: int) -> List[int]:
+    if length <= tile:
+        return [0]
+    positions = list(range(0, length - tile, stride))
+    positions.append(length - tile)
+    return positions
+
+
+def plan_tiles(width: int, height: int, tile: int = 256, overlap: int = 32) -> List[List[Tile]]:
+    """Tile boxes grouped by row; every tile is min(tile, image) sized"""
+    if overlap >= tile:
+        raise ValueError(f"Tile overlap ({overlap}) must be smaller than the tile size ({tile})")
+    stride = tile - overlap
+    tile_w, tile_h = min(tile, width), min(tile, height)
+    return [
+        [(x, y, x + tile_w, y + tile_h) for x in _positions(width, tile, stride)]
+        for y in _positions(height, tile, stride)
+    ]
+
+
+def _ramp(length: int, overlap: int, start: bool, end: bool, mode: str) -> np.ndarray:
+    """1-D weights rising over `overlap` at inner edges (flat at image borders)"""
+    weights = np.ones(length, dtype=np.float32)
+    if overlap <= 0:
+        return weights
+    n = min(overlap, length // 2)
+    t = (np.arange(n, dtype=np.float32) + 0.5) / n
+    if mode == "gaussian":
+        ramp = np.exp(-0.5 * ((1 - t) / 0.4) ** 2)
+    else:
+        ramp = t
+    if start:
+        weights[:n] = ramp
+    if end:
+        weights[length - n:] = ramp[::-1]
+    return weights
+
+
+def tile_weights(box: Tile, width: int, height: int, overlap: int, scale: int, mode: str = "feather") -> np.ndarray:
+    """2-D blend weights for an upscaled tile (shape: tile_h*scale x tile_w*scale)"""
+    if mode not in BLEND_MODES:
+        raise ValueError(f"Unknown blend mode: {mode} (expected one of {', '.join(BLEND_MODES)})")
+    x0, y0, x1, y1 = box
+    wx = _ramp((x1 - x0) * scale, overlap * scale, x0 > 0, x1 < width, mode)
+    wy = _ramp((y1 - y0) * scale, overlap * scale, y0 > 0, y1 < height, mode)
+    return np.outer(wy, wx)
+
+
+class TileCancelled(Exception):
+    """Raised when a tiled upscale is cancelled between tiles"""
+
+
+class TiledUpscaler:
+    """
+    Upscale images tile by tile.
+
+    `upscale(tiles)` takes a list of equally sized RGB PIL tiles and returns
+    them upscaled by `scale`; it is called with up to `batch_size` tiles at
+    a time.
+    """
+
+    def __init__(
+        self,
+        upscale: Callable[[List[Image.Image]], Sequence[Image.Image]],
+        scale: int = 4,
+        tile: int = 256,
+        overlap: int = 32,
+        blend: str = "feather",
+        batch_size: int = 1
+    ):
+        if blend not in BLEND_MODES:
+            raise ValueError(f"Unknown blend mode: {blend} (expected one of {', '.join(BLEND_MODES)})")
+        self.upscale = upscale
+        self.scale = scale
+        self.tile = tile
+        self.overlap = overlap
+        self.blend = blend
+        self.batch_size = max(1, batch_size)
+
+    def tile_count(self, width: int, height: int) -> int:
+        return sum(len(row) for row in plan_tiles(width, height, self.tile, self.overlap))
+
+    def run(
+        self,
+        image: Image.Image,
+        progress: Optional[Callable[[int, int], None]] = None,
+        cancel: Optional[threading.Event] = None
+    ) -> Image.Image:
+        """Upscaled copy of `image`; `progress(done, total)` is called after each batch"""
+        image = image.convert("RGB")
+        width, height = image.size
+        s = self.scale
+        rows = plan_tiles(width, height, self.tile, self.overlap)
+        total = sum(len(row) for row in rows)
+        tile_h = rows[0][0][3] - rows[0][0][1]
+
+        result = Image.new("RGB", (width * s, height * s))
+        # Float accumulator covering one tile row, starting at `band_y` (input px)
+        band_y = 0
+        acc = np.zeros((tile_h * s, width * s, 3), dtype=np.float32)
+        weight = np.zeros((tile_h * s, width * s, 1), dtype=np.float32)
+        done = 0
+
+        for row in rows:
+            y0 = row[0][1]
+            if y0 > band_y:
+                band_y, acc, weight = self._flush(result, acc, weight, band_y, y0)
+
+            for start in range(0, len(row), self.batch_size):
+                if cancel is not None and cancel.is_set():
+                    raise TileCancelled(f"Cancelled after {done}/{total} tiles")
+                boxes = row[start:start + self.batch_size]
+                outputs = self.upscale([image.crop(box) for box in boxes])
+                for box, out in zip(boxes, outputs):
+                    self._accumulate(acc, weight, box, out, band_y, width, height)
+                done += len(boxes)
+                if progress is not None:
+                    progress(done, total)
+
+        self._flush(result, acc, weight, band_y, height)
+        return result
+
+    def _accumulate(self, acc, weight, box: Tile, out: Image.Image, band_y: int, width: int, height: int):
+        s = self.scale
+        x0, y0, x1, y1 = box
+        expected = ((x1 - x0) * s, (y1 - y0) * s)
+        if out.size != expected:
+            out = out.resize(expected, Image.Resampling.LANCZOS)
+        w = tile_weights(box, width, height, self.overlap, s, self.blend)[..., None]
+        ys = slice((y0 - band_y) * s, (y1 - band_y) * s)
+        xs = slice(x0 * s, x1 * s)
+        acc[ys, xs] += np.asarray(out.convert("RGB"), dtype=np.float32) * w
+        weight[ys, xs] += w
+
+    def _flush(self, result: Image.Image, acc, weight, band_y: int, until: int, strip: int = 64):
+        """Write rows [band_y, until) into `result`; returns the shifted band"""
+        s = self.scale
+        n = (until - band_y) * s
+        # Normalise and shift in strips so temporaries stay a few rows high
+        for top in range(0, n, strip):
+            bottom = min(top + strip, n)
+            pixels = acc[top:bottom] / np.maximum(weight[top:bottom], 1e-6)
+            pixels += 0.5
+            result.paste(Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)), (0, band_y * s + top))
+        for top in range(0, len(acc) - n, strip):
+            bottom = min(top + strip, len(acc) - n)
+            acc[top:bottom] = acc[top + n:bottom + n]
+            weight[top:bottom] = weight[top + n:bottom + n]
+        acc[len(acc) - n:] = 0
+        weight[len(acc) - n:] = 0
+        return until, acc, weight
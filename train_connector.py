@@ -1,26 +1,193 @@
 import argparse
+import json
+import re
 import time
 import os
 import subprocess
 import sys
 import glob
 
+from bucket_sampler import BucketedImageDataset, bucket_loader, dataset_stats
+from dataset_ingest import dataset_path
+
+# tqdm progress from the diffusers training scripts: " 45%|####  | 450/1000 [..., loss=0.123, lr=...]"
+TQDM_STEPS = re.compile(r"(\d+)/(\d+) \[")
+TQDM_LOSS = re.compile(r"loss=([0-9.eE+-]+)")
+
+BASE_MODEL = "stabilityai/stable-diffusion-xl-base-1.0"
+RESOLUTION = 1024
+# Images per optimizer step; gradient accumulation makes up for smaller batches
+EFFECTIVE_BATCH = 4
+
+
+class Reporter:
+    """
+    Progress output. "text" keeps the PROGRESS:/METRICS:/LOG: lines; "json"
+    writes one JSON object per line for the server's training supervisor:
+    {"event": "progress" | "log" | "checkpoint" | "done", ...}
+    """
+
+    def __init__(self, fmt: str = "text"):
+        self.json = fmt == "json"
+
+    def _emit(self, event: str, **data):
+        print(json.dumps({"event": event, **data}), flush=True)
+
+    def log(self, message: str):
+        if self.json:
+            self._emit("log", message=message)
+        else:
+            print(message, flush=True)
+
+    def progress(self, step: int, total: int, loss=None):
+        if self.json:
+            self._emit("progress", step=step, total_steps=total, progress=int(step / total * 100) if total else 0, loss=loss)
+        else:
+            print(f"PROGRESS: {int(step / total * 100) if total else 0}")
+            if loss is not None:
+                print(f"METRICS: loss={loss:.4f} steps={step}/{total}", flush=True)
+
+    def checkpoint(self, path: str):
+        if self.json:
+            self._emit("checkpoint", path=path)
+        else:
+            print(f"LOG: Checkpoint saved: {path}", flush=True)
+
+    def done(self, ok: bool, output: str = None, error: str = None):
+        if self.json:
+            self._emit("done", status="completed" if ok else "failed", output=output, error=error)
+        elif ok:
+            print("PROGRESS: 100", flush=True)
+        else:
+            print(f"ERROR: {error or 'Training failed'}", flush=True)
+
+
+def _trainer_lines(stream):
+    """Lines from the trainer, splitting tqdm's carriage-return updates too"""
+    buffer = ""
+    while True:
+        chunk = stream.read(1024)
+        if not chunk:
+            break
+        buffer += chunk
+        parts = re.split(r"[\r\n]", buffer)
+        buffer = parts.pop()
+        for part in parts:
+            if part.strip():
+                yield part.strip()
+    if buffer.strip():
+        yield buffer.strip()
+
+
+def prepare_latents(args, dataset_dir, instance_prompt, report):
+    """
+    Bring the dataset's latent cache up to date (latent_cache.py): images
+    and captions are encoded once, later runs only encode what changed.
+    Returns the cache directory, or None when the encoders can't be loaded.
+    """
+    try:
+        from latent_cache import CACHE_DIR, LatentCache, sdxl_encoders
+        encoders = sdxl_encoders(BASE_MODEL)
+    except Exception as e:
+        report.log(f"⚠️ Caché de latentes no disponible ({e}); el entrenador codificará cada paso.")
+        return None
+
+    cache = LatentCache(os.path.join(CACHE_DIR, args.project_name))
+    last = [0.0]
+
+    def progress(stats):
+        if time.monotonic() - last[0] >= 5:
+            last[0] = time.monotonic()
+            report.log(f"🗜️ Latentes: {stats.encoded + stats.reused + stats.failed}/{stats.total}")
+
+    stats = cache.prepare(dataset_dir, encoders, instance_prompt, resolution=RESOLUTION, progress=progress)
+    directory = cache.directory(encoders.version, RESOLUTION)
+    del encoders
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+    summary = stats.to_dict()
+    report.log(
+        f"🗜️ Caché de latentes: {summary['encoded']} codificadas ({summary['images_per_second']} img/s), "
+        f"{summary['reused']} reutilizadas, {summary['failed']} fallidas en {summary['elapsed']}s"
+    )
+    return directory
+
+
+def simulated_batches(project_name, report):
+    """Endless batches from an existing latent cache, so the simulation reads it like a trainer would"""
+    from latent_cache import CACHE_DIR, INDEX_FILE, LatentDataset
+    root = os.path.join(CACHE_DIR, project_name)
+    caches = sorted(glob.glob(os.path.join(root, "*", INDEX_FILE)), key=os.path.getmtime)
+    if not caches:
+        return None
+    dataset = LatentDataset(os.path.dirname(caches[-1]))
+    if not len(dataset):
+        return None
+    report.log(f"🗜️ Usando caché de latentes: {len(dataset)} imágenes en {len(dataset.buckets)} buckets")
+
+    def cycle():
+        epoch = 0
+        while True:
+            yield from dataset.batches(batch_size=1, seed=epoch)
+            epoch += 1
+    return cycle()
+
+
+def report_buckets(dataset, batch_size, report):
+    stats = dataset_stats(dataset, batch_size)
+    report.log(
+        f"🪣 Buckets: {stats['buckets_used']} usados, {stats['batches_per_epoch']} batches/época "
+        f"({stats['full_batches']} completos, batch={batch_size}); recorte medio {stats['mean_crop_pct']}% "
+        f"vs {stats['square_crop_pct']}% con recorte cuadrado"
+    )
+    for row in stats["buckets"]:
+        report.log(f"   {row['ratio']:>5} {row['bucket']:>10}: {row['images']} imágenes, "
+                   f"recorte {row['mean_crop_pct']}%, {row['upscaled']} ampliadas")
+
+
+def loader_batches(dataset, args):
+    """Endless same-shape batches from the bucketed image loader"""
+    loader = bucket_loader(dataset, batch_size=args.batch_size, workers=args.loader_workers)
+    epoch = 0
+    while True:
+        loader.batch_sampler.set_epoch(epoch)
+        yield from loader
+        epoch += 1
+
+
 def train(args):
-    print(f"🚀 Iniciando trabajo de entrenamiento: {args.project_name}")
+    report = Reporter(args.progress_format)
+    report.log(f"🚀 Iniciando trabajo de entrenamiento: {args.project_name}")
     
     # Paths
-    dataset_dir = os.path.join("datasets", args.project_name)
+    dataset_dir = dataset_path(args.project_name)
+    instance_prompt = f"a photo of {args.project_name}"
     output_dir = os.path.join("models", "loras", args.project_name)
     os.makedirs(output_dir, exist_ok=True)
     
-    # Check dataset
-    images = glob.glob(os.path.join(dataset_dir, "*"))
-    print(f"📁 Dataset: {len(images)} imágenes encontradas en {dataset_dir}")
+    # Check dataset (.txt caption sidecars from /dataset/caption are not images)
+    image_exts = {".png", ".jpg", ".jpeg", ".webp", ".bmp"}
+    images = [p for p in glob.glob(os.path.join(dataset_dir, "*")) if os.path.splitext(p)[1].lower() in image_exts]
+    captions = [p for p in images if os.path.exists(os.path.splitext(p)[0] + ".txt")]
+    report.log(f"📁 Dataset: {len(images)} imágenes encontradas en {dataset_dir} ({len(captions)} con caption)")
     
     if len(images) == 0:
-        print("⚠️ No hay imágenes en el dataset. Abortando entrenamiento real.")
+        report.log("⚠️ No hay imágenes en el dataset. Abortando entrenamiento real.")
+        report.done(False, error="Dataset is empty")
         return False
 
+    bucketed = BucketedImageDataset.from_directory(dataset_dir, instance_prompt, RESOLUTION)
+    if len(bucketed) == 0:
+        report.log("⚠️ Ninguna imagen del dataset se puede leer. Abortando entrenamiento.")
+        report.done(False, error="No readable images in dataset")
+        return False
+    report_buckets(bucketed, args.batch_size, report)
+    gradient_accumulation = max(1, EFFECTIVE_BATCH // args.batch_size)
+
     # Check for accelerate
     training_script = "scripts/train_dreambooth_lora_sdxl.py" 
     
@@ -29,82 +196,108 @@ def train(args):
         subprocess.run(["accelerate", "--version"], capture_output=True, check=True)
         has_accelerate = True
     except:
-        print("⚠️ 'accelerate' no encontrado en el PATH.")
+        report.log("⚠️ 'accelerate' no encontrado en el PATH.")
 
     if has_accelerate and os.path.exists(training_script):
-        print("⚙️ Entorno de entrenamiento detectado. Iniciando entrenamiento REAL...")
+        report.log("⚙️ Entorno de entrenamiento detectado. Iniciando entrenamiento REAL...")
+        # Explicit opt-in: the stock script does not accept --latent_cache_dir
+        cache_dir = prepare_latents(args, dataset_dir, instance_prompt, report) if args.latent_cache else None
         
         command = [
             "accelerate", "launch",
             training_script,
-            f"--pretrained_model_name_or_path=stabilityai/stable-diffusion-xl-base-1.0",
+            f"--pretrained_model_name_or_path={BASE_MODEL}",
             f"--instance_data_dir={dataset_dir}",
             f"--output_dir={output_dir}",
-            f"--instance_prompt=a photo of {args.project_name}", 
+            f"--instance_prompt={instance_prompt}", 
             f"--max_train_steps={args.max_train_steps}",
-            "--resolution=1024",
-            "--train_batch_size=1",
-            "--gradient_accumulation_steps=4",
+            f"--resolution={RESOLUTION}",
+            f"--train_batch_size={args.batch_size}",
+            f"--gradient_accumulation_steps={gradient_accumulation}",
             "--learning_rate=1e-4",
             "--lr_scheduler=constant",
             "--lr_warmup_steps=0",
             "--mixed_precision=fp16",
             "--use_8bit_adam",
-            "--gradient_checkpointing"
+            "--gradient_checkpointing",
+            # Without a persistent cache the script still encodes once per run, not per epoch
+            "--cache_latents"
         ]
+        if cache_dir:
+            command.append(f"--latent_cache_dir={cache_dir}")
         
         try:
             # Stream output
             process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-            
-            while True:
-                line = process.stdout.readline()
-                if line == '' and process.poll() is not None:
-                    break
-                if line:
-                    line = line.strip()
-                    print(line)
-                    sys.stdout.flush()
+            last_step = 0
+            for line in _trainer_lines(process.stdout):
+                steps = TQDM_STEPS.search(line)
+                if steps:
+                    step, total = int(steps.group(1)), int(steps.group(2))
+                    if step != last_step:
+                        last_step = step
+                        loss = TQDM_LOSS.search(line)
+                        report.progress(step, total, float(loss.group(1)) if loss else None)
+                    continue
+                report.log(line)
+            process.wait()
             
             if process.returncode == 0:
-                print("PROGRESS: 100")
-                print("✅ Entrenamiento Real Completado Exitosamente.")
+                report.log("✅ Entrenamiento Real Completado Exitosamente.")
+                report.done(True, output=output_dir)
                 return True
             else:
-                print("ERROR: Training failed")
-                print("❌ Error en el proceso de entrenamiento.")
+                report.log("❌ Error en el proceso de entrenamiento.")
+                report.done(False, error=f"Trainer exited with code {process.returncode}")
                 return False
                 
         except Exception as e:
-            print(f"❌ Excepción durante ejecución: {e}")
+            report.log(f"❌ Excepción durante ejecución: {e}")
+            report.done(False, error=str(e))
             return False
 
     else:
-        print("⚠️ Script de entrenamiento o 'accelerate' no encontrados.")
-        print("ℹ️ Ejecutando SIMULACIÓN para pruebas de UI...")
+        report.log("⚠️ Script de entrenamiento o 'accelerate' no encontrados.")
+        report.log("ℹ️ Ejecutando SIMULACIÓN para pruebas de UI...")
         
-        print(f"⚙️ Config Simulada: Batch Size=1, Gradient Acc=4, FP16")
+        report.log(f"⚙️ Config Simulada: Batch Size={args.batch_size}, Gradient Acc={gradient_accumulation}, FP16")
         total_steps = args.max_train_steps
+        batches = simulated_batches(args.project_name, report) if args.latent_cache else None
+        if batches is None:
+            batches = loader_batches(bucketed, args)
         
         for i in range(total_steps):
-            time.sleep(0.5)
+            next(batches)
+            time.sleep(args.step_seconds)
             loss = 0.15 - (i / total_steps * 0.1)
-            prog = int((i + 1) / total_steps * 100)
-            print(f"PROGRESS: {prog}")
-            print(f"METRICS: loss={loss:.4f} steps={i+1}/{total_steps}")
+            report.progress(i + 1, total_steps, loss)
             if i % 10 == 0:
-                  print(f"LOG: Step {i}/{total_steps} - Batch processed")
+                report.log(f"Step {i}/{total_steps} - Batch processed")
         
         # Crear un archivo dummy como "resultado"
-        with open(os.path.join(output_dir, f"{args.project_name}.safetensors"), "w") as f:
+        output_file = os.path.join(output_dir, f"{args.project_name}.safetensors")
+        with open(output_file, "w") as f:
             f.write("dummy model content")
+        report.checkpoint(output_file)
             
-        print("✅ Simulación Completada. Modelo dummy guardado.")
+        report.log("✅ Simulación Completada. Modelo dummy guardado.")
+        report.done(True, output=output_dir)
         return True
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--project_name', type=str, required=True)
     parser.add_argument('--max_train_steps', type=int, default=100)
+    parser.add_argument('--progress-format', choices=['text', 'json'], default='text')
+    parser.add_argument('--step-seconds', type=float, default=0.5, help='Simulated step time')
+    parser.add_argument('--latent-cache', action=argparse.BooleanOptionalAction, default=False,
+                        help='Encode the dataset once into cache/latents/<project> before training. '
+                             'Real training then passes --latent_cache_dir, so only enable it with a '
+                             'training script that accepts it (the stock DreamBooth script does not)')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Images per batch. Only the simulated trainer draws batches from one '
+                             'aspect-ratio bucket; the DreamBooth script center-crops to RESOLUTION')
+    parser.add_argument('--loader-workers', type=int, default=min(4, (os.cpu_count() or 1) - 1),
+                        help='Image loader processes (0: load in the training process)')
     args = parser.parse_args()
-    train(args)
+    sys.exit(0 if train(args) else 1)
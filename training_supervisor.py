@@ -0,0 +1,463 @@
+"""
+Training Job Supervisor
+
+Runs train_connector.py jobs as asyncio subprocesses (no thread blocked
+per job) and tracks them from its JSON-lines progress protocol:
+
+    {"event": "progress", "step": 12, "total_steps": 100, "progress": 12, "loss": 0.14}
+    {"event": "log", "message": "..."}
+    {"event": "checkpoint", "path": "models/loras/x/x.safetensors"}
+    {"event": "done", "status": "completed" | "failed", "output": ..., "error": ...}
+
+Anything else on stdout (trainer warnings, tracebacks) is kept as a log line.
+
+- logs live in a fixed-size ring buffer per job with absolute line
+  offsets, so clients read incrementally (`offset` -> `next_offset`) and
+  several pollers never steal lines from each other; the full log is
+  appended to a file next to the job state
+- job state is written to `<state_dir>/<job_id>.json` (progress at most
+  every `persist_interval` seconds); jobs found running at startup were
+  cut off by a restart and are marked "interrupted"
+- cancellation terminates the process (then kills it after a grace period)
+- with a GPUArbiter, each job gets a device lease before it is spawned
+  (pinned through CUDA_VISIBLE_DEVICES, released when the process exits),
+  and the arbiter may pause (SIGSTOP) / resume (SIGCONT) it while
+  interactive requests are waiting for the GPU it shares
+- only `max_jobs` finished jobs stay in memory; older ones are read back
+  from disk on request
+"""
+
+import asyncio
+import collections
+import json
+import os
+import re
+import signal
+import sys
+import time
+import uuid
+from dataclasses import asdict, dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional
+import logging
+
+from gpu_arbiter import GPUArbiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_DIR = os.path.join("cache", "training")
+TRAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "train_connector.py")
+
+RUNNING = "training"
+PAUSED = "paused"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+INTERRUPTED = "interrupted"
+FINISHED = (COMPLETED, FAILED, CANCELLED, INTERRUPTED)
+
+_JOB_ID = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+class LogRing:
+    """Last `capacity` lines, addressed by absolute line number"""
+
+    def __init__(self, capacity: int = 2000):
+        self._lines: "collections.deque[str]" = collections.deque(maxlen=capacity)
+        self.total = 0
+
+    def append(self, line: str):
+        self._lines.append(line)
+        self.total += 1
+
+    @property
+    def first_offset(self) -> int:
+        return self.total - len(self._lines)
+
+    def read(self, offset: int = 0, limit: int = 500) -> dict:
+        """Lines from `offset` on; `dropped` counts lines already rotated out"""
+        start = max(offset, self.first_offset)
+        begin = start - self.first_offset
+        lines = list(self._lines)[begin:begin + max(0, limit)]
+        return {
+            "lines": lines,
+            "offset": start,
+            "next_offset": start + len(lines),
+            "dropped": max(0, self.first_offset - offset),
+            "total": self.total
+        }
+
+
+@dataclass
+class TrainingJob:
+    job_id: str
+    project_name: str
+    total_steps: int
+    batch_size: int = 1
+    status: str = RUNNING
+    progress: int = 0
+    current_step: int = 0
+    loss: Optional[float] = None
+    started: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    returncode: Optional[int] = None
+    error: Optional[str] = None
+    output: Optional[str] = None
+    checkpoints: List[str] = field(default_factory=list)
+    pid: Optional[int] = None
+    device: Optional[int] = None
+    gpu_mode: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        elapsed = int((self.finished or time.time()) - self.started)
+        data["elapsed_time"] = f"{elapsed // 60:02d}:{elapsed % 60:02d}"
+        return data
+
+
+Notify = Callable[[str, str, dict], Awaitable[None]]
+
+
+class TrainingSupervisor:
+    def __init__(
+        self,
+        state_dir: str = DEFAULT_STATE_DIR,
+        command: Optional[Callable[[TrainingJob], List[str]]] = None,
+        notify: Optional[Notify] = None,
+        log_lines: int = 2000,
+        max_jobs: int = 50,
+        persist_interval: float = 2.0,
+        kill_timeout: float = 10.0,
+        cwd: Optional[str] = None,
+        arbiter: Optional[GPUArbiter] = None
+    ):
+        """
+        `command(job)` builds the argv (default: train_connector.py with JSON
+        progress); `notify(job_id, event, data)` pushes updates (e.g. to
+        websocket_manager); `arbiter` places jobs on devices (start() then
+        raises NoDeviceAvailable when none is free).
+        """
+        self.state_dir = state_dir
+        self.command = command or self._default_command
+        self.notify = notify
+        self.log_lines = log_lines
+        self.max_jobs = max_jobs
+        self.persist_interval = persist_interval
+        self.kill_timeout = kill_timeout
+        self.cwd = cwd
+        self.arbiter = arbiter
+        if arbiter is not None:
+            arbiter.bind_training(self.pause, self.resume)
+        self.jobs: Dict[str, TrainingJob] = {}
+        self.logs: Dict[str, LogRing] = {}
+        self._processes: Dict[str, asyncio.subprocess.Process] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._cancelled: set = set()
+        self._persisted: Dict[str, float] = {}
+        self._log_files: Dict[str, "object"] = {}
+        self._recovered = False
+
+    @staticmethod
+    def _default_command(job: TrainingJob) -> List[str]:
+        return [
+            sys.executable, TRAIN_SCRIPT,
+            "--project_name", job.project_name,
+            "--max_train_steps", str(job.total_steps),
+            "--batch-size", str(job.batch_size),
+            "--progress-format", "json"
+        ]
+
+    # ---- persistence ----
+
+    def _state_path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f"{job_id}.json")
+
+    def log_path(self, job_id: str) -> str:
+        return os.path.join(self.state_dir, f"{job_id}.log")
+
+    def _persist(self, job: TrainingJob, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self._persisted.get(job.job_id, 0.0) < self.persist_interval:
+            return
+        self._persisted[job.job_id] = now
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = self._state_path(job.job_id)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(asdict(job), f)
+        os.replace(tmp, path)
+
+    def _load(self, job_id: str) -> Optional[TrainingJob]:
+        if not _JOB_ID.match(job_id):
+            return None
+        try:
+            with open(self._state_path(job_id), encoding="utf-8") as f:
+                return TrainingJob(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def recover(self):
+        """Mark jobs persisted as running (by a previous server process) as interrupted"""
+        self._recovered = True
+        if not os.path.isdir(self.state_dir):
+            return
+        for name in os.listdir(self.state_dir):
+            if not name.endswith(".json"):
+                continue
+            job = self._load(name[:-5])
+            if job is not None and job.status in (RUNNING, PAUSED):
+                job.status = INTERRUPTED
+                job.finished = job.finished or time.time()
+                job.error = "Server restarted while the job was running"
+                self._persist(job, force=True)
+
+    # ---- public API ----
+
+    async def start(self, project_name: str, steps: int, batch_size: int = 1) -> TrainingJob:
+        if not self._recovered:
+            self.recover()
+        job_id = f"train_{uuid.uuid4().hex[:10]}"
+        env = None
+        if self.arbiter is not None:
+            lease = await self.arbiter.reserve_training(job_id)
+            env = {**os.environ, **lease.env()}
+        job = TrainingJob(job_id=job_id, project_name=project_name, total_steps=steps, batch_size=batch_size)
+        if self.arbiter is not None:
+            job.device, job.gpu_mode = lease.device, lease.mode
+        self.jobs[job.job_id] = job
+        self.logs[job.job_id] = LogRing(self.log_lines)
+        os.makedirs(self.state_dir, exist_ok=True)
+        self._log_files[job.job_id] = open(self.log_path(job.job_id), "a", encoding="utf-8")
+        self._append_log(job, "Job initialized.")
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self.command(job),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=self.cwd,
+                env=env,
+                limit=1024 * 1024,
+                # Own process group, so cancel also stops the trainer it launches
+                start_new_session=True
+            )
+        except OSError as e:
+            job.status, job.error, job.finished = FAILED, f"Could not start training: {e}", time.time()
+            self._append_log(job, job.error)
+            self._close_log(job.job_id)
+            self._persist(job, force=True)
+            await self._release_device(job)
+            self._prune()
+            return job
+        job.pid = process.pid
+        self._processes[job.job_id] = process
+        self._append_log(job, "Training process spawned.")
+        self._persist(job, force=True)
+        self._tasks[job.job_id] = asyncio.ensure_future(self._supervise(job, process))
+        return job
+
+    def get(self, job_id: str) -> Optional[TrainingJob]:
+        return self.jobs.get(job_id) or self._load(job_id)
+
+    def list(self) -> List[dict]:
+        return [job.to_dict() for job in sorted(self.jobs.values(), key=lambda j: j.started, reverse=True)]
+
+    def read_logs(self, job_id: str, offset: int = 0, limit: int = 500) -> Optional[dict]:
+        ring = self.logs.get(job_id)
+        if ring is not None:
+            return ring.read(offset, limit)
+        return self._read_log_file(job_id, offset, limit)
+
+    async def cancel(self, job_id: str) -> bool:
+        """Stop a running job; False if it is not running"""
+        process = self._processes.get(job_id)
+        if process is None or process.returncode is not None:
+            return False
+        task = self._tasks[job_id]
+        self._cancelled.add(job_id)
+        self._signal(process, signal.SIGTERM)
+        job = self.jobs.get(job_id)
+        if job is not None and job.status == PAUSED:
+            # A stopped process only handles SIGTERM once continued
+            self._signal(process, signal.SIGCONT)
+        try:
+            await asyncio.wait_for(asyncio.shield(task), self.kill_timeout)
+        except asyncio.TimeoutError:
+            self._signal(process, signal.SIGKILL)
+            await task
+        return True
+
+    def pause(self, job_id: str) -> bool:
+        """Stop a running job in place (SIGSTOP); its GPU memory stays allocated"""
+        return self._set_paused(job_id, True)
+
+    def resume(self, job_id: str) -> bool:
+        """Continue a paused job"""
+        return self._set_paused(job_id, False)
+
+    def _set_paused(self, job_id: str, paused: bool) -> bool:
+        process = self._processes.get(job_id)
+        job = self.jobs.get(job_id)
+        if process is None or process.returncode is not None or job is None or job_id in self._cancelled:
+            return False
+        if job.status != (RUNNING if paused else PAUSED):
+            return False
+        self._signal(process, signal.SIGSTOP if paused else signal.SIGCONT)
+        job.status = PAUSED if paused else RUNNING
+        self._append_log(job, "Training paused." if paused else "Training resumed.")
+        self._persist(job, force=True)
+        asyncio.ensure_future(self._notify(job, "training_paused" if paused else "training_resumed", {}))
+        return True
+
+    async def shutdown(self):
+        """Stop every running job (they cannot outlive the server's pipes)"""
+        for job_id in list(self._processes):
+            await self.cancel(job_id)
+            job = self.jobs.get(job_id)
+            if job is not None and job.status == CANCELLED:
+                job.status, job.error = INTERRUPTED, "Server shut down"
+                self._persist(job, force=True)
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._processes),
+            "paused": sum(1 for job in self.jobs.values() if job.status == PAUSED),
+            "in_memory": len(self.jobs),
+            "log_lines_in_memory": sum(len(ring._lines) for ring in self.logs.values())
+        }
+
+    # ---- supervision ----
+
+    @staticmethod
+    def _signal(process: asyncio.subprocess.Process, sig: int):
+        try:
+            os.killpg(process.pid, sig)
+        except (ProcessLookupError, PermissionError, AttributeError):
+            try:
+                process.send_signal(sig)
+            except ProcessLookupError:
+                pass
+
+    async def _supervise(self, job: TrainingJob, process: asyncio.subprocess.Process):
+        try:
+            while True:
+                try:
+                    raw = await process.stdout.readline()
+                except ValueError:
+                    # Line over the stream limit (already discarded): keep reading
+                    continue
+                if not raw:
+                    break
+                await self._handle_line(job, raw.decode("utf-8", errors="replace").rstrip())
+            job.returncode = await process.wait()
+        except Exception as e:
+            logger.warning(f"Supervising {job.job_id} failed: {e}")
+            job.error = job.error or str(e)
+            job.returncode = await process.wait()
+        finally:
+            self._processes.pop(job.job_id, None)
+            self._tasks.pop(job.job_id, None)
+            await self._release_device(job)
+
+        if job.job_id in self._cancelled:
+            self._cancelled.discard(job.job_id)
+            job.status = CANCELLED
+            self._append_log(job, "Training cancelled.")
+        elif job.returncode == 0 and job.status != FAILED:
+            job.status, job.progress = COMPLETED, 100
+            self._append_log(job, "Training completed successfully.")
+        else:
+            job.status = FAILED
+            job.error = job.error or f"Training process exited with code {job.returncode}"
+            self._append_log(job, "Training process exited with error.")
+        job.finished = time.time()
+        self._close_log(job.job_id)
+        self._persist(job, force=True)
+        await self._notify(job, "training_complete", job.to_dict())
+        self._prune()
+
+    async def _release_device(self, job: TrainingJob):
+        if self.arbiter is not None:
+            await self.arbiter.release_training(job.job_id)
+
+    async def _handle_line(self, job: TrainingJob, line: str):
+        if not line:
+            return
+        event = None
+        if line.startswith("{"):
+            try:
+                event = json.loads(line)
+            except ValueError:
+                event = None
+        if not isinstance(event, dict) or "event" not in event:
+            self._append_log(job, line)
+            return
+
+        kind = event["event"]
+        if kind == "progress":
+            job.current_step = int(event.get("step", job.current_step))
+            job.total_steps = int(event.get("total_steps") or job.total_steps)
+            job.progress = int(event.get("progress", job.progress))
+            if event.get("loss") is not None:
+                job.loss = float(event["loss"])
+            self._persist(job)
+            await self._notify(job, "training_progress", {
+                "progress": job.progress,
+                "current_step": job.current_step,
+                "total_steps": job.total_steps,
+                "loss": job.loss
+            })
+        elif kind == "log":
+            self._append_log(job, str(event.get("message", "")))
+        elif kind == "checkpoint":
+            job.checkpoints.append(event.get("path"))
+            self._append_log(job, f"Checkpoint saved: {event.get('path')}")
+            await self._notify(job, "training_checkpoint", {"path": event.get("path")})
+        elif kind == "done":
+            job.output = event.get("output")
+            if event.get("status") == FAILED:
+                job.status = FAILED
+                job.error = event.get("error")
+
+    def _append_log(self, job: TrainingJob, line: str):
+        ring = self.logs.get(job.job_id)
+        if ring is not None:
+            ring.append(line)
+        log_file = self._log_files.get(job.job_id)
+        if log_file is not None:
+            log_file.write(line + "\n")
+            log_file.flush()
+
+    def _close_log(self, job_id: str):
+        log_file = self._log_files.pop(job_id, None)
+        if log_file is not None:
+            log_file.close()
+
+    def _read_log_file(self, job_id: str, offset: int, limit: int) -> Optional[dict]:
+        path = self.log_path(job_id)
+        if not _JOB_ID.match(job_id) or not os.path.exists(path):
+            return None
+        lines = []
+        total = 0
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for total, line in enumerate(f, start=1):
+                if offset < total <= offset + limit:
+                    lines.append(line.rstrip("\n"))
+        return {"lines": lines, "offset": offset, "next_offset": offset + len(lines), "dropped": 0, "total": total}
+
+    async def _notify(self, job: TrainingJob, event: str, data: dict):
+        if self.notify is None:
+            return
+        try:
+            await self.notify(job.job_id, event, data)
+        except Exception as e:
+            logger.warning(f"Training notification failed: {e}")
+
+    def _prune(self):
+        finished = sorted(
+            (job for job in self.jobs.values() if job.status in FINISHED and job.job_id not in self._processes),
+            key=lambda j: j.finished or 0
+        )
+        for job in finished[:max(0, len(finished) - self.max_jobs)]:
+            # Still on disk: get() and read_logs() fall back to the files
+            self.jobs.pop(job.job_id, None)
+            self.logs.pop(job.job_id, None)
+            self._persisted.pop(job.job_id, None)
@@ -0,0 +1,255 @@
+"""
+Binary Upload Store
+
+Receives raw image uploads (multipart or application/octet-stream) by
+streaming them into a spooled temporary file, then persists them under a
+content-hash id. Any image field of the JSON endpoints accepts
+``upload:<id>`` in place of base64, so a client uploads an image once and
+references it in later requests without resending it.
+
+Ids use the same hash as ``image_cache.content_key`` so decodes of an
+uploaded image share cache entries with identical URL fetches.
+
+Archives (zip, tar and compressed tar) and videos are accepted as well,
+with their own size limit, for batch and sequence endpoints that take
+many frames at once; ``iter_archive_images`` streams archive members.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from dataclasses import dataclass
+from typing import AsyncIterator, BinaryIO, Iterator, Optional, Tuple
+import logging
+
+from http_fetch import sniff_image_type
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_REF_PREFIX = "upload:"
+_ID_PATTERN = re.compile(r"^[0-9a-f]{40}$")
+_CHUNK_SIZE = 1024 * 1024
+_SNIFF_BYTES = 512  # tar's "ustar" magic sits at offset 257
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif", ".tif", ".tiff")
+
+_ARCHIVE_SIGNATURES = (
+    (b"PK\x03\x04", "application/zip"),
+    (b"PK\x05\x06", "application/zip"),
+    (b"\x1f\x8b", "application/gzip"),
+    (b"BZh", "application/x-bzip2"),
+    (b"\xfd7zXZ\x00", "application/x-xz"),
+)
+
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds the configured size limit"""
+
+
+def sniff_archive_type(head: bytes) -> Optional[str]:
+    """Detect zip / tar / compressed-tar uploads from their first bytes"""
+    if head[257:262] == b"ustar":
+        return "application/x-tar"
+    for signature, mime in _ARCHIVE_SIGNATURES:
+        if head.startswith(signature):
+            return mime
+    return None
+
+
+def sniff_video_type(head: bytes) -> Optional[str]:
+    """Detect common video containers from their first bytes"""
+    if head[4:8] == b"ftyp":
+        return "video/quicktime" if head[8:10] == b"qt" else "video/mp4"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "video/webm"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "video/x-msvideo"
+    return None
+
+
+def iter_archive_images(path: str, max_member_bytes: int) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yield (name, data) for image members of a zip or tar archive, in
+    archive order. Tars are read as a stream, so compressed tars are never
+    decompressed to disk. Oversized members and hidden files are skipped.
+    """
+    def wanted(name: str, size: int) -> bool:
+        base = os.path.basename(name)
+        return (
+            not base.startswith(".")
+            and "__MACOSX" not in name
+            and base.lower().endswith(IMAGE_EXTENSIONS)
+            and size <= max_member_bytes
+        )
+
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and wanted(info.filename, info.file_size):
+                    yield info.filename, archive.read(info)
+        return
+
+    with tarfile.open(path, mode="r|*") as archive:
+        for member in archive:
+            if member.isfile() and wanted(member.name, member.size):
+                yield member.name, archive.extractfile(member).read()
+
+
+@dataclass
+class StoredUpload:
+    """An upload persisted in the store"""
+    id: str
+    path: str
+    size: int
+    content_type: str
+
+    @property
+    def ref(self) -> str:
+        return f"{UPLOAD_REF_PREFIX}{self.id}"
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "ref": self.ref,
+            "size": self.size,
+            "content_type": self.content_type
+        }
+
+
+class UploadStore:
+    """Content-addressed store for uploaded images"""
+
+    def __init__(
+        self,
+        root: str = "uploads",
+        max_bytes: int = 64 * 1024**2,
+        spool_bytes: int = 1024**2,
+        ttl_seconds: int = 24 * 3600,
+        max_archive_bytes: int = 2 * 1024**3
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_archive_bytes = max_archive_bytes
+        self.spool_bytes = spool_bytes
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(self.root, exist_ok=True)
+
+    async def save_stream(self, chunks: AsyncIterator[bytes]) -> StoredUpload:
+        """
+        Spool an async byte stream (e.g. ``request.stream()``) and persist it.
+        Only the receive loop runs on the event loop: chunks are gathered
+        into ~1 MB writes, and spool writes (which spill to disk past
+        `spool_bytes`) and the final copy run in a worker thread.
+        """
+        spool = tempfile.SpooledTemporaryFile(max_size=self.spool_bytes)
+        hasher = hashlib.blake2b(digest_size=20)
+        total = 0
+        head = b""
+        pending = []
+        pending_bytes = 0
+        # The type (and so the limit) is known once enough bytes arrived
+        limit = max(self.max_bytes, self.max_archive_bytes)
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                if len(head) < _SNIFF_BYTES:
+                    head += chunk[:_SNIFF_BYTES - len(head)]
+                    if len(head) >= _SNIFF_BYTES:
+                        limit = self._size_limit(head)
+                total += len(chunk)
+                if total > limit:
+                    raise UploadTooLarge(f"Upload exceeds {limit} bytes")
+                hasher.update(chunk)
+                pending.append(chunk)
+                pending_bytes += len(chunk)
+                if pending_bytes >= _CHUNK_SIZE:
+                    await asyncio.to_thread(spool.write, b"".join(pending))
+                    pending, pending_bytes = [], 0
+            if pending:
+                await asyncio.to_thread(spool.write, b"".join(pending))
+            return await asyncio.to_thread(self._persist, spool, hasher.hexdigest(), total)
+        finally:
+            await asyncio.to_thread(spool.close)
+
+    def save_file(self, fileobj: BinaryIO) -> StoredUpload:
+        """Persist an already-spooled file (e.g. a multipart ``UploadFile.file``)"""
+        hasher = hashlib.blake2b(digest_size=20)
+        total = 0
+        fileobj.seek(0)
+        limit = self._size_limit(fileobj.read(_SNIFF_BYTES))
+        fileobj.seek(0)
+        while True:
+            chunk = fileobj.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > limit:
+                raise UploadTooLarge(f"Upload exceeds {limit} bytes")
+            hasher.update(chunk)
+        return self._persist(fileobj, hasher.hexdigest(), total)
+
+    def _size_limit(self, head: bytes) -> int:
+        if sniff_archive_type(head) or sniff_video_type(head):
+            return self.max_archive_bytes
+        return self.max_bytes
+
+    def _persist(self, fileobj: BinaryIO, digest: str, size: int) -> StoredUpload:
+        fileobj.seek(0)
+        head = fileobj.read(_SNIFF_BYTES)
+        content_type = sniff_image_type(head) or sniff_archive_type(head) or sniff_video_type(head)
+        if content_type is None:
+            raise ValueError("Upload is not a supported image, archive or video format")
+        if size > self._size_limit(head):
+            raise UploadTooLarge(f"Upload exceeds {self._size_limit(head)} bytes")
+
+        path = os.path.join(self.root, digest)
+        if os.path.exists(path):
+            # Same content uploaded before: refresh its age and reuse it
+            os.utime(path)
+        else:
+            fileobj.seek(0)
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".incoming-")
+            try:
+                with os.fdopen(fd, "wb") as out:
+                    shutil.copyfileobj(fileobj, out, _CHUNK_SIZE)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        return StoredUpload(digest, path, size, content_type)
+
+    def resolve(self, ref: str) -> Optional[str]:
+        """File path for an ``upload:<id>`` reference (or bare id), or None"""
+        upload_id = ref[len(UPLOAD_REF_PREFIX):] if ref.startswith(UPLOAD_REF_PREFIX) else ref
+        if not _ID_PATTERN.match(upload_id):
+            return None
+        path = os.path.join(self.root, upload_id)
+        return path if os.path.isfile(path) else None
+
+    def cleanup(self) -> int:
+        """Delete uploads not used within the TTL. Returns number removed."""
+        cutoff = time.time() - self.ttl_seconds
+        removed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        if removed:
+            logger.info(f"Removed {removed} expired upload(s)")
+        return removed
+
+
+# Global upload store instance
+upload_store = UploadStore()
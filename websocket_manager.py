@@ -41,6 +41,14 @@ class ConnectionManager:
                     del self.active_connections[job_id]
         logger.info(f"Client disconnected from job {job_id}")
     
+    def connection_count(self) -> int:
+        """Total number of open WebSocket connections across all jobs"""
+        return sum(len(sockets) for sockets in list(self.active_connections.values()))
+    
+    def subscribed_jobs(self) -> int:
+        """Number of jobs with at least one subscriber"""
+        return len(self.active_connections)
+    
     async def send_progress(self, job_id: str, data: dict):
         """Send progress update to all clients subscribed to a job"""
         if job_id not in self.active_connections: